@@ -31,10 +31,23 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 db = SQLAlchemy(model_class=Base)
 db.init_app(app)
 
+# The job queue writes to SQLite from several threads; WAL lets readers and
+# the writer proceed concurrently and avoids an fsync on every commit
+if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+    from sqlalchemy import event
+
+    with app.app_context():
+        @event.listens_for(db.engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+
 # Import models and routes after app initialization
 with app.app_context():
     # Create all tables
-    from models import User, VideoRequest, Video
+    from models import User, VideoRequest, Video, VideoJob, CoalescedRequest
     db.create_all()
     
     # Import route modules
@@ -45,7 +58,17 @@ with app.app_context():
     app.register_blueprint(routes.web.bp)
     app.register_blueprint(routes.api.bp, url_prefix="/api")
 
+# Start the background workers that process queued video requests
+from services.job_queue import start_embedded_workers
+start_embedded_workers(app)
+
 # Health check route
 @app.route("/health")
 def health_check():
     return jsonify({"status": "healthy", "version": "1.0.0"})
+
+# Prometheus metrics route
+@app.route("/metrics")
+def metrics():
+    from services.metrics import render_metrics
+    return render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
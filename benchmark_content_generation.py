@@ -0,0 +1,194 @@
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+import statistics
+from typing import Dict, List
+
+import services.content_generator as content_generator
+import services.llm_client as llm_client
+from config import settings
+from services.metrics import OPERATION_DURATION
+
+
+class FakeUsage:
+    def __init__(self, prompt_tokens: int, response_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = response_tokens
+
+
+class FakeResponse:
+    def __init__(self, text: str, prompt: str):
+        self.text = text
+        # Roughly four characters per token
+        self.usage_metadata = FakeUsage(len(prompt) // 4, len(text) // 4)
+
+
+class FakeModel:
+    """
+    Stand-in for genai.GenerativeModel that answers every prompt with JSON
+    after sleeping for a randomly drawn latency. Some answers are malformed
+    the way free-form model output often is (surrounding prose, trailing commas).
+    """
+
+    def __init__(self, mean_latency: float, jitter: float, malformed_rate: float = 0.0,
+                 structured_malformed_rate: float = 0.0, token_latency: float = 0.0, seed: int = 42):
+        self.mean_latency = mean_latency
+        self.jitter = jitter
+        self.malformed_rate = malformed_rate
+        self.structured_malformed_rate = structured_malformed_rate
+        self.token_latency = token_latency
+        self.random = random.Random(seed)
+
+    def _latency(self, response_tokens: int) -> float:
+        # Log-normal latency gives the long tail typical of LLM calls; longer
+        # answers also take longer to decode
+        return self.mean_latency * self.random.lognormvariate(0, self.jitter) + response_tokens * self.token_latency
+
+    def _malform(self, text: str) -> str:
+        if self.random.random() < 0.5:
+            return "Here is the JSON you asked for:\n" + text.replace("}", "},", 1) + "\nHope this helps!"
+        return text[:len(text) // 2]
+
+    def generate_content(self, prompt: str, generation_config=None, **kwargs) -> FakeResponse:
+        if generation_config is not None:
+            payload = {
+                "title": "Fake title",
+                "description": "Fake description",
+                "learning_objectives": ["Objective 1", "Objective 2"],
+                "key_points": [{"point": f"Point {i}", "explanation": "Because"} for i in range(5)],
+                "questions": [{"question": "Why?", "answer": "Because"}],
+                "activities": [{"title": "Try it", "description": "Do it", "materials_needed": "None"}],
+                "additional_resources": [{"type": "website", "title": "Resource", "description": "Read this"}],
+                "script": "Fake script",
+                "scenes": [{
+                    "description": f"Scene {i}",
+                    "narration": "Narration",
+                    "visual_elements": "Diagram",
+                    "duration_seconds": 10
+                } for i in range(6)]
+            }
+            text = json.dumps(payload)
+            if self.random.random() < self.structured_malformed_rate:
+                text = self._malform(text)
+            time.sleep(self._latency(len(text) // 4))
+            return FakeResponse(text, prompt)
+
+        if "catchy" in prompt:
+            payload = {
+                "title": "Fake title",
+                "description": "Fake description",
+                "learning_objectives": ["Objective 1", "Objective 2"]
+            }
+        elif "key educational points" in prompt:
+            payload = [{"point": f"Point {i}", "explanation": "Because"} for i in range(5)]
+        elif "interactive elements" in prompt:
+            payload = {
+                "questions": [{"question": "Why?", "answer": "Because"}],
+                "activities": [{"title": "Try it", "description": "Do it", "materials_needed": "None"}]
+            }
+        elif "resources" in prompt:
+            payload = [{"type": "website", "title": "Resource", "description": "Read this"}]
+        else:
+            payload = {
+                "script": "Fake script",
+                "scenes": [{
+                    "description": f"Scene {i}",
+                    "narration": "Narration",
+                    "visual_elements": "Diagram",
+                    "duration_seconds": 10
+                } for i in range(6)]
+            }
+
+        text = json.dumps(payload)
+        if self.random.random() < self.malformed_rate:
+            text = self._malform(text)
+        time.sleep(self._latency(len(text) // 4))
+        return FakeResponse(text, prompt)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def counter_total(counter) -> float:
+    with counter.lock:
+        return sum(counter.values.values())
+
+
+def run_benchmark(mode: str, workers: int, iterations: int, fake_model: FakeModel) -> Dict[str, float]:
+    """
+    Time generate_educational_content in the given mode and measure its
+    token use and parse failures.
+    """
+    llm_client.genai.GenerativeModel = lambda *args, **kwargs: fake_model
+    llm_client.reset_models()
+    settings.CONTENT_STAGE_WORKERS = workers
+
+    tokens_before = counter_total(content_generator.GEMINI_TOKENS)
+    failures_before = counter_total(content_generator.PARSE_FAILURES)
+    calls_before = sum(entry[2] for key, entry in OPERATION_DURATION.values.items() if key[0].startswith("gemini_"))
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        content_generator.generate_educational_content(
+            "Science", "Photosynthesis", "Beginner", "How do plants make food?",
+            use_cache=False, generation_mode=mode
+        )
+        timings.append(time.perf_counter() - start)
+
+    calls = sum(entry[2] for key, entry in OPERATION_DURATION.values.items() if key[0].startswith("gemini_")) - calls_before
+    return {
+        "p50": percentile(timings, 50),
+        "p99": percentile(timings, 99),
+        "mean": statistics.mean(timings),
+        "tokens": (counter_total(content_generator.GEMINI_TOKENS) - tokens_before) / iterations,
+        "calls": calls / iterations,
+        "failure_rate": (counter_total(content_generator.PARSE_FAILURES) - failures_before) / max(1, calls)
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark content generation modes with a fake model")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean fake model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Log-normal sigma of the fake latency")
+    parser.add_argument("--token-latency", type=float, default=0.0005, help="Extra seconds per response token")
+    parser.add_argument("--malformed-rate", type=float, default=0.05, help="Share of free-form answers that are malformed")
+    parser.add_argument("--structured-malformed-rate", type=float, default=0.005, help="Share of schema-constrained answers that are malformed")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    print(f"Fake model latency: mean {args.latency:.3f}s, sigma {args.jitter}, {args.iterations} iterations\n")
+    print(f"{'mode':<22}{'p50 (s)':>9}{'p99 (s)':>9}{'mean (s)':>9}{'calls':>7}{'tokens':>8}{'parse fail':>12}")
+
+    stage_count = len(content_generator.CONTENT_STAGE_DEPENDENCIES)
+    results = {}
+    for label, mode, workers in [
+        ("staged serial", "staged", 1),
+        ("staged concurrent", "staged", stage_count),
+        ("single-shot", "single_shot", stage_count),
+    ]:
+        fake_model = FakeModel(
+            args.latency, args.jitter, args.malformed_rate,
+            args.structured_malformed_rate, args.token_latency
+        )
+        result = run_benchmark(mode, workers, args.iterations, fake_model)
+        results[label] = result
+        print(
+            f"{label:<22}{result['p50']:>9.3f}{result['p99']:>9.3f}{result['mean']:>9.3f}"
+            f"{result['calls']:>7.1f}{result['tokens']:>8.0f}{result['failure_rate']:>11.1%}"
+        )
+
+    print(f"\np50 speedup of concurrent stages over serial: {results['staged serial']['p50'] / results['staged concurrent']['p50']:.2f}x")
+    print(f"Token use of single-shot vs staged: {results['single-shot']['tokens'] / results['staged concurrent']['tokens']:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+
+# Use a throwaway database and run the workers in this process
+_temp_dir = tempfile.mkdtemp(prefix="tapbuddy-dispatch-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_temp_dir, 'benchmark.db')}"
+os.environ["TEMP_DIR"] = _temp_dir
+os.environ["EMBEDDED_WORKERS"] = "False"
+
+from app import app
+from config import settings
+from services.job_queue import WorkerPool, get_queue_stats
+
+SUBJECTS = ["Science", "Coding", "Visual Arts", "Financial Literacy", "Performing Arts"]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Push mixed web/webhook submissions through a stubbed pipeline")
+    parser.add_argument("--submissions", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--job-time", type=float, default=0.01, help="Seconds the stubbed pipeline takes per job")
+    parser.add_argument("--max-depth", type=int, default=settings.MAX_QUEUE_DEPTH)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    settings.MAX_QUEUE_DEPTH = args.max_depth
+    settings.WORKER_COUNT = args.workers
+    settings.JOB_POLL_INTERVAL = 0.01
+
+    processed = []
+    processed_lock = threading.Lock()
+
+    def stub_pipeline(request_id: int, message_type: str) -> None:
+        time.sleep(args.job_time)
+        with processed_lock:
+            processed.append(request_id)
+
+    pool = WorkerPool(app, num_workers=args.workers, handler=stub_pipeline)
+    pool.start()
+
+    client = app.test_client()
+    rng = random.Random(3)
+    outcomes = {"webhook_queued_with_position": 0, "errors": 0}
+
+    start = time.perf_counter()
+    for i in range(args.submissions):
+        phone = f"+1555{i % 200:07d}"
+        subject = rng.choice(SUBJECTS)
+        if rng.random() < 0.5:
+            response = client.post("/api/process_message_webhook", data={
+                "From": f"whatsapp:{phone}",
+                "Body": f"#{subject.replace(' ', '')} #Topic{i % 50} #Beginner Question {i}"
+            })
+            if response.status_code == 200 and response.get_json().get("queue_position"):
+                outcomes["webhook_queued_with_position"] += 1
+            elif response.status_code not in (200, 503):
+                outcomes["errors"] += 1
+        else:
+            response = client.post("/submit_request", data={
+                "phone_number": phone,
+                "subject": subject,
+                "topic": f"Topic {i % 50}",
+                "level": "Beginner",
+                "query": f"Question {i}",
+                "message_type": "sms"
+            })
+            if response.status_code != 302 or "dashboard" not in response.headers.get("Location", ""):
+                outcomes["errors"] += 1
+    submit_time = time.perf_counter() - start
+
+    while True:
+        with app.app_context():
+            stats = get_queue_stats()
+        if not stats.get("queued") and not stats.get("leased"):
+            break
+        time.sleep(0.05)
+    total_time = time.perf_counter() - start
+    pool.stop(5)
+
+    with app.app_context():
+        from models import get_db, VideoRequest, VideoJob
+        db_session = get_db()
+        queued = db_session.query(VideoJob).count()
+        rejected = db_session.query(VideoRequest).filter(VideoRequest.status == "failed").count()
+
+    print(f"Submissions:        {args.submissions} ({queued} queued, {rejected} rejected, {outcomes})")
+    print(f"Submit throughput:  {args.submissions / submit_time:.1f} req/s")
+    print(f"Jobs processed:     {len(processed)} of {queued} queued")
+    print(f"End-to-end:         {total_time:.2f}s ({len(processed) / total_time:.1f} jobs/s)")
+    print(f"Final queue state:  {stats}")
+    ok = outcomes["errors"] == 0 and len(processed) == queued and queued + rejected == args.submissions
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
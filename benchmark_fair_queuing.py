@@ -0,0 +1,145 @@
+import os
+import sys
+import heapq
+import random
+import logging
+import argparse
+import tempfile
+from typing import Dict, List, Tuple
+
+# Use a throwaway database; the simulation leases jobs itself
+_temp_dir = tempfile.mkdtemp(prefix="tapbuddy-fairness-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_temp_dir, 'benchmark.db')}"
+os.environ["TEMP_DIR"] = _temp_dir
+os.environ["EMBEDDED_WORKERS"] = "False"
+
+from app import app
+from config import settings
+from models import get_db, VideoJob
+from services import job_queue
+from services.job_queue import enqueue_job, lease_job, complete_job
+
+ABUSER_ID = 0
+WEB_PRIORITY = 10
+
+# Policy name -> (FAIR_QUEUING_ENABLED, MAX_INFLIGHT_PER_USER)
+POLICIES = {
+    "fifo": (False, 0),
+    "fair": (True, 0),
+    "fair+cap": (True, 2),
+}
+
+
+def build_arrivals(args) -> List[Tuple[float, int, int]]:
+    """
+    Poisson arrivals from well-behaved users, a share of them from the web
+    dashboard, plus one user flooding the webhook at the start of the run.
+    Returns sorted (virtual time, user_id, priority) tuples.
+    """
+    rng = random.Random(args.seed)
+    arrivals = []
+    at = 0.0
+    while True:
+        at += rng.expovariate(args.rate)
+        if at > args.duration:
+            break
+        priority = WEB_PRIORITY if rng.random() < args.web_share else 0
+        arrivals.append((at, rng.randint(1, args.users), priority))
+
+    spacing = args.abuse_window / max(1, args.abuse)
+    arrivals.extend((i * spacing, ABUSER_ID, 0) for i in range(args.abuse))
+    arrivals.sort()
+    return arrivals
+
+
+def simulate(arrivals: List[Tuple[float, int, int]], args, fair: bool, cap: int) -> Dict[str, List[float]]:
+    """
+    Run the arrivals through the real job queue with a virtual clock:
+    each lease occupies one of the workers for a random service time.
+    Returns the latencies (arrival to completion) of each traffic class.
+    """
+    settings.FAIR_QUEUING_ENABLED = fair
+    settings.MAX_INFLIGHT_PER_USER = cap
+    job_queue._last_served.clear()
+
+    rng = random.Random(args.seed + 1)
+    with app.app_context():
+        db_session = get_db()
+        db_session.query(VideoJob).delete()
+        db_session.commit()
+
+        events = [(at, i, "arrival", (i, user_id, priority)) for i, (at, user_id, priority) in enumerate(arrivals)]
+        heapq.heapify(events)
+        sequence = len(events)
+        info: Dict[int, Tuple[float, str]] = {}
+        latencies: Dict[str, List[float]] = {"well-behaved webhook": [], "well-behaved web": [], "abusive": []}
+        busy = 0
+
+        while events:
+            now, _, kind, payload = heapq.heappop(events)
+            if kind == "arrival":
+                request_id, user_id, priority = payload
+                if user_id == ABUSER_ID:
+                    group = "abusive"
+                else:
+                    group = "well-behaved web" if priority else "well-behaved webhook"
+                info[request_id + 1] = (now, group)
+                enqueue_job(request_id + 1, user_id, priority=priority)
+            else:
+                job_id, request_id = payload
+                complete_job(job_id)
+                busy -= 1
+                arrived_at, group = info[request_id]
+                latencies[group].append(now - arrived_at)
+
+            while busy < args.workers:
+                leased = lease_job("simulation")
+                if leased is None:
+                    break
+                job_id, request_id, _ = leased
+                busy += 1
+                sequence += 1
+                service = rng.lognormvariate(0, 0.3) * args.service_time
+                heapq.heappush(events, (now + service, sequence, "completion", (job_id, request_id)))
+
+    return latencies
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Simulate well-behaved users' latency while one user floods the queue")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--service-time", type=float, default=60.0, help="Mean virtual seconds per video")
+    parser.add_argument("--users", type=int, default=40, help="Well-behaved users")
+    parser.add_argument("--rate", type=float, default=0.08, help="Well-behaved requests per virtual second")
+    parser.add_argument("--web-share", type=float, default=0.2, help="Share of well-behaved requests from the web dashboard")
+    parser.add_argument("--duration", type=float, default=3600.0, help="Virtual seconds of well-behaved traffic")
+    parser.add_argument("--abuse", type=int, default=300, help="Requests sent by the abusive user")
+    parser.add_argument("--abuse-window", type=float, default=120.0, help="Virtual seconds over which they arrive")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    arrivals = build_arrivals(args)
+    capacity = args.workers / args.service_time
+    print(f"{len(arrivals)} requests ({args.abuse} from one user), {args.workers} workers, "
+          f"well-behaved load {args.rate / capacity:.0%} of capacity")
+
+    print(f"\n{'policy':<10} {'class':<22} {'count':>6} {'p50 s':>9} {'p95 s':>9} {'p99 s':>9} {'max s':>9}")
+    for name, (fair, cap) in POLICIES.items():
+        latencies = simulate(arrivals, args, fair, cap)
+        for group, samples in latencies.items():
+            print(f"{name:<10} {group:<22} {len(samples):>6} {percentile(samples, 50):>9.0f} "
+                  f"{percentile(samples, 95):>9.0f} {percentile(samples, 99):>9.0f} {max(samples, default=float('nan')):>9.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
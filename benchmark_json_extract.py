@@ -0,0 +1,200 @@
+import sys
+import json
+import time
+import random
+import argparse
+from typing import Any, Callable, List, Optional, Tuple
+
+from services.json_extract import extract_json
+
+# Model outputs seen in practice that the old find/rfind + json.loads parsing
+# rejected, paired with the value that should be extracted
+CORPUS: List[Tuple[str, Any]] = [
+    (
+        '```json\n{"title": "Photosynthesis Power", "description": "How plants eat light.", '
+        '"learning_objectives": ["Explain photosynthesis", "Name the inputs"]}\n```',
+        {"title": "Photosynthesis Power", "description": "How plants eat light.",
+         "learning_objectives": ["Explain photosynthesis", "Name the inputs"]}
+    ),
+    (
+        'Here is the JSON you asked for:\n{"title": "Budgeting 101", "description": "Plan your money.", '
+        '"learning_objectives": ["Track spending",]}\nLet me know if you want changes! {Happy learning}',
+        {"title": "Budgeting 101", "description": "Plan your money.", "learning_objectives": ["Track spending"]}
+    ),
+    (
+        '[\n  {\n    "point": "Cells are the unit of life",\n    "explanation": "Everything living is made of them"\n  },\n'
+        '  // more points here...\n  {\n    "point": "Cells divide",\n    "explanation": "That is how we grow"\n  },\n]',
+        [{"point": "Cells are the unit of life", "explanation": "Everything living is made of them"},
+         {"point": "Cells divide", "explanation": "That is how we grow"}]
+    ),
+    (
+        "{'questions': [{'question': 'Why is the sky blue?', 'answer': 'Rayleigh scattering'}], "
+        "'activities': [{'title': 'Prism', 'description': 'Split light', 'materials_needed': None}]}",
+        {"questions": [{"question": "Why is the sky blue?", "answer": "Rayleigh scattering"}],
+         "activities": [{"title": "Prism", "description": "Split light", "materials_needed": None}]}
+    ),
+    (
+        '```\n[{"type": "website", "title": "Khan Academy", "description": "Free lessons [all levels]"}, '
+        '{"type": "book", "title": "The Way Things Work", "description": "Illustrated {classic}"}]\n```\n'
+        'These resources are great [trust me].',
+        [{"type": "website", "title": "Khan Academy", "description": "Free lessons [all levels]"},
+         {"type": "book", "title": "The Way Things Work", "description": "Illustrated {classic}"}]
+    ),
+    (
+        '{"script": "Welcome! Today we learn about loops.\nA loop repeats code.", "scenes": [{"description": "Title card", '
+        '"narration": "Welcome!", "visual_elements": "Logo", "duration_seconds": 5}]}',
+        {"script": "Welcome! Today we learn about loops.\nA loop repeats code.",
+         "scenes": [{"description": "Title card", "narration": "Welcome!", "visual_elements": "Logo", "duration_seconds": 5}]}
+    ),
+    (
+        'Sure. Note: use {braces} carefully.\n\n{"title": "Loops", "description": "Repeat yourself", "learning_objectives": []}',
+        {"title": "Loops", "description": "Repeat yourself", "learning_objectives": []}
+    ),
+    (
+        '{"title": "Rhythm", "description": "Feel the \\"beat\\"", "learning_objectives": ["Clap along"], "done": True}',
+        {"title": "Rhythm", "description": 'Feel the "beat"', "learning_objectives": ["Clap along"], "done": True}
+    ),
+]
+
+# Truncated responses: the old parser produced nothing, the extractor should
+# recover the complete part
+TRUNCATED_CORPUS: List[Tuple[str, Any]] = [
+    (
+        '{"script": "Intro", "scenes": [{"description": "One", "duration_seconds": 10}, {"description": "Tw',
+        {"script": "Intro", "scenes": [{"description": "One", "duration_seconds": 10}, {"description": "Tw"}]}
+    ),
+    (
+        '[{"point": "A", "explanation": "B"}, {"point": "C", "expl',
+        [{"point": "A", "explanation": "B"}, {"point": "C"}]
+    ),
+]
+
+
+def legacy_extract(text: str, expect: Optional[type] = None) -> Any:
+    """
+    The parsing previously used by every content stage.
+    """
+    opener, closer = ("[", "]") if expect is list else ("{", "}")
+    start = text.find(opener)
+    end = text.rfind(closer) + 1
+    if start >= 0 and end > start:
+        try:
+            return json.loads(text[start:end])
+        except ValueError:
+            return None
+    return None
+
+
+def mutate(payload: Any, rng: random.Random) -> Tuple[str, bool]:
+    """
+    Produce a randomly malformed rendering of payload, the way model output
+    tends to be malformed. Returns the text and whether it was truncated.
+    """
+    text = json.dumps(payload, indent=rng.choice([None, 2]))
+    truncated = False
+    for mutation in rng.sample(["fence", "prose", "trailing_comma", "comment", "single_quotes", "truncate"], rng.randint(1, 3)):
+        if mutation == "fence":
+            text = "```json\n" + text + "\n```"
+        elif mutation == "prose":
+            text = "Here's your content {as requested}:\n" + text + "\nEnjoy [and share]!"
+        elif mutation == "trailing_comma":
+            index = text.rfind("]")
+            if index > 0:
+                text = text[:index] + "," + text[index:]
+        elif mutation == "comment":
+            index = text.find(",")
+            if index > 0:
+                text = text[:index + 1] + " // more items here...\n" + text[index + 1:]
+        elif mutation == "single_quotes" and "'" not in text:
+            # Python-style quoting: escaped double quotes become plain ones
+            text = text.replace('\\"', "\0").replace('"', "'").replace("\0", '"')
+        elif mutation == "truncate":
+            text = text[:rng.randint(len(text) // 2, len(text) - 2)]
+            truncated = True
+    return text, truncated
+
+
+def sample_payload(rng: random.Random, scenes: int) -> Any:
+    return {
+        "script": " ".join(f"Sentence {i} about {{topic}} and [ideas]." for i in range(scenes * 4)),
+        "scenes": [{
+            "description": f"Scene {i} with a \"quoted\" diagram",
+            "narration": f"Narration {i}",
+            "visual_elements": "Arrows, labels {x}",
+            "duration_seconds": rng.randint(5, 20)
+        } for i in range(scenes)]
+    }
+
+
+def time_call(func: Callable, inputs: List[Tuple[str, Optional[type]]], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text, expect in inputs:
+            func(text, expect)
+    return (time.perf_counter() - start) / (repeat * len(inputs))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare the JSON extractor with the old find/rfind parsing")
+    parser.add_argument("--fuzz", type=int, default=2000, help="Number of randomly malformed responses")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print("Corpus of real malformed outputs")
+    failures = 0
+    for label, corpus in [("complete", CORPUS), ("truncated", TRUNCATED_CORPUS)]:
+        legacy_ok = new_ok = 0
+        for text, expected in corpus:
+            expect = type(expected)
+            legacy_ok += legacy_extract(text, expect) == expected
+            result = extract_json(text, expect)
+            if result == expected:
+                new_ok += 1
+            else:
+                failures += 1
+                print(f"  MISMATCH: {text[:60]!r} -> {result!r}")
+        print(f"  {label:<10} legacy {legacy_ok}/{len(corpus)}, extractor {new_ok}/{len(corpus)}")
+
+    print(f"\nFuzzed responses ({args.fuzz})")
+    legacy_ok = new_ok = truncated_total = truncated_ok = 0
+    crashes = 0
+    for _ in range(args.fuzz):
+        payload = sample_payload(rng, rng.randint(1, 8))
+        text, truncated = mutate(payload, rng)
+        try:
+            result = extract_json(text, dict)
+        except Exception as e:
+            crashes += 1
+            print(f"  CRASH: {type(e).__name__}: {e} on {text[:60]!r}")
+            continue
+        if truncated:
+            truncated_total += 1
+            truncated_ok += isinstance(result, dict)
+        else:
+            legacy_ok += legacy_extract(text, dict) == payload
+            new_ok += result == payload
+    complete_total = args.fuzz - truncated_total
+    print(f"  complete   legacy {legacy_ok}/{complete_total}, extractor {new_ok}/{complete_total}")
+    print(f"  truncated  extractor recovered an object from {truncated_ok}/{truncated_total}")
+    print(f"  crashes    {crashes}")
+
+    print("\nThroughput (mean per response)")
+    for scenes in [8, 200, 2000]:
+        payload = sample_payload(rng, scenes)
+        clean = "Here is the JSON:\n```json\n" + json.dumps(payload, indent=2) + "\n```"
+        malformed = clean.replace("}\n  ]", "},\n  ]")
+        inputs_clean = [(clean, dict)]
+        inputs_malformed = [(malformed, dict)]
+        print(
+            f"  {len(clean) / 1024:>8.1f} KiB  clean: legacy {time_call(legacy_extract, inputs_clean, args.repeat) * 1e3:7.3f} ms, "
+            f"extractor {time_call(extract_json, inputs_clean, args.repeat) * 1e3:7.3f} ms   "
+            f"malformed: extractor {time_call(extract_json, inputs_malformed, args.repeat) * 1e3:7.3f} ms"
+        )
+
+    return 0 if failures == 0 and crashes == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import os
+import ssl
+import sys
+import time
+import json
+import argparse
+import datetime
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Tuple
+
+import requests
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+
+import services.llm_client as llm_client
+from config import settings
+
+
+class GenerateHandler(BaseHTTPRequestHandler):
+    """
+    Answers every POST like a tiny generateContent response, keeping the
+    connection open between requests.
+    """
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, delayed ACKs
+    # add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def self_signed_context(directory: str) -> Tuple[ssl.SSLContext, str]:
+    """
+    Create a server TLS context with a throwaway certificate for localhost.
+    """
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(hours=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        ))
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    return context, cert_path
+
+
+def per_call(func: Callable[[], object], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure per-call Gemini client overhead with and without the shared registry")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    # Client creation does not contact the API, so a dummy key is enough
+    genai.configure(api_key="benchmark-key", transport="rest")
+    llm_client.GEMINI_API_KEY = "benchmark-key"
+    settings.GEMINI_TRANSPORT = "rest"
+
+    print("Per-call setup (no network)")
+
+    def legacy_setup():
+        # What every generate_educational_content call did: a new model,
+        # whose client is resolved on its first generate_content call
+        genai.GenerativeModel("gemini-1.5-flash")
+        genai_client.get_default_generative_client()
+
+    llm_client.reset_models()
+    llm_client.get_model()
+    legacy = per_call(legacy_setup, args.repeat)
+    shared = per_call(llm_client.get_model, args.repeat)
+    fresh_client = per_call(lambda: genai_client._client_manager.make_client("generative"), max(1, args.repeat // 10))
+    print(f"  new model per call         {legacy * 1e6:10.1f} us")
+    print(f"  shared model (registry)    {shared * 1e6:10.1f} us")
+    print(f"  new client per call        {fresh_client * 1e6:10.1f} us  (paid whenever the client is not shared)")
+
+    with tempfile.TemporaryDirectory() as directory:
+        server_context, cert_path = self_signed_context(directory)
+        server = ThreadingHTTPServer(("localhost", 0), GenerateHandler)
+        server.socket = server_context.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"https://localhost:{server.server_address[1]}/v1beta/models/gemini-1.5-flash:generateContent"
+        payload = {"contents": [{"parts": [{"text": "ping"}]}]}
+
+        print("\nHTTPS round trip to a local server (TCP + TLS handshake cost)")
+        new_connection = per_call(lambda: requests.post(url, json=payload, verify=cert_path), args.repeat)
+        session = requests.Session()
+        keep_alive = per_call(lambda: session.post(url, json=payload, verify=cert_path), args.repeat)
+        print(f"  new connection per call    {new_connection * 1e3:10.3f} ms")
+        print(f"  keep-alive session         {keep_alive * 1e3:10.3f} ms")
+
+        server.shutdown()
+
+    print(f"\nSetup overhead saved per call: {(legacy - shared) * 1e6:.1f} us; "
+          f"connection reuse saves {(new_connection - keep_alive) * 1e3:.2f} ms per call")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+
+os.environ.setdefault("TEMP_DIR", tempfile.mkdtemp(prefix="tapbuddy-local-tts-"))
+
+import services.local_tts as local_tts
+from config import settings
+
+SENTENCE = "Plants turn sunlight, water and air into sugar, and they breathe out the oxygen we need. "
+
+
+def run(workers: int, chunks: int, chunk_chars: int, output_dir: str) -> Tuple[float, float]:
+    """
+    Synthesize chunks on a pool of that many worker processes. Returns (wall seconds, seconds of audio).
+    """
+    settings.LOCAL_TTS_WORKERS = workers
+    local_tts._reset_pool()
+    provider = local_tts.LocalTTSProvider()
+    text = (SENTENCE * (chunk_chars // len(SENTENCE) + 1))[:chunk_chars]
+
+    # Start the worker processes before timing
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda i: provider.synthesize("Warm up.", os.path.join(output_dir, f"warm{i}.mp3")), range(workers)))
+
+    _, bitrate = local_tts.output_format()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        paths = list(executor.map(
+            lambda i: provider.synthesize(f"{i}. {text}", os.path.join(output_dir, f"chunk{i}.mp3")),
+            range(chunks)
+        ))
+    elapsed = time.perf_counter() - start
+    audio_seconds = sum(os.path.getsize(path) * 8 / bitrate for path in paths)
+    return elapsed, audio_seconds
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Local TTS throughput by number of worker processes")
+    parser.add_argument("--chunks", type=int, default=16)
+    parser.add_argument("--chunk-chars", type=int, default=settings.TTS_CHUNK_CHARS)
+    parser.add_argument("--max-workers", type=int, default=(os.cpu_count() or 1) * 2)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    if local_tts.resolve_engine() is None:
+        # No speech engine installed: measure the pipeline with speech-like audio
+        settings.LOCAL_TTS_ENGINE = "tone"
+    if not local_tts.is_available():
+        print("Local TTS needs ffmpeg (see FFMPEG_PATH)")
+        return 1
+
+    cores = os.cpu_count() or 1
+    output_dir = tempfile.mkdtemp(dir=os.environ["TEMP_DIR"])
+    print(f"Engine {local_tts.resolve_engine()}, {args.chunks} chunks of {args.chunk_chars} characters, {cores} cores")
+    workers = 1
+    while workers <= args.max_workers:
+        elapsed, audio_seconds = run(workers, args.chunks, args.chunk_chars, output_dir)
+        busy_cores = min(workers, cores)
+        print(f"  {workers:>2} workers: {elapsed:6.2f}s  {args.chunks * args.chunk_chars / elapsed:7.0f} chars/s  "
+              f"{audio_seconds / elapsed:6.1f}x realtime  {audio_seconds / elapsed / busy_cores:6.1f}x realtime per core")
+        workers *= 2
+    local_tts._reset_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
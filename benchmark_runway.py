@@ -0,0 +1,208 @@
+import os
+import re
+import sys
+import time
+import json
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import itertools
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+# Scene rendering only goes to RunwayML when a key is configured
+os.environ.setdefault("RUNWAY_ML_API_KEY", "fake-runway-key")
+os.environ.setdefault("TEMP_DIR", tempfile.mkdtemp(prefix="tapbuddy-runway-"))
+
+import services.video_generator as video_generator
+from services import video_renderer
+from config import settings
+
+_SCENE_NUMBER = re.compile(r"Scene (\d+)")
+
+
+class FakeRunwayHandler(BaseHTTPRequestHandler):
+    """
+    A local stand-in for the RunwayML task API. A text_to_video task stays
+    THROTTLED for a moment, then RUNNING until render_factor seconds per
+    second of requested video have passed. Durations other than
+    RUNWAY_DURATIONS are rejected. The downloaded clip is a real MP4 of the
+    requested length, in a shade of grey that identifies the scene, so the
+    assembly order can be checked in the finished video.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    tasks: Dict[str, Dict[str, Any]] = {}
+    tasks_lock = threading.Lock()
+    task_ids = itertools.count(1)
+    render_factor = 0.1
+    polls = 0
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if self.path != "/v1/text_to_video" or not self.headers.get("Authorization"):
+            self._send_json(400, {"error": "unexpected request"})
+            return
+        if str(request["duration"]) not in settings.RUNWAY_DURATIONS.split(","):
+            self._send_json(400, {"error": f"unsupported duration {request['duration']}"})
+            return
+        task_id = f"task-{next(self.task_ids)}"
+        now = time.monotonic()
+        with self.tasks_lock:
+            self.tasks[task_id] = {
+                "prompt": request["promptText"],
+                "duration": request["duration"],
+                "throttled_until": now + 0.1,
+                "done_at": now + request["duration"] * self.render_factor,
+            }
+        self._send_json(200, {"id": task_id})
+
+    def do_GET(self):
+        if self.path.startswith("/v1/tasks/"):
+            task_id = self.path.rsplit("/", 1)[-1]
+            with self.tasks_lock:
+                task = self.tasks.get(task_id)
+                type(self).polls += 1
+            if task is None:
+                self._send_json(404, {"error": "not found"})
+                return
+            now = time.monotonic()
+            if now < task["throttled_until"]:
+                self._send_json(200, {"id": task_id, "status": "THROTTLED"})
+            elif now < task["done_at"]:
+                self._send_json(200, {"id": task_id, "status": "RUNNING"})
+            else:
+                host = self.headers.get("Host")
+                self._send_json(200, {"id": task_id, "status": "SUCCEEDED", "output": [f"http://{host}/clips/{task_id}.mp4"]})
+        elif self.path.startswith("/clips/"):
+            task_id = self.path.rsplit("/", 1)[-1][:-len(".mp4")]
+            with self.tasks_lock:
+                task = self.tasks[task_id]
+            body = make_clip(int(_SCENE_NUMBER.search(task["prompt"]).group(1)), task["duration"])
+            self.send_response(200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def log_message(self, *args):
+        pass
+
+
+def scene_shade(number: int) -> int:
+    return 16 + (number - 1) % 8 * 28
+
+
+def make_clip(number: int, duration: int) -> bytes:
+    """
+    A clip of a different size and frame rate than the rendered video.
+    """
+    result = subprocess.run([
+        video_renderer.get_ffmpeg(), "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"color=c=0x{scene_shade(number):02x}{scene_shade(number):02x}{scene_shade(number):02x}:s=640x360:r=30:d={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-movflags", "frag_keyframe+empty_moov", "-f", "mp4", "-"
+    ], capture_output=True, check=True)
+    return result.stdout
+
+
+def make_content(scene_count: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    scenes = [
+        {
+            "description": f"Scene {i + 1} of the lesson",
+            "narration": f"Narration for scene {i + 1}",
+            "visual_elements": "diagram",
+            "duration_seconds": rng.choice([10, 15, 20, 30]),
+        }
+        for i in range(scene_count)
+    ]
+    return {"title": "Fake lesson", "description": "Benchmark content", "script": "Script", "key_points": [], "scenes": scenes}
+
+
+def assembled_order(output_path: str, durations: List[float]) -> List[int]:
+    """
+    Scene numbers of the clips, in the order they were assembled, read from
+    the grey level of a frame in the middle of each scene.
+    """
+    order = []
+    start = 0.0
+    for duration in durations:
+        frame = subprocess.run([
+            video_renderer.get_ffmpeg(), "-hide_banner", "-loglevel", "error", "-ss", f"{start + duration / 2:.2f}",
+            "-i", output_path, "-frames:v", "1", "-vf", "scale=8:8", "-pix_fmt", "gray", "-f", "rawvideo", "-"
+        ], capture_output=True, check=True).stdout
+        shade = sum(frame) / max(1, len(frame))
+        order.append(min(range(1, 9), key=lambda number: abs(scene_shade(number) - shade)))
+        start += duration
+    return order
+
+
+def run(content: Dict[str, Any], parallel: int) -> float:
+    settings.RUNWAY_MAX_PARALLEL_SCENES = parallel
+    video_generator._scene_executor = None
+    video_generator._runway_session = None
+
+    output_path = os.path.join(video_generator.TEMP_DIR, f"runway_{parallel}.mp4")
+    start = time.perf_counter()
+    video_generator.generate_with_runway(content, "Science", "", output_path)
+    elapsed = time.perf_counter() - start
+
+    durations = [scene["duration_seconds"] for scene in content["scenes"]]
+    order = assembled_order(output_path, durations)
+    if order != [(i % 8) + 1 for i in range(len(durations))]:
+        raise SystemExit(f"Clips assembled out of order or missing: {order}")
+    leftover = [name for name in os.listdir(video_generator.TEMP_DIR) if name.startswith("scene_")]
+    if leftover:
+        raise SystemExit(f"Downloaded clips left behind: {leftover}")
+    return elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Render scenes against a local fake RunwayML server, one at a time and in parallel")
+    parser.add_argument("--scenes", type=int, default=8)
+    parser.add_argument("--parallel", type=int, default=8, help="RUNWAY_MAX_PARALLEL_SCENES for the parallel run")
+    parser.add_argument("--render-factor", type=float, default=0.1, help="Fake render seconds per second of video")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    FakeRunwayHandler.render_factor = args.render_factor
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRunwayHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    settings.RUNWAY_API_URL = f"http://127.0.0.1:{server.server_port}"
+    settings.RUNWAY_POLL_INITIAL = 0.05
+    settings.RUNWAY_POLL_MAX = 0.5
+    # Small frames keep the assembly quick; it is not what is measured
+    settings.VIDEO_WIDTH, settings.VIDEO_HEIGHT = 320, 180
+    if video_renderer.get_ffmpeg() is None:
+        raise SystemExit("ffmpeg is needed to assemble the clips (set FFMPEG_PATH)")
+
+    content = make_content(args.scenes, args.seed)
+    render_times = [video_generator.runway_duration(scene) * args.render_factor for scene in content["scenes"]]
+    print(f"{args.scenes} scenes, fake render time {sum(render_times):.1f}s in total, slowest {max(render_times):.1f}s")
+
+    for parallel in (1, args.parallel):
+        FakeRunwayHandler.polls = 0
+        elapsed = run(content, parallel)
+        print(f"  {parallel:>2} at a time: {elapsed:6.2f}s  ({FakeRunwayHandler.polls} polls, clips in scene order)")
+
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import sys
+import time
+import random
+import argparse
+import statistics
+from typing import List
+
+from services.semantic_cache import SemanticIndex
+
+WORDS = [
+    "plants", "food", "photosynthesis", "light", "energy", "cells", "water", "sun", "leaf",
+    "chlorophyll", "python", "loop", "function", "variable", "budget", "saving", "interest",
+    "painting", "color", "shading", "rhythm", "dance", "music", "gravity", "atoms", "molecules",
+    "fractions", "algebra", "equation", "history", "climate", "weather", "volcano", "ocean",
+    "memory", "brain", "heart", "blood", "bones", "muscles", "electricity", "magnet", "circuit"
+]
+
+TEMPLATES = [
+    "how do {0} use {1}",
+    "what is the role of {0} in {1}",
+    "explain {0} and {1} for beginners",
+    "why does {0} affect {1}",
+    "can you teach me about {0} {1} and {2}",
+]
+
+
+def make_query(rng: random.Random) -> str:
+    template = rng.choice(TEMPLATES)
+    return template.format(*rng.sample(WORDS, 3))
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark semantic cache lookups on a large index")
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--batch", type=int, default=64)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    index = SemanticIndex(args.dimensions, args.entries, args.batch)
+
+    start = time.perf_counter()
+    index.extend([(make_query(rng), f"key-{i}") for i in range(args.entries)])
+    build_time = time.perf_counter() - start
+    print(f"Built index of {len(index)} entries in {build_time:.2f}s "
+          f"({index.memory_bytes() / 1024 / 1024:.1f} MiB)")
+
+    # Incremental inserts go through the batched merge path
+    start = time.perf_counter()
+    for i in range(args.batch * 10):
+        index.add(make_query(rng), f"extra-{i}")
+    insert_time = time.perf_counter() - start
+    print(f"Inserted {args.batch * 10} entries in {insert_time * 1000:.1f} ms "
+          f"({insert_time / (args.batch * 10) * 1e6:.1f} us/entry)")
+
+    timings = []
+    for _ in range(args.lookups):
+        query = make_query(rng)
+        start = time.perf_counter()
+        index.search(query)
+        timings.append(time.perf_counter() - start)
+
+    print(f"\nLookup latency over {args.lookups} queries:")
+    print(f"  p50:  {percentile(timings, 50) * 1000:.2f} ms")
+    print(f"  p99:  {percentile(timings, 99) * 1000:.2f} ms")
+    print(f"  mean: {statistics.mean(timings) * 1000:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+# Synthesis goes to the fake provider, which sleeps like a TTS API would
+os.environ.setdefault("TTS_PROVIDER", "fake")
+os.environ.setdefault("TEMP_DIR", tempfile.mkdtemp(prefix="tapbuddy-tts-"))
+
+import services.speech_generator as speech_generator
+from config import settings
+from services.providers import reset_providers
+from services.audio_cache import get_audio_cache_stats
+
+PARAGRAPH = (
+    "Gravity pulls every mass toward every other mass. The sun is so heavy that the planets "
+    "are always falling toward it, yet they move sideways fast enough to keep missing it. "
+    "That endless fall is what we call an orbit! Closer planets move faster, farther ones "
+    "take longer to go around, and a year on Neptune lasts about 165 of ours."
+)
+
+
+def make_script(paragraphs: int) -> str:
+    return "\n\n".join(f"Part {i + 1}. {PARAGRAPH}" for i in range(paragraphs))
+
+
+def make_scenes(count: int) -> List[Dict[str, Any]]:
+    return [{"description": f"Scene {i + 1}", "duration_seconds": 15} for i in range(count)]
+
+
+def run(script: str, chunk_chars: int, parallel: int) -> Tuple[float, float, str]:
+    """
+    Synthesize the script once. Returns (seconds to the first audio, total seconds, audio path).
+    """
+    settings.TTS_CHUNK_CHARS = chunk_chars
+    settings.TTS_MAX_PARALLEL_CHUNKS = parallel
+    speech_generator._chunk_executor = None
+
+    first_audio: List[float] = []
+    observe = speech_generator.observe
+
+    def record(operation: str, seconds: float) -> None:
+        if operation == "tts_first_audio":
+            first_audio.append(seconds)
+        observe(operation, seconds)
+
+    speech_generator.observe = record
+    output_path = os.path.join(speech_generator.TEMP_DIR, f"narration_{chunk_chars}_{parallel}.mp3")
+    try:
+        start = time.perf_counter()
+        speech_generator.synthesize_chunked(script, output_path)
+        elapsed = time.perf_counter() - start
+    finally:
+        speech_generator.observe = observe
+    return first_audio[0], elapsed, output_path
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare one TTS request per script with parallel chunked synthesis")
+    parser.add_argument("--paragraphs", type=int, default=8)
+    parser.add_argument("--chunk-chars", type=int, default=settings.TTS_CHUNK_CHARS)
+    parser.add_argument("--parallel", type=int, default=settings.TTS_MAX_PARALLEL_CHUNKS)
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake seconds per request")
+    parser.add_argument("--per-char", type=float, default=0.002, help="Fake seconds per character")
+    parser.add_argument("--scenes", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    settings.FAKE_TTS = f"latency={args.latency},sigma=0,dist=fixed,per_unit={args.per_char},failure_rate=0"
+    reset_providers()
+
+    script = make_script(args.paragraphs)
+    chunks = speech_generator.split_script(script, args.chunk_chars)
+    print(f"{len(script)} characters, {len(chunks)} chunks of at most {args.chunk_chars}")
+
+    # Measure synthesis itself first; the cache gets its own run below
+    settings.TTS_CACHE_ENABLED = False
+    runs = [
+        ("one request", len(script) + 1, 1),
+        (f"chunked, {args.parallel} at once", args.chunk_chars, args.parallel),
+    ]
+    for name, chunk_chars, parallel in runs:
+        first, total, audio_path = run(script, chunk_chars, parallel)
+        print(f"  {name:<24} first audio {first:6.2f}s  total {total:6.2f}s")
+
+    manifest = speech_generator.load_timing_manifest(audio_path)
+    chunk_total = sum(chunk["duration"] for chunk in manifest["chunks"])
+    print(f"Manifest: {len(manifest['chunks'])} chunks, {chunk_total:.2f}s of {manifest['duration']:.2f}s audio")
+    durations = speech_generator.align_scenes(manifest, make_scenes(args.scenes))
+    print(f"  {args.scenes} scenes of 15s aligned to the narration: {', '.join(f'{d:.1f}s' for d in durations)} "
+          f"(sum {sum(durations):.2f}s)")
+
+    settings.TTS_CACHE_ENABLED = True
+    settings.TTS_CACHE_DIR = os.path.join(speech_generator.TEMP_DIR, "tts_cache")
+    print(f"With the audio cache ({settings.TTS_CACHE_DIR})")
+    for name in ("cold", "warm"):
+        _, total, _ = run(script, args.chunk_chars, args.parallel)
+        stats = get_audio_cache_stats()
+        print(f"  {name:<24} total {total:6.2f}s  {stats['hits']:.0f} hits, "
+              f"{stats['characters_saved']:.0f} characters not sent to the TTS API")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Synthesis goes to ElevenLabs (the local fake server below) when a key is configured
+os.environ.setdefault("ELEVENLABS_API_KEY", "fake-elevenlabs-key")
+os.environ.setdefault("TEMP_DIR", tempfile.mkdtemp(prefix="tapbuddy-tts-download-"))
+os.environ["TTS_PROVIDER"] = "elevenlabs"
+os.environ["TTS_CACHE_ENABLED"] = "False"
+
+import requests
+
+import services.speech_generator as speech_generator
+from config import settings
+
+
+class FakeElevenLabsHandler(BaseHTTPRequestHandler):
+    """
+    A local stand-in for the ElevenLabs text-to-speech endpoint. It answers
+    with an ID3 tag and audio_bytes of fake MP3 frames, sent in blocks at
+    about rate bytes per second so that the downloads overlap.
+    """
+    protocol_version = "HTTP/1.1"
+
+    audio_bytes = 4 * 1024 * 1024
+    rate = 8 * 1024 * 1024
+
+    def do_POST(self):
+        json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if not self.path.startswith("/v1/text-to-speech/") or not self.headers.get("xi-api-key"):
+            self.send_response(401)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        tag = b"ID3\x04\x00\x00\x00\x00\x00\x00"
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(tag) + self.audio_bytes))
+        self.end_headers()
+        self.wfile.write(tag)
+        block = b"\xff\xfb\x90\x64" * 16384
+        sent = 0
+        while sent < self.audio_bytes:
+            data = block[:self.audio_bytes - sent]
+            self.wfile.write(data)
+            sent += len(data)
+            time.sleep(len(data) / self.rate)
+
+    def log_message(self, *args):
+        pass
+
+
+def synthesize_buffered(text: str, output_path: str) -> str:
+    """
+    The previous download: the whole response held in memory, then written.
+    """
+    response = requests.post(
+        f"{settings.ELEVENLABS_API_URL}/v1/text-to-speech/{speech_generator.ELEVENLABS_VOICE_ID}",
+        json={"text": text, "model_id": speech_generator.ELEVENLABS_MODEL_ID},
+        headers={"xi-api-key": speech_generator.ELEVENLABS_API_KEY},
+        timeout=settings.TTS_CALL_TIMEOUT
+    )
+    response.raise_for_status()
+    with open(output_path, "wb") as audio_file:
+        audio_file.write(response.content)
+    return output_path
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_client(mode: str, concurrency: int) -> None:
+    """
+    Synthesize concurrency scripts at once and print the result as JSON.
+    Runs in its own process so that the peak RSS belongs to one mode only.
+    """
+    synthesize = synthesize_buffered if mode == "buffered" else speech_generator.synthesize_with_elevenlabs
+    settings.TTS_MAX_PARALLEL_CHUNKS = concurrency
+    output_dir = tempfile.mkdtemp(dir=speech_generator.TEMP_DIR)
+    baseline = peak_rss_mb()
+
+    def one(i: int) -> int:
+        path = os.path.join(output_dir, f"{uuid.uuid4().hex}.mp3")
+        synthesize(f"Narration number {i}.", path)
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        sizes = list(executor.map(one, range(concurrency)))
+    print(json.dumps({
+        "elapsed": time.perf_counter() - start,
+        "baseline_mb": baseline,
+        "peak_mb": peak_rss_mb(),
+        "bytes": sum(sizes),
+    }))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Peak memory of concurrent TTS downloads, buffered and streamed, against a local fake ElevenLabs")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--audio-mb", type=float, default=4, help="Size of each synthesized file")
+    parser.add_argument("--client", choices=["buffered", "streamed"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.client:
+        run_client(args.client, args.concurrency)
+        return 0
+
+    FakeElevenLabsHandler.audio_bytes = int(args.audio_mb * 1024 * 1024)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeElevenLabsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    env = dict(os.environ, ELEVENLABS_API_URL=f"http://127.0.0.1:{server.server_port}")
+
+    print(f"{args.concurrency} concurrent syntheses of {args.audio_mb:g} MB each")
+    for mode in ("buffered", "streamed"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--client", mode, "--concurrency", str(args.concurrency)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"  {mode:<9} peak RSS {result['peak_mb']:7.1f} MB  "
+              f"(+{result['peak_mb'] - result['baseline_mb']:.1f} MB over idle)  "
+              f"{result['bytes'] / 1e6:.0f} MB written in {result['elapsed']:.2f}s")
+
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
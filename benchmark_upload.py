@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+import itertools
+from urllib.parse import urlparse, parse_qs, unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+# Uploads go to the local fake GCS server below instead of Firebase
+os.environ.setdefault("TEMP_DIR", tempfile.mkdtemp(prefix="tapbuddy-upload-"))
+os.environ["STORAGE_PROVIDER"] = "firebase"
+os.environ.setdefault("FIREBASE_STORAGE_BUCKET", "tapbuddy-bench")
+
+import services.firebase_service as firebase_service
+from config import settings
+
+
+class FakeGCSHandler(BaseHTTPRequestHandler):
+    """
+    A local stand-in for the parts of the Cloud Storage JSON API that uploads
+    use: resumable upload sessions, compose, ACLs and deletes. Each
+    connection is limited to stream_rate bytes per second. With
+    failure_rate, a chunk request fails with a 503, or the connection drops
+    after storage has persisted only part of the chunk.
+    """
+    protocol_version = "HTTP/1.1"
+
+    objects: Dict[str, bytes] = {}
+    sessions: Dict[str, Dict[str, Any]] = {}
+    lock = threading.Lock()
+    session_ids = itertools.count(1)
+    stream_rate = 20 * 1024 * 1024
+    failure_rate = 0.0
+    rng = random.Random(7)
+    injected = {"503": 0, "partial": 0}
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Dict[str, str] = None) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _object(self, bucket: str, name: str) -> Dict[str, Any]:
+        with self.lock:
+            size = len(self.objects.get(name, b""))
+        return {"kind": "storage#object", "bucket": bucket, "name": name, "size": str(size),
+                "generation": "1", "metageneration": "1", "acl": [{"entity": "allUsers", "role": "READER"}]}
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        data = bytearray()
+        while len(data) < length:
+            block = self.rfile.read(min(256 * 1024, length - len(data)))
+            if not block:
+                break
+            data += block
+            time.sleep(len(block) / self.stream_rate)
+        return bytes(data)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        body = self._body()
+        path = url.path.split("/")
+        if url.path.startswith("/upload/storage/v1/b/") and query.get("uploadType") == ["resumable"]:
+            bucket = path[5]
+            name = query.get("name", [None])[0] or json.loads(body or b"{}").get("name")
+            session_id = str(next(self.session_ids))
+            with self.lock:
+                self.sessions[session_id] = {"bucket": bucket, "name": name, "data": bytearray()}
+            host = self.headers.get("Host")
+            self._send_json(200, {}, {"Location": f"http://{host}/upload/session/{session_id}"})
+        elif url.path.endswith("/compose"):
+            bucket, name = path[4], unquote(path[6])
+            request = json.loads(body)
+            with self.lock:
+                self.objects[name] = b"".join(self.objects[source["name"]] for source in request["sourceObjects"])
+            self._send_json(200, self._object(bucket, name))
+        else:
+            self._send_json(404, {"error": url.path})
+
+    def do_PUT(self):
+        session_id = urlparse(self.path).path.rsplit("/", 1)[-1]
+        content_range = self.headers.get("Content-Range", "")
+        body = self._body()
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            self._send_json(404, {"error": "no such upload"})
+            return
+
+        total = content_range.rsplit("/", 1)[-1]
+        if body:
+            start = int(content_range.split(" ")[1].split("-")[0])
+            draw = self.rng.random()
+            if draw < self.failure_rate / 2:
+                type(self).injected["503"] += 1
+                self._send_json(503, {"error": "backend error"})
+                return
+            with self.lock:
+                if start != len(session["data"]):
+                    self._send_json(400, {"error": f"chunk starts at {start}, expected {len(session['data'])}"})
+                    return
+                if draw < self.failure_rate:
+                    # Part of the chunk made it to storage before the connection dropped
+                    session["data"] += body[:len(body) // 2 // (256 * 1024) * (256 * 1024)]
+                    type(self).injected["partial"] += 1
+                    self.close_connection = True
+                    return
+                session["data"] += body
+
+        with self.lock:
+            received = len(session["data"])
+            if total != "*" and received == int(total):
+                self.objects[session["name"]] = bytes(session["data"])
+                done = True
+            else:
+                done = False
+        if done:
+            self._send_json(200, self._object(session["bucket"], session["name"]))
+            return
+        headers = {"Range": f"bytes=0-{received - 1}"} if received else {}
+        self.send_response(308)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        path = urlparse(self.path).path.split("/")
+        if path[-1] == "acl":
+            self._send_json(200, {"kind": "storage#objectAccessControls", "items": []})
+        elif len(path) < 7:
+            self._send_json(200, {"kind": "storage#bucket", "name": path[-1]})
+        else:
+            self._send_json(200, self._object(path[4], unquote(path[6])))
+
+    def do_PATCH(self):
+        path = urlparse(self.path).path.split("/")
+        self._body()
+        self._send_json(200, self._object(path[4], unquote(path[6])))
+
+    def do_DELETE(self):
+        name = unquote(urlparse(self.path).path.split("/")[6])
+        with self.lock:
+            existed = self.objects.pop(name, None) is not None
+        self.send_response(204 if existed else 404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def run(file_path: str, destination: str, composite: bool) -> float:
+    settings.UPLOAD_COMPOSITE_THRESHOLD = 0 if composite else 1 << 62
+    start = time.perf_counter()
+    if not firebase_service.upload_file_to_firebase(file_path, destination):
+        raise SystemExit(f"Upload of {destination} failed")
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Upload a video to a local fake GCS server, in one stream and as parallel composite parts")
+    parser.add_argument("--size-mb", type=float, default=64)
+    parser.add_argument("--stream-mbps", type=float, default=20, help="Fake per-connection bandwidth in MB/s")
+    parser.add_argument("--chunk-mb", type=float, default=2)
+    parser.add_argument("--parts", type=int, default=8)
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="Share of chunk requests that fail in the faulty run")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    FakeGCSHandler.stream_rate = args.stream_mbps * 1024 * 1024
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGCSHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["STORAGE_EMULATOR_HOST"] = f"http://127.0.0.1:{server.server_port}"
+
+    settings.UPLOAD_CHUNK_SIZE = int(args.chunk_mb * 1024 * 1024)
+    settings.UPLOAD_COMPOSITE_PARTS = args.parts
+    settings.UPLOAD_BACKOFF_BASE = 0.05
+    settings.UPLOAD_BACKOFF_MAX = 0.5
+
+    file_path = os.path.join(os.environ["TEMP_DIR"], "video.mp4")
+    data = random.Random(1).randbytes(int(args.size_mb * 1024 * 1024))
+    with open(file_path, "wb") as f:
+        f.write(data)
+    digest = hashlib.sha256(data).hexdigest()
+
+    print(f"{args.size_mb:g} MB video, {args.stream_mbps:g} MB/s per connection, {args.chunk_mb:g} MB chunks")
+    runs = [
+        ("one resumable stream", False, 0.0),
+        (f"{args.parts} composite parts", True, 0.0),
+        (f"{args.parts} parts, {args.failure_rate:.0%} chunks fail", True, args.failure_rate),
+    ]
+    for name, composite, failure_rate in runs:
+        FakeGCSHandler.failure_rate = failure_rate
+        FakeGCSHandler.injected = {"503": 0, "partial": 0}
+        retries_before = sum(firebase_service.UPLOAD_RETRIES.values.values())
+        destination = f"videos/{name.replace(' ', '_')}.mp4"
+        elapsed = run(file_path, destination, composite)
+
+        stored = FakeGCSHandler.objects.get(destination, b"")
+        intact = hashlib.sha256(stored).hexdigest() == digest
+        leftover = [key for key in FakeGCSHandler.objects if ".parts/" in key]
+        retries = sum(firebase_service.UPLOAD_RETRIES.values.values()) - retries_before
+        print(f"  {name:<30} {elapsed:6.2f}s  {args.size_mb / elapsed:6.1f} MB/s  "
+              f"{'intact' if intact else 'CORRUPT'}, {retries:.0f} retries "
+              f"({FakeGCSHandler.injected['503']} 503s, {FakeGCSHandler.injected['partial']} dropped mid-chunk), "
+              f"{len(leftover)} parts left behind")
+        if not intact:
+            return 1
+
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
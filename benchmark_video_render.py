@@ -0,0 +1,172 @@
+import os
+import sys
+import time
+import random
+import resource
+import logging
+import argparse
+import tempfile
+import subprocess
+from typing import Any, Dict, List, Tuple
+
+from config import settings
+import services.video_renderer as video_renderer
+import services.video_generator as video_generator
+import services.fragment_cache as fragment_cache
+from services.speech_generator import write_timing_manifest
+
+
+def make_content(scene_count: int, scene_seconds: int) -> Dict[str, Any]:
+    return {
+        "title": "How gravity shapes the solar system",
+        "scenes": [
+            {
+                "description": f"Scene {i + 1}: why planets keep moving around the sun",
+                "narration": "Gravity pulls every mass toward every other mass, and the planets are always falling around the sun. " * 3,
+                "visual_elements": "orbit diagram, sun, planets, arrows showing the pull",
+                "duration_seconds": scene_seconds,
+            }
+            for i in range(scene_count)
+        ],
+    }
+
+
+def make_templated_lesson(lesson: int, body_scenes: int, scene_seconds: int) -> Dict[str, Any]:
+    """
+    A lesson built from the shared intro, outro and section cards plus a few
+    scenes of its own, like most generated lessons of one subject.
+    """
+    scenes = [{"description": "Welcome to TapBuddy Science", "visual_elements": "logo, lab bench", "duration_seconds": scene_seconds}]
+    for i in range(body_scenes):
+        scenes.append({"description": "Let's look closer", "visual_elements": "magnifying glass", "duration_seconds": 5})
+        scenes.append({
+            "description": f"Lesson {lesson}, part {i + 1}",
+            "visual_elements": "diagram",
+            "duration_seconds": scene_seconds,
+        })
+    scenes.append({"description": "Quick recap", "visual_elements": "checklist", "duration_seconds": scene_seconds})
+    scenes.append({"description": "Thanks for learning with TapBuddy", "visual_elements": "logo", "duration_seconds": scene_seconds})
+    return {"title": f"Lesson {lesson}", "scenes": scenes}
+
+
+def cpu_seconds() -> float:
+    """
+    CPU time used by this process and the ffmpeg processes it waited for.
+    """
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def make_narration(path: str, seconds: float) -> None:
+    subprocess.run(
+        [video_renderer.get_ffmpeg(), "-y", "-loglevel", "error", "-f", "lavfi",
+         "-i", f"sine=frequency=220:duration={seconds}", path],
+        check=True
+    )
+
+
+def make_lesson_narration(path: str, content: Dict[str, Any], rng: random.Random) -> None:
+    """
+    Narration for a lesson with a timing manifest, one chunk per scene. Like
+    real narration, it runs a little longer or shorter than planned, so the
+    scenes are aligned to it.
+    """
+    durations = [scene["duration_seconds"] * rng.uniform(0.85, 1.15) for scene in content["scenes"]]
+    make_narration(path, round(sum(durations), 2))
+    write_timing_manifest(path, [scene["description"] for scene in content["scenes"]], durations)
+
+
+def run(content: Dict[str, Any], audio_path: str, output_path: str, workers: int, card_fps: int) -> Tuple[float, float]:
+    """
+    Render one video the way the pipeline does. Returns (wall seconds, CPU seconds).
+    """
+    settings.VIDEO_RENDER_WORKERS = workers
+    settings.VIDEO_CARD_FPS = card_fps
+    video_renderer._render_executor = None
+    start, start_cpu = time.perf_counter(), cpu_seconds()
+    video_generator.render_local_video(content, "Science", audio_path, output_path)
+    elapsed, cpu = time.perf_counter() - start, cpu_seconds() - start_cpu
+    with open(output_path, "rb") as f:
+        if f.read(8)[4:] != b"ftyp":
+            raise SystemExit(f"Rendering {output_path} failed, see the log")
+    return elapsed, cpu
+
+
+def run_templated(args, temp_dir: str, grid: float) -> None:
+    """
+    Render several templated lessons, each with its own narration, with the
+    fragment cache enabled and scene cuts on the given grid.
+    """
+    settings.VIDEO_FRAGMENT_CACHE_ENABLED = True
+    settings.VIDEO_FRAGMENT_CACHE_DIR = os.path.join(temp_dir, f"fragments_{grid:g}")
+    settings.VIDEO_SCENE_GRID_SECONDS = grid
+    rng = random.Random(3)
+    print(f"\nTemplated lessons with the fragment cache, scene cuts {f'on a {grid:g}s grid' if grid else 'exact'}")
+    results: List[Tuple[float, float]] = []
+    hits_total = scenes_total = 0
+    for lesson in range(args.lessons):
+        content = make_templated_lesson(lesson, 2, args.scene_seconds)
+        audio_path = os.path.join(temp_dir, f"lesson_{lesson}.mp3")
+        make_lesson_narration(audio_path, content, rng)
+        before = fragment_cache.get_fragment_stats()
+        output_path = os.path.join(temp_dir, f"lesson_{lesson}_{grid:g}.mp4")
+        elapsed, cpu = run(content, audio_path, output_path, args.workers, settings.VIDEO_CARD_FPS)
+        hits = fragment_cache.get_fragment_stats()["hits"] - before["hits"]
+        if lesson:
+            hits_total += hits
+            scenes_total += len(content["scenes"])
+        results.append((elapsed, cpu))
+        print(f"  lesson {lesson + 1}: {elapsed:6.2f}s wall  {cpu:6.2f}s CPU  "
+              f"{hits:.0f}/{len(content['scenes'])} scenes from the cache")
+    if len(results) > 1:
+        later_cpu = sum(cpu for _, cpu in results[1:]) / (len(results) - 1)
+        print(f"  CPU per video: {results[0][1]:.2f}s cold, {later_cpu:.2f}s warm; "
+              f"hit rate after the first lesson {hits_total / scenes_total:.0%}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure local video render time per minute of video")
+    parser.add_argument("--scenes", type=int, default=6)
+    parser.add_argument("--scene-seconds", type=int, default=15)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Scenes encoded at once in the parallel run")
+    parser.add_argument("--lessons", type=int, default=4, help="Templated lessons rendered with the fragment cache")
+    parser.add_argument("--grid", type=float, default=settings.VIDEO_SCENE_GRID_SECONDS, help="Scene cut grid for the templated lessons")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    if not video_renderer.is_available():
+        print("The local renderer needs ffmpeg (see FFMPEG_PATH) and Pillow")
+        return 1
+
+    temp_dir = tempfile.mkdtemp(prefix="tapbuddy-render-")
+    content = make_content(args.scenes, args.scene_seconds)
+    video_minutes = args.scenes * args.scene_seconds / 60
+    audio_path = os.path.join(temp_dir, "narration.mp3")
+    make_narration(audio_path, args.scenes * args.scene_seconds)
+
+    print(f"{args.scenes} scenes, {video_minutes * 60:.0f}s of {settings.VIDEO_WIDTH}x{settings.VIDEO_HEIGHT} "
+          f"video at {settings.VIDEO_FPS} fps, preset {settings.VIDEO_X264_PRESET}, {os.cpu_count()} cores")
+    # Every scene below is unique; measure the renderer itself, not the cache
+    settings.VIDEO_FRAGMENT_CACHE_ENABLED = False
+    runs = [
+        ("sequential, every frame piped", 1, settings.VIDEO_FPS),
+        ("sequential", 1, settings.VIDEO_CARD_FPS),
+        (f"{args.workers} scenes at once", args.workers, settings.VIDEO_CARD_FPS),
+    ]
+    for name, workers, card_fps in runs:
+        output_path = os.path.join(temp_dir, f"video_{workers}_{card_fps}.mp4")
+        elapsed, cpu = run(content, audio_path, output_path, workers, card_fps)
+        print(f"  {name:<32} {elapsed:6.2f}s  {elapsed / video_minutes:6.2f}s per minute of video  "
+              f"{cpu:6.2f}s CPU  ({os.path.getsize(output_path) / 1e6:.1f} MB)")
+
+    if args.lessons:
+        for grid in (0.0, args.grid):
+            run_templated(args, temp_dir, grid)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 import os
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Any, Dict
 
 class Settings(BaseSettings):
     # Application Settings
@@ -25,9 +26,189 @@ class Settings(BaseSettings):
     # Database Settings
     DATABASE_URL: str = os.environ.get("DATABASE_URL", "sqlite:///./tapbuddy.db")
     
+    # Job Queue and Worker Settings
+    # Run the worker pool inside the web process (disable when running worker.py separately)
+    EMBEDDED_WORKERS: bool = os.environ.get("EMBEDDED_WORKERS", "True").lower() == "true"
+    # Requests in flight at once; should cover the stage workers below so every stage stays busy
+    WORKER_COUNT: int = int(os.environ.get("WORKER_COUNT", "12"))
+    JOB_LEASE_SECONDS: int = int(os.environ.get("JOB_LEASE_SECONDS", "120"))
+    JOB_MAX_ATTEMPTS: int = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+    JOB_POLL_INTERVAL: float = float(os.environ.get("JOB_POLL_INTERVAL", "1.0"))
+    # Requests are rejected once this many jobs are waiting or running
+    MAX_QUEUE_DEPTH: int = int(os.environ.get("MAX_QUEUE_DEPTH", "500"))
+    # Worker threads per pipeline stage, e.g. "content=4,speech=2,video=2,upload=4"
+    STAGE_CONCURRENCY: str = os.environ.get("STAGE_CONCURRENCY", "content=4,speech=2,video=2,upload=4")
+    # Maximum number of requests waiting in front of each pipeline stage
+    PIPELINE_QUEUE_SIZE: int = int(os.environ.get("PIPELINE_QUEUE_SIZE", "16"))
+    
+    # Scheduling Settings
+    # Serve users round-robin within a priority class instead of first come, first served
+    FAIR_QUEUING_ENABLED: bool = os.environ.get("FAIR_QUEUING_ENABLED", "True").lower() == "true"
+    # Jobs of one user running at the same time (0 for no limit)
+    MAX_INFLIGHT_PER_USER: int = int(os.environ.get("MAX_INFLIGHT_PER_USER", "2"))
+    # Jobs of one user waiting in the queue before further requests are rejected (0 for no limit)
+    MAX_QUEUED_PER_USER: int = int(os.environ.get("MAX_QUEUED_PER_USER", "20"))
+    # Priority of each request class; higher classes are leased first
+    PRIORITY_CLASSES: str = os.environ.get("PRIORITY_CLASSES", "cached=20,web_interface=10,webhook=0")
+    
+    # Deadline Settings
+    # Wall-clock budget for one video request, from leaving the queue to the final notification
+    REQUEST_DEADLINE_SECONDS: float = float(os.environ.get("REQUEST_DEADLINE_SECONDS", "300"))
+    # Upper bounds for single upstream calls; the remaining request budget is used when it is lower
+    GEMINI_CALL_TIMEOUT: float = float(os.environ.get("GEMINI_CALL_TIMEOUT", "60"))
+    TTS_CALL_TIMEOUT: float = float(os.environ.get("TTS_CALL_TIMEOUT", "90"))
+    UPLOAD_CALL_TIMEOUT: float = float(os.environ.get("UPLOAD_CALL_TIMEOUT", "120"))
+    # Extra time a job may run past its deadline before the watchdog reaps it
+    WATCHDOG_GRACE_SECONDS: float = float(os.environ.get("WATCHDOG_GRACE_SECONDS", "30"))
+    
+    # Provider Settings
+    # Implementation behind each upstream service; "fake" uses the offline fakes for load testing
+    LLM_PROVIDER: str = os.environ.get("LLM_PROVIDER", "gemini")
+    TTS_PROVIDER: str = os.environ.get("TTS_PROVIDER", "elevenlabs")
+    STORAGE_PROVIDER: str = os.environ.get("STORAGE_PROVIDER", "firebase")
+    MESSAGING_PROVIDER: str = os.environ.get("MESSAGING_PROVIDER", "twilio")
+    # Fake behaviour: latency (mean seconds), dist (fixed/uniform/exponential/lognormal), sigma,
+    # per_unit (seconds per token/character/byte), failure_rate and, for the LLM, throttle_rate
+    FAKE_LLM: str = os.environ.get("FAKE_LLM", "latency=1.5,sigma=0.5,failure_rate=0.01,throttle_rate=0.01")
+    FAKE_TTS: str = os.environ.get("FAKE_TTS", "latency=2.0,sigma=0.3,per_unit=0.0005,failure_rate=0.01")
+    FAKE_STORAGE: str = os.environ.get("FAKE_STORAGE", "latency=0.3,sigma=0.3,per_unit=0.00000002,failure_rate=0.005")
+    FAKE_MESSAGING: str = os.environ.get("FAKE_MESSAGING", "latency=0.1,sigma=0.3")
+    FAKE_PROVIDER_SEED: int = int(os.environ.get("FAKE_PROVIDER_SEED", "42"))
+    FAKE_STORAGE_DIR: str = os.environ.get("FAKE_STORAGE_DIR", os.path.join(os.environ.get("TEMP_DIR", "./temp"), "fake_storage"))
+    FAKE_STORAGE_URL: str = os.environ.get("FAKE_STORAGE_URL", "http://localhost:9199/fake-storage")
+    
     # Application Paths
     TEMP_DIR: str = os.environ.get("TEMP_DIR", "./temp")
     
+    # Gemini Client Settings
+    GEMINI_MODEL_NAME: str = os.environ.get("GEMINI_MODEL_NAME", "gemini-1.5-flash")
+    # Default generation config for every call, e.g. "temperature=0.7,max_output_tokens=8192"
+    GEMINI_GENERATION_CONFIG: str = os.environ.get("GEMINI_GENERATION_CONFIG", "")
+    # "grpc" or "rest"; both keep connections alive between calls
+    GEMINI_TRANSPORT: str = os.environ.get("GEMINI_TRANSPORT", "grpc")
+    # Keep-alive connections kept by the REST transport
+    GEMINI_POOL_SIZE: int = int(os.environ.get("GEMINI_POOL_SIZE", "16"))
+    
+    # Gemini Rate Limit Settings (per process)
+    GEMINI_RPM: float = float(os.environ.get("GEMINI_RPM", "2000"))
+    GEMINI_TPM: float = float(os.environ.get("GEMINI_TPM", "4000000"))
+    # Seconds of quota that may be used in one burst
+    GEMINI_BURST_SECONDS: float = float(os.environ.get("GEMINI_BURST_SECONDS", "5"))
+    # Bounds of the adaptive concurrency limit, which halves on 429/503 and grows back on success
+    GEMINI_MAX_CONCURRENCY: int = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "20"))
+    GEMINI_MIN_CONCURRENCY: int = int(os.environ.get("GEMINI_MIN_CONCURRENCY", "1"))
+    # Response tokens reserved per call until the actual usage is known
+    GEMINI_EXPECTED_RESPONSE_TOKENS: int = int(os.environ.get("GEMINI_EXPECTED_RESPONSE_TOKENS", "1024"))
+    GEMINI_MAX_RETRIES: int = int(os.environ.get("GEMINI_MAX_RETRIES", "4"))
+    GEMINI_BACKOFF_BASE: float = float(os.environ.get("GEMINI_BACKOFF_BASE", "1.0"))
+    GEMINI_BACKOFF_MAX: float = float(os.environ.get("GEMINI_BACKOFF_MAX", "30"))
+    # Longest a call waits for quota before its request is put back on the queue
+    GEMINI_QUOTA_WAIT_SECONDS: float = float(os.environ.get("GEMINI_QUOTA_WAIT_SECONDS", "30"))
+    # Delay before a request that ran out of quota is tried again
+    QUOTA_RETRY_DELAY_SECONDS: float = float(os.environ.get("QUOTA_RETRY_DELAY_SECONDS", "60"))
+    
+    # Content Generation Settings
+    # Number of Gemini prompt stages that may run at the same time (1 = serial)
+    CONTENT_STAGE_WORKERS: int = int(os.environ.get("CONTENT_STAGE_WORKERS", "5"))
+    # "staged" sends five separate prompts; "single_shot" requests the whole lesson in one structured call
+    CONTENT_GENERATION_MODE: str = os.environ.get("CONTENT_GENERATION_MODE", "staged")
+    # Stream the script response and start speech and scene rendering as soon as parts of it are complete
+    CONTENT_STREAMING_ENABLED: bool = os.environ.get("CONTENT_STREAMING_ENABLED", "True").lower() == "true"
+    # Threads rendering speech ahead of its pipeline stage (scenes go to the RunwayML scene pool)
+    STREAM_PREFETCH_WORKERS: int = int(os.environ.get("STREAM_PREFETCH_WORKERS", "4"))
+    
+    # Speech Settings
+    ELEVENLABS_API_URL: str = os.environ.get("ELEVENLABS_API_URL", "https://api.elevenlabs.io")
+    # Scripts are synthesized in chunks of up to this many characters, split between sentences
+    TTS_CHUNK_CHARS: int = int(os.environ.get("TTS_CHUNK_CHARS", "800"))
+    # Chunks synthesized at the same time, shared by all requests in the process
+    TTS_MAX_PARALLEL_CHUNKS: int = int(os.environ.get("TTS_MAX_PARALLEL_CHUNKS", "4"))
+    # Constant-bitrate MP3 so that chunks can be joined and timed without decoding
+    TTS_OUTPUT_FORMAT: str = os.environ.get("TTS_OUTPUT_FORMAT", "mp3_44100_128")
+    # Synthesized audio is cached on disk by text and voice, shared by all workers on the host
+    TTS_CACHE_ENABLED: bool = os.environ.get("TTS_CACHE_ENABLED", "True").lower() == "true"
+    TTS_CACHE_DIR: str = os.environ.get("TTS_CACHE_DIR", os.path.join(os.environ.get("TEMP_DIR", "./temp"), "tts_cache"))
+    TTS_CACHE_MAX_BYTES: int = int(os.environ.get("TTS_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+    
+    # Local TTS Settings
+    # Offline speech with espeak-ng or piper when ElevenLabs is not configured, and as its failover
+    LOCAL_TTS_ENABLED: bool = os.environ.get("LOCAL_TTS_ENABLED", "True").lower() == "true"
+    # auto (the first installed of espeak-ng and piper), espeak-ng, piper, or tone (speech-like audio for load tests)
+    LOCAL_TTS_ENGINE: str = os.environ.get("LOCAL_TTS_ENGINE", "auto")
+    LOCAL_TTS_ESPEAK_PATH: str = os.environ.get("LOCAL_TTS_ESPEAK_PATH", "espeak-ng")
+    LOCAL_TTS_PIPER_PATH: str = os.environ.get("LOCAL_TTS_PIPER_PATH", "piper")
+    LOCAL_TTS_PIPER_MODEL: str = os.environ.get("LOCAL_TTS_PIPER_MODEL", "")
+    LOCAL_TTS_VOICE: str = os.environ.get("LOCAL_TTS_VOICE", "en-us")
+    LOCAL_TTS_WORDS_PER_MINUTE: int = int(os.environ.get("LOCAL_TTS_WORDS_PER_MINUTE", "160"))
+    # Synthesis processes (0 = one per core)
+    LOCAL_TTS_WORKERS: int = int(os.environ.get("LOCAL_TTS_WORKERS", "0"))
+    LOCAL_TTS_TIMEOUT: float = float(os.environ.get("LOCAL_TTS_TIMEOUT", "120"))
+    # Synthesize locally when ElevenLabs is rate limited or down
+    LOCAL_TTS_FAILOVER: bool = os.environ.get("LOCAL_TTS_FAILOVER", "True").lower() == "true"
+    
+    # Upload Settings
+    # Bytes per request of a resumable upload (rounded down to a multiple of 256 KiB)
+    UPLOAD_CHUNK_SIZE: int = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(8 * 1024 ** 2)))
+    # Files at least this large are uploaded as parts in parallel and composed in the bucket
+    UPLOAD_COMPOSITE_THRESHOLD: int = int(os.environ.get("UPLOAD_COMPOSITE_THRESHOLD", str(64 * 1024 ** 2)))
+    UPLOAD_COMPOSITE_PARTS: int = int(os.environ.get("UPLOAD_COMPOSITE_PARTS", "8"))
+    # Retries of a transient upload failure (5xx, 429, timeout, dropped connection), with jittered backoff
+    UPLOAD_MAX_RETRIES: int = int(os.environ.get("UPLOAD_MAX_RETRIES", "6"))
+    UPLOAD_BACKOFF_BASE: float = float(os.environ.get("UPLOAD_BACKOFF_BASE", "0.5"))
+    UPLOAD_BACKOFF_MAX: float = float(os.environ.get("UPLOAD_BACKOFF_MAX", "30"))
+    
+    # Local Video Renderer Settings
+    # Render scene cards with ffmpeg when RunwayML is not configured (needs ffmpeg and Pillow)
+    VIDEO_RENDERER_ENABLED: bool = os.environ.get("VIDEO_RENDERER_ENABLED", "True").lower() == "true"
+    FFMPEG_PATH: str = os.environ.get("FFMPEG_PATH", "ffmpeg")
+    VIDEO_WIDTH: int = int(os.environ.get("VIDEO_WIDTH", "1280"))
+    VIDEO_HEIGHT: int = int(os.environ.get("VIDEO_HEIGHT", "720"))
+    VIDEO_FPS: int = int(os.environ.get("VIDEO_FPS", "24"))
+    # Frames per second piped to ffmpeg; cards only change as the progress bar grows,
+    # so ffmpeg repeats them up to VIDEO_FPS, which roughly halves the encoding time
+    VIDEO_CARD_FPS: int = int(os.environ.get("VIDEO_CARD_FPS", "6"))
+    VIDEO_X264_PRESET: str = os.environ.get("VIDEO_X264_PRESET", "veryfast")
+    VIDEO_CRF: int = int(os.environ.get("VIDEO_CRF", "28"))
+    VIDEO_FONT_PATH: str = os.environ.get("VIDEO_FONT_PATH", "")
+    # Scenes encoded at the same time across all requests (0 = one per CPU core)
+    VIDEO_RENDER_WORKERS: int = int(os.environ.get("VIDEO_RENDER_WORKERS", "0"))
+    # Rendered scene fragments are reused by any video with an identical scene
+    VIDEO_FRAGMENT_CACHE_ENABLED: bool = os.environ.get("VIDEO_FRAGMENT_CACHE_ENABLED", "True").lower() == "true"
+    VIDEO_FRAGMENT_CACHE_DIR: str = os.environ.get("VIDEO_FRAGMENT_CACHE_DIR", os.path.join(os.environ.get("TEMP_DIR", "./temp"), "fragments"))
+    VIDEO_FRAGMENT_CACHE_MAX_BYTES: int = int(os.environ.get("VIDEO_FRAGMENT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+    # Scene cuts aligned to the narration are rounded to this many seconds, so that
+    # scenes shared between lessons keep matching cached fragments (0 = exact cuts)
+    VIDEO_SCENE_GRID_SECONDS: float = float(os.environ.get("VIDEO_SCENE_GRID_SECONDS", "1.0"))
+    
+    RUNWAY_API_URL: str = os.environ.get("RUNWAY_API_URL", "https://api.dev.runwayml.com")
+    RUNWAY_API_VERSION: str = os.environ.get("RUNWAY_API_VERSION", "2024-11-06")
+    RUNWAY_MODEL: str = os.environ.get("RUNWAY_MODEL", "veo3.1_fast")
+    RUNWAY_RATIO: str = os.environ.get("RUNWAY_RATIO", "1280:720")
+    # Clip lengths in seconds that RUNWAY_MODEL accepts; clips are cut or held to the scene length
+    RUNWAY_DURATIONS: str = os.environ.get("RUNWAY_DURATIONS", "4,6,8")
+    # Scene tasks submitted and polled at the same time, shared by all requests in the process
+    RUNWAY_MAX_PARALLEL_SCENES: int = int(os.environ.get("RUNWAY_MAX_PARALLEL_SCENES", "6"))
+    # Task polling starts at the initial interval and backs off up to the maximum
+    RUNWAY_POLL_INITIAL: float = float(os.environ.get("RUNWAY_POLL_INITIAL", "2.0"))
+    RUNWAY_POLL_MAX: float = float(os.environ.get("RUNWAY_POLL_MAX", "15.0"))
+    RUNWAY_CALL_TIMEOUT: float = float(os.environ.get("RUNWAY_CALL_TIMEOUT", "30"))
+    # Longest one scene task may take, including time spent queued at RunwayML
+    RUNWAY_TASK_TIMEOUT: float = float(os.environ.get("RUNWAY_TASK_TIMEOUT", "600"))
+    
+    # Content Cache Settings
+    CONTENT_CACHE_ENABLED: bool = os.environ.get("CONTENT_CACHE_ENABLED", "True").lower() == "true"
+    CONTENT_CACHE_PATH: str = os.environ.get("CONTENT_CACHE_PATH", os.path.join(os.environ.get("TEMP_DIR", "./temp"), "content_cache.db"))
+    CONTENT_CACHE_TTL_SECONDS: int = int(os.environ.get("CONTENT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    CONTENT_CACHE_MAX_ENTRIES: int = int(os.environ.get("CONTENT_CACHE_MAX_ENTRIES", "5000"))
+    
+    # Semantic (near-duplicate) Cache Settings
+    SEMANTIC_CACHE_ENABLED: bool = os.environ.get("SEMANTIC_CACHE_ENABLED", "True").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+    SEMANTIC_CACHE_DIMENSIONS: int = int(os.environ.get("SEMANTIC_CACHE_DIMENSIONS", "256"))
+    # Maximum number of cached queries kept per (subject, level) index
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "20000"))
+    SEMANTIC_CACHE_REBUILD_BATCH: int = int(os.environ.get("SEMANTIC_CACHE_REBUILD_BATCH", "64"))
+    
     model_config = {
         "env_file": ".env"
     }
@@ -45,3 +226,30 @@ def get_settings() -> Settings:
         Settings object with all configuration parameters
     """
     return settings
+
+
+def parse_options(spec: str) -> Dict[str, Any]:
+    """
+    Parse a "key=value,key=value" setting, such as GEMINI_GENERATION_CONFIG
+    or STAGE_CONCURRENCY. Items without "=" are skipped.
+
+    Args:
+        spec: The setting's value
+
+    Returns:
+        Dictionary of key to value, with numbers converted to int or float
+    """
+    options = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        key, value = (part.strip() for part in item.split("=", 1))
+        for convert in (int, float):
+            try:
+                options[key] = convert(value)
+                break
+            except ValueError:
+                continue
+        else:
+            options[key] = value
+    return options
@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+import pytest
+
+# The app reads its configuration at import time: point it at a scratch
+# SQLite database and the fake providers before anything imports it
+_TEST_DIR = tempfile.mkdtemp(prefix="tapbuddy-test-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_TEST_DIR, 'tapbuddy.db')}")
+os.environ.setdefault("TEMP_DIR", _TEST_DIR)
+os.environ["EMBEDDED_WORKERS"] = "False"
+for _kind in ("LLM", "TTS", "STORAGE", "MESSAGING"):
+    os.environ.setdefault(f"{_kind}_PROVIDER", "fake")
+
+
+@pytest.fixture
+def app_context():
+    """
+    An application context over an empty job queue.
+    """
+    from app import app, db
+    from models import VideoJob, VideoRequest, CoalescedRequest
+
+    with app.app_context():
+        for model in (CoalescedRequest, VideoJob, VideoRequest):
+            db.session.query(model).delete()
+        db.session.commit()
+        yield db.session
+        db.session.rollback()
+
+
+@pytest.fixture
+def make_request(app_context):
+    """
+    Factory for pending VideoRequests.
+    """
+    from models import VideoRequest
+
+    def make(user_id=1, topic="Photosynthesis"):
+        video_request = VideoRequest(
+            user_id=user_id, subject="Biology", topic=topic, level="beginner",
+            query=f"How does {topic.lower()} work?", status="pending", request_metadata={}
+        )
+        app_context.add(video_request)
+        app_context.commit()
+        return video_request
+
+    return make
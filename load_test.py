@@ -0,0 +1,228 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+SUBJECTS = ["Science", "Coding", "VisualArts", "FinancialLiteracy", "PerformingArts"]
+TOPICS = ["Photosynthesis", "Loops", "ColorTheory", "Budgeting", "Rhythm", "Gravity", "Recursion", "Saving"]
+LEVELS = ["Beginner", "Intermediate", "Advanced"]
+
+_JOBS_LINE = re.compile(r'^tapbuddy_jobs\{status="(\w+)"\} (\S+)$', re.MULTILINE)
+_STAGE_DEPTH_LINE = re.compile(r'^tapbuddy_pipeline_queue_depth\{stage="(\w+)"\} (\S+)$', re.MULTILINE)
+
+
+def start_local_server(args) -> str:
+    """
+    Run the app with its embedded workers in this process, with every
+    upstream service replaced by the offline fakes. Returns the base URL.
+    """
+    temp_dir = tempfile.mkdtemp(prefix="tapbuddy-load-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(temp_dir, 'load.db')}")
+    os.environ.setdefault("TEMP_DIR", temp_dir)
+    os.environ["EMBEDDED_WORKERS"] = "True"
+    for setting in ["LLM_PROVIDER", "TTS_PROVIDER", "STORAGE_PROVIDER", "MESSAGING_PROVIDER"]:
+        os.environ.setdefault(setting, "fake")
+    if args.no_cache:
+        os.environ["CONTENT_CACHE_ENABLED"] = "False"
+        os.environ["SEMANTIC_CACHE_ENABLED"] = "False"
+
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger().setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-test-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def synthetic_traffic(count: int, rate: float, users: int, seed: int) -> List[Tuple[float, Dict[str, str]]]:
+    """
+    Poisson arrivals of webhook payloads at the given rate per second.
+    """
+    rng = random.Random(seed)
+    at = 0.0
+    traffic = []
+    for i in range(count):
+        at += rng.expovariate(rate)
+        phone = f"+1555{rng.randrange(users):07d}"
+        body = f"#{rng.choice(SUBJECTS)} #{rng.choice(TOPICS)} #{rng.choice(LEVELS)} Question {i} about this topic?"
+        channel = "whatsapp:" if rng.random() < 0.7 else ""
+        traffic.append((at, {"From": f"{channel}{phone}", "Body": body}))
+    return traffic
+
+
+def load_replay(path: str, speed: float) -> List[Tuple[float, Dict[str, str]]]:
+    """
+    Read recorded webhooks, one JSON object per line. Each line holds the
+    form fields Twilio posted and optionally "at", the seconds since the
+    first webhook; without it the webhooks are sent one second apart.
+    """
+    traffic = []
+    with open(path) as f:
+        for i, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            payload = json.loads(line)
+            at = float(payload.pop("at", i))
+            traffic.append((at / speed, payload))
+    traffic.sort(key=lambda item: item[0])
+    return traffic
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class QueueSampler(threading.Thread):
+    """
+    Polls /metrics and records job and pipeline stage queue depths.
+    """
+
+    def __init__(self, base_url: str, interval: float):
+        super().__init__(name="queue-sampler", daemon=True)
+        self.base_url = base_url
+        self.interval = interval
+        self.samples: List[Dict[str, float]] = []
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        session = requests.Session()
+        while not self.stop_event.is_set():
+            try:
+                text = session.get(f"{self.base_url}/metrics", timeout=5).text
+                sample = {
+                    f"jobs_{status}": float(value) for status, value in _JOBS_LINE.findall(text)
+                    if status in ("queued", "leased")
+                }
+                sample.update({f"stage_{stage}": float(value) for stage, value in _STAGE_DEPTH_LINE.findall(text)})
+                self.samples.append(sample)
+            except requests.RequestException:
+                pass
+            self.stop_event.wait(self.interval)
+
+
+def send_webhook(session: requests.Session, base_url: str, payload: Dict[str, str]) -> Tuple[int, float, Optional[int]]:
+    start = time.perf_counter()
+    try:
+        response = session.post(f"{base_url}/api/process_message_webhook", data=payload, timeout=30)
+    except requests.RequestException:
+        return 0, time.perf_counter() - start, None
+    elapsed = time.perf_counter() - start
+    request_id = None
+    if response.headers.get("Content-Type", "").startswith("application/json"):
+        request_id = response.json().get("request_id")
+    return response.status_code, elapsed, request_id
+
+
+def wait_for_completion(base_url: str, submitted: Dict[int, float], timeout: float) -> Dict[int, Tuple[str, float]]:
+    """
+    Poll /api/video_status until every request has finished or the timeout
+    passes. Returns request ID -> (final status, seconds from submission).
+    """
+    session = requests.Session()
+    finished: Dict[int, Tuple[str, float]] = {}
+    give_up_at = time.perf_counter() + timeout
+    while len(finished) < len(submitted) and time.perf_counter() < give_up_at:
+        for request_id, submitted_at in submitted.items():
+            if request_id in finished:
+                continue
+            try:
+                status = session.get(f"{base_url}/api/video_status/{request_id}", timeout=10).json().get("status")
+            except (requests.RequestException, ValueError):
+                continue
+            if status in ("completed", "failed"):
+                finished[request_id] = (status, time.perf_counter() - submitted_at)
+        time.sleep(0.2)
+    return finished
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay webhook traffic against the message webhook and report throughput, latency and queue depths")
+    parser.add_argument("--url", help="Base URL of a running server; by default the app runs in-process with fake providers")
+    parser.add_argument("--replay", help="JSON-lines file of recorded webhook payloads")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed-up factor")
+    parser.add_argument("--requests", type=int, default=100, help="Synthetic webhooks to send")
+    parser.add_argument("--rate", type=float, default=5.0, help="Synthetic webhooks per second")
+    parser.add_argument("--users", type=int, default=50, help="Distinct synthetic senders")
+    parser.add_argument("--senders", type=int, default=16, help="Concurrent HTTP senders")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for requests to finish")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the content caches of the in-process app")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/") if args.url else start_local_server(args)
+    traffic = load_replay(args.replay, args.speed) if args.replay else synthetic_traffic(args.requests, args.rate, args.users, args.seed)
+    print(f"Sending {len(traffic)} webhooks to {base_url} over {traffic[-1][0]:.1f}s")
+
+    sampler = QueueSampler(base_url, 0.5)
+    sampler.start()
+
+    local = threading.local()
+    submitted: Dict[int, float] = {}
+    webhook_latencies: List[float] = []
+    status_codes: Dict[int, int] = {}
+    results_lock = threading.Lock()
+
+    def fire(payload: Dict[str, str]) -> None:
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        sent_at = time.perf_counter()
+        status_code, elapsed, request_id = send_webhook(local.session, base_url, payload)
+        with results_lock:
+            webhook_latencies.append(elapsed)
+            status_codes[status_code] = status_codes.get(status_code, 0) + 1
+            if request_id is not None and status_code == 200:
+                submitted[request_id] = sent_at
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.senders) as executor:
+        for at, payload in traffic:
+            delay = start + at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(fire, payload)
+    send_seconds = time.perf_counter() - start
+
+    finished = wait_for_completion(base_url, dict(submitted), args.timeout)
+    total_seconds = time.perf_counter() - start
+    sampler.stop_event.set()
+    sampler.join()
+
+    completed = [seconds for status, seconds in finished.values() if status == "completed"]
+    failed = sum(1 for status, _ in finished.values() if status == "failed")
+    print(f"\nWebhooks: {len(traffic)} sent in {send_seconds:.1f}s, responses {dict(sorted(status_codes.items()))}")
+    print(f"  webhook latency  p50 {percentile(webhook_latencies, 50) * 1e3:8.1f} ms  "
+          f"p95 {percentile(webhook_latencies, 95) * 1e3:8.1f} ms  p99 {percentile(webhook_latencies, 99) * 1e3:8.1f} ms")
+    print(f"\nRequests: {len(completed)} completed, {failed} failed, "
+          f"{len(submitted) - len(finished)} unfinished after {total_seconds:.1f}s")
+    print(f"  throughput       {len(completed) / total_seconds:8.2f} videos/s")
+    if completed:
+        print(f"  end-to-end       p50 {percentile(completed, 50):8.2f} s   p95 {percentile(completed, 95):8.2f} s   "
+              f"p99 {percentile(completed, 99):8.2f} s   mean {statistics.mean(completed):8.2f} s")
+
+    if sampler.samples:
+        print("\nQueue depths (mean / max over the run)")
+        for key in sorted({key for sample in sampler.samples for key in sample}):
+            values = [sample.get(key, 0.0) for sample in sampler.samples]
+            print(f"  {key:<20} {statistics.mean(values):8.1f} / {max(values):6.0f}")
+    return 0 if failed == 0 and len(finished) == len(submitted) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
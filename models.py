@@ -52,7 +52,20 @@ class VideoRequest(db.Model):
     request_metadata = db.Column(MutableDict.as_mutable(JSON), default=dict)
     
     user = db.relationship("User", back_populates="requests")
-    video = db.relationship("Video", back_populates="request", uselist=False)
+    own_video = db.relationship("Video", back_populates="request", uselist=False)
+    # Video of the identical request this one was coalesced with, if any
+    shared_video = db.relationship(
+        "Video",
+        secondary="coalesced_requests",
+        primaryjoin="VideoRequest.id == CoalescedRequest.request_id",
+        secondaryjoin="CoalescedRequest.video_id == Video.id",
+        uselist=False,
+        viewonly=True
+    )
+    
+    @property
+    def video(self) -> Optional["Video"]:
+        return self.own_video or self.shared_video
     
     def get_message_type(self) -> str:
         if not self.request_metadata:
@@ -76,9 +89,36 @@ class Video(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     video_metadata = db.Column(MutableDict.as_mutable(JSON), default=dict)
     
-    request = db.relationship("VideoRequest", back_populates="video")
+    request = db.relationship("VideoRequest", back_populates="own_video")
     
     def get_content_features(self) -> List[str]:
         if not self.video_metadata or "content_features" not in self.video_metadata:
             return []
         return self.video_metadata.get("content_features", [])
+
+class VideoJob(db.Model):
+    __tablename__ = "video_jobs"
+
+    id = db.Column(db.Integer, primary_key=True, index=True)
+    request_id = db.Column(db.Integer, db.ForeignKey("video_requests.id"), unique=True, index=True)
+    user_id = db.Column(db.Integer, index=True, nullable=True)
+    message_type = db.Column(db.String(20), default="whatsapp")
+    priority = db.Column(db.Integer, default=0)
+    status = db.Column(db.String(20), default="queued", index=True)
+    attempts = db.Column(db.Integer, default=0)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    leased_by = db.Column(db.String(64), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    request = db.relationship("VideoRequest")
+
+class CoalescedRequest(db.Model):
+    __tablename__ = "coalesced_requests"
+
+    request_id = db.Column(db.Integer, db.ForeignKey("video_requests.id"), primary_key=True)
+    leader_request_id = db.Column(db.Integer, db.ForeignKey("video_requests.id"), index=True)
+    video_id = db.Column(db.Integer, db.ForeignKey("videos.id"), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -2,15 +2,29 @@ import logging
 from flask import Blueprint, request, jsonify
 from sqlalchemy.orm import Session
 from typing import Dict, Any, Tuple, Optional, Literal
-from models import get_db, User, VideoRequest, Video
-from services.content_generator import generate_educational_content
-from services.video_generator import generate_video
-from services.speech_generator import generate_speech
+from models import get_db, User, VideoRequest, Video, VideoJob, CoalescedRequest
+from services.content_generator import generate_educational_content, lookup_cached_content
+from services.content_cache import make_cache_key, get_cached_video
+from services.video_generator import generate_video, submit_scene, discard_clip, RUNWAY_ML_API_KEY
+from services.speech_generator import generate_speech, discard_speech
 from services.messaging_service import send_message, handle_message_webhook
 from services.firebase_service import upload_file_to_firebase, get_firebase_url
+from services.job_queue import get_queue_stats, requeue_request, complete_request_jobs, JobHandedOff
+from services.dispatcher import dispatch_request, format_dispatch_message
+from services.pipeline import build_pipeline
+from services.metrics import register_collector
+from services.deadline import Deadline, DeadlineExceeded, register_request_deadline, unregister_request_deadline
+from services.rate_limiter import QuotaExhaustedError
+from services.single_flight import begin_flight, end_flight
+from sqlalchemy.exc import IntegrityError
+from config import settings
 from datetime import datetime
 import json
+import time
+import queue
 import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 
 bp = Blueprint('api', __name__)
 logger = logging.getLogger(__name__)
@@ -22,7 +36,8 @@ def process_message_webhook():
     This endpoint receives messages (SMS or WhatsApp) from students and triggers the
     video generation process.
     """
-    data = request.json or request.form.to_dict()
+    # Twilio posts form-encoded data; JSON is accepted for manual testing
+    data = request.get_json(silent=True) or request.form.to_dict()
     logger.debug(f"Received message webhook: {json.dumps(data)}")
 
     try:
@@ -59,28 +74,28 @@ def process_message_webhook():
         db.commit()
         db.refresh(video_request)
 
+        # Hand the request to the dispatch layer, which queues it for the workers
+        try:
+            accepted, position = dispatch_request(video_request, message_type, source="webhook")
+        except Exception as e:
+            logger.error(f"Failed to queue request {video_request.id}: {str(e)}")
+            return jsonify({"error": "Failed to start processing"}), 500
+
         # Send acknowledgment to the user
         send_message(
             phone_number,
-            f"Thanks for your request! We're generating a {subject} video about '{topic}' for you. This may take a few minutes.",
+            format_dispatch_message(accepted, position, subject, topic),
             message_type
         )
 
-        # Start the video generation process in the background
-        try:
-            logger.info(f"Starting background thread for request {video_request.id}")
-            thread = threading.Thread(
-                target=process_video_request,
-                args=(video_request.id, message_type)
-            )
-            thread.daemon = True
-            thread.start()
-            logger.info(f"Background thread started successfully for request {video_request.id}")
-        except Exception as e:
-            logger.error(f"Failed to start background thread: {str(e)}")
-            return jsonify({"error": "Failed to start processing"}), 500
+        if not accepted:
+            return jsonify({"status": "rejected", "message": "Too many requests, please try again later"}), 503
 
-        return jsonify({"status": "success", "message": "Request received and processing started"})
+        response = {"status": "success", "message": "Request received and processing started", "request_id": video_request.id}
+        if position:
+            response["message"] = f"Request queued at position {position}"
+            response["queue_position"] = position
+        return jsonify(response)
 
     except Exception as e:
         logger.error(f"Error processing message webhook: {str(e)}", exc_info=True)
@@ -123,27 +138,114 @@ def get_video_status(request_id):
 
 def process_video_request(request_id, message_type="whatsapp"):
     """
-    Background task to process a video generation request
+    Background task to process a video generation request. The request is
+    handed to the shared staged pipeline, so while this request waits on one
+    stage (e.g. speech) other requests can use the remaining stages.
+
+    The request gets REQUEST_DEADLINE_SECONDS of wall-clock time. Upstream
+    calls use timeouts derived from what is left of it, and once it runs out
+    the request is failed right away, without waiting for the stage it is in.
+
+    Identical requests (same normalized subject, topic, level and query) are
+    generated once: a request arriving while an identical one is in flight in
+    this process is attached to it and completed with the same video. Its job
+    stays leased until then (see JobHandedOff). Identical requests running in
+    different worker processes are each generated.
 
     Args:
         request_id: The ID of the video request to process
         message_type: The type of message to use for notifications ("sms" or "whatsapp")
+
+    Raises:
+        QuotaExhaustedError: If Gemini had no quota left; the job queue
+            retries the request later
+        JobHandedOff: If the request was attached to an identical request;
+            finish_followers or release_follower completes its job
     """
-    MAX_PROCESSING_TIME = 300  # 5 minutes timeout
-    start_time = datetime.utcnow()
+    deadline = Deadline(settings.REQUEST_DEADLINE_SECONDS)
     logger.info(f"Starting video generation process for request {request_id}, message type: {message_type}")
 
+    context = start_video_request(request_id, message_type)
+    if context is None:
+        return
+
+    flight_key = make_cache_key(context["subject"], context["topic"], context["level"], context["query"])
+    leader_id = begin_flight(flight_key, request_id, context)
+    if leader_id is not None:
+        attach_to_leader(context, leader_id)
+        raise JobHandedOff(f"Request {request_id} waits for identical request {leader_id}")
+
+    try:
+        run_video_request(context, deadline, flight_key)
+    finally:
+        # Followers attached after the outcome was handled still need one
+        for follower in end_flight(flight_key, request_id):
+            release_follower(follower)
+
+
+def run_video_request(context, deadline, flight_key):
+    """
+    Generate the video for a request that leads its flight, then complete,
+    fail or requeue it together with the identical requests attached to it.
+    """
+    request_id = context["request_id"]
+    context["started_at"] = time.perf_counter()
+    context["deadline"] = deadline
+    register_request_deadline(request_id, deadline)
+    try:
+        job = get_pipeline().submit(context, timeout=deadline.remaining())
+
+        # Wake up periodically so that a cancellation by the watchdog is noticed
+        while not job.wait(min(1.0, deadline.remaining())):
+            if deadline.expired():
+                break
+    except queue.Full:
+        job = None
+    finally:
+        unregister_request_deadline(request_id)
+
+    if job is None or not job.done.is_set():
+        # A stage still working on the job sees the cancelled deadline and drops it
+        deadline.cancel(f"exceeded the {settings.REQUEST_DEADLINE_SECONDS:.0f}s deadline")
+        logger.error(f"Video request {request_id} stopped: {deadline.reason}")
+        fail_video_request(context, DeadlineExceeded(f"Request {deadline.reason}"))
+        for follower in end_flight(flight_key, request_id):
+            release_follower(follower)
+    elif isinstance(job.error, QuotaExhaustedError):
+        requeue_video_request(context, job.error)
+        for follower in end_flight(flight_key, request_id):
+            release_follower(follower, job.error.retry_after)
+        raise job.error
+    elif job.error is not None:
+        logger.error(f"Error processing video request {request_id} in stage '{job.failed_stage}': {str(job.error)}")
+        fail_video_request(context, job.error)
+        for follower in end_flight(flight_key, request_id):
+            release_follower(follower)
+    else:
+        video_id = finish_video_request(context)
+        finish_followers(context, video_id, end_flight(flight_key, request_id))
+
+
+def start_video_request(request_id, message_type):
+    """
+    Mark a request as processing and notify the user.
+
+    Returns:
+        The pipeline context for the request, or None if it could not be started
+    """
     # Get the session inside this task
     from app import app
     with app.app_context():
         db_session = get_db()
+        request = None
+        user = None
 
         try:
             # Get the request
             request = db_session.query(VideoRequest).filter(VideoRequest.id == request_id).first()
             if not request:
                 logger.error(f"Request {request_id} not found")
-                return
+                return None
 
             logger.info(f"Starting processing for request {request_id}")
             # Update request status
@@ -151,10 +253,6 @@ def process_video_request(request_id, message_type="whatsapp"):
             db_session.commit()
             db_session.flush()
 
-            # Check for timeout
-            if (datetime.utcnow() - start_time).total_seconds() > MAX_PROCESSING_TIME:
-                raise TimeoutError("Video generation process timed out")
-
             # Send progress update
             user = db_session.query(User).filter(User.id == request.user_id).first()
             if user:
@@ -164,60 +262,16 @@ def process_video_request(request_id, message_type="whatsapp"):
                     message_type
                 )
 
-            try:
-                # Generate educational content using Gemini API
-                logger.info(f"Generating content for request {request_id}")
-                content = generate_educational_content(
-                    subject=request.subject,
-                    topic=request.topic,
-                    level=request.level,
-                    query=request.query
-                )
-
-                # Generate speech using text-to-speech
-                logger.info(f"Generating speech for request {request_id}")
-                audio_file_path = generate_speech(content["script"])
-
-                # Generate video using text-to-video APIs
-                logger.info(f"Generating video for request {request_id}")
-                video_file_path = generate_video(content, request.subject, audio_file_path)
-
-                # Upload to Firebase
-                firebase_path = f"videos/{request_id}/{datetime.now().strftime('%Y%m%d%H%M%S')}.mp4"
-                upload_file_to_firebase(video_file_path, firebase_path)
-                firebase_url = get_firebase_url(firebase_path)
-
-                # Create video record
-                video = Video(
-                    request_id=request.id,
-                    title=content["title"],
-                    description=content["description"],
-                    firebase_url=firebase_url
-                )
-                db_session.add(video)
-
-                # Update request status
-                request.status = "completed"
-                request.completed_at = datetime.utcnow()
-                db_session.commit()
-
-                # Send notification
-                send_message(
-                    user.phone_number,
-                    f"Your video about '{request.topic}' is ready! Watch it here: {firebase_url}",
-                    message_type
-                )
-            except Exception as e:
-                logger.error(f"Error processing video request {request_id}: {str(e)}", exc_info=True)
-                request.status = "failed"
-                db_session.commit()
-
-                # Send failure notification
-                send_message(
-                    user.phone_number,
-                    f"We encountered an issue while generating your video about '{request.topic}'. Please try again.",
-                    message_type
-                )
+            return {
+                "request_id": request.id,
+                "message_type": message_type,
+                "subject": request.subject,
+                "topic": request.topic,
+                "level": request.level,
+                "query": request.query,
+                "generation_mode": (request.request_metadata or {}).get("generation_mode"),
+                "phone_number": user.phone_number if user else None
+            }
         except Exception as e:
             logger.error(f"Error processing video request {request_id}: {str(e)}", exc_info=True)
             if request:
@@ -230,6 +284,357 @@ def process_video_request(request_id, message_type="whatsapp"):
                     f"We encountered an issue while generating your video. Please try again.",
                     message_type
                 )
+            return None
+
+
+_prefetch_executor = None
+_prefetch_executor_lock = threading.Lock()
+
+
+def prefetch(func, *args):
+    """
+    Start func(*args) on the prefetch pool, carrying over the current request's
+    deadline and timings.
+    """
+    global _prefetch_executor
+    with _prefetch_executor_lock:
+        if _prefetch_executor is None:
+            _prefetch_executor = ThreadPoolExecutor(
+                max_workers=settings.STREAM_PREFETCH_WORKERS,
+                thread_name_prefix="prefetch"
+            )
+    return _prefetch_executor.submit(contextvars.copy_context().run, func, *args)
+
+
+def prefetched_result(future):
+    """
+    Wait for a prefetched result, or return None if the prefetch failed.
+    """
+    try:
+        return future.result()
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.warning(f"Prefetch failed, redoing the work: {str(e)}")
+        return None
+
+
+def content_stage(context):
+    # Generate educational content using Gemini API. The script and scenes are
+    # streamed, so speech and scene rendering start before the content is done.
+    logger.info(f"Generating content for request {context['request_id']}")
+    if settings.CONTENT_CACHE_ENABLED:
+        cache_key, cached_content = lookup_cached_content(
+            context["subject"], context["topic"], context["level"], context["query"]
+        )
+        if cached_content is not None:
+            context["content"] = cached_content
+            # Popular requests are rendered ahead of time by warm_catalog.py
+            firebase_url = get_cached_video(cache_key)
+            if firebase_url:
+                logger.info(f"Serving request {context['request_id']} with a pre-rendered video")
+                context["firebase_url"] = firebase_url
+                context["prerendered"] = True
+            return
+
+    prefetched_scenes = context.setdefault("prefetched_scenes", {})
+
+    def on_script(script):
+        context["prefetched_speech"] = (script, prefetch(generate_speech, script))
+
+    def on_scene(index, scene):
+        # Scenes are only worth rendering early when they go to RunwayML
+        if RUNWAY_ML_API_KEY:
+            prefetched_scenes[index] = (scene, submit_scene(scene, context["subject"]))
+
+    context["content"] = generate_educational_content(
+        subject=context["subject"],
+        topic=context["topic"],
+        level=context["level"],
+        query=context["query"],
+        # Already looked up above; a second lookup would only count the miss twice
+        cache_checked=settings.CONTENT_CACHE_ENABLED,
+        generation_mode=context.get("generation_mode"),
+        on_script=on_script,
+        on_scene=on_scene
+    )
+
+
+def speech_stage(context):
+    # Generate speech using text-to-speech, unless it was already started for
+    # the same script while the content was streaming
+    if context.get("prerendered"):
+        return
+    logger.info(f"Generating speech for request {context['request_id']}")
+    script = context["content"]["script"]
+    audio_file_path = None
+    prefetched = context.pop("prefetched_speech", None)
+    if prefetched is not None and prefetched[0] == script:
+        audio_file_path = prefetched_result(prefetched[1])
+    elif prefetched is not None:
+        # The final script differs from the streamed one
+        discard_prefetched({"prefetched_speech": prefetched})
+    context["audio_file_path"] = audio_file_path or generate_speech(script)
+
+
+def video_stage(context):
+    # Generate video using text-to-video APIs
+    if context.get("prerendered"):
+        return
+    logger.info(f"Generating video for request {context['request_id']}")
+    scene_clips = {}
+    for index, (scene, future) in context.pop("prefetched_scenes", {}).items():
+        clip = prefetched_result(future)
+        if clip is not None:
+            scene_clips[index] = clip
+    context["video_file_path"] = generate_video(
+        context["content"], context["subject"], context["audio_file_path"], scene_clips=scene_clips
+    )
+
+
+def discard_prefetched(context):
+    """
+    Cancel the speech and scene prefetches a request no longer needs, and
+    remove their outputs once those that already started have finished.
+    """
+    prefetched = context.pop("prefetched_speech", None)
+    if prefetched is not None:
+        prefetched[1].cancel()
+        prefetched[1].add_done_callback(discard_speech)
+    for _, future in context.pop("prefetched_scenes", {}).values():
+        future.cancel()
+        future.add_done_callback(discard_clip)
+
+
+def upload_stage(context):
+    # Upload to Firebase
+    if context.get("prerendered"):
+        return
+    firebase_path = f"videos/{context['request_id']}/{datetime.now().strftime('%Y%m%d%H%M%S')}.mp4"
+    upload_file_to_firebase(context["video_file_path"], firebase_path)
+    context["firebase_url"] = get_firebase_url(firebase_path)
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    """
+    Return the process-wide video generation pipeline, starting it on first use.
+    """
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = build_pipeline({
+                "content": content_stage,
+                "speech": speech_stage,
+                "video": video_stage,
+                "upload": upload_stage
+            }, on_failure=discard_prefetched)
+            register_collector(_pipeline.render_metrics)
+        return _pipeline
+
+
+def attach_to_leader(context, leader_id):
+    """
+    Record that a request will share the video of an identical request that
+    is already being generated.
+    """
+    from app import app
+    with app.app_context():
+        db_session = get_db()
+        try:
+            if db_session.get(CoalescedRequest, context["request_id"]) is None:
+                db_session.add(CoalescedRequest(request_id=context["request_id"], leader_request_id=leader_id))
+            request = db_session.query(VideoRequest).filter(VideoRequest.id == context["request_id"]).first()
+            if request:
+                metadata = dict(request.request_metadata or {})
+                metadata["coalesced_with"] = leader_id
+                request.request_metadata = metadata
+            db_session.commit()
+        except IntegrityError:
+            # The leader finished and linked this request in the meantime
+            db_session.rollback()
+    logger.info(f"Request {context['request_id']} attached to identical in-flight request {leader_id}")
+
+
+def finish_followers(context, video_id, followers):
+    """
+    Complete the requests attached to a finished request with its video, and
+    notify their users. Includes attached requests recorded in the database
+    that this process no longer knows about, e.g. after a restart.
+    """
+    from app import app
+    with app.app_context():
+        db_session = get_db()
+        known = {follower["request_id"] for follower in followers}
+        pending = db_session.query(CoalescedRequest).filter(
+            CoalescedRequest.leader_request_id == context["request_id"],
+            CoalescedRequest.video_id.is_(None)
+        ).all()
+        for row in pending:
+            if row.request_id not in known:
+                request = db_session.query(VideoRequest).filter(VideoRequest.id == row.request_id).first()
+                if request and request.status == "processing":
+                    # The job records the channel the request came in on
+                    job = db_session.query(VideoJob).filter(VideoJob.request_id == request.id).first()
+                    followers.append({
+                        "request_id": request.id,
+                        "topic": request.topic,
+                        "message_type": job.message_type if job else request.get_message_type(),
+                        "phone_number": request.user.phone_number if request.user else None
+                    })
+
+        for follower in followers:
+            db_session.merge(CoalescedRequest(
+                request_id=follower["request_id"],
+                leader_request_id=context["request_id"],
+                video_id=video_id
+            ))
+            request = db_session.query(VideoRequest).filter(VideoRequest.id == follower["request_id"]).first()
+            if request:
+                request.status = "completed"
+                request.completed_at = datetime.utcnow()
+        db_session.commit()
+        complete_request_jobs([follower["request_id"] for follower in followers])
+
+    if followers:
+        logger.info(f"Completed {len(followers)} requests identical to request {context['request_id']}")
+    for follower in followers:
+        if follower["phone_number"]:
+            send_message(
+                follower["phone_number"],
+                f"Your video about '{follower['topic']}' is ready! Watch it here: {context['firebase_url']}",
+                follower["message_type"]
+            )
+
+
+def release_follower(follower, delay=0.0):
+    """
+    Give a request back its own place in the queue after the identical
+    request it was attached to did not produce a video.
+    """
+    from app import app
+    with app.app_context():
+        db_session = get_db()
+        db_session.query(CoalescedRequest).filter(
+            CoalescedRequest.request_id == follower["request_id"],
+            CoalescedRequest.video_id.is_(None)
+        ).delete(synchronize_session=False)
+        request = db_session.query(VideoRequest).filter(VideoRequest.id == follower["request_id"]).first()
+        if request:
+            request.status = "pending"
+        db_session.commit()
+        requeue_request(follower["request_id"], delay)
+    logger.info(f"Request {follower['request_id']} queued again after its identical request did not complete")
+
+
+def finish_video_request(context):
+    """
+    Store the generated video and notify the user that it is ready.
+
+    Returns:
+        The ID of the new Video
+    """
+    from app import app
+    with app.app_context():
+        db_session = get_db()
+        request = db_session.query(VideoRequest).filter(VideoRequest.id == context["request_id"]).first()
+        content = context["content"]
+
+        # Create video record
+        video = Video(
+            request_id=request.id,
+            title=content["title"],
+            description=content["description"],
+            firebase_url=context["firebase_url"]
+        )
+        db_session.add(video)
+
+        # Update request status
+        request.status = "completed"
+        request.completed_at = datetime.utcnow()
+        save_request_timings(request, context)
+        db_session.commit()
+
+        # Send notification
+        if context["phone_number"]:
+            send_message(
+                context["phone_number"],
+                f"Your video about '{request.topic}' is ready! Watch it here: {context['firebase_url']}",
+                context["message_type"]
+            )
+        return video.id
+
+
+def fail_video_request(context, error):
+    """
+    Mark a request as failed and notify the user.
+    """
+    from app import app
+    with app.app_context():
+        db_session = get_db()
+        request = db_session.query(VideoRequest).filter(VideoRequest.id == context["request_id"]).first()
+        if request:
+            request.status = "failed"
+            save_request_timings(request, context)
+            metadata = dict(request.request_metadata or {})
+            metadata["error"] = str(error)
+            request.request_metadata = metadata
+            db_session.commit()
+
+        # Send failure notification
+        if context["phone_number"]:
+            send_message(
+                context["phone_number"],
+                f"We encountered an issue while generating your video about '{context['topic']}'. Please try again.",
+                context["message_type"]
+            )
+
+
+def requeue_video_request(context, error):
+    """
+    Put a request that ran out of upstream quota back to pending, so it is
+    picked up again instead of being completed with default content.
+    """
+    from app import app
+    with app.app_context():
+        db_session = get_db()
+        request = db_session.query(VideoRequest).filter(VideoRequest.id == context["request_id"]).first()
+        if request:
+            logger.warning(f"Request {request.id} ran out of Gemini quota, it will be retried: {str(error)}")
+            request.status = "pending"
+            metadata = dict(request.request_metadata or {})
+            metadata["quota_requeues"] = metadata.get("quota_requeues", 0) + 1
+            request.request_metadata = metadata
+            db_session.commit()
+
+
+def save_request_timings(request, context):
+    """
+    Store where the time went for this request in its metadata, so the
+    dashboard can show a per-stage breakdown.
+    """
+    if "timings" not in context:
+        return
+    metadata = dict(request.request_metadata or {})
+    metadata["timings"] = context["timings"]
+    if "started_at" in context:
+        metadata["total_seconds"] = round(time.perf_counter() - context["started_at"], 3)
+    request.request_metadata = metadata
+
+
+@bp.route("/pipeline_stats")
+def get_pipeline_stats():
+    """
+    Get per-stage queue depth and throughput of the video generation pipeline
+    together with the job queue counts
+    """
+    return jsonify({
+        "stages": get_pipeline().get_metrics(),
+        "jobs": get_queue_stats()
+    })
 
 def parse_message(message: str):
     """
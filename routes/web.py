@@ -4,6 +4,8 @@ from models import get_db, VideoRequest, User
 from typing import Optional, Dict, Any
 import logging
 from services.messaging_service import validate_phone_number
+from services.dispatcher import dispatch_request
+from services.content_generator import GENERATION_MODES
 
 logger = logging.getLogger(__name__)
 bp = Blueprint('web', __name__)
@@ -94,6 +96,7 @@ def submit_request():
         level = request.form.get("level")
         query = request.form.get("query")
         message_type = request.form.get("message_type", "whatsapp")  # Default to WhatsApp if not specified
+        generation_mode = request.form.get("generation_mode")  # Optional override of CONTENT_GENERATION_MODE
         
         # Validate phone number
         is_valid, formatted_number = validate_phone_number(phone_number)
@@ -111,6 +114,14 @@ def submit_request():
             db.commit()
             db.refresh(user)
         
+        request_metadata = {
+            "message_type": message_type,
+            "source": "web_interface",
+            "enhanced_features": True
+        }
+        if generation_mode in GENERATION_MODES:
+            request_metadata["generation_mode"] = generation_mode
+        
         # Create a new video request with enhanced data
         video_request = VideoRequest(
             user_id=user.id,
@@ -120,14 +131,21 @@ def submit_request():
             query=query,
             status="pending",
             # Store the preferred message delivery type
-            request_metadata={
-                "message_type": message_type,
-                "source": "web_interface",
-                "enhanced_features": True
-            }
+            request_metadata=request_metadata
         )
         db.add(video_request)
         db.commit()
+        db.refresh(video_request)
+        
+        # Send the request into the generation pipeline
+        accepted, position = dispatch_request(video_request, message_type, source="web_interface")
+        if not accepted:
+            flash(
+                "We're receiving too many requests right now, so your video couldn't be queued. "
+                "Please try again in a few minutes.",
+                "error"
+            )
+            return redirect(url_for("web.dashboard", phone=formatted_number))
         
         # Build a more informative success message
         message_type_name = "SMS" if message_type == "sms" else "WhatsApp"
@@ -135,6 +153,8 @@ def submit_request():
             f"Your {subject} video request about '{topic}' has been submitted successfully! "
             f"You will receive a notification via {message_type_name} when your video is ready."
         )
+        if position:
+            flash_message += f" Your request is queued at position {position}."
         
         # Redirect to the dashboard with a success message
         flash(flash_message, "success")
@@ -0,0 +1,199 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+import unicodedata
+from typing import Any, Dict
+
+from config import settings
+from services.metrics import register, Counter, Gauge
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+LOOKUPS = register(Counter(
+    "tapbuddy_tts_cache_lookups_total",
+    "Synthesized audio cache lookups, by result",
+    ("result",)
+))
+CHARACTERS = register(Counter(
+    "tapbuddy_tts_cache_characters_total",
+    "Characters of narration looked up in the audio cache, by result; hits are characters not sent to the TTS API",
+    ("result",)
+))
+EVICTIONS = register(Counter(
+    "tapbuddy_tts_cache_evictions_total",
+    "Audio files removed to keep the cache under TTS_CACHE_MAX_BYTES"
+))
+CACHE_BYTES = register(Gauge(
+    "tapbuddy_tts_cache_bytes",
+    "Size of the audio cache at the last eviction scan"
+))
+
+# Stores between full scans of the cache directory, while it is below its limit
+SCAN_INTERVAL = 50
+
+_evict_lock = threading.Lock()
+# Size of the cache as of the last scan plus what this process stored since
+_estimated_bytes = None
+_stores_since_scan = 0
+
+
+def normalize_text(text: str) -> str:
+    """
+    Text as it is keyed in the cache: Unicode NFC with runs of whitespace
+    collapsed, so that the same narration reformatted still hits.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def audio_key(text: str, voice: Dict[str, Any]) -> str:
+    """
+    Content hash identifying synthesized audio.
+
+    Args:
+        text: The spoken text
+        voice: Everything else that changes the audio: provider, voice id,
+            model id, voice settings and output format
+
+    Returns:
+        Hex digest naming the audio file
+    """
+    canonical = json.dumps([normalize_text(text), voice], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _audio_path(key: str) -> str:
+    # Two-level fan-out keeps directories small with many short clips
+    return os.path.join(settings.TTS_CACHE_DIR, key[:2], f"{key}.mp3")
+
+
+def fetch_audio(key: str, destination: str, characters: int = 0) -> bool:
+    """
+    Place the cached audio for key at destination. The destination is
+    replaced by a hard link to the cached file where possible, so callers
+    must write new audio to a fresh path rather than into destination.
+
+    Args:
+        key: The audio key
+        destination: Where the audio is needed
+        characters: Length of the text, for the characters counter
+
+    Returns:
+        True on a hit, False if the text has to be synthesized
+    """
+    if not settings.TTS_CACHE_ENABLED:
+        return False
+    path = _audio_path(key)
+    try:
+        if os.path.exists(destination):
+            os.remove(destination)
+        try:
+            os.link(path, destination)
+        except OSError:
+            shutil.copyfile(path, destination)
+        # The modification time orders eviction, least recently used first
+        os.utime(path)
+    except OSError:
+        LOOKUPS.inc("miss")
+        CHARACTERS.inc("miss", amount=characters)
+        return False
+    LOOKUPS.inc("hit")
+    CHARACTERS.inc("hit", amount=characters)
+    return True
+
+
+def store_audio(key: str, source: str) -> None:
+    """
+    Copy freshly synthesized audio into the cache. The copy is renamed into
+    place, so workers in other processes either find the complete file or
+    none at all.
+    """
+    global _estimated_bytes, _stores_since_scan
+    if not settings.TTS_CACHE_ENABLED:
+        return
+    path = _audio_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = os.path.join(os.path.dirname(path), f".{key}.{uuid.uuid4().hex}.tmp")
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+    except OSError as e:
+        logger.warning(f"Could not cache audio {key[:12]}: {str(e)}")
+        return
+
+    with _evict_lock:
+        _stores_since_scan += 1
+        if _estimated_bytes is not None:
+            _estimated_bytes += size
+        scan = (
+            _estimated_bytes is None
+            or _estimated_bytes > settings.TTS_CACHE_MAX_BYTES
+            or _stores_since_scan >= SCAN_INTERVAL
+        )
+    if scan:
+        evict_audio()
+
+
+def evict_audio() -> int:
+    """
+    Remove the least recently used audio until the cache fits in
+    TTS_CACHE_MAX_BYTES. Other processes may evict at the same time; files
+    that are already gone are skipped.
+
+    Returns:
+        Number of files removed
+    """
+    global _estimated_bytes, _stores_since_scan
+    with _evict_lock:
+        entries = []
+        for directory in os.scandir(settings.TTS_CACHE_DIR):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if entry.name.endswith(".mp3"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= settings.TTS_CACHE_MAX_BYTES:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        _estimated_bytes = total
+        _stores_since_scan = 0
+
+    CACHE_BYTES.set(value=total)
+    if removed:
+        EVICTIONS.inc(amount=removed)
+        logger.info(f"Evicted {removed} cached audio files, cache now {total / 1e6:.0f} MB")
+    return removed
+
+
+def get_audio_cache_stats() -> Dict[str, float]:
+    """
+    Lookup counters of this process along with the hit rate.
+    """
+    hits = LOOKUPS.values.get(("hit",), 0.0)
+    misses = LOOKUPS.values.get(("miss",), 0.0)
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "characters_saved": CHARACTERS.values.get(("hit",), 0.0),
+    }
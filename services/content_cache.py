@@ -0,0 +1,322 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional, Iterator, Tuple
+
+from config import settings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Hit/miss counters for this process
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+# Tracks which cache files already have their schema created
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS content_cache (
+    cache_key TEXT PRIMARY KEY,
+    subject TEXT,
+    topic TEXT,
+    level TEXT,
+    query TEXT,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_accessed REAL NOT NULL,
+    hit_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_content_cache_last_accessed ON content_cache (last_accessed);
+CREATE TABLE IF NOT EXISTS rendered_videos (
+    cache_key TEXT PRIMARY KEY,
+    firebase_url TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """
+    Normalize a free-text value so that differences in case and whitespace
+    map to the same cache key.
+    """
+    if not value:
+        return ""
+    return _WHITESPACE_RE.sub(" ", value).strip().casefold()
+
+
+def make_cache_key(subject: str, topic: str, level: str, query: str) -> str:
+    """
+    Build the canonical cache key for a request from the values returned by
+    parse_message (subject, topic, level, query).
+
+    Args:
+        subject: The subject area
+        topic: The specific topic within the subject
+        level: The difficulty level
+        query: The student's question
+
+    Returns:
+        Hex digest identifying the normalized request
+    """
+    # Trailing punctuation rarely changes the meaning of a question
+    normalized_query = normalize_text(query).rstrip("?!. ")
+    canonical = json.dumps(
+        [normalize_text(subject), normalize_text(topic), normalize_text(level), normalized_query],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _connect() -> sqlite3.Connection:
+    """
+    Open a connection to the cache database, creating the schema on first use.
+    """
+    path = settings.CONTENT_CACHE_PATH
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    connection = sqlite3.connect(path, timeout=30)
+    with _init_lock:
+        if path not in _initialized_paths:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            _initialized_paths.add(path)
+    return connection
+
+
+def _record(stat: str, count: int = 1) -> None:
+    with _stats_lock:
+        _stats[stat] += count
+
+
+def get_cached_content(cache_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up generated content by cache key.
+
+    Args:
+        cache_key: Key returned by make_cache_key
+
+    Returns:
+        The cached content dictionary, or None on a miss or expired entry
+    """
+    now = time.time()
+    try:
+        connection = _connect()
+        try:
+            row = connection.execute(
+                "SELECT content, created_at FROM content_cache WHERE cache_key = ?",
+                (cache_key,)
+            ).fetchone()
+
+            if row is None:
+                _record("misses")
+                return None
+
+            content, created_at = row
+            if now - created_at > settings.CONTENT_CACHE_TTL_SECONDS:
+                # Expired entries are removed on read
+                connection.execute("DELETE FROM content_cache WHERE cache_key = ?", (cache_key,))
+                connection.commit()
+                _record("misses")
+                _record("evictions")
+                return None
+
+            connection.execute(
+                "UPDATE content_cache SET last_accessed = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                (now, cache_key)
+            )
+            connection.commit()
+        finally:
+            connection.close()
+
+        _record("hits")
+        return json.loads(content)
+
+    except Exception as e:
+        logger.warning(f"Content cache lookup failed: {str(e)}")
+        _record("errors")
+        return None
+
+
+def has_cached_content(cache_key: str) -> bool:
+    """
+    Whether unexpired content is cached under the key. Unlike
+    get_cached_content this does not count as a hit or touch the entry.
+    """
+    try:
+        connection = _connect()
+        try:
+            row = connection.execute(
+                "SELECT 1 FROM content_cache WHERE cache_key = ? AND created_at >= ?",
+                (cache_key, time.time() - settings.CONTENT_CACHE_TTL_SECONDS)
+            ).fetchone()
+        finally:
+            connection.close()
+    except Exception as e:
+        logger.warning(f"Content cache lookup failed: {str(e)}")
+        _record("errors")
+        return False
+    return row is not None
+
+
+def store_content(cache_key: str, content: Dict[str, Any], subject: str = "", topic: str = "", level: str = "", query: str = "") -> bool:
+    """
+    Store generated content in the cache and evict the least recently used
+    entries once the cache grows past CONTENT_CACHE_MAX_ENTRIES.
+
+    Args:
+        cache_key: Key returned by make_cache_key
+        content: The generated content dictionary
+        subject, topic, level, query: Original request values, kept for inspection
+
+    Returns:
+        Boolean indicating whether the content was stored
+    """
+    now = time.time()
+    try:
+        connection = _connect()
+        try:
+            connection.execute(
+                """
+                INSERT OR REPLACE INTO content_cache
+                    (cache_key, subject, topic, level, query, content, created_at, last_accessed, hit_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
+                """,
+                (cache_key, subject, topic, level, query, json.dumps(content), now, now)
+            )
+
+            # Drop expired entries, then the least recently used ones above the size limit
+            expired = connection.execute(
+                "DELETE FROM content_cache WHERE created_at < ?",
+                (now - settings.CONTENT_CACHE_TTL_SECONDS,)
+            ).rowcount
+            evicted = connection.execute(
+                """
+                DELETE FROM content_cache WHERE cache_key IN (
+                    SELECT cache_key FROM content_cache
+                    ORDER BY last_accessed DESC
+                    LIMIT -1 OFFSET ?
+                )
+                """,
+                (settings.CONTENT_CACHE_MAX_ENTRIES,)
+            ).rowcount
+            connection.commit()
+        finally:
+            connection.close()
+
+        _record("stores")
+        if expired + evicted:
+            _record("evictions", expired + evicted)
+        return True
+
+    except Exception as e:
+        logger.warning(f"Content cache store failed: {str(e)}")
+        _record("errors")
+        return False
+
+
+def get_cached_video(cache_key: str) -> Optional[str]:
+    """
+    Look up a video rendered ahead of time for cached content.
+
+    Args:
+        cache_key: Key the content is cached under
+
+    Returns:
+        The video's public URL, or None if there is no unexpired video
+    """
+    try:
+        connection = _connect()
+        try:
+            row = connection.execute(
+                "SELECT firebase_url, created_at FROM rendered_videos WHERE cache_key = ?",
+                (cache_key,)
+            ).fetchone()
+        finally:
+            connection.close()
+    except Exception as e:
+        logger.warning(f"Rendered video lookup failed: {str(e)}")
+        _record("errors")
+        return None
+
+    if row is None or time.time() - row[1] > settings.CONTENT_CACHE_TTL_SECONDS:
+        return None
+    return row[0]
+
+
+def store_video(cache_key: str, firebase_url: str) -> bool:
+    """
+    Remember the video rendered for cached content, and forget videos whose
+    content has been evicted.
+
+    Returns:
+        Boolean indicating whether the video was stored
+    """
+    try:
+        connection = _connect()
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO rendered_videos (cache_key, firebase_url, created_at) VALUES (?, ?, ?)",
+                (cache_key, firebase_url, time.time())
+            )
+            connection.execute(
+                "DELETE FROM rendered_videos WHERE cache_key NOT IN (SELECT cache_key FROM content_cache)"
+            )
+            connection.commit()
+        finally:
+            connection.close()
+        return True
+    except Exception as e:
+        logger.warning(f"Rendered video store failed: {str(e)}")
+        _record("errors")
+        return False
+
+
+def iter_cached_requests(limit: Optional[int] = None) -> Iterator[Tuple[str, str, str, str, str]]:
+    """
+    Iterate over the unexpired cached requests, most recently used first.
+
+    Args:
+        limit: Maximum number of entries to return (defaults to CONTENT_CACHE_MAX_ENTRIES)
+
+    Yields:
+        Tuples of (cache_key, subject, topic, level, query)
+    """
+    connection = _connect()
+    try:
+        rows = connection.execute(
+            """
+            SELECT cache_key, subject, topic, level, query FROM content_cache
+            WHERE created_at >= ?
+            ORDER BY last_accessed DESC
+            LIMIT ?
+            """,
+            (time.time() - settings.CONTENT_CACHE_TTL_SECONDS, limit or settings.CONTENT_CACHE_MAX_ENTRIES)
+        ).fetchall()
+    finally:
+        connection.close()
+
+    for row in rows:
+        yield row
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """
+    Return hit/miss counters for this process along with the hit rate.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
@@ -1,27 +1,273 @@
-import os
-import json
 import logging
 import re
+import queue
+import threading
+import contextvars
 import google.generativeai as genai
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple
 
 # Get Gemini API key from environment variables
 from config import settings
+from services.stage_scheduler import run_stages
+from services.content_cache import make_cache_key, get_cached_content, store_content
+from services import semantic_cache
+from services.metrics import track, register, Counter
+from services.deadline import DeadlineExceeded, call_timeout
+from services.json_extract import extract_json, extract_objects, StreamingJSONParser
+from services.llm_client import get_model
+from services.rate_limiter import get_gemini_limiter, QuotaExhaustedError
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Get Gemini API key from environment variables
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+# Stages of generate_educational_content and the stages each one waits on.
+# None of the current prompts consume the output of another stage, so all
+# of them can be sent to Gemini at the same time.
+CONTENT_STAGE_DEPENDENCIES = {
+    "title": [],
+    "key_points": [],
+    "interactive": [],
+    "resources": [],
+    "script": [],
+}
+
+# Content generation modes: five prompts run concurrently, or one structured call
+GENERATION_MODES = ["staged", "single_shot"]
+
+# Response schema for single-shot mode, covering every field of the content dict
+CONTENT_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "description": {"type": "string"},
+        "learning_objectives": {"type": "array", "items": {"type": "string"}},
+        "key_points": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "point": {"type": "string"},
+                    "explanation": {"type": "string"}
+                },
+                "required": ["point", "explanation"]
+            }
+        },
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "answer": {"type": "string"}
+                },
+                "required": ["question", "answer"]
+            }
+        },
+        "activities": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "description": {"type": "string"},
+                    "materials_needed": {"type": "string"}
+                },
+                "required": ["title", "description"]
+            }
+        },
+        "additional_resources": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": {"type": "string"},
+                    "title": {"type": "string"},
+                    "description": {"type": "string"}
+                },
+                "required": ["type", "title", "description"]
+            }
+        },
+        "script": {"type": "string"},
+        "scenes": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "description": {"type": "string"},
+                    "narration": {"type": "string"},
+                    "visual_elements": {"type": "string"},
+                    "duration_seconds": {"type": "integer"}
+                },
+                "required": ["description", "narration", "visual_elements", "duration_seconds"]
+            }
+        }
+    },
+    "required": [
+        "title", "description", "learning_objectives", "key_points", "questions",
+        "activities", "additional_resources", "script", "scenes"
+    ]
+}
+
+GEMINI_TOKENS = register(Counter(
+    "tapbuddy_gemini_tokens_total",
+    "Gemini tokens used, by content stage and kind (prompt or response)",
+    ("stage", "kind")
+))
+PARSE_FAILURES = register(Counter(
+    "tapbuddy_content_parse_failures_total",
+    "Gemini responses that could not be parsed as the requested JSON",
+    ("stage",)
+))
+
+def record_parse_failure(prompt_context: Dict[str, Any], stage: str) -> None:
+    """
+    Count a response that could not be parsed as requested. The stage is
+    remembered in the prompt context, because content built from text
+    extraction or defaults is not cached. Each stage is counted once per
+    request, however many fallbacks it goes through.
+    """
+    failures = prompt_context.setdefault("parse_failures", set())
+    if stage not in failures:
+        failures.add(stage)
+        PARSE_FAILURES.inc(stage)
+
+
+def estimate_tokens(prompt: str) -> int:
+    """
+    Tokens to reserve with the rate limiter before a call: roughly four
+    characters per prompt token plus the expected response.
+    """
+    return len(prompt) // 4 + settings.GEMINI_EXPECTED_RESPONSE_TOKENS
+
+def call_gemini(model: Any, prompt: str, stage: str, generation_config: Optional[Any] = None) -> Any:
+    """
+    Send one prompt to Gemini, recording its latency under gemini_<stage>
+    and its token usage. The call is bounded by GEMINI_CALL_TIMEOUT and the
+    request's remaining time, and goes through the shared rate limiter.
+    
+    Raises:
+        QuotaExhaustedError: If there was no quota for the call in time
+    """
+    def send():
+        with track(f"gemini_{stage}"):
+            timeout = call_timeout(settings.GEMINI_CALL_TIMEOUT, f"gemini_{stage}")
+            kwargs = {"request_options": {"timeout": timeout}}
+            if generation_config is not None:
+                kwargs["generation_config"] = generation_config
+            return model.generate_content(prompt, **kwargs)
+    
+    response = get_gemini_limiter().call(send, estimate_tokens(prompt), f"gemini_{stage}", count_tokens=total_tokens)
+    record_token_usage(response, stage)
+    return response
+
+def total_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) if usage is not None else None
 
-# Configure the Gemini API if key is available
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+def record_token_usage(response: Any, stage: str) -> None:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        GEMINI_TOKENS.inc(stage, "prompt", amount=getattr(usage, "prompt_token_count", 0) or 0)
+        GEMINI_TOKENS.inc(stage, "response", amount=getattr(usage, "candidates_token_count", 0) or 0)
 
-def generate_educational_content(subject: str, topic: str, level: str, query: str, user_id: Optional[int] = None) -> Dict[str, Any]:
+def stream_gemini(
+    model: Any,
+    prompt: str,
+    stage: str,
+    generation_config: Optional[Any] = None,
+    on_script: Optional[Callable[[str], None]] = None,
+    on_scene: Optional[Callable[[int, Dict[str, Any]], None]] = None
+) -> str:
+    """
+    Stream a Gemini response, calling on_script as soon as the script field
+    is complete and on_scene for each scene object as soon as it closes.
+    
+    Returns:
+        The complete response text, to be parsed as usual
+    
+    Raises:
+        QuotaExhaustedError: If there was no quota for the call in time
+    """
+    def stream():
+        # Throttling is reported before the first chunk, so a retry starts from scratch
+        parser = StreamingJSONParser(strings=["script"], arrays=["scenes"])
+        scene_count = 0
+        
+        with track(f"gemini_{stage}"):
+            timeout = call_timeout(settings.GEMINI_CALL_TIMEOUT, f"gemini_{stage}")
+            kwargs = {"stream": True, "request_options": {"timeout": timeout}}
+            if generation_config is not None:
+                kwargs["generation_config"] = generation_config
+            response = model.generate_content(prompt, **kwargs)
+            
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text, e.g. the final one carrying the finish reason
+                    continue
+                
+                for field, value in parser.feed(text):
+                    try:
+                        if field == "script" and on_script is not None and isinstance(value, str):
+                            on_script(value)
+                        elif field == "scenes" and isinstance(value, dict):
+                            if on_scene is not None:
+                                on_scene(scene_count, value)
+                            scene_count += 1
+                    except Exception as e:
+                        logger.warning(f"Streaming callback for {field} failed: {str(e)}")
+        
+        logger.info(f"Streamed {stage} response with {scene_count} scenes")
+        return response, parser.text
+    
+    response, text = get_gemini_limiter().call(
+        stream, estimate_tokens(prompt), f"gemini_{stage}",
+        count_tokens=lambda result: total_tokens(result[0])
+    )
+    record_token_usage(response, stage)
+    return text
+
+def lookup_cached_content(subject: str, topic: str, level: str, query: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Find cached content for a request, either for exactly this request or
+    for a differently worded but similar question.
+    
+    Returns:
+        Tuple of (cache key the content is stored under, content), or (None, None) on a miss
+    """
+    cache_key = make_cache_key(subject, topic, level, query)
+    cached_content = get_cached_content(cache_key)
+    if cached_content is not None:
+        logger.info(f"Content cache hit for {subject} - {topic} ({level})")
+        return cache_key, cached_content
+    
+    # Fall back to content generated for a differently worded but similar question
+    if settings.SEMANTIC_CACHE_ENABLED:
+        similar_key = semantic_cache.find_similar(subject, topic, level, query)
+        if similar_key:
+            cached_content = get_cached_content(similar_key)
+            if cached_content is not None:
+                return similar_key, cached_content
+    
+    return None, None
+
+def generate_educational_content(
+    subject: str,
+    topic: str,
+    level: str,
+    query: str,
+    user_id: Optional[int] = None,
+    use_cache: bool = True,
+    cache_checked: bool = False,
+    generation_mode: Optional[str] = None,
+    on_script: Optional[Callable[[str], None]] = None,
+    on_scene: Optional[Callable[[int, Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
     """
     Generate educational content using Gemini API based on the student's query,
     subject, topic, and level. If user_id is provided, personalization is applied.
+    Non-personalized content is served from the content cache when available.
     
     Args:
         subject: The subject area (e.g., Visual Arts, Coding, Science)
@@ -29,15 +275,33 @@ def generate_educational_content(subject: str, topic: str, level: str, query: st
         level: The difficulty level (Beginner, Intermediate, Advanced)
         query: The student's actual question or request
         user_id: Optional user ID for personalization based on past requests
+        use_cache: Set to False to bypass the content cache for this request
+        cache_checked: Set to True if the caller already missed in lookup_cached_content;
+            the content is then generated and cached without looking it up again
+        generation_mode: "staged" or "single_shot"; defaults to CONTENT_GENERATION_MODE
+        on_script: Called with the narration script as soon as it has been generated,
+            before the rest of the content (only when streaming is enabled)
+        on_scene: Called with (index, scene) for each scene as soon as it has been
+            generated. The returned content is authoritative: streamed scenes can
+            differ from it if the full response had to be repaired or replaced.
     
     Returns:
         Dictionary containing the enhanced generated content
     """
     logger.info(f"Generating content for {subject} - {topic} ({level})")
     
+    # Personalized content depends on the user's history, so it is never cached
+    cache_key = None
+    if use_cache and settings.CONTENT_CACHE_ENABLED and not user_id:
+        cache_key = make_cache_key(subject, topic, level, query)
+        if not cache_checked:
+            _, cached_content = lookup_cached_content(subject, topic, level, query)
+            if cached_content is not None:
+                return cached_content
+    
     try:
-        # Create a model instance with faster version
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        # Shared model instance, reused across requests and threads
+        model = get_model()
         
         # Get user's past learning history for personalization if user_id is provided
         personalization_context = ""
@@ -64,8 +328,318 @@ def generate_educational_content(subject: str, topic: str, level: str, query: st
         # Determine if this is a specialized subject that needs additional handling
         subject_specific_instructions = get_subject_specific_instructions(subject)
         
-        # First, generate a title and description with learning objectives
-        title_prompt = f"""
+        prompt_context = {
+            "subject": subject,
+            "topic": topic,
+            "level": level,
+            "query": query,
+            "personalization_context": personalization_context,
+            "subject_specific_instructions": subject_specific_instructions,
+            # Stages whose response had to be salvaged; filled in by record_parse_failure
+            "parse_failures": set()
+        }
+        
+        generation_mode = generation_mode or settings.CONTENT_GENERATION_MODE
+        if generation_mode not in GENERATION_MODES:
+            logger.warning(f"Unknown content generation mode '{generation_mode}', using staged")
+            generation_mode = "staged"
+        
+        results = None
+        # Only stream when someone is listening for partial results
+        stream_callbacks = {}
+        if settings.CONTENT_STREAMING_ENABLED and (on_script or on_scene):
+            stream_callbacks = {"on_script": on_script, "on_scene": on_scene}
+        
+        if generation_mode == "single_shot":
+            results = generate_single_shot_content(model, prompt_context, **stream_callbacks)
+        
+        if results is None:
+            # Run the prompt stages, sending independent ones to Gemini concurrently
+            stages = {
+                "title": lambda deps: generate_title_section(model, prompt_context),
+                "key_points": lambda deps: generate_key_points_section(model, prompt_context),
+                "interactive": lambda deps: generate_interactive_section(model, prompt_context),
+                "resources": lambda deps: generate_resources_section(model, prompt_context),
+                "script": lambda deps: generate_script_section(model, prompt_context, **stream_callbacks),
+            }
+            results = run_stages(
+                stages,
+                CONTENT_STAGE_DEPENDENCIES,
+                max_workers=settings.CONTENT_STAGE_WORKERS
+            )
+        
+        title_section = results["title"]
+        key_points_section = results["key_points"]
+        interactive_section = results["interactive"]
+        
+        learning_objectives = title_section["learning_objectives"]
+        key_points = key_points_section["key_points"]
+        key_points_with_explanations = key_points_section["key_points_detailed"]
+        questions = interactive_section["questions"]
+        activities = interactive_section["activities"]
+        additional_resources = results["resources"]
+        script = results["script"]["script"]
+        scenes = results["script"]["scenes"]
+        
+        # Ensure we have default values for missing fields; content with any
+        # defaults in it is served but not cached
+        fallbacks = set(prompt_context["parse_failures"])
+        if not learning_objectives:
+            learning_objectives = generate_default_content("learning_objectives", subject, topic)
+            fallbacks.add("learning_objectives")
+        
+        if not key_points_with_explanations:
+            key_points_with_explanations = [{
+                "point": point,
+                "explanation": ""
+            } for point in key_points]
+        
+        if not questions:
+            questions = generate_default_content("questions", subject, topic)
+            fallbacks.add("questions")
+        
+        if not activities:
+            activities = generate_default_content("activities", subject, topic)
+            fallbacks.add("activities")
+        
+        if not additional_resources:
+            additional_resources = generate_default_content("additional_resources", subject, topic)
+            fallbacks.add("additional_resources")
+        
+        if not scenes:
+            scenes = generate_default_content("scenes", subject, topic)
+            fallbacks.add("scenes")
+        
+        # Combine all parts into our final content dictionary
+        content = {
+            "title": title_section["title"],
+            "description": title_section["description"],
+            "learning_objectives": learning_objectives,
+            "key_points": key_points,
+            "key_points_detailed": key_points_with_explanations,
+            "script": script,
+            "scenes": scenes,
+            "interactive_elements": {
+                "questions": questions,
+                "activities": activities
+            },
+            "additional_resources": additional_resources
+        }
+        
+        # Validate the required fields are present
+        required_fields = ["title", "description", "script", "scenes", "key_points"]
+        for field in required_fields:
+            if field not in content:
+                content[field] = generate_default_content(field, subject, topic)
+                fallbacks.add(field)
+        
+        logger.info(f"Successfully generated enhanced content for {topic}")
+        
+        if fallbacks:
+            logger.warning(f"Not caching content for {topic}: fell back for {', '.join(sorted(fallbacks))}")
+        elif cache_key and store_content(cache_key, content, subject, topic, level, query):
+            if settings.SEMANTIC_CACHE_ENABLED:
+                semantic_cache.add_entry(subject, topic, level, query, cache_key)
+        
+        return content
+    
+    except DeadlineExceeded:
+        # Out of time: default content would only be thrown away by the next stage
+        raise
+    except QuotaExhaustedError:
+        # Out of quota: the request is queued again instead of getting default content
+        raise
+    except Exception as e:
+        logger.error(f"Error generating content: {str(e)}", exc_info=True)
+        # Return default content in case of an error
+        return {
+            "title": f"Learning about {topic} in {subject}",
+            "description": f"An educational video about {topic} for {level} students",
+            "learning_objectives": generate_default_content("learning_objectives", subject, topic),
+            "key_points": [f"Basic understanding of {topic}"],
+            "key_points_detailed": [{"point": f"Basic understanding of {topic}", "explanation": ""}],
+            "script": f"In this video, we'll explore {topic} in {subject}. This is an important topic for {level} students.",
+            "scenes": generate_default_content("scenes", subject, topic),
+            "interactive_elements": {
+                "questions": generate_default_content("questions", subject, topic),
+                "activities": generate_default_content("activities", subject, topic)
+            },
+            "additional_resources": generate_default_content("additional_resources", subject, topic)
+        }
+
+
+def stream_educational_content(subject: str, topic: str, level: str, query: str, **kwargs) -> Iterator[Tuple[str, Any]]:
+    """
+    Generator version of generate_educational_content with streaming. Yields
+    ("script", script) and ("scene", (index, scene)) events as parts of the
+    content are generated, followed by ("content", content) with the final
+    content. Takes the same keyword arguments as generate_educational_content.
+    """
+    events: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+    context = contextvars.copy_context()
+    
+    def produce():
+        try:
+            content = generate_educational_content(
+                subject, topic, level, query,
+                on_script=lambda script: events.put(("script", script)),
+                on_scene=lambda index, scene: events.put(("scene", (index, scene))),
+                **kwargs
+            )
+            events.put(("content", content))
+        except BaseException as e:
+            events.put(("error", e))
+    
+    threading.Thread(target=context.run, args=(produce,), name="content-stream", daemon=True).start()
+    
+    while True:
+        kind, value = events.get()
+        if kind == "error":
+            raise value
+        yield kind, value
+        if kind == "content":
+            return
+
+
+def generate_single_shot_content(
+    model: Any,
+    prompt_context: Dict[str, Any],
+    on_script: Optional[Callable[[str], None]] = None,
+    on_scene: Optional[Callable[[int, Dict[str, Any]], None]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Generate the whole lesson with one Gemini call, using a JSON response
+    schema so the reply can be parsed directly.
+    
+    Args:
+        model: The Gemini model to send the prompt to
+        prompt_context: Subject, topic, level, query and shared prompt instructions
+        on_script: If given, the response is streamed and this is called with the script
+        on_scene: If given, the response is streamed and this is called with each scene
+    
+    Returns:
+        The sections in the same shape as the staged results (keyed by stage
+        name), or None if the response could not be parsed
+    """
+    subject = prompt_context["subject"]
+    topic = prompt_context["topic"]
+    level = prompt_context["level"]
+    query = prompt_context["query"]
+    personalization_context = prompt_context["personalization_context"]
+    subject_specific_instructions = prompt_context["subject_specific_instructions"]
+    
+    single_shot_prompt = f"""
+        Create a complete educational video lesson for:
+        Subject: {subject}
+        Topic: {topic}
+        Level: {level}
+        Student Query: {query}
+        
+        {personalization_context}
+        {subject_specific_instructions}
+
+        Include:
+        - A catchy, engaging title, a brief description (2-3 sentences) and 3 learning objectives
+        - 4-6 key points, each with a brief explanation of why it's important
+        - 2-3 thought-provoking questions with answers and 1-2 hands-on activities
+        - 3-4 resources for further learning of different types (website, video, book, practice)
+        - A detailed narration script (2-3 minutes) and 5-8 scenes with specific visual
+          descriptions, narration, visual elements and a duration in seconds
+        
+        Make everything appropriate for {level} level students.
+        """
+    
+    logger.info("Generating complete content in a single structured call")
+    generation_config = genai.GenerationConfig(
+        response_mime_type="application/json",
+        response_schema=CONTENT_RESPONSE_SCHEMA
+    )
+    if on_script or on_scene:
+        response_text = stream_gemini(model, single_shot_prompt, "single_shot", generation_config, on_script, on_scene)
+    else:
+        response_text = call_gemini(model, single_shot_prompt, "single_shot", generation_config).text
+    
+    data = extract_json(response_text, dict)
+    if data is None:
+        PARSE_FAILURES.inc("single_shot")
+        logger.warning("Could not parse single-shot content, falling back to staged generation")
+        return None
+    
+    key_points_detailed = [
+        {"point": item.get("point", ""), "explanation": item.get("explanation", "")}
+        for item in data.get("key_points", []) if isinstance(item, dict) and item.get("point")
+    ]
+    scenes = [
+        {
+            "description": scene.get("description", f"Scene about {topic}"),
+            "narration": scene.get("narration", f"Information about {topic}"),
+            "visual_elements": scene.get("visual_elements", ""),
+            "duration_seconds": scene.get("duration_seconds", 15)
+        }
+        for scene in data.get("scenes", []) if isinstance(scene, dict)
+    ]
+    learning_objectives = data.get("learning_objectives", [])
+    if not isinstance(learning_objectives, list):
+        learning_objectives = [str(learning_objectives)]
+    
+    return {
+        "title": {
+            "title": data.get("title") or f"Learning about {topic} in {subject}",
+            "description": data.get("description") or f"An educational video about {topic} for {level} students",
+            "learning_objectives": learning_objectives
+        },
+        "key_points": {
+            "key_points": [item["point"] for item in key_points_detailed] or [f"Understanding {topic} in {subject}"],
+            "key_points_detailed": key_points_detailed
+        },
+        "interactive": {
+            "questions": [
+                {"question": q.get("question", ""), "answer": q.get("answer", "")}
+                for q in data.get("questions", []) if isinstance(q, dict) and q.get("question")
+            ],
+            "activities": [
+                {
+                    "title": a.get("title", f"Activity for {topic}"),
+                    "description": a.get("description", ""),
+                    "materials_needed": a.get("materials_needed", "None")
+                }
+                for a in data.get("activities", []) if isinstance(a, dict)
+            ]
+        },
+        "resources": [
+            {
+                "type": r.get("type", "website"),
+                "title": r.get("title", f"Resource for {topic}"),
+                "description": r.get("description", "")
+            }
+            for r in data.get("additional_resources", []) if isinstance(r, dict)
+        ],
+        "script": {
+            "script": data.get("script") or f"In this video, we'll explore {topic} in {subject}.",
+            "scenes": scenes
+        }
+    }
+
+
+def generate_title_section(model: Any, prompt_context: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Generate the title, description and learning objectives.
+    
+    Args:
+        model: The Gemini model to send the prompt to
+        prompt_context: Subject, topic, level, query and shared prompt instructions
+    
+    Returns:
+        Dictionary with title, description and learning_objectives
+    """
+    subject = prompt_context["subject"]
+    topic = prompt_context["topic"]
+    level = prompt_context["level"]
+    query = prompt_context["query"]
+    personalization_context = prompt_context["personalization_context"]
+    subject_specific_instructions = prompt_context["subject_specific_instructions"]
+    
+    title_prompt = f"""
         Create a catchy, engaging educational title, brief description, and learning objectives for:
         Subject: {subject}
         Topic: {topic}
@@ -84,60 +658,83 @@ def generate_educational_content(subject: str, topic: str, level: str, query: st
         
         Be educational and appropriate for {level} level students. Return ONLY the JSON.
         """
+    
+    logger.info("Generating title, description and learning objectives")
+    title_response = call_gemini(model, title_prompt, "title")
+    title_content = title_response.text
+    
+    # Parse title, description and learning objectives - with better error handling
+    title = f"Learning about {topic} in {subject}"
+    description = f"An educational video about {topic} for {level} students"
+    learning_objectives = []
+    
+    try:
+        # Extract the JSON object even if the response contains other text
+        title_data = extract_json(title_content, dict)
         
-        logger.info("Generating title, description and learning objectives")
-        title_response = model.generate_content(title_prompt)
-        title_content = title_response.text
-        
-        # Parse title, description and learning objectives - with better error handling
-        title = f"Learning about {topic} in {subject}"
-        description = f"An educational video about {topic} for {level} students"
-        learning_objectives = []
-        
-        try:
-            # Try to extract JSON if response contains other text
-            json_start = title_content.find('{')
-            json_end = title_content.rfind('}') + 1
+        if title_data is not None:
+            title = title_data.get("title", title)
+            description = title_data.get("description", description)
+            learning_objectives = title_data.get("learning_objectives", [])
             
-            if json_start >= 0 and json_end > json_start:
-                json_content = title_content[json_start:json_end]
-                title_data = json.loads(json_content)
-                title = title_data.get("title", title)
-                description = title_data.get("description", description)
-                learning_objectives = title_data.get("learning_objectives", [])
-                
-                # Ensure learning_objectives is a list
-                if not isinstance(learning_objectives, list):
-                    learning_objectives = [str(learning_objectives)]
-            else:
-                # No JSON found, try to extract title and description directly
-                title_match = title_content.split("title", 1)
-                if len(title_match) > 1 and ":" in title_match[1]:
-                    title = title_match[1].split(":", 1)[1].strip().strip('"').strip()[:100]
-                
-                desc_match = title_content.split("description", 1)
-                if len(desc_match) > 1 and ":" in desc_match[1]:
-                    description = desc_match[1].split(":", 1)[1].strip().strip('"').strip()[:200]
-                
-                # Try to extract learning objectives
-                objectives_match = title_content.split("learning_objectives", 1)
-                if len(objectives_match) > 1:
-                    obj_text = objectives_match[1]
-                    # Look for list items
-                    learning_objectives = []
-                    lines = obj_text.split("\n")
-                    for line in lines:
-                        if "-" in line or "*" in line or re.match(r'^\d+\.', line):
-                            obj = re.sub(r'^[\-\*\d\.]+\s*', '', line).strip()
-                            if obj:
-                                learning_objectives.append(obj)
-                
-                logger.warning(f"Using text extraction for title/description: {title[:30]}...")
-        except Exception as e:
-            logger.warning(f"Could not parse title/description: {str(e)}")
-        
-        # Now, generate key points with expanded information
-        key_points_prompt = f"""
+            # Ensure learning_objectives is a list
+            if not isinstance(learning_objectives, list):
+                learning_objectives = [str(learning_objectives)]
+        else:
+            # No JSON found, try to extract title and description directly
+            record_parse_failure(prompt_context, "title")
+            title_match = title_content.split("title", 1)
+            if len(title_match) > 1 and ":" in title_match[1]:
+                title = title_match[1].split(":", 1)[1].strip().strip('"').strip()[:100]
+            
+            desc_match = title_content.split("description", 1)
+            if len(desc_match) > 1 and ":" in desc_match[1]:
+                description = desc_match[1].split(":", 1)[1].strip().strip('"').strip()[:200]
+            
+            # Try to extract learning objectives
+            objectives_match = title_content.split("learning_objectives", 1)
+            if len(objectives_match) > 1:
+                obj_text = objectives_match[1]
+                # Look for list items
+                learning_objectives = []
+                lines = obj_text.split("\n")
+                for line in lines:
+                    if "-" in line or "*" in line or re.match(r'^\d+\.', line):
+                        obj = re.sub(r'^[\-\*\d\.]+\s*', '', line).strip()
+                        if obj:
+                            learning_objectives.append(obj)
+            
+            logger.warning(f"Using text extraction for title/description: {title[:30]}...")
+    except Exception as e:
+        record_parse_failure(prompt_context, "title")
+        logger.warning(f"Could not parse title/description: {str(e)}")
+    
+    return {
+        "title": title,
+        "description": description,
+        "learning_objectives": learning_objectives
+    }
+
+
+def generate_key_points_section(model: Any, prompt_context: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Generate the key points together with an explanation for each one.
+    
+    Args:
+        model: The Gemini model to send the prompt to
+        prompt_context: Subject, topic, level, query and shared prompt instructions
+    
+    Returns:
+        Dictionary with key_points and key_points_detailed
+    """
+    subject = prompt_context["subject"]
+    topic = prompt_context["topic"]
+    level = prompt_context["level"]
+    query = prompt_context["query"]
+    personalization_context = prompt_context["personalization_context"]
+    subject_specific_instructions = prompt_context["subject_specific_instructions"]
+    
+    key_points_prompt = f"""
         List 4-6 key educational points about:
         Subject: {subject}
         Topic: {topic}
@@ -159,97 +756,120 @@ def generate_educational_content(subject: str, topic: str, level: str, query: st
         
         Return ONLY the JSON array.
         """
+    
+    logger.info("Generating key points")
+    key_points_response = call_gemini(model, key_points_prompt, "key_points")
+    key_points_content = key_points_response.text
+    
+    # Parse key points with better error handling
+    key_points = []
+    key_points_with_explanations = []
+    
+    try:
+        # Try to find array in response
+        key_points_data = extract_json(key_points_content, list)
         
-        logger.info("Generating key points")
-        key_points_response = model.generate_content(key_points_prompt)
-        key_points_content = key_points_response.text
-        
-        # Parse key points with better error handling
-        key_points = []
-        key_points_with_explanations = []
+        if key_points_data is not None:
+            if isinstance(key_points_data, list):
+                for point_data in key_points_data:
+                    if isinstance(point_data, dict):
+                        point = point_data.get("point", "")
+                        explanation = point_data.get("explanation", "")
+                        
+                        if point:
+                            key_points.append(point)
+                            key_points_with_explanations.append({
+                                "point": point,
+                                "explanation": explanation
+                            })
+            elif isinstance(key_points_data, str):
+                key_points = [key_points_data]
+                key_points_with_explanations = [{"point": key_points_data, "explanation": ""}]
         
-        try:
-            # Try to find array in response
-            array_start = key_points_content.find('[')
-            array_end = key_points_content.rfind(']') + 1
-            
-            if array_start >= 0 and array_end > array_start:
-                array_content = key_points_content[array_start:array_end]
-                key_points_data = json.loads(array_content)
-                
-                if isinstance(key_points_data, list):
-                    for point_data in key_points_data:
-                        if isinstance(point_data, dict):
-                            point = point_data.get("point", "")
-                            explanation = point_data.get("explanation", "")
-                            
-                            if point:
-                                key_points.append(point)
-                                key_points_with_explanations.append({
-                                    "point": point,
-                                    "explanation": explanation
-                                })
-                elif isinstance(key_points_data, str):
-                    key_points = [key_points_data]
-                    key_points_with_explanations = [{"point": key_points_data, "explanation": ""}]
+        # If we couldn't get key points from JSON, try text extraction
+        if not key_points:
+            record_parse_failure(prompt_context, "key_points")
+            # Split by numbered bullets, newlines, or dashes
+            lines = key_points_content.split('\n')
+            current_point = ""
+            current_explanation = ""
             
-            # If we couldn't get key points from JSON, try text extraction
-            if not key_points:
-                # Split by numbered bullets, newlines, or dashes
-                lines = key_points_content.split('\n')
-                current_point = ""
-                current_explanation = ""
-                
-                for line in lines:
-                    line = line.strip()
-                    if not line:
-                        continue
-                        
-                    # Check if this is a new point
-                    is_new_point = False
-                    for prefix in ['•', '-', '*', '1.', '2.', '3.', '4.', '5.', '6.']:
-                        if line.startswith(prefix):
-                            # If we already have a point, save it before starting a new one
-                            if current_point:
-                                key_points.append(current_point)
-                                key_points_with_explanations.append({
-                                    "point": current_point,
-                                    "explanation": current_explanation
-                                })
-                            
-                            # Start a new point
-                            current_point = line.replace(prefix, '', 1).strip()
-                            current_explanation = ""
-                            is_new_point = True
-                            break
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
                     
-                    # If not a new point, add to current explanation
-                    if not is_new_point and current_point:
-                        current_explanation += " " + line
-                
-                # Add the last point if we have one
-                if current_point:
-                    key_points.append(current_point)
-                    key_points_with_explanations.append({
-                        "point": current_point,
-                        "explanation": current_explanation
-                    })
+                # Check if this is a new point
+                is_new_point = False
+                for prefix in ['•', '-', '*', '1.', '2.', '3.', '4.', '5.', '6.']:
+                    if line.startswith(prefix):
+                        # If we already have a point, save it before starting a new one
+                        if current_point:
+                            key_points.append(current_point)
+                            key_points_with_explanations.append({
+                                "point": current_point,
+                                "explanation": current_explanation
+                            })
+                        
+                        # Start a new point
+                        current_point = line.replace(prefix, '', 1).strip()
+                        current_explanation = ""
+                        is_new_point = True
+                        break
                 
-                logger.warning(f"Using text extraction for key points: Found {len(key_points)} points")
-        except Exception as e:
-            logger.warning(f"Could not parse key points: {str(e)}")
-        
-        # If we still don't have key points, use defaults
-        if not key_points:
-            key_points = [f"Understanding {topic} in {subject}"]
-            key_points_with_explanations = [{"point": f"Understanding {topic} in {subject}", "explanation": ""}]
-        
-        # Generate interactive elements (questions, activities)
-        interactive_prompt = f"""
+                # If not a new point, add to current explanation
+                if not is_new_point and current_point:
+                    current_explanation += " " + line
+            
+            # Add the last point if we have one
+            if current_point:
+                key_points.append(current_point)
+                key_points_with_explanations.append({
+                    "point": current_point,
+                    "explanation": current_explanation
+                })
+            
+            logger.warning(f"Using text extraction for key points: Found {len(key_points)} points")
+    except Exception as e:
+        record_parse_failure(prompt_context, "key_points")
+        logger.warning(f"Could not parse key points: {str(e)}")
+    
+    # If we still don't have key points, use defaults
+    if not key_points:
+        record_parse_failure(prompt_context, "key_points")
+        key_points = [f"Understanding {topic} in {subject}"]
+        key_points_with_explanations = [{"point": f"Understanding {topic} in {subject}", "explanation": ""}]
+    
+    return {
+        "key_points": key_points,
+        "key_points_detailed": key_points_with_explanations
+    }
+
+
+def generate_interactive_section(model: Any, prompt_context: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Generate the interactive elements (questions and activities).
+    
+    Args:
+        model: The Gemini model to send the prompt to
+        prompt_context: Subject, topic, level, query and shared prompt instructions
+    
+    Returns:
+        Dictionary with questions and activities
+    """
+    subject = prompt_context["subject"]
+    topic = prompt_context["topic"]
+    level = prompt_context["level"]
+    query = prompt_context["query"]
+    personalization_context = prompt_context["personalization_context"]
+    subject_specific_instructions = prompt_context["subject_specific_instructions"]
+    
+    interactive_prompt = f"""
         Create educational interactive elements for:
         Subject: {subject}
         Topic: {topic}
         Level: {level}
+        Student Query: {query}
         
         {personalization_context}
         {subject_specific_instructions}
@@ -278,115 +898,139 @@ def generate_educational_content(subject: str, topic: str, level: str, query: st
         Make everything appropriate for {level} level students.
         Return ONLY the JSON.
         """
+    
+    logger.info("Generating interactive elements")
+    interactive_response = call_gemini(model, interactive_prompt, "interactive")
+    interactive_content = interactive_response.text
+    
+    # Parse interactive elements
+    questions = []
+    activities = []
+    
+    try:
+        # Extract the JSON object even if the response contains other text
+        interactive_data = extract_json(interactive_content, dict)
         
-        logger.info("Generating interactive elements")
-        interactive_response = model.generate_content(interactive_prompt)
-        interactive_content = interactive_response.text
-        
-        # Parse interactive elements
-        questions = []
-        activities = []
-        
-        try:
-            # Try to extract JSON if response contains other text
-            json_start = interactive_content.find('{')
-            json_end = interactive_content.rfind('}') + 1
+        if interactive_data is not None:
             
-            if json_start >= 0 and json_end > json_start:
-                json_content = interactive_content[json_start:json_end]
-                interactive_data = json.loads(json_content)
-                
-                # Extract questions
-                if "questions" in interactive_data and isinstance(interactive_data["questions"], list):
-                    for q_data in interactive_data["questions"]:
-                        if isinstance(q_data, dict) and "question" in q_data:
-                            questions.append({
-                                "question": q_data.get("question", ""),
-                                "answer": q_data.get("answer", "")
-                            })
+            # Extract questions
+            if "questions" in interactive_data and isinstance(interactive_data["questions"], list):
+                for q_data in interactive_data["questions"]:
+                    if isinstance(q_data, dict) and "question" in q_data:
+                        questions.append({
+                            "question": q_data.get("question", ""),
+                            "answer": q_data.get("answer", "")
+                        })
+            
+            # Extract activities
+            if "activities" in interactive_data and isinstance(interactive_data["activities"], list):
+                for a_data in interactive_data["activities"]:
+                    if isinstance(a_data, dict) and ("title" in a_data or "description" in a_data):
+                        activities.append({
+                            "title": a_data.get("title", f"Activity for {topic}"),
+                            "description": a_data.get("description", ""),
+                            "materials_needed": a_data.get("materials_needed", "None")
+                        })
+        else:
+            # Text extraction for interactive elements
+            record_parse_failure(prompt_context, "interactive")
+            # (This is a simplified extraction as a fallback)
+            lines = interactive_content.split('\n')
+            current_section = None
+            current_item = {}
+            
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
                 
-                # Extract activities
-                if "activities" in interactive_data and isinstance(interactive_data["activities"], list):
-                    for a_data in interactive_data["activities"]:
-                        if isinstance(a_data, dict) and ("title" in a_data or "description" in a_data):
-                            activities.append({
-                                "title": a_data.get("title", f"Activity for {topic}"),
-                                "description": a_data.get("description", ""),
-                                "materials_needed": a_data.get("materials_needed", "None")
-                            })
-            else:
-                # Text extraction for interactive elements
-                # (This is a simplified extraction as a fallback)
-                lines = interactive_content.split('\n')
-                current_section = None
-                current_item = {}
+                # Check for section headers
+                lower_line = line.lower()
+                if "question" in lower_line and ":" not in lower_line:
+                    current_section = "questions"
+                    # Save previous item if exists
+                    if current_item and "question" in current_item:
+                        questions.append(current_item)
+                    current_item = {}
+                elif "activit" in lower_line and ":" not in lower_line:
+                    current_section = "activities"
+                    # Save previous item if exists
+                    if current_item and "title" in current_item:
+                        activities.append(current_item)
+                    current_item = {}
                 
-                for line in lines:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    # Check for section headers
-                    lower_line = line.lower()
-                    if "question" in lower_line and ":" not in lower_line:
-                        current_section = "questions"
+                # Extract content based on section
+                if current_section == "questions":
+                    if "question" in lower_line and ":" in line:
                         # Save previous item if exists
-                        if current_item and "question" in current_item:
+                        if "question" in current_item:
+                            questions.append(current_item)
+                            current_item = {}
+                        current_item["question"] = line.split(":", 1)[1].strip()
+                    elif "answer" in lower_line and ":" in line:
+                        current_item["answer"] = line.split(":", 1)[1].strip()
+                        # Save this Q&A pair
+                        if "question" in current_item:
                             questions.append(current_item)
-                        current_item = {}
-                    elif "activit" in lower_line and ":" not in lower_line:
-                        current_section = "activities"
+                            current_item = {}
+                
+                elif current_section == "activities":
+                    if "title" in lower_line and ":" in line:
                         # Save previous item if exists
-                        if current_item and "title" in current_item:
+                        if "title" in current_item:
                             activities.append(current_item)
-                        current_item = {}
-                    
-                    # Extract content based on section
-                    if current_section == "questions":
-                        if "question" in lower_line and ":" in line:
-                            # Save previous item if exists
-                            if "question" in current_item:
-                                questions.append(current_item)
-                                current_item = {}
-                            current_item["question"] = line.split(":", 1)[1].strip()
-                        elif "answer" in lower_line and ":" in line:
-                            current_item["answer"] = line.split(":", 1)[1].strip()
-                            # Save this Q&A pair
-                            if "question" in current_item:
-                                questions.append(current_item)
-                                current_item = {}
-                    
-                    elif current_section == "activities":
-                        if "title" in lower_line and ":" in line:
-                            # Save previous item if exists
-                            if "title" in current_item:
-                                activities.append(current_item)
-                                current_item = {}
-                            current_item["title"] = line.split(":", 1)[1].strip()
-                        elif "description" in lower_line and ":" in line:
-                            current_item["description"] = line.split(":", 1)[1].strip()
-                        elif "material" in lower_line and ":" in line:
-                            current_item["materials_needed"] = line.split(":", 1)[1].strip()
-                            # Save this activity
-                            if "title" in current_item or "description" in current_item:
-                                activities.append(current_item)
-                                current_item = {}
-                
-                # Add the last item if not already added
-                if current_section == "questions" and "question" in current_item:
-                    questions.append(current_item)
-                elif current_section == "activities" and ("title" in current_item or "description" in current_item):
-                    activities.append(current_item)
-        except Exception as e:
-            logger.warning(f"Could not parse interactive elements: {str(e)}")
-        
-        # Generate additional resources
-        resources_prompt = f"""
+                            current_item = {}
+                        current_item["title"] = line.split(":", 1)[1].strip()
+                    elif "description" in lower_line and ":" in line:
+                        current_item["description"] = line.split(":", 1)[1].strip()
+                    elif "material" in lower_line and ":" in line:
+                        current_item["materials_needed"] = line.split(":", 1)[1].strip()
+                        # Save this activity
+                        if "title" in current_item or "description" in current_item:
+                            activities.append(current_item)
+                            current_item = {}
+            
+            # Add the last item if not already added
+            if current_section == "questions" and "question" in current_item:
+                questions.append(current_item)
+            elif current_section == "activities" and ("title" in current_item or "description" in current_item):
+                activities.append(current_item)
+    except Exception as e:
+        record_parse_failure(prompt_context, "interactive")
+        logger.warning(f"Could not parse interactive elements: {str(e)}")
+    
+    return {
+        "questions": questions,
+        "activities": activities
+    }
+
+
+def generate_resources_section(model: Any, prompt_context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Generate suggestions of additional resources for further learning.
+    
+    Args:
+        model: The Gemini model to send the prompt to
+        prompt_context: Subject, topic, level, query and shared prompt instructions
+    
+    Returns:
+        List of resource dictionaries
+    """
+    subject = prompt_context["subject"]
+    topic = prompt_context["topic"]
+    level = prompt_context["level"]
+    query = prompt_context["query"]
+    personalization_context = prompt_context["personalization_context"]
+    subject_specific_instructions = prompt_context["subject_specific_instructions"]
+    
+    resources_prompt = f"""
         Suggest educational resources for further learning about:
         Subject: {subject}
         Topic: {topic}
         Level: {level}
+        Student Query: {query}
         
+        {personalization_context}
         {subject_specific_instructions}
 
         Return exactly in this JSON format:
@@ -404,83 +1048,108 @@ def generate_educational_content(subject: str, topic: str, level: str, query: st
         Resources should be specific and educational.
         Return ONLY the JSON array.
         """
+    
+    logger.info("Generating additional resources")
+    resources_response = call_gemini(model, resources_prompt, "resources")
+    resources_content = resources_response.text
+    
+    # Parse additional resources
+    additional_resources = []
+    
+    try:
+        # Try to find array in response
+        resources_data = extract_json(resources_content, list)
         
-        logger.info("Generating additional resources")
-        resources_response = model.generate_content(resources_prompt)
-        resources_content = resources_response.text
-        
-        # Parse additional resources
-        additional_resources = []
-        
-        try:
-            # Try to find array in response
-            array_start = resources_content.find('[')
-            array_end = resources_content.rfind(']') + 1
+        if resources_data is not None:
+            if isinstance(resources_data, list):
+                for resource in resources_data:
+                    if isinstance(resource, dict):
+                        additional_resources.append({
+                            "type": resource.get("type", "website"),
+                            "title": resource.get("title", f"Resource for {topic}"),
+                            "description": resource.get("description", "")
+                        })
+        else:
+            # Text extraction for resources
+            record_parse_failure(prompt_context, "resources")
+            lines = resources_content.split('\n')
+            current_resource = {}
             
-            if array_start >= 0 and array_end > array_start:
-                array_content = resources_content[array_start:array_end]
-                resources_data = json.loads(array_content)
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
                 
-                if isinstance(resources_data, list):
-                    for resource in resources_data:
-                        if isinstance(resource, dict):
-                            additional_resources.append({
-                                "type": resource.get("type", "website"),
-                                "title": resource.get("title", f"Resource for {topic}"),
-                                "description": resource.get("description", "")
-                            })
-            else:
-                # Text extraction for resources
-                lines = resources_content.split('\n')
-                current_resource = {}
-                
-                for line in lines:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    # Check if this is a new resource (starts with bullet or number)
-                    is_new_resource = False
-                    for prefix in ['•', '-', '*', '1.', '2.', '3.', '4.', '5.']:
-                        if line.startswith(prefix):
-                            # Save previous resource if exists
-                            if current_resource and "title" in current_resource:
-                                additional_resources.append(current_resource)
-                            
-                            # Start a new resource
-                            current_resource = {
-                                "type": "website",  # Default type
-                                "title": line.replace(prefix, '', 1).strip(),
-                                "description": ""
-                            }
-                            
-                            # Try to determine resource type from the line
-                            lower_line = line.lower()
-                            if "video" in lower_line or "youtube" in lower_line or "watch" in lower_line:
-                                current_resource["type"] = "video"
-                            elif "book" in lower_line or "read" in lower_line:
-                                current_resource["type"] = "book"
-                            elif "exercise" in lower_line or "practice" in lower_line or "worksheet" in lower_line:
-                                current_resource["type"] = "practice"
-                            
-                            is_new_resource = True
-                            break
-                    
-                    # If this continues a resource description
-                    if not is_new_resource and current_resource and "title" in current_resource:
-                        if not current_resource["description"]:
-                            current_resource["description"] = line
-                        else:
-                            current_resource["description"] += " " + line
+                # Check if this is a new resource (starts with bullet or number)
+                is_new_resource = False
+                for prefix in ['•', '-', '*', '1.', '2.', '3.', '4.', '5.']:
+                    if line.startswith(prefix):
+                        # Save previous resource if exists
+                        if current_resource and "title" in current_resource:
+                            additional_resources.append(current_resource)
+                        
+                        # Start a new resource
+                        current_resource = {
+                            "type": "website",  # Default type
+                            "title": line.replace(prefix, '', 1).strip(),
+                            "description": ""
+                        }
+                        
+                        # Try to determine resource type from the line
+                        lower_line = line.lower()
+                        if "video" in lower_line or "youtube" in lower_line or "watch" in lower_line:
+                            current_resource["type"] = "video"
+                        elif "book" in lower_line or "read" in lower_line:
+                            current_resource["type"] = "book"
+                        elif "exercise" in lower_line or "practice" in lower_line or "worksheet" in lower_line:
+                            current_resource["type"] = "practice"
+                        
+                        is_new_resource = True
+                        break
                 
-                # Add the last resource if not already added
-                if current_resource and "title" in current_resource:
-                    additional_resources.append(current_resource)
-        except Exception as e:
-            logger.warning(f"Could not parse additional resources: {str(e)}")
-        
-        # Generate script and scenes with visual elements
-        script_prompt = f"""
+                # If this continues a resource description
+                if not is_new_resource and current_resource and "title" in current_resource:
+                    if not current_resource["description"]:
+                        current_resource["description"] = line
+                    else:
+                        current_resource["description"] += " " + line
+            
+            # Add the last resource if not already added
+            if current_resource and "title" in current_resource:
+                additional_resources.append(current_resource)
+    except Exception as e:
+        record_parse_failure(prompt_context, "resources")
+        logger.warning(f"Could not parse additional resources: {str(e)}")
+    
+    return additional_resources
+
+
+def generate_script_section(
+    model: Any,
+    prompt_context: Dict[str, Any],
+    on_script: Optional[Callable[[str], None]] = None,
+    on_scene: Optional[Callable[[int, Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Generate the narration script and the scene descriptions for the video.
+    
+    Args:
+        model: The Gemini model to send the prompt to
+        prompt_context: Subject, topic, level, query and shared prompt instructions
+        on_script: If given, the response is streamed and this is called with the script
+        on_scene: If given, the response is streamed and this is called with each scene
+    
+    Returns:
+        Dictionary with script and scenes
+    """
+    subject = prompt_context["subject"]
+    topic = prompt_context["topic"]
+    level = prompt_context["level"]
+    query = prompt_context["query"]
+    personalization_context = prompt_context["personalization_context"]
+    subject_specific_instructions = prompt_context["subject_specific_instructions"]
+    
+    script_prompt = f"""
         Create an educational script and detailed scene descriptions for a video about:
         Subject: {subject}
         Topic: {topic}
@@ -510,158 +1179,74 @@ def generate_educational_content(subject: str, topic: str, level: str, query: st
         Make the content appropriate for {level} level students.
         Return ONLY the JSON.
         """
+    
+    logger.info("Generating script and scenes")
+    if on_script or on_scene:
+        script_content = stream_gemini(model, script_prompt, "script", on_script=on_script, on_scene=on_scene)
+    else:
+        script_content = call_gemini(model, script_prompt, "script").text
+    
+    # Parse script and scenes with better error handling
+    script = f"In this video, we'll explore {topic} in {subject}."
+    scenes = []
+    
+    try:
+        # Extract the JSON object even if the response contains other text
+        script_data = extract_json(script_content, dict)
         
-        logger.info("Generating script and scenes")
-        script_response = model.generate_content(script_prompt)
-        script_content = script_response.text
-        
-        # Parse script and scenes with better error handling
-        script = f"In this video, we'll explore {topic} in {subject}."
-        scenes = []
-        
-        try:
-            # Try to extract JSON if response contains other text
-            json_start = script_content.find('{')
-            json_end = script_content.rfind('}') + 1
+        if script_data is not None:
+            script = script_data.get("script", script)
             
-            if json_start >= 0 and json_end > json_start:
-                json_content = script_content[json_start:json_end]
-                script_data = json.loads(json_content)
-                script = script_data.get("script", script)
-                
-                scenes_data = script_data.get("scenes", [])
-                for scene in scenes_data:
-                    if isinstance(scene, dict):
-                        scenes.append({
-                            "description": scene.get("description", f"Scene about {topic}"),
-                            "narration": scene.get("narration", f"Information about {topic}"),
-                            "visual_elements": scene.get("visual_elements", ""),
-                            "duration_seconds": scene.get("duration_seconds", 15)
-                        })
-            else:
-                # Try to extract script directly
-                script_parts = script_content.split("script", 1)
-                if len(script_parts) > 1 and ":" in script_parts[1]:
-                    script_text = script_parts[1].split("scenes", 1)[0].split(":", 1)[1].strip().strip('"').strip()
-                    script = script_text
-                
-                # Extract scenes using regex or simple text parsing
-                scenes_match = re.search(r'scenes.*?:(.*?)(?=\}|$)', script_content, re.DOTALL)
-                if scenes_match:
-                    scenes_text = scenes_match.group(1)
-                    scene_blocks = re.findall(r'\{(.*?)\}', scenes_text, re.DOTALL)
-                    
-                    for block in scene_blocks:
-                        scene = {}
-                        
-                        # Extract each property
-                        desc_match = re.search(r'description.*?:(.*?)(?=,|\}|$)', block, re.DOTALL)
-                        if desc_match:
-                            scene["description"] = desc_match.group(1).strip().strip('"').strip()
-                        
-                        narr_match = re.search(r'narration.*?:(.*?)(?=,|\}|$)', block, re.DOTALL)
-                        if narr_match:
-                            scene["narration"] = narr_match.group(1).strip().strip('"').strip()
-                        
-                        visual_match = re.search(r'visual_elements.*?:(.*?)(?=,|\}|$)', block, re.DOTALL)
-                        if visual_match:
-                            scene["visual_elements"] = visual_match.group(1).strip().strip('"').strip()
-                        
-                        duration_match = re.search(r'duration_seconds.*?:(\d+)', block)
-                        if duration_match:
-                            scene["duration_seconds"] = int(duration_match.group(1))
-                        else:
-                            scene["duration_seconds"] = 15
-                        
-                        if "description" in scene or "narration" in scene:
-                            scenes.append(scene)
-                
-                if not scenes:
-                    # Default scenes
-                    scenes = [
-                        {
-                            "description": f"Introduction to {topic}",
-                            "narration": f"Welcome to this educational video about {topic} in {subject}.",
-                            "visual_elements": "Title screen with topic name and engaging background",
-                            "duration_seconds": 10
-                        },
-                        {
-                            "description": f"Explaining the basics of {topic}",
-                            "narration": f"Let's start by understanding the basics of {topic}.",
-                            "visual_elements": "Simple diagram showing key concepts",
-                            "duration_seconds": 20
-                        }
-                    ]
-                
-                logger.warning(f"Using text extraction for script: {script[:30]}...")
-        except Exception as e:
-            logger.warning(f"Could not parse script/scenes: {str(e)}")
-            # Default values are already set
-        
-        # Ensure we have default values for missing fields
-        if not learning_objectives:
-            learning_objectives = generate_default_content("learning_objectives", subject, topic)
-        
-        if not key_points_with_explanations:
-            key_points_with_explanations = [{
-                "point": point,
-                "explanation": ""
-            } for point in key_points]
-        
-        if not questions:
-            questions = generate_default_content("questions", subject, topic)
-        
-        if not activities:
-            activities = generate_default_content("activities", subject, topic)
-        
-        if not additional_resources:
-            additional_resources = generate_default_content("additional_resources", subject, topic)
-        
-        if not scenes:
-            scenes = generate_default_content("scenes", subject, topic)
-        
-        # Combine all parts into our final content dictionary
-        content = {
-            "title": title,
-            "description": description,
-            "learning_objectives": learning_objectives,
-            "key_points": key_points,
-            "key_points_detailed": key_points_with_explanations,
-            "script": script,
-            "scenes": scenes,
-            "interactive_elements": {
-                "questions": questions,
-                "activities": activities
-            },
-            "additional_resources": additional_resources
-        }
-        
-        # Validate the required fields are present
-        required_fields = ["title", "description", "script", "scenes", "key_points"]
-        for field in required_fields:
-            if field not in content:
-                content[field] = generate_default_content(field, subject, topic)
-        
-        logger.info(f"Successfully generated enhanced content for {topic}")
-        return content
-    
+            scenes_data = script_data.get("scenes", [])
+            for scene in scenes_data:
+                if isinstance(scene, dict):
+                    scenes.append({
+                        "description": scene.get("description", f"Scene about {topic}"),
+                        "narration": scene.get("narration", f"Information about {topic}"),
+                        "visual_elements": scene.get("visual_elements", ""),
+                        "duration_seconds": scene.get("duration_seconds", 15)
+                    })
+        else:
+            # Try to extract script directly
+            record_parse_failure(prompt_context, "script")
+            script_parts = script_content.split("script", 1)
+            if len(script_parts) > 1 and ":" in script_parts[1]:
+                script_text = script_parts[1].split("scenes", 1)[0].split(":", 1)[1].strip().strip('"').strip()
+                script = script_text
+            
+            # Salvage whichever scene objects can still be parsed on their own
+            for scene in extract_objects(script_content, after="scenes"):
+                if "description" in scene or "narration" in scene:
+                    scene.setdefault("duration_seconds", 15)
+                    scenes.append(scene)
+            
+            if not scenes:
+                # Default scenes
+                scenes = [
+                    {
+                        "description": f"Introduction to {topic}",
+                        "narration": f"Welcome to this educational video about {topic} in {subject}.",
+                        "visual_elements": "Title screen with topic name and engaging background",
+                        "duration_seconds": 10
+                    },
+                    {
+                        "description": f"Explaining the basics of {topic}",
+                        "narration": f"Let's start by understanding the basics of {topic}.",
+                        "visual_elements": "Simple diagram showing key concepts",
+                        "duration_seconds": 20
+                    }
+                ]
+            
+            logger.warning(f"Using text extraction for script: {script[:30]}...")
     except Exception as e:
-        logger.error(f"Error generating content: {str(e)}", exc_info=True)
-        # Return default content in case of an error
-        return {
-            "title": f"Learning about {topic} in {subject}",
-            "description": f"An educational video about {topic} for {level} students",
-            "learning_objectives": generate_default_content("learning_objectives", subject, topic),
-            "key_points": [f"Basic understanding of {topic}"],
-            "key_points_detailed": [{"point": f"Basic understanding of {topic}", "explanation": ""}],
-            "script": f"In this video, we'll explore {topic} in {subject}. This is an important topic for {level} students.",
-            "scenes": generate_default_content("scenes", subject, topic),
-            "interactive_elements": {
-                "questions": generate_default_content("questions", subject, topic),
-                "activities": generate_default_content("activities", subject, topic)
-            },
-            "additional_resources": generate_default_content("additional_resources", subject, topic)
-        }
+        record_parse_failure(prompt_context, "script")
+        logger.warning(f"Could not parse script/scenes: {str(e)}")
+        # Default values are already set
+    
+    return {
+        "script": script,
+        "scenes": scenes
+    }
 
 
 def get_subject_specific_instructions(subject: str) -> str:
@@ -0,0 +1,143 @@
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Never give an upstream call less than this, so that a nearly spent budget
+# fails on the deadline check rather than with a confusing socket timeout
+MIN_CALL_TIMEOUT = 1.0
+
+# Deadline of the request currently being processed. Propagated to stage and
+# Gemini worker threads together with the rest of the context.
+_current_deadline: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar(
+    "current_deadline", default=None
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a request has used up its time budget or was cancelled.
+    """
+
+
+class Deadline:
+    """
+    Wall-clock budget for one request. Can also be cancelled early, for
+    example by the watchdog.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.cancelled = threading.Event()
+        self.reason: Optional[str] = None
+
+    def remaining(self) -> float:
+        """
+        Seconds left in the budget, or 0 once expired or cancelled.
+        """
+        if self.cancelled.is_set():
+            return 0.0
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def cancel(self, reason: str) -> None:
+        if not self.cancelled.is_set():
+            self.reason = reason
+            self.cancelled.set()
+
+    def check(self, operation: str = "request") -> None:
+        """
+        Raise DeadlineExceeded if there is no time left.
+        """
+        if self.cancelled.is_set():
+            raise DeadlineExceeded(f"{operation} cancelled: {self.reason}")
+        if self.expired():
+            raise DeadlineExceeded(f"{operation} exceeded the {self.seconds:.0f}s deadline")
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """
+    Make the given deadline the current one for the code inside the block.
+    """
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def check_deadline(operation: str = "request") -> None:
+    """
+    Raise DeadlineExceeded if the current request is out of time. Does
+    nothing outside of a request.
+    """
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.check(operation)
+
+
+def call_timeout(limit: float, operation: str = "request") -> float:
+    """
+    Timeout to use for one upstream call: the configured limit, capped by
+    what is left of the current request's budget.
+
+    Args:
+        limit: The longest this call may take on its own
+        operation: Name used in the error if the budget is already spent
+
+    Returns:
+        Timeout in seconds
+
+    Raises:
+        DeadlineExceeded: If the current request has no time left
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return limit
+    deadline.check(operation)
+    return max(MIN_CALL_TIMEOUT, min(limit, deadline.remaining()))
+
+
+# Deadlines of the requests running in this process, so that the watchdog
+# can cancel them by request ID
+_request_deadlines: Dict[int, Deadline] = {}
+_request_deadlines_lock = threading.Lock()
+
+
+def register_request_deadline(request_id: int, deadline: Deadline) -> None:
+    with _request_deadlines_lock:
+        _request_deadlines[request_id] = deadline
+
+
+def unregister_request_deadline(request_id: int) -> None:
+    with _request_deadlines_lock:
+        _request_deadlines.pop(request_id, None)
+
+
+def cancel_request(request_id: int, reason: str) -> bool:
+    """
+    Cancel a running request so that its remaining stages are skipped.
+
+    Returns:
+        True if the request was running in this process
+    """
+    with _request_deadlines_lock:
+        deadline = _request_deadlines.get(request_id)
+    if deadline is None:
+        return False
+    logger.warning(f"Cancelling request {request_id}: {reason}")
+    deadline.cancel(reason)
+    return True
@@ -0,0 +1,163 @@
+import logging
+from typing import Dict, Tuple
+
+from config import settings, parse_options
+from services.job_queue import enqueue_job, get_queue_stats
+from services.content_cache import make_cache_key, has_cached_content
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def get_priority_classes() -> Dict[str, int]:
+    """
+    Parse PRIORITY_CLASSES, e.g. "cached=20,web_interface=10,webhook=0".
+    """
+    return {name: int(value) for name, value in parse_options(settings.PRIORITY_CLASSES).items()}
+
+
+def classify_request(video_request, source: str) -> Tuple[str, int]:
+    """
+    Pick the priority class of a request: requests whose content is already
+    cached finish in seconds, so they go first; otherwise the class is the
+    channel the request came from.
+
+    Returns:
+        Tuple of (class name, priority)
+    """
+    classes = get_priority_classes()
+    if "cached" in classes and settings.CONTENT_CACHE_ENABLED:
+        cache_key = make_cache_key(video_request.subject, video_request.topic, video_request.level, video_request.query)
+        if has_cached_content(cache_key):
+            return "cached", classes["cached"]
+    return source, classes.get(source, 0)
+
+
+def get_queue_position(job) -> int:
+    """
+    1-based position of a queued job, counting the jobs that will be leased
+    before it. Returns 0 once the job is no longer waiting.
+
+    With fair queuing, users are served round-robin within a priority class,
+    so only as many jobs of each other user are ahead as this user has
+    waiting up to and including this job.
+    """
+    from models import get_db, VideoJob
+    from sqlalchemy import func, or_, and_
+
+    if job.status != "queued":
+        return 0
+
+    db_session = get_db()
+    if not settings.FAIR_QUEUING_ENABLED:
+        ahead = db_session.query(VideoJob).filter(
+            VideoJob.status == "queued",
+            or_(
+                VideoJob.priority > job.priority,
+                and_(VideoJob.priority == job.priority, VideoJob.id < job.id)
+            )
+        ).count()
+        return ahead + 1
+
+    higher = db_session.query(VideoJob).filter(
+        VideoJob.status == "queued",
+        VideoJob.priority > job.priority
+    ).count()
+    own_rank = db_session.query(VideoJob).filter(
+        VideoJob.status == "queued",
+        VideoJob.priority == job.priority,
+        VideoJob.user_id == job.user_id,
+        VideoJob.id <= job.id
+    ).count()
+    others = db_session.query(VideoJob.user_id, func.count(VideoJob.id)).filter(
+        VideoJob.status == "queued",
+        VideoJob.priority == job.priority,
+        or_(VideoJob.user_id != job.user_id, VideoJob.user_id.is_(None))
+    ).group_by(VideoJob.user_id).all()
+    return higher + own_rank + sum(min(count, own_rank) for _, count in others)
+
+
+def count_queued_for_user(user_id) -> int:
+    from models import get_db, VideoJob
+
+    return get_db().query(VideoJob).filter(VideoJob.status == "queued", VideoJob.user_id == user_id).count()
+
+
+def dispatch_request(video_request, message_type: str = "whatsapp", source: str = "webhook") -> Tuple[bool, int]:
+    """
+    Single entry point for sending a new video request into the generation
+    pipeline. Applies admission control: once MAX_QUEUE_DEPTH jobs are waiting
+    or running, or the user already has MAX_QUEUED_PER_USER jobs waiting, the
+    request is rejected immediately instead of piling up. Accepted requests
+    are queued with the priority of their class (see classify_request).
+    Must be called inside an application context.
+
+    Args:
+        video_request: The pending VideoRequest to process
+        message_type: The type of message to use for notifications ("sms" or "whatsapp")
+        source: Where the request came from ("webhook" or "web_interface")
+
+    Returns:
+        Tuple of (accepted, queue_position). The position is 0 when the request
+        was rejected or a worker is expected to pick it up right away.
+    """
+    from models import get_db
+
+    stats = get_queue_stats()
+    running = stats.get("leased", 0)
+    depth = stats.get("queued", 0) + running
+    rejected_reason = None
+    if depth >= settings.MAX_QUEUE_DEPTH:
+        logger.warning(f"Queue full ({depth} jobs), rejecting request {video_request.id} from {source}")
+        rejected_reason = "queue_full"
+    elif settings.MAX_QUEUED_PER_USER and video_request.user_id is not None:
+        waiting = count_queued_for_user(video_request.user_id)
+        if waiting >= settings.MAX_QUEUED_PER_USER:
+            logger.warning(f"User {video_request.user_id} has {waiting} requests waiting, rejecting request {video_request.id}")
+            rejected_reason = "user_queue_full"
+
+    if rejected_reason:
+        video_request.status = "failed"
+        metadata = dict(video_request.request_metadata or {})
+        metadata["rejected_reason"] = rejected_reason
+        video_request.request_metadata = metadata
+        get_db().commit()
+        return False, 0
+
+    priority_class, priority = classify_request(video_request, source)
+    job = enqueue_job(video_request.id, video_request.user_id, message_type, priority=priority)
+
+    # Only report a position when the request has to wait for a free worker
+    position = get_queue_position(job)
+    free_workers = max(0, settings.WORKER_COUNT - running)
+    logger.info(
+        f"Dispatched request {video_request.id} from {source} as {priority_class}: "
+        f"depth {depth + 1}, position {position}"
+    )
+    return True, position if position > free_workers else 0
+
+
+def format_dispatch_message(accepted: bool, position: int, subject: str, topic: str) -> str:
+    """
+    Build the acknowledgment sent to the user after dispatching a request.
+
+    Args:
+        accepted: Whether the request entered the queue
+        position: Queue position returned by dispatch_request
+        subject: The subject of the requested video
+        topic: The topic of the requested video
+
+    Returns:
+        Message text for the user
+    """
+    if not accepted:
+        return (
+            f"Sorry, we're receiving too many requests right now and couldn't queue your video about '{topic}'. "
+            f"Please try again in a few minutes."
+        )
+    if position:
+        return (
+            f"Thanks for your request! Your {subject} video about '{topic}' is queued at position {position}. "
+            f"We'll message you as soon as it's ready."
+        )
+    return f"Thanks for your request! We're generating a {subject} video about '{topic}' for you. This may take a few minutes."
@@ -1,10 +1,26 @@
 import os
+import time
+import uuid
+import random
 import logging
 import json
+import mimetypes
+import threading
+import contextvars
+import requests
 import firebase_admin
+from concurrent.futures import ThreadPoolExecutor, wait
 from firebase_admin import credentials, storage
+from google.api_core import exceptions as api_exceptions
+from google.auth.credentials import AnonymousCredentials
+from google.auth.exceptions import TransportError
 from google.cloud import storage as google_storage
-from typing import Optional
+from typing import Any, Callable, List, Optional
+
+from config import settings
+from services.metrics import instrumented, record_error, register, Counter, Histogram
+from services.deadline import call_timeout, current_deadline
+from services.providers import get_provider
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -16,6 +32,41 @@ FIREBASE_STORAGE_BUCKET = os.environ.get("FIREBASE_STORAGE_BUCKET", "")
 # Firebase app instance
 firebase_app = None
 
+# Resumable upload chunks must be multiples of this, except the last
+CHUNK_ALIGNMENT = 256 * 1024
+# The most objects one compose request accepts
+MAX_COMPOSE_SOURCES = 32
+# Responses worth retrying
+TRANSIENT_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+UPLOAD_BYTES = register(Counter(
+    "tapbuddy_upload_bytes_total",
+    "Bytes uploaded to storage, by method",
+    ("method",)
+))
+UPLOAD_RETRIES = register(Counter(
+    "tapbuddy_upload_retries_total",
+    "Upload calls retried after a transient error, by step",
+    ("operation",)
+))
+UPLOAD_THROUGHPUT = register(Histogram(
+    "tapbuddy_upload_throughput_bytes_per_second",
+    "Throughput of whole file uploads, by method",
+    ("method",),
+    buckets=(2.5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8)
+))
+
+# Parts of composite uploads from all requests share one pool
+_upload_executor: Optional[ThreadPoolExecutor] = None
+_upload_lock = threading.Lock()
+_emulator_bucket = None
+
+
+class TransientUploadError(Exception):
+    """
+    Raised when storage answers an upload request with a status worth retrying.
+    """
+
 def initialize_firebase():
     """
     Initialize Firebase app with credentials.
@@ -54,9 +105,202 @@ def initialize_firebase():
         return None
 
 
+def get_bucket() -> Optional[Any]:
+    """
+    Return the storage bucket, or None if Firebase is not configured. With
+    STORAGE_EMULATOR_HOST set (a local GCS emulator such as fake-gcs-server),
+    the bucket is on the emulator and no credentials are needed.
+    """
+    global _emulator_bucket
+    if os.environ.get("STORAGE_EMULATOR_HOST"):
+        with _upload_lock:
+            if _emulator_bucket is None:
+                client = google_storage.Client(project="tapbuddy-emulator", credentials=AnonymousCredentials())
+                _emulator_bucket = client.bucket(FIREBASE_STORAGE_BUCKET)
+            return _emulator_bucket
+
+    if initialize_firebase() is None:
+        return None
+    return storage.bucket()
+
+
+def get_upload_executor() -> ThreadPoolExecutor:
+    global _upload_executor
+    with _upload_lock:
+        if _upload_executor is None:
+            _upload_executor = ThreadPoolExecutor(
+                max_workers=max(1, min(settings.UPLOAD_COMPOSITE_PARTS, MAX_COMPOSE_SOURCES)),
+                thread_name_prefix="upload-part"
+            )
+        return _upload_executor
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Whether an upload error is worth retrying: throttling, server errors,
+    timeouts and dropped connections.
+    """
+    return isinstance(error, (
+        TransientUploadError,
+        requests.ConnectionError,
+        requests.Timeout,
+        TransportError,
+        api_exceptions.TooManyRequests,
+        api_exceptions.InternalServerError,
+        api_exceptions.BadGateway,
+        api_exceptions.ServiceUnavailable,
+        api_exceptions.GatewayTimeout,
+    ))
+
+
+def backoff(attempt: int, operation: str, error: Exception) -> None:
+    """
+    Sleep before retry attempt (0-based) of a transient failure, with
+    full-jitter exponential backoff.
+
+    Raises:
+        The error itself, once UPLOAD_MAX_RETRIES retries are used up or the
+        request's deadline would pass while waiting
+    """
+    delay = random.uniform(0, min(settings.UPLOAD_BACKOFF_MAX, settings.UPLOAD_BACKOFF_BASE * (2 ** attempt)))
+    deadline = current_deadline()
+    if attempt >= settings.UPLOAD_MAX_RETRIES or (deadline is not None and deadline.remaining() < delay):
+        raise error
+    UPLOAD_RETRIES.inc(operation)
+    logger.info(f"{operation} failed ({str(error)[:200]}), retrying in {delay:.1f}s")
+    time.sleep(delay)
+
+
+def with_retries(operation: str, func: Callable[[], Any]) -> Any:
+    """
+    Call func, retrying transient failures with backoff.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if not is_transient(e):
+                raise
+            backoff(attempt, operation, e)
+            attempt += 1
+
+
+def _upload_offset(response: requests.Response) -> Optional[int]:
+    """
+    Interpret the answer to a resumable upload request.
+
+    Returns:
+        The number of bytes storage has persisted, or None once the upload is complete
+    """
+    if response.status_code in (200, 201):
+        return None
+    if response.status_code == 308:
+        # "Range: bytes=0-N" lists what was persisted; no header means nothing yet
+        persisted = response.headers.get("Range")
+        return int(persisted.rsplit("-", 1)[1]) + 1 if persisted else 0
+    if response.status_code in TRANSIENT_STATUS_CODES:
+        raise TransientUploadError(f"Upload chunk answered {response.status_code}: {response.text[:200]}")
+    raise requests.HTTPError(f"Upload chunk failed: {response.status_code} - {response.text[:500]}", response=response)
+
+
+def resumable_upload(blob: Any, file_path: str, offset: int, length: int) -> None:
+    """
+    Upload length bytes of file_path, starting at offset, to blob with a
+    resumable upload in chunks of UPLOAD_CHUNK_SIZE. After a transient
+    failure the upload asks storage how much it has persisted and carries
+    on from there rather than starting over.
+
+    Raises:
+        requests.HTTPError: If storage rejects the upload
+        Exception: The last transient error, once the retries are used up
+    """
+    chunk_size = max(CHUNK_ALIGNMENT, settings.UPLOAD_CHUNK_SIZE // CHUNK_ALIGNMENT * CHUNK_ALIGNMENT)
+    content_type = blob.content_type or mimetypes.guess_type(blob.name)[0] or "application/octet-stream"
+    session_url = with_retries("upload_session", lambda: blob.create_resumable_upload_session(
+        content_type=content_type,
+        size=length,
+        timeout=call_timeout(settings.UPLOAD_CALL_TIMEOUT, "firebase_upload")
+    ))
+    transport = blob.client._http
+
+    position = 0
+    attempt = 0
+    recovering = False
+    with open(file_path, "rb") as f:
+        while True:
+            try:
+                if recovering:
+                    # Status check: an empty request with an unknown range
+                    data = b""
+                    content_range = f"bytes */{length}"
+                else:
+                    f.seek(offset + position)
+                    data = f.read(min(chunk_size, length - position))
+                    content_range = f"bytes {position}-{position + len(data) - 1}/{length}" if data else f"bytes */{length}"
+                response = transport.put(
+                    session_url,
+                    data=data,
+                    headers={"Content-Range": content_range},
+                    timeout=call_timeout(settings.UPLOAD_CALL_TIMEOUT, "firebase_upload")
+                )
+                position = _upload_offset(response)
+                if position is None:
+                    return
+                attempt = 0
+                recovering = False
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                backoff(attempt, "upload_chunk", e)
+                attempt += 1
+                recovering = True
+
+
+def composite_upload(blob: Any, file_path: str, size: int) -> None:
+    """
+    Upload a large file as UPLOAD_COMPOSITE_PARTS parts in parallel, each a
+    resumable upload to a temporary object, then compose them into blob in
+    the bucket and delete the parts.
+    """
+    parts = max(1, min(settings.UPLOAD_COMPOSITE_PARTS, MAX_COMPOSE_SOURCES))
+    part_size = -(-size // parts)
+    prefix = f"{blob.name}.parts/{uuid.uuid4().hex}"
+    ranges = [(offset, min(part_size, size - offset)) for offset in range(0, size, part_size)]
+    part_blobs: List[Any] = [blob.bucket.blob(f"{prefix}/{i}") for i in range(len(ranges))]
+
+    executor = get_upload_executor()
+    futures = [
+        executor.submit(contextvars.copy_context().run, resumable_upload, part, file_path, offset, length)
+        for part, (offset, length) in zip(part_blobs, ranges)
+    ]
+    try:
+        for future in futures:
+            future.result()
+        blob.content_type = mimetypes.guess_type(blob.name)[0] or "application/octet-stream"
+        with_retries("upload_compose", lambda: blob.compose(
+            part_blobs,
+            timeout=call_timeout(settings.UPLOAD_CALL_TIMEOUT, "firebase_upload")
+        ))
+    finally:
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        for part in part_blobs:
+            try:
+                part.delete(timeout=settings.UPLOAD_CALL_TIMEOUT)
+            except Exception as e:
+                # Parts that never got uploaded don't exist
+                if not isinstance(e, api_exceptions.NotFound):
+                    logger.warning(f"Could not delete upload part {part.name}: {str(e)}")
+
+
+@instrumented("upload_file_to_firebase")
 def upload_file_to_firebase(file_path: str, destination_path: str) -> bool:
     """
-    Upload a file to Firebase Storage.
+    Upload a file to Firebase Storage with a resumable upload, or for files
+    of UPLOAD_COMPOSITE_THRESHOLD and more as parallel parts composed in the
+    bucket. Transient failures are retried with backoff.
     
     Args:
         file_path: Path to the local file
@@ -68,28 +312,43 @@ def upload_file_to_firebase(file_path: str, destination_path: str) -> bool:
     logger.info(f"Uploading file to Firebase: {file_path} -> {destination_path}")
     
     try:
-        # Initialize Firebase if not already
-        app = initialize_firebase()
+        provider = get_provider("storage")
+        if provider is not None:
+            return provider.upload(file_path, destination_path)
+        
+        # Get bucket (initializes Firebase, or uses the local emulator)
+        bucket = get_bucket()
         
-        if app is None:
+        if bucket is None:
             logger.warning("Firebase not initialized, storing file locally")
             return False
         
-        # Get bucket
-        bucket = storage.bucket()
-        
-        # Upload file
+        # Upload file in resumable chunks, or as parallel parts if it is large
         blob = bucket.blob(destination_path)
-        blob.upload_from_filename(file_path)
+        size = os.path.getsize(file_path)
+        start = time.perf_counter()
+        if size >= settings.UPLOAD_COMPOSITE_THRESHOLD and settings.UPLOAD_COMPOSITE_PARTS > 1:
+            method = "composite"
+            composite_upload(blob, file_path, size)
+        else:
+            method = "resumable"
+            resumable_upload(blob, file_path, 0, size)
+        elapsed = max(time.perf_counter() - start, 1e-6)
         
         # Make the file publicly accessible
-        blob.make_public()
+        with_retries("make_public", lambda: blob.make_public(timeout=call_timeout(settings.UPLOAD_CALL_TIMEOUT, "firebase_upload")))
         
-        logger.info(f"File uploaded successfully to Firebase: {blob.public_url}")
+        UPLOAD_BYTES.inc(method, amount=size)
+        UPLOAD_THROUGHPUT.observe(method, value=size / elapsed)
+        logger.info(
+            f"File uploaded successfully to Firebase ({size / 1e6:.1f} MB {method} at "
+            f"{size / 1e6 / elapsed:.1f} MB/s): {blob.public_url}"
+        )
         return True
         
     except Exception as e:
         logger.error(f"Error uploading file to Firebase: {str(e)}", exc_info=True)
+        record_error("upload_file_to_firebase")
         return False
 
 
@@ -104,16 +363,17 @@ def get_firebase_url(firebase_path: str) -> str:
         Public URL for the file
     """
     try:
-        # Initialize Firebase if not already
-        app = initialize_firebase()
+        provider = get_provider("storage")
+        if provider is not None:
+            return provider.public_url(firebase_path)
+        
+        # Get bucket (initializes Firebase, or uses the local emulator)
+        bucket = get_bucket()
         
-        if app is None:
+        if bucket is None:
             # Return a placeholder URL if Firebase is not initialized
             return f"https://storage.googleapis.com/{FIREBASE_STORAGE_BUCKET}/{firebase_path}"
         
-        # Get bucket
-        bucket = storage.bucket()
-        
         # Get blob
         blob = bucket.blob(firebase_path)
         
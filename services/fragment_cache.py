@@ -0,0 +1,188 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List
+
+from config import settings
+from services.metrics import register, register_collector, Counter, Gauge
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+LOOKUPS = register(Counter(
+    "tapbuddy_fragment_cache_lookups_total",
+    "Scene fragment cache lookups, by result",
+    ("result",)
+))
+EVICTIONS = register(Counter(
+    "tapbuddy_fragment_cache_evictions_total",
+    "Scene fragments removed to keep the cache under VIDEO_FRAGMENT_CACHE_MAX_BYTES"
+))
+CACHE_BYTES = register(Gauge(
+    "tapbuddy_fragment_cache_bytes",
+    "Size of the scene fragment cache after the last store"
+))
+
+# Stores between full scans of the cache directory, while it is below its limit
+SCAN_INTERVAL = 50
+
+# Serializes eviction scans within the process
+_evict_lock = threading.Lock()
+# Size of the cache as of the last scan plus what this process stored since
+_estimated_bytes = None
+_stores_since_scan = 0
+
+
+def fragment_key(scene: Dict[str, Any], style: Any, duration: float, encoding: Dict[str, Any]) -> str:
+    """
+    Content hash identifying a rendered scene fragment.
+
+    Args:
+        scene: The scene; its description and visual_elements are what the card shows
+        style: The card style (colours) of the subject
+        duration: Scene length in seconds
+        encoding: Resolution and encoder settings, so that changing any of
+            them never mixes incompatible fragments in one stream copy
+
+    Returns:
+        Hex digest naming the fragment
+    """
+    canonical = json.dumps(
+        [scene.get("description", ""), scene.get("visual_elements", ""), style, duration, encoding],
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _fragment_path(key: str) -> str:
+    return os.path.join(settings.VIDEO_FRAGMENT_CACHE_DIR, f"{key}.mp4")
+
+
+def _place(source: str, destination: str) -> None:
+    """
+    Hard-link source to destination, copying when the two are on different
+    file systems. A link keeps the fragment readable even if the cache
+    evicts it in the meantime.
+    """
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def fetch_fragment(key: str, destination: str) -> bool:
+    """
+    Place the cached fragment for key at destination.
+
+    Returns:
+        True on a hit, False if the fragment has to be rendered
+    """
+    if not settings.VIDEO_FRAGMENT_CACHE_ENABLED:
+        return False
+    path = _fragment_path(key)
+    try:
+        _place(path, destination)
+        # The modification time orders eviction, least recently used first
+        os.utime(path)
+    except OSError:
+        LOOKUPS.inc("miss")
+        return False
+    LOOKUPS.inc("hit")
+    return True
+
+
+def store_fragment(key: str, source: str) -> None:
+    """
+    Add a freshly rendered fragment to the cache. The file appears under its
+    final name atomically, so other processes never see a partial fragment.
+    """
+    global _estimated_bytes, _stores_since_scan
+    if not settings.VIDEO_FRAGMENT_CACHE_ENABLED:
+        return
+    try:
+        os.makedirs(settings.VIDEO_FRAGMENT_CACHE_DIR, exist_ok=True)
+        temp_path = os.path.join(settings.VIDEO_FRAGMENT_CACHE_DIR, f".{key}.{uuid.uuid4().hex}.tmp")
+        _place(source, temp_path)
+        os.replace(temp_path, _fragment_path(key))
+        size = os.path.getsize(_fragment_path(key))
+
+        with _evict_lock:
+            _stores_since_scan += 1
+            if _estimated_bytes is not None:
+                _estimated_bytes += size
+            scan = (
+                _estimated_bytes is None
+                or _estimated_bytes > settings.VIDEO_FRAGMENT_CACHE_MAX_BYTES
+                or _stores_since_scan >= SCAN_INTERVAL
+            )
+        if scan:
+            evict_fragments()
+    except OSError as e:
+        logger.warning(f"Could not cache scene fragment {key[:12]}: {str(e)}")
+
+
+def evict_fragments() -> int:
+    """
+    Remove the least recently used fragments until the cache fits in
+    VIDEO_FRAGMENT_CACHE_MAX_BYTES.
+
+    Returns:
+        Number of fragments removed
+    """
+    global _estimated_bytes, _stores_since_scan
+    with _evict_lock:
+        entries = []
+        for entry in os.scandir(settings.VIDEO_FRAGMENT_CACHE_DIR):
+            if entry.name.endswith(".mp4"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= settings.VIDEO_FRAGMENT_CACHE_MAX_BYTES:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        _estimated_bytes = total
+        _stores_since_scan = 0
+
+    CACHE_BYTES.set(value=total)
+    if removed:
+        EVICTIONS.inc(amount=removed)
+        logger.info(f"Evicted {removed} scene fragments, cache now {total / 1e6:.0f} MB")
+    return removed
+
+
+def get_fragment_stats() -> Dict[str, float]:
+    """
+    Lookup counters of this process along with the hit rate.
+    """
+    hits = LOOKUPS.values.get(("hit",), 0.0)
+    misses = LOOKUPS.values.get(("miss",), 0.0)
+    lookups = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / lookups if lookups else 0.0}
+
+
+def render_fragment_metrics() -> List[str]:
+    return [
+        "# HELP tapbuddy_fragment_cache_hit_rate Share of scene fragment lookups served from the cache",
+        "# TYPE tapbuddy_fragment_cache_hit_rate gauge",
+        f"tapbuddy_fragment_cache_hit_rate {get_fragment_stats()['hit_rate']:.4f}",
+    ]
+
+
+register_collector(render_fragment_metrics)
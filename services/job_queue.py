@@ -0,0 +1,609 @@
+import os
+import time
+import socket
+import itertools
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Callable, List, Optional, Tuple
+
+from config import settings
+from services.metrics import register_collector
+from services.deadline import cancel_request
+from services.rate_limiter import QuotaExhaustedError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Round-robin state for fair queuing: user ID -> when the user was last served
+# by this process, as a sequence number
+_last_served: Dict[Optional[int], int] = {}
+_serve_sequence = itertools.count(1)
+_last_served_lock = threading.Lock()
+
+
+class JobHandedOff(Exception):
+    """
+    Raised by a job handler when the job is not finished yet but will be
+    completed elsewhere, e.g. a request attached to an identical request in
+    flight. The job stays leased, and its worker is free for other jobs.
+    """
+
+
+def enqueue_job(request_id: int, user_id: Optional[int] = None, message_type: str = "whatsapp", priority: int = 0):
+    """
+    Add a video request to the persistent job queue. Must be called inside an
+    application context.
+
+    Args:
+        request_id: The ID of the video request to process
+        user_id: The ID of the user who made the request
+        message_type: The type of message to use for notifications ("sms" or "whatsapp")
+        priority: Higher priorities are leased first
+
+    Returns:
+        The queued VideoJob
+    """
+    from models import get_db, VideoJob
+
+    db_session = get_db()
+    job = db_session.query(VideoJob).filter(VideoJob.request_id == request_id).first()
+    if job is None:
+        job = VideoJob(
+            request_id=request_id,
+            user_id=user_id,
+            message_type=message_type,
+            priority=priority,
+            status="queued",
+            available_at=datetime.utcnow()
+        )
+        db_session.add(job)
+        db_session.commit()
+        db_session.refresh(job)
+        logger.info(f"Queued job {job.id} for request {request_id}")
+    return job
+
+
+def get_inflight_by_user() -> Dict[Optional[int], int]:
+    """
+    Number of leased jobs per user. Must be called inside an application context.
+    """
+    from models import get_db, VideoJob
+    from sqlalchemy import func
+
+    rows = get_db().query(VideoJob.user_id, func.count(VideoJob.id)).filter(
+        VideoJob.status == "leased"
+    ).group_by(VideoJob.user_id).all()
+    return {user_id: count for user_id, count in rows}
+
+
+def _next_candidate(db_session, now: datetime) -> Optional[Tuple[int, Optional[int]]]:
+    """
+    Pick the next job to lease: the highest priority class first, and within
+    it, with FAIR_QUEUING_ENABLED, the oldest job of the user with the fewest
+    running jobs who was served least recently. Users at MAX_INFLIGHT_PER_USER
+    are skipped until one of their jobs finishes.
+
+    Returns:
+        Tuple of (job_id, user_id), or None if no job is available
+    """
+    from models import VideoJob
+    from sqlalchemy import func, or_
+
+    available = db_session.query(VideoJob).filter(
+        VideoJob.status == "queued",
+        VideoJob.available_at <= now
+    )
+
+    inflight = get_inflight_by_user() if settings.FAIR_QUEUING_ENABLED or settings.MAX_INFLIGHT_PER_USER else {}
+    if settings.MAX_INFLIGHT_PER_USER:
+        capped = [
+            user_id for user_id, count in inflight.items()
+            if user_id is not None and count >= settings.MAX_INFLIGHT_PER_USER
+        ]
+        if capped:
+            available = available.filter(or_(VideoJob.user_id.is_(None), VideoJob.user_id.notin_(capped)))
+
+    if not settings.FAIR_QUEUING_ENABLED:
+        candidate = available.with_entities(VideoJob.id, VideoJob.user_id).order_by(
+            VideoJob.priority.desc(), VideoJob.id
+        ).first()
+        return (candidate.id, candidate.user_id) if candidate else None
+
+    top_priority = available.with_entities(func.max(VideoJob.priority)).scalar()
+    if top_priority is None:
+        return None
+
+    # The oldest waiting job of each user in the top priority class
+    heads = available.filter(VideoJob.priority == top_priority).with_entities(
+        VideoJob.user_id, func.min(VideoJob.id)
+    ).group_by(VideoJob.user_id).all()
+    if not heads:
+        # Another worker leased the last of them in the meantime
+        return None
+
+    with _last_served_lock:
+        user_id, job_id = min(
+            heads,
+            key=lambda head: (inflight.get(head[0], 0), _last_served.get(head[0], 0), head[1])
+        )
+    return job_id, user_id
+
+
+def lease_job(worker_id: str) -> Optional[Tuple[int, int, str]]:
+    """
+    Atomically claim the next available job (see _next_candidate for the
+    order). Must be called inside an application context.
+
+    Args:
+        worker_id: Identifier of the worker taking the lease
+
+    Returns:
+        Tuple of (job_id, request_id, message_type), or None if no job is available
+    """
+    from models import get_db, VideoJob
+
+    db_session = get_db()
+
+    # Another worker may claim the same candidate first; try a few candidates
+    for _ in range(5):
+        now = datetime.utcnow()
+        candidate = _next_candidate(db_session, now)
+        if candidate is None:
+            return None
+
+        candidate_id, user_id = candidate
+        updated = db_session.query(VideoJob).filter(
+            VideoJob.id == candidate_id,
+            VideoJob.status == "queued"
+        ).update({
+            "status": "leased",
+            "leased_by": worker_id,
+            "lease_expires_at": now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+            "attempts": VideoJob.attempts + 1,
+            "updated_at": now
+        }, synchronize_session=False)
+        db_session.commit()
+
+        if updated == 1:
+            with _last_served_lock:
+                _last_served[user_id] = next(_serve_sequence)
+            job = db_session.query(VideoJob).filter(VideoJob.id == candidate_id).first()
+            return job.id, job.request_id, job.message_type
+
+    return None
+
+
+def extend_leases(job_ids: List[int], worker_id: str) -> List[int]:
+    """
+    Push back the lease expiry of jobs that are still being worked on.
+
+    Returns:
+        The IDs of the jobs that were renewed, i.e. are still leased by worker_id
+    """
+    if not job_ids:
+        return []
+
+    from models import get_db, VideoJob
+
+    db_session = get_db()
+    leased = db_session.query(VideoJob.id).filter(
+        VideoJob.id.in_(job_ids),
+        VideoJob.status == "leased",
+        VideoJob.leased_by == worker_id
+    )
+    renewed = [job_id for job_id, in leased.all()]
+    if renewed:
+        db_session.query(VideoJob).filter(
+            VideoJob.id.in_(renewed),
+            VideoJob.status == "leased",
+            VideoJob.leased_by == worker_id
+        ).update({
+            "lease_expires_at": datetime.utcnow() + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        }, synchronize_session=False)
+        db_session.commit()
+    return renewed
+
+
+def complete_job(job_id: int) -> None:
+    """
+    Mark a leased job as done. Jobs that were reaped in the meantime stay failed.
+    """
+    from models import get_db, VideoJob
+
+    db_session = get_db()
+    db_session.query(VideoJob).filter(VideoJob.id == job_id, VideoJob.status == "leased").update({
+        "status": "done",
+        "lease_expires_at": None,
+        "updated_at": datetime.utcnow()
+    }, synchronize_session=False)
+    db_session.commit()
+
+
+def complete_request_jobs(request_ids: List[int]) -> None:
+    """
+    Mark the jobs of requests that were completed elsewhere (with the video
+    of an identical request) as done.
+    """
+    if not request_ids:
+        return
+
+    from models import get_db, VideoJob
+
+    db_session = get_db()
+    db_session.query(VideoJob).filter(
+        VideoJob.request_id.in_(request_ids),
+        VideoJob.status.in_(["queued", "leased"])
+    ).update({
+        "status": "done",
+        "lease_expires_at": None,
+        "updated_at": datetime.utcnow()
+    }, synchronize_session=False)
+    db_session.commit()
+
+
+def fail_job(job_id: int, error: str, retry_delay: Optional[float] = None, count_attempt: bool = True) -> None:
+    """
+    Record a job failure. If retry_delay is given and the job has attempts
+    left, it is queued again after the delay; otherwise it is marked failed.
+    Jobs that are no longer leased, e.g. because the watchdog reaped them,
+    are left as they are.
+
+    Args:
+        job_id: The ID of the failed job
+        error: Description of the failure
+        retry_delay: Seconds to wait before the job becomes available again
+        count_attempt: False when the job did not get a fair try (e.g. it ran
+            out of upstream quota), so the attempt is given back
+    """
+    from models import get_db, VideoJob
+
+    db_session = get_db()
+    job = db_session.query(VideoJob).filter(VideoJob.id == job_id).first()
+    if job is None or job.status != "leased":
+        return
+
+    job.last_error = error
+    job.lease_expires_at = None
+    if not count_attempt:
+        job.attempts = max(0, job.attempts - 1)
+    if retry_delay is not None and job.attempts < settings.JOB_MAX_ATTEMPTS:
+        job.status = "queued"
+        job.available_at = datetime.utcnow() + timedelta(seconds=retry_delay)
+        logger.info(f"Job {job_id} will be retried in {retry_delay:.0f}s: {error}")
+    else:
+        job.status = "failed"
+        logger.warning(f"Job {job_id} failed: {error}")
+    db_session.commit()
+
+
+def requeue_request(request_id: int, delay: float = 0.0) -> None:
+    """
+    Queue the job of a request again, whatever its state. Used for requests
+    that were attached to an identical request which then did not complete.
+    """
+    from models import get_db, VideoJob
+
+    db_session = get_db()
+    db_session.query(VideoJob).filter(VideoJob.request_id == request_id).update({
+        "status": "queued",
+        "available_at": datetime.utcnow() + timedelta(seconds=delay),
+        "leased_by": None,
+        "lease_expires_at": None,
+        "updated_at": datetime.utcnow()
+    }, synchronize_session=False)
+    db_session.commit()
+
+
+def recover_expired_leases() -> int:
+    """
+    Return jobs whose worker stopped renewing the lease (for example after a
+    crash or restart) to the queue, resetting their requests to pending.
+    Jobs that have used up their attempts are marked failed instead.
+    Must be called inside an application context.
+
+    Returns:
+        Number of jobs recovered or failed
+    """
+    from models import get_db, VideoJob, VideoRequest
+
+    db_session = get_db()
+    now = datetime.utcnow()
+    expired_jobs = db_session.query(VideoJob).filter(
+        VideoJob.status == "leased",
+        VideoJob.lease_expires_at < now
+    ).all()
+
+    for job in expired_jobs:
+        video_request = db_session.query(VideoRequest).filter(VideoRequest.id == job.request_id).first()
+        job.leased_by = None
+        job.lease_expires_at = None
+
+        if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+            job.status = "failed"
+            job.last_error = "Lease expired too many times"
+            if video_request and video_request.status != "completed":
+                video_request.status = "failed"
+            logger.warning(f"Job {job.id} for request {job.request_id} exceeded its attempts")
+        else:
+            job.status = "queued"
+            job.available_at = now
+            if video_request and video_request.status == "processing":
+                video_request.status = "pending"
+            logger.info(f"Re-queued job {job.id} for request {job.request_id} after an expired lease")
+
+    if expired_jobs:
+        db_session.commit()
+    return len(expired_jobs)
+
+
+def reap_job(job_id: int, request_id: int, reason: str) -> None:
+    """
+    Fail a runaway job and its request without waiting for it to return.
+    Must be called inside an application context.
+    """
+    from models import get_db, VideoJob, VideoRequest
+
+    db_session = get_db()
+    db_session.query(VideoJob).filter(VideoJob.id == job_id, VideoJob.status == "leased").update({
+        "status": "failed",
+        "last_error": reason,
+        "lease_expires_at": None,
+        "updated_at": datetime.utcnow()
+    }, synchronize_session=False)
+
+    video_request = db_session.query(VideoRequest).filter(VideoRequest.id == request_id).first()
+    if video_request and video_request.status != "completed":
+        video_request.status = "failed"
+        metadata = dict(video_request.request_metadata or {})
+        metadata["error"] = reason
+        video_request.request_metadata = metadata
+    db_session.commit()
+    logger.warning(f"Reaped job {job_id} for request {request_id}: {reason}")
+
+
+def get_queue_stats() -> Dict[str, int]:
+    """
+    Return the number of jobs in each status. Must be called inside an
+    application context.
+    """
+    from models import get_db, VideoJob
+    from sqlalchemy import func
+
+    db_session = get_db()
+    rows = db_session.query(VideoJob.status, func.count(VideoJob.id)).group_by(VideoJob.status).all()
+    return {status: count for status, count in rows}
+
+
+def render_queue_metrics() -> List[str]:
+    """
+    Job counts by status in Prometheus text format. Must be called inside an
+    application context.
+    """
+    stats = get_queue_stats()
+    lines = [
+        "# HELP tapbuddy_jobs Number of jobs in the persistent queue by status",
+        "# TYPE tapbuddy_jobs gauge"
+    ]
+    for status in ["queued", "leased", "done", "failed"]:
+        lines.append(f'tapbuddy_jobs{{status="{status}"}} {stats.get(status, 0)}')
+    return lines
+
+
+register_collector(render_queue_metrics)
+
+
+def default_job_handler(request_id: int, message_type: str) -> None:
+    """
+    Run the video generation pipeline for one request.
+    """
+    from routes.api import process_video_request
+    process_video_request(request_id, message_type)
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of threads that lease jobs from the persistent queue and
+    run them. A maintenance thread renews the leases of running jobs and
+    re-queues jobs whose leases have expired. It also acts as a watchdog:
+    jobs still running well past the request deadline are failed and their
+    worker is replaced, so a hung upstream call cannot use up the pool.
+
+    Jobs whose handler raised JobHandedOff are parked: they keep their lease,
+    renewed like running jobs, until whoever took them over completes or
+    requeues them. If that does not happen within the watchdog limit, the
+    lease is left to expire and the job is queued again.
+    """
+
+    def __init__(self, app, num_workers: Optional[int] = None, handler: Optional[Callable[[int, str], None]] = None):
+        self.app = app
+        self.num_workers = num_workers or settings.WORKER_COUNT
+        self.handler = handler or default_job_handler
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.stop_event = threading.Event()
+        self.threads: List[threading.Thread] = []
+        self.active_jobs: Dict[int, str] = {}
+        self.job_started: Dict[int, Tuple[int, float]] = {}
+        # Parked job ID -> (worker that leased it, when it was parked)
+        self.parked_jobs: Dict[int, Tuple[str, float]] = {}
+        self.reaped_workers: set = set()
+        self.active_lock = threading.Lock()
+        self.next_worker_index = 0
+
+    def start(self) -> None:
+        logger.info(f"Starting worker pool {self.worker_id} with {self.num_workers} workers")
+
+        with self.app.app_context():
+            recovered = recover_expired_leases()
+            if recovered:
+                logger.info(f"Recovered {recovered} jobs from expired leases")
+
+        for _ in range(self.num_workers):
+            self._start_worker()
+
+        maintenance = threading.Thread(target=self._maintenance_loop, name="job-maintenance", daemon=True)
+        maintenance.start()
+        self.threads.append(maintenance)
+
+    def _start_worker(self) -> None:
+        index = self.next_worker_index
+        self.next_worker_index += 1
+        thread = threading.Thread(
+            target=self._work_loop,
+            args=(f"{self.worker_id}-{index}",),
+            name=f"job-worker-{index}",
+            daemon=True
+        )
+        thread.start()
+        self.threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop leasing new jobs and wait for running jobs to finish.
+        """
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def _work_loop(self, worker_id: str) -> None:
+        while not self.stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    leased = lease_job(worker_id)
+            except Exception as e:
+                logger.error(f"Worker {worker_id} could not lease a job: {str(e)}", exc_info=True)
+                leased = None
+
+            if leased is None:
+                self.stop_event.wait(settings.JOB_POLL_INTERVAL)
+                continue
+
+            job_id, request_id, message_type = leased
+            with self.active_lock:
+                self.active_jobs[job_id] = worker_id
+                self.job_started[job_id] = (request_id, time.monotonic())
+
+            try:
+                logger.info(f"Worker {worker_id} processing job {job_id} (request {request_id})")
+                self.handler(request_id, message_type)
+                with self.app.app_context():
+                    complete_job(job_id)
+            except JobHandedOff:
+                logger.info(f"Job {job_id} handed off, keeping its lease until it is completed")
+                with self.active_lock:
+                    self.parked_jobs[job_id] = (worker_id, time.monotonic())
+            except QuotaExhaustedError as e:
+                logger.warning(f"Job {job_id} ran out of quota, queueing it again: {str(e)}")
+                with self.app.app_context():
+                    fail_job(job_id, str(e), retry_delay=e.retry_after, count_attempt=False)
+            except Exception as e:
+                logger.error(f"Job {job_id} raised an error: {str(e)}", exc_info=True)
+                with self.app.app_context():
+                    fail_job(job_id, str(e))
+            finally:
+                with self.active_lock:
+                    self.active_jobs.pop(job_id, None)
+                    self.job_started.pop(job_id, None)
+                    reaped = worker_id in self.reaped_workers
+
+            # A replacement worker took over while this one was stuck
+            if reaped:
+                logger.info(f"Worker {worker_id} exiting after its job was reaped")
+                return
+
+    def _maintenance_loop(self) -> None:
+        interval = max(1.0, settings.JOB_LEASE_SECONDS / 3)
+        while not self.stop_event.wait(interval):
+            try:
+                self._reap_runaway_jobs()
+
+                parked = self._parked_to_renew()
+                with self.active_lock:
+                    by_worker: Dict[str, List[int]] = {}
+                    for job_id, worker_id in self.active_jobs.items():
+                        by_worker.setdefault(worker_id, []).append(job_id)
+
+                with self.app.app_context():
+                    for worker_id, job_ids in by_worker.items():
+                        extend_leases(job_ids, worker_id)
+                    for worker_id, job_ids in parked.items():
+                        renewed = set(extend_leases(job_ids, worker_id))
+                        # Completed or requeued by the job that took them over
+                        with self.active_lock:
+                            for job_id in job_ids:
+                                if job_id not in renewed:
+                                    self.parked_jobs.pop(job_id, None)
+                    recover_expired_leases()
+            except Exception as e:
+                logger.error(f"Job queue maintenance failed: {str(e)}", exc_info=True)
+
+    def _parked_to_renew(self) -> Dict[str, List[int]]:
+        """
+        Parked jobs by worker, leaving out those parked for longer than the
+        watchdog allows: their leases expire and they are queued again.
+        """
+        limit = settings.REQUEST_DEADLINE_SECONDS + settings.WATCHDOG_GRACE_SECONDS
+        now = time.monotonic()
+        by_worker: Dict[str, List[int]] = {}
+        with self.active_lock:
+            for job_id, (worker_id, parked_at) in list(self.parked_jobs.items()):
+                if now - parked_at > limit:
+                    logger.warning(f"Job {job_id} was not completed within {limit:.0f}s of being handed off, letting its lease expire")
+                    del self.parked_jobs[job_id]
+                else:
+                    by_worker.setdefault(worker_id, []).append(job_id)
+        return by_worker
+
+    def _reap_runaway_jobs(self) -> None:
+        limit = settings.REQUEST_DEADLINE_SECONDS + settings.WATCHDOG_GRACE_SECONDS
+        now = time.monotonic()
+        with self.active_lock:
+            runaway = [
+                (job_id, request_id, self.active_jobs[job_id])
+                for job_id, (request_id, started) in self.job_started.items()
+                if now - started > limit
+            ]
+            for job_id, _, worker_id in runaway:
+                # Stop renewing the lease and retire the stuck worker
+                self.active_jobs.pop(job_id, None)
+                self.job_started.pop(job_id, None)
+                self.reaped_workers.add(worker_id)
+
+        for job_id, request_id, worker_id in runaway:
+            reason = f"Job ran for more than {limit:.0f}s and was stopped by the watchdog"
+            cancel_request(request_id, reason)
+            with self.app.app_context():
+                reap_job(job_id, request_id, reason)
+            if not self.stop_event.is_set():
+                self._start_worker()
+
+    def run_forever(self) -> None:
+        """
+        Start the pool and block until stop() is called.
+        """
+        self.start()
+        try:
+            while not self.stop_event.wait(1.0):
+                pass
+        finally:
+            self.stop()
+
+
+_embedded_pool: Optional[WorkerPool] = None
+_embedded_pool_lock = threading.Lock()
+
+
+def start_embedded_workers(app) -> Optional[WorkerPool]:
+    """
+    Start the worker pool inside the web process, unless EMBEDDED_WORKERS is
+    disabled because workers run separately (see worker.py).
+    """
+    global _embedded_pool
+    if not settings.EMBEDDED_WORKERS:
+        return None
+
+    with _embedded_pool_lock:
+        if _embedded_pool is None:
+            _embedded_pool = WorkerPool(app)
+            _embedded_pool.start()
+        return _embedded_pool
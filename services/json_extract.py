@@ -0,0 +1,481 @@
+import re
+import json
+import logging
+from typing import Any, Iterator, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Markdown code fences around model output, e.g. ```json ... ```
+_CODE_FENCE = re.compile(r"```[a-zA-Z]*[ \t]*\n?|```")
+
+# Characters that matter while scanning outside of a string
+_STRUCTURAL = re.compile(r"[{}\[\]\"']")
+
+# Rest of a double- or single-quoted string after its opening quote,
+# written as an unrolled loop so the regex engine does not backtrack
+_STRING_REST = {
+    '"': re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL),
+    "'": re.compile(r"[^'\\]*(?:\\.[^'\\]*)*'", re.DOTALL),
+}
+
+# Cheap checks for whether repair() has anything to rewrite
+_NEEDS_TOKEN_REPAIR = re.compile(r"'|//|/\*|\bTrue\b|\bFalse\b|\bNone\b")
+_HAS_TRAILING_COMMA = re.compile(r",\s*[}\]]")
+
+# Tokens rewritten by repair(): strings, comments and Python literals
+_REPAIR_TOKEN = re.compile(
+    r'"[^"\\]*(?:\\.[^"\\]*)*"'
+    r"|'[^'\\]*(?:\\.[^'\\]*)*'"
+    r"|//[^\n]*"
+    r"|/\*.*?\*/"
+    r"|\bTrue\b|\bFalse\b|\bNone\b",
+    re.DOTALL
+)
+
+# Trailing commas, skipping over strings so commas inside them are kept.
+# Substituting r"\1\2" keeps strings and drops the comma.
+_TRAILING_COMMA = re.compile(r'("[^"\\]*(?:\\.[^"\\]*)*")|,(\s*[}\]])', re.DOTALL)
+
+# A key with no value at the very end of a truncated object
+_DANGLING_KEY = re.compile(r'([{,])\s*(?:"[^"\\]*(?:\\.[^"\\]*)*"|\'[^\'\\]*(?:\\.[^\'\\]*)*\')\s*$')
+
+_CLOSERS = {"{": "}", "[": "]"}
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+# Maximum number of local fixes tried before falling back to a full repair
+MAX_POINT_FIXES = 16
+
+
+def strip_code_fences(text: str) -> str:
+    """
+    Remove markdown code fences, keeping the text between them.
+    """
+    if "```" not in text:
+        return text
+    return _CODE_FENCE.sub("", text)
+
+
+def resume_scan(text: str, position: int, stack: List[str]) -> Tuple[Optional[int], List[str], int]:
+    """
+    Continue scanning a JSON object or array whose brackets in stack are
+    still open, from text[position] on. Strings are skipped with
+    precompiled searches, so the scan is a single linear pass that only
+    visits structural characters.
+
+    Args:
+        text: The text to scan
+        position: Where to continue
+        stack: Brackets open at position; updated in place
+
+    Returns:
+        Tuple of (end index just past the closing bracket or None if the value
+        is unterminated, stack of brackets still open, position to resume the
+        scan at once more text has arrived)
+    """
+    length = len(text)
+
+    while position < length:
+        match = _STRUCTURAL.search(text, position)
+        if match is None:
+            break
+        char = match.group()
+        position = match.end()
+
+        if char == '"' or char == "'":
+            # Skip to the closing quote, stepping over escapes
+            string_match = _STRING_REST[char].match(text, position)
+            if string_match is None:
+                # Rescan the string from its opening quote next time
+                return None, stack, match.start()
+            position = string_match.end()
+        elif char in "{[":
+            stack.append(char)
+        else:
+            stack.pop()
+            if not stack:
+                return position, stack, position
+
+    return None, stack, length
+
+
+def scan_value(text: str, start: int) -> Tuple[Optional[int], List[str]]:
+    """
+    Find the end of the JSON object or array that opens at text[start].
+
+    Args:
+        text: The text to scan
+        start: Index of the opening brace or bracket
+
+    Returns:
+        Tuple of (end index just past the closing bracket or None if the value
+        is unterminated, stack of brackets still open at the end of the text,
+        ending with the quote of an unterminated string)
+    """
+    end, stack, position = resume_scan(text, start + 1, [text[start]])
+    if end is None and position < len(text):
+        stack.append(text[position])
+    return end, stack
+
+
+def find_json_spans(text: str, openers: str = "{[") -> Iterator[Tuple[int, Optional[int]]]:
+    """
+    Yield the spans of the top-level JSON values in text, in order. A value
+    that is still open at the end of the text (a truncated response) is
+    yielded with an end of None and ends the scan.
+
+    Args:
+        text: The text to scan
+        openers: Which values to look for: "{" for objects, "[" for arrays
+    """
+    opener_pattern = re.compile("[" + re.escape(openers) + "]")
+    position = 0
+    while True:
+        match = opener_pattern.search(text, position)
+        if match is None:
+            return
+        start = match.start()
+        end, _ = scan_value(text, start)
+        yield start, end
+        if end is None:
+            return
+        position = end
+
+
+def _repair_token(match: "re.Match") -> str:
+    token = match.group()
+    if token.startswith("//") or token.startswith("/*"):
+        return ""
+    if token in _PYTHON_LITERALS:
+        return _PYTHON_LITERALS[token]
+    if token.startswith("'"):
+        inner = token[1:-1].replace("\\'", "'").replace('"', '\\"')
+        return '"' + inner + '"'
+    return token
+
+
+def _close_truncated(fragment: str) -> str:
+    """
+    Close a value that was cut off mid-way: finish an open string, drop a
+    dangling comma or key, and add the missing closing brackets.
+    """
+    _, stack = scan_value(fragment, 0)
+    if stack and stack[-1] in "\"'":
+        fragment += stack.pop()
+
+    fragment = fragment.rstrip()
+    if stack and stack[-1] == "{":
+        dangling = _DANGLING_KEY.search(fragment)
+        if dangling:
+            fragment = fragment[:dangling.start() + 1]
+    if fragment.endswith(","):
+        fragment = fragment[:-1]
+    elif fragment.endswith(":"):
+        fragment += " null"
+
+    # Start a new line in case the text was cut off inside a // comment
+    return fragment + "\n" + "".join(_CLOSERS[bracket] for bracket in reversed(stack))
+
+
+def repair(fragment: str, truncated: bool = False) -> str:
+    """
+    Fix the mistakes models commonly make in JSON: comments, single-quoted
+    strings, Python literals, trailing commas and (when truncated is set)
+    missing closing brackets.
+    """
+    if truncated:
+        fragment = _close_truncated(fragment)
+    if _NEEDS_TOKEN_REPAIR.search(fragment):
+        fragment = _REPAIR_TOKEN.sub(_repair_token, fragment)
+    if _HAS_TRAILING_COMMA.search(fragment):
+        fragment = _TRAILING_COMMA.sub(r"\1\2", fragment)
+    return fragment
+
+
+def _fix_at_error(text: str, error: json.JSONDecodeError) -> Optional[str]:
+    """
+    Fix the mistake at the position json.loads stopped at, if it is one that
+    can be fixed locally (a trailing comma, a comment or a Python literal).
+    This avoids rewriting the whole text when a long response has one or two
+    small mistakes.
+    """
+    position = error.pos
+    if position >= len(text):
+        return None
+
+    if text[position] in "}]":
+        comma = len(text[:position].rstrip()) - 1
+        if comma >= 0 and text[comma] == ",":
+            return text[:comma] + text[comma + 1:]
+    elif text.startswith("//", position):
+        line_end = text.find("\n", position)
+        return text[:position] + (text[line_end:] if line_end >= 0 else "")
+    elif text.startswith("/*", position):
+        comment_end = text.find("*/", position)
+        if comment_end >= 0:
+            return text[:position] + text[comment_end + 2:]
+    else:
+        for literal, replacement in _PYTHON_LITERALS.items():
+            if text.startswith(literal, position):
+                return text[:position] + replacement + text[position + len(literal):]
+    return None
+
+
+def _loads_with_point_fixes(text: str) -> Any:
+    """
+    json.loads, fixing small mistakes one at a time at the reported error.
+
+    Raises:
+        ValueError: If the text has other mistakes or too many of them
+    """
+    for _ in range(MAX_POINT_FIXES):
+        try:
+            return json.loads(text, strict=False)
+        except json.JSONDecodeError as e:
+            fixed = _fix_at_error(text, e)
+            if fixed is None:
+                raise
+            text = fixed
+    return json.loads(text, strict=False)
+
+
+def loads_tolerant(fragment: str, truncated: bool = False) -> Any:
+    """
+    Parse a JSON fragment, repairing it if it does not parse as-is.
+
+    Raises:
+        ValueError: If the fragment cannot be parsed even after repair
+    """
+    if not truncated:
+        try:
+            return _loads_with_point_fixes(fragment)
+        except ValueError:
+            pass
+    return json.loads(repair(fragment, truncated), strict=False)
+
+
+def extract_json(text: str, expect: Optional[type] = None) -> Any:
+    """
+    Extract the first JSON value from a model response. Handles code fences,
+    surrounding prose, trailing commas, comments, single quotes and responses
+    that were cut off.
+
+    Args:
+        text: The raw model response
+        expect: dict or list to only accept objects or arrays
+
+    Returns:
+        The parsed value, or None if no JSON value could be extracted
+    """
+    if not text:
+        return None
+    accepted = expect or (dict, list)
+
+    # Most responses are plain JSON: parse them as they are, without copying
+    try:
+        value = json.loads(text)
+        if isinstance(value, accepted):
+            return value
+    except ValueError:
+        pass
+
+    # Nearly well-formed responses: if everything from the first opening to
+    # the last closing bracket parses, it is the first value. Code fences and
+    # prose around the value fall outside that span, so they need no stripping.
+    openers = "{" if expect is dict else "[" if expect is list else "{["
+    start = min((i for i in (text.find(o) for o in openers) if i >= 0), default=-1)
+    if start < 0:
+        return None
+    end = text.rfind(_CLOSERS[text[start]]) + 1
+    if end > start:
+        try:
+            value = _loads_with_point_fixes(text[start:end])
+            if isinstance(value, accepted):
+                return value
+        except ValueError:
+            pass
+
+    # Otherwise scan for balanced values
+    text = strip_code_fences(text)
+    for start, end in find_json_spans(text, openers):
+        fragment = text[start:end] if end is not None else text[start:]
+        try:
+            value = loads_tolerant(fragment, truncated=end is None)
+        except ValueError:
+            continue
+        if isinstance(value, accepted):
+            return value
+    return None
+
+
+def extract_objects(text: str, after: Optional[str] = None) -> List[dict]:
+    """
+    Extract every top-level JSON object from text, optionally only those
+    after a marker such as '"scenes"'. Used to salvage list items when the
+    enclosing value cannot be parsed.
+    """
+    text = strip_code_fences(text)
+    if after is not None:
+        index = text.find(after)
+        if index < 0:
+            return []
+        # Skip the marker's own bracket so the list items become top-level
+        bracket = text.find("[", index)
+        text = text[bracket + 1:] if bracket >= 0 else text[index + len(after):]
+
+    objects = []
+    for start, end in find_json_spans(text, "{"):
+        fragment = text[start:end] if end is not None else text[start:]
+        try:
+            value = loads_tolerant(fragment, truncated=end is None)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            objects.append(value)
+    return objects
+
+
+class StreamingJSONParser:
+    """
+    Incremental parser for a JSON object that arrives in chunks, such as a
+    streamed model response. Reports the value of selected string fields and
+    each object of selected array fields as soon as it is complete, without
+    waiting for the rest of the response. Each scan resumes where the
+    previous chunk left off, so a long stream is scanned once.
+
+    Example:
+        parser = StreamingJSONParser(strings=["script"], arrays=["scenes"])
+        for chunk in chunks:
+            for field, value in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self, strings: Optional[List[str]] = None, arrays: Optional[List[str]] = None):
+        self.buffer = ""
+        # field -> pattern finding the start of its value
+        self.pending_strings = {name: self._key_pattern(name, '"') for name in (strings or [])}
+        self.pending_arrays = {name: self._key_pattern(name, r"\[") for name in (arrays or [])}
+        # field -> position in the buffer to continue looking for its key at
+        self.search_positions: dict = {}
+        # field -> (start of its string value, position to continue looking for the closing quote at)
+        self.open_strings: dict = {}
+        # field -> position in the buffer where the next array item may start
+        self.array_positions: dict = {}
+        # field -> (start, open brackets, scan position) of an array item that is not complete yet
+        self.open_items: dict = {}
+        self.closed_arrays: set = set()
+
+    @staticmethod
+    def _key_pattern(name: str, opener: str) -> Tuple["re.Pattern", "re.Pattern"]:
+        """
+        The pattern finding a key and the opening of its value, and the
+        pattern of everything that may precede the value at the end of the
+        buffer while the rest has not arrived yet.
+        """
+        key = r'(?<!\\)"' + re.escape(name) + r'"'
+        return re.compile(key + r"\s*:\s*" + opener), re.compile(key + r"\s*(?::\s*)?")
+
+    def _find_key(self, name: str, patterns: Tuple["re.Pattern", "re.Pattern"]) -> Optional["re.Match"]:
+        """
+        Search the buffer for a key from where the previous search left off.
+        """
+        pattern, prefix = patterns
+        position = self.search_positions.get(name, 0)
+        match = pattern.search(self.buffer, position)
+        if match is None:
+            # Only a key at the very end of the buffer can still turn into a
+            # match; everything before it never needs to be searched again
+            key = self.buffer.rfind(f'"{name}"', position)
+            if key >= 0 and prefix.fullmatch(self.buffer, key):
+                self.search_positions[name] = key
+            else:
+                self.search_positions[name] = max(position, len(self.buffer) - len(name) - 2)
+        return match
+
+    def _string_end(self, name: str) -> Optional[int]:
+        """
+        Index just past the closing quote of a string field, or None if it
+        has not arrived yet.
+        """
+        value_start, position = self.open_strings[name]
+        while True:
+            quote = self.buffer.find('"', position)
+            if quote < 0:
+                self.open_strings[name] = (value_start, len(self.buffer))
+                return None
+            # A quote after an odd number of backslashes is escaped
+            escape = quote
+            while escape > value_start and self.buffer[escape - 1] == "\\":
+                escape -= 1
+            if (quote - escape) % 2 == 0:
+                return quote + 1
+            position = quote + 1
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Add a chunk of text and return the (field, value) pairs completed by it.
+        Array items are returned one by one under their array's field name.
+        """
+        # Appending to a string nothing else refers to grows it in place,
+        # instead of copying the whole response for every chunk
+        buffer, self.buffer = self.buffer, ""
+        buffer += chunk
+        self.buffer = buffer
+        completed = []
+
+        for name in list(self.pending_strings):
+            if name not in self.open_strings:
+                match = self._find_key(name, self.pending_strings[name])
+                if match is None:
+                    continue
+                self.open_strings[name] = (match.end(), match.end())
+            string_end = self._string_end(name)
+            if string_end is None:
+                continue
+            try:
+                completed.append((name, json.loads('"' + self.buffer[self.open_strings[name][0]:string_end], strict=False)))
+            except ValueError:
+                logger.debug(f"Could not decode streamed field '{name}'")
+            del self.pending_strings[name]
+            del self.open_strings[name]
+
+        for name in list(self.pending_arrays):
+            match = self._find_key(name, self.pending_arrays[name])
+            if match is not None:
+                self.array_positions[name] = match.end()
+                del self.pending_arrays[name]
+
+        for name, position in self.array_positions.items():
+            if name in self.closed_arrays:
+                continue
+            while True:
+                item = self.open_items.pop(name, None)
+                if item is None:
+                    # Skip separators up to the next item or the end of the array
+                    item_start = position
+                    length = len(self.buffer)
+                    while item_start < length and self.buffer[item_start] in " \t\r\n,":
+                        item_start += 1
+                    if item_start >= length:
+                        break
+                    if self.buffer[item_start] != "{":
+                        self.closed_arrays.add(name)
+                        break
+                    item = (item_start, ["{"], item_start + 1)
+                item_start, stack, scan_position = item
+                item_end, stack, scan_position = resume_scan(self.buffer, scan_position, stack)
+                if item_end is None:
+                    self.open_items[name] = (item_start, stack, scan_position)
+                    break
+                try:
+                    completed.append((name, loads_tolerant(self.buffer[item_start:item_end])))
+                except ValueError:
+                    logger.debug(f"Could not decode streamed item of '{name}'")
+                position = item_end
+            self.array_positions[name] = position
+
+        return completed
+
+    @property
+    def text(self) -> str:
+        return self.buffer
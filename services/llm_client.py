@@ -0,0 +1,95 @@
+import os
+import logging
+import threading
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+from requests.adapters import HTTPAdapter
+from typing import Any, Dict, Optional
+
+from config import settings, parse_options
+from services.providers import get_provider
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Get Gemini API key from environment variables
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+
+# Models shared by every worker thread, keyed by model name.
+# GenerativeModel keeps no per-call state, so one instance can serve
+# concurrent generate_content calls.
+_models: Dict[str, Any] = {}
+_models_lock = threading.Lock()
+_client_ready = False
+
+
+def _configure_client() -> None:
+    """
+    Configure the Gemini SDK and create its generative client once, so that
+    all models share one transport. Must be called with _models_lock held.
+    """
+    global _client_ready
+    if _client_ready:
+        return
+    _client_ready = True
+
+    if not GEMINI_API_KEY:
+        return
+
+    genai.configure(api_key=GEMINI_API_KEY, transport=settings.GEMINI_TRANSPORT)
+    try:
+        # The SDK caches this client but does not lock its creation, so
+        # create it here before worker threads start asking for it
+        generative_client = genai_client.get_default_generative_client()
+    except Exception as e:
+        logger.warning(f"Could not create the Gemini client up front: {str(e)}")
+        return
+
+    # The REST transport uses a requests session; size its keep-alive pool
+    # for the number of threads calling Gemini at once
+    session = getattr(getattr(generative_client, "_transport", None), "_session", None)
+    if session is not None:
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.GEMINI_POOL_SIZE)
+        session.mount("https://", adapter)
+        logger.info(f"Gemini REST transport using a pool of {settings.GEMINI_POOL_SIZE} connections")
+
+
+def get_model(model_name: Optional[str] = None) -> Any:
+    """
+    Return the shared GenerativeModel for the given model name, creating it
+    and the underlying client on first use.
+
+    Args:
+        model_name: The Gemini model to use, GEMINI_MODEL_NAME by default
+
+    Returns:
+        A GenerativeModel configured with GEMINI_GENERATION_CONFIG, or the
+        configured LLM provider's equivalent
+    """
+    model_name = model_name or settings.GEMINI_MODEL_NAME
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        model = _models.get(model_name)
+        if model is None:
+            provider = get_provider("llm")
+            if provider is not None:
+                model = provider.get_model(model_name)
+                _models[model_name] = model
+                return model
+            _configure_client()
+            generation_config = parse_options(settings.GEMINI_GENERATION_CONFIG)
+            model = genai.GenerativeModel(model_name, generation_config=generation_config or None)
+            _models[model_name] = model
+            logger.info(f"Created Gemini model {model_name}")
+        return model
+
+
+def reset_models() -> None:
+    """
+    Drop the shared models, e.g. after changing settings or in benchmarks.
+    """
+    with _models_lock:
+        _models.clear()
@@ -0,0 +1,256 @@
+import os
+import re
+import json
+import shutil
+import logging
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import requests
+
+from config import settings
+from services.deadline import call_timeout
+from services.metrics import register, instrumented, Counter
+from services.providers import TTSProvider, ProviderError, register_provider
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+FAILOVERS = register(Counter(
+    "tapbuddy_tts_failovers_total",
+    "Chunks synthesized locally because ElevenLabs was rate limited or unavailable"
+))
+
+_WORD_RE = re.compile(r"\w+|[.!?;:,]")
+
+# Synthesis runs in worker processes; engines are CPU bound
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_local_provider: Optional["LocalTTSProvider"] = None
+
+
+def resolve_engine() -> Optional[str]:
+    """
+    The local engine to use: LOCAL_TTS_ENGINE, or with "auto" the first
+    installed speech engine. None if the engine is not installed.
+    """
+    engine = settings.LOCAL_TTS_ENGINE
+    espeak = shutil.which(settings.LOCAL_TTS_ESPEAK_PATH) is not None
+    piper = shutil.which(settings.LOCAL_TTS_PIPER_PATH) is not None and os.path.exists(settings.LOCAL_TTS_PIPER_MODEL)
+    if engine == "auto":
+        return "espeak-ng" if espeak else "piper" if piper else None
+    if engine == "espeak-ng":
+        return engine if espeak else None
+    if engine == "piper":
+        return engine if piper else None
+    return engine if engine == "tone" else None
+
+
+def is_available() -> bool:
+    """
+    Whether speech can be synthesized locally: an engine is installed and
+    ffmpeg is there to encode its output.
+    """
+    return (
+        settings.LOCAL_TTS_ENABLED
+        and resolve_engine() is not None
+        and shutil.which(settings.FFMPEG_PATH) is not None
+    )
+
+
+def output_format() -> Tuple[int, int]:
+    """
+    Sample rate and bitrate of TTS_OUTPUT_FORMAT (e.g. mp3_44100_128), so
+    that local audio joins and times like ElevenLabs audio.
+    """
+    try:
+        _, sample_rate, kbps = settings.TTS_OUTPUT_FORMAT.split("_")
+        return int(sample_rate), int(kbps) * 1000
+    except ValueError:
+        return 44100, 128000
+
+
+def engine_options(engine: str) -> Dict[str, Any]:
+    """
+    Settings a worker process needs, resolved in the calling process.
+    """
+    sample_rate, bitrate = output_format()
+    return {
+        "engine": engine,
+        "ffmpeg": shutil.which(settings.FFMPEG_PATH),
+        "espeak": shutil.which(settings.LOCAL_TTS_ESPEAK_PATH),
+        "piper": shutil.which(settings.LOCAL_TTS_PIPER_PATH),
+        "piper_model": settings.LOCAL_TTS_PIPER_MODEL,
+        "voice": settings.LOCAL_TTS_VOICE,
+        "words_per_minute": settings.LOCAL_TTS_WORDS_PER_MINUTE,
+        "sample_rate": sample_rate,
+        "bitrate": bitrate,
+    }
+
+
+def _tone_pcm(text: str, words_per_minute: int, sample_rate: int = 22050) -> bytes:
+    """
+    Speech-like audio without a speech engine: one voiced burst per
+    syllable with a falling pitch, and pauses at punctuation. The length
+    matches what the text would take to say.
+    """
+    word_seconds = 60.0 / max(60, words_per_minute)
+    pieces = []
+    for token in _WORD_RE.findall(text):
+        if not token[0].isalnum():
+            pieces.append(np.zeros(int(sample_rate * word_seconds * (0.8 if token in ".!?" else 0.3)), dtype=np.float32))
+            continue
+        syllables = max(1, len(re.findall(r"[aeiouy]+", token.lower())))
+        length = int(sample_rate * word_seconds * (0.6 + 0.25 * syllables) / 1.1)
+        t = np.arange(length, dtype=np.float32) / sample_rate
+        progress = t / max(float(t[-1]), 1e-3)
+        pitch = 140.0 - 25.0 * progress + 10.0 * (len(token) % 5)
+        phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+        voice = np.sin(phase) + 0.5 * np.sin(2 * phase) + 0.25 * np.sin(3 * phase)
+        envelope = np.abs(np.sin(np.pi * syllables * progress))
+        pieces.append((voice * envelope).astype(np.float32))
+        pieces.append(np.zeros(int(sample_rate * word_seconds * 0.1), dtype=np.float32))
+    audio = np.concatenate(pieces) if pieces else np.zeros(sample_rate // 2, dtype=np.float32)
+    return (audio * 8000).astype("<i2").tobytes()
+
+
+def _engine_audio(text: str, options: Dict[str, Any], timeout: float) -> Tuple[bytes, list]:
+    """
+    Run the engine. Returns the audio and the ffmpeg arguments describing it.
+    """
+    engine = options["engine"]
+    if engine == "espeak-ng":
+        result = subprocess.run(
+            [options["espeak"], "-v", options["voice"], "-s", str(options["words_per_minute"]), "--stdin", "--stdout"],
+            input=text.encode("utf-8"), capture_output=True, timeout=timeout
+        )
+        if result.returncode != 0:
+            raise ProviderError(f"espeak-ng failed: {result.stderr.decode(errors='replace')[-300:]}")
+        return result.stdout, ["-f", "wav"]
+    if engine == "piper":
+        sample_rate = 22050
+        try:
+            with open(f"{options['piper_model']}.json") as f:
+                sample_rate = json.load(f)["audio"]["sample_rate"]
+        except (OSError, KeyError, ValueError):
+            pass
+        result = subprocess.run(
+            [options["piper"], "--model", options["piper_model"], "--output-raw"],
+            input=text.encode("utf-8"), capture_output=True, timeout=timeout
+        )
+        if result.returncode != 0:
+            raise ProviderError(f"piper failed: {result.stderr.decode(errors='replace')[-300:]}")
+        return result.stdout, ["-f", "s16le", "-ar", str(sample_rate), "-ac", "1"]
+    return _tone_pcm(text, options["words_per_minute"]), ["-f", "s16le", "-ar", "22050", "-ac", "1"]
+
+
+def synthesize_in_worker(text: str, output_path: str, options: Dict[str, Any], timeout: float) -> str:
+    """
+    Synthesize text and encode it as constant-bitrate MP3 without tags, so
+    that chunks can be joined frame by frame. Runs in a pool process.
+    """
+    audio, input_args = _engine_audio(text, options, timeout)
+    temp_path = f"{output_path}.local.tmp"
+    result = subprocess.run(
+        [options["ffmpeg"], "-hide_banner", "-loglevel", "error", "-y"] + input_args + [
+            "-i", "-", "-ar", str(options["sample_rate"]), "-ac", "1",
+            "-c:a", "libmp3lame", "-b:a", str(options["bitrate"]),
+            "-write_xing", "0", "-id3v2_version", "0", "-f", "mp3", temp_path
+        ],
+        input=audio, capture_output=True, timeout=timeout
+    )
+    if result.returncode != 0:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise ProviderError(f"ffmpeg could not encode local speech: {result.stderr.decode(errors='replace')[-300:]}")
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: the web process has threads and open connections
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.LOCAL_TTS_WORKERS or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+class LocalTTSProvider(TTSProvider):
+    """
+    Speaks with a local engine (espeak-ng or piper) in a process pool, for
+    running the pipeline offline and as the failover when ElevenLabs is
+    rate limited. Select it with TTS_PROVIDER=local.
+    """
+
+    def voice_parameters(self) -> Dict[str, Any]:
+        """
+        Everything besides the text that determines the audio, for the audio cache.
+        """
+        options = engine_options(resolve_engine())
+        return {
+            "provider": "local",
+            "engine": options["engine"],
+            "voice": options["piper_model"] if options["engine"] == "piper" else options["voice"],
+            "words_per_minute": options["words_per_minute"],
+            "output_format": settings.TTS_OUTPUT_FORMAT,
+        }
+
+    @instrumented("local_tts")
+    def synthesize(self, text: str, output_path: str) -> str:
+        engine = resolve_engine()
+        if engine is None or shutil.which(settings.FFMPEG_PATH) is None:
+            raise ProviderError(f"Local TTS engine '{settings.LOCAL_TTS_ENGINE}' or ffmpeg is not installed")
+        timeout = call_timeout(settings.LOCAL_TTS_TIMEOUT, "local_tts")
+        try:
+            future = get_pool().submit(synthesize_in_worker, text, output_path, engine_options(engine), timeout)
+            return future.result(timeout=timeout + 5)
+        except FutureTimeoutError:
+            future.cancel()
+            raise ProviderError(f"Local TTS took longer than {timeout:.0f}s")
+        except subprocess.TimeoutExpired as e:
+            raise ProviderError(f"Local TTS engine timed out: {str(e)}")
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool next time
+            _reset_pool()
+            raise ProviderError("Local TTS worker process died")
+
+
+def get_local_provider() -> LocalTTSProvider:
+    global _local_provider
+    with _pool_lock:
+        if _local_provider is None:
+            _local_provider = LocalTTSProvider()
+        return _local_provider
+
+
+def should_fail_over(error: Exception) -> bool:
+    """
+    Whether an ElevenLabs error is worth retrying locally: rate limiting,
+    server errors and network failures, not rejected requests.
+    """
+    if not settings.LOCAL_TTS_FAILOVER or not is_available():
+        return False
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else 0
+        return status == 429 or status >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+register_provider("tts", "local", LocalTTSProvider)
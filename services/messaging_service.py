@@ -3,10 +3,13 @@ from typing import Dict, Any, Tuple, Optional, Literal
 
 from services.whatsapp_service import send_whatsapp_message, handle_whatsapp_webhook, validate_phone_number
 from services.sms_service import send_sms_message, handle_sms_webhook
+from services.metrics import instrumented, record_error
+from services.providers import get_provider
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+@instrumented("send_message")
 def send_message(
     to_phone_number: str, 
     message: str, 
@@ -32,15 +35,23 @@ def send_message(
     is_valid, result = validate_phone_number(to_phone_number)
     if not is_valid:
         logger.error(f"Invalid phone number: {result}")
+        record_error("send_message")
         return False
     
     validated_phone = result
     
     # Use the appropriate service based on message type
-    if normalized_type == "whatsapp":
-        return send_whatsapp_message(validated_phone, message)
+    provider = get_provider("messaging")
+    if provider is not None:
+        sent = provider.send(validated_phone, message, normalized_type)
+    elif normalized_type == "whatsapp":
+        sent = send_whatsapp_message(validated_phone, message)
     else:  # Default to SMS
-        return send_sms_message(validated_phone, message)
+        sent = send_sms_message(validated_phone, message)
+    
+    if not sent:
+        record_error("send_message")
+    return sent
 
 def handle_message_webhook(webhook_data: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], str]:
     """
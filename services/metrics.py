@@ -0,0 +1,257 @@
+import time
+import logging
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, covering fast cache hits up to slow video renders
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Timings of the request currently being processed, shared by every thread
+# that runs work for that request (see collect_request_timings)
+_request_timings: contextvars.ContextVar[Optional[Dict[str, Dict[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+# Stages of one request can record timings from several threads at once
+_request_timings_lock = threading.Lock()
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values: Dict[LabelValues, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values: Dict[LabelValues, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values: str, value: float) -> None:
+        with self.lock:
+            self.values[label_values] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (bucket counts, sum, count)
+        self.values: Dict[LabelValues, List[Any]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, *label_values: str, value: float) -> None:
+        with self.lock:
+            entry = self.values.get(label_values)
+            if entry is None:
+                entry = [[0] * len(self.buckets), 0.0, 0]
+                self.values[label_values] = entry
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_values, (bucket_counts, total, count) in sorted(self.values.items()):
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+OPERATION_DURATION = Histogram(
+    "tapbuddy_operation_duration_seconds",
+    "Latency of external calls and pipeline operations",
+    ("operation",)
+)
+OPERATION_ERRORS = Counter(
+    "tapbuddy_operation_errors_total",
+    "Number of operations that raised an error",
+    ("operation",)
+)
+OPERATION_IN_FLIGHT = Gauge(
+    "tapbuddy_operation_in_flight",
+    "Number of operations currently running",
+    ("operation",)
+)
+
+_metrics: List[Any] = [OPERATION_DURATION, OPERATION_ERRORS, OPERATION_IN_FLIGHT]
+_collectors: List[Callable[[], List[str]]] = []
+_registry_lock = threading.Lock()
+
+
+def register(metric: Any) -> Any:
+    """
+    Add a Counter, Gauge or Histogram to the /metrics output.
+    """
+    with _registry_lock:
+        _metrics.append(metric)
+    return metric
+
+
+def register_collector(collector: Callable[[], List[str]]) -> None:
+    """
+    Add a callable that returns extra Prometheus text lines, computed when
+    /metrics is scraped (for example queue depths).
+    """
+    with _registry_lock:
+        _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    """
+    Render every registered metric in the Prometheus text exposition format.
+    """
+    with _registry_lock:
+        metrics = list(_metrics)
+        collectors = list(_collectors)
+
+    lines: List[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    for collector in collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            logger.warning(f"Metrics collector failed: {str(e)}")
+    return "\n".join(lines) + "\n"
+
+
+def _record_request_timing(operation: str, elapsed: float, failed: bool) -> None:
+    timings = _request_timings.get()
+    if timings is None:
+        return
+    with _request_timings_lock:
+        entry = timings.setdefault(operation, {"seconds": 0.0, "calls": 0, "errors": 0})
+        entry["seconds"] = round(entry["seconds"] + elapsed, 4)
+        entry["calls"] += 1
+        if failed:
+            entry["errors"] += 1
+
+
+@contextmanager
+def track(operation: str):
+    """
+    Time a block of code, recording its latency, errors and in-flight count
+    under the given operation name, and adding it to the current request's
+    timings if there is one.
+    """
+    OPERATION_IN_FLIGHT.inc(operation)
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        OPERATION_ERRORS.inc(operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        OPERATION_IN_FLIGHT.dec(operation)
+        OPERATION_DURATION.observe(operation, value=elapsed)
+        _record_request_timing(operation, elapsed, failed)
+
+
+def instrumented(operation: str) -> Callable:
+    """
+    Decorator version of track().
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe(operation: str, seconds: float) -> None:
+    """
+    Record a duration measured elsewhere, such as the time a job spent
+    waiting in a queue.
+    """
+    OPERATION_DURATION.observe(operation, value=seconds)
+    _record_request_timing(operation, seconds, False)
+
+
+def record_error(operation: str) -> None:
+    """
+    Count an operation failure that was handled without raising, such as an
+    API error that falls back to placeholder output.
+    """
+    OPERATION_ERRORS.inc(operation)
+    timings = _request_timings.get()
+    if timings is not None:
+        with _request_timings_lock:
+            entry = timings.setdefault(operation, {"seconds": 0.0, "calls": 0, "errors": 0})
+            entry["errors"] += 1
+
+
+@contextmanager
+def collect_request_timings(timings: Dict[str, Dict[str, float]]):
+    """
+    Record the timings of every tracked operation run inside the block
+    (including work submitted to other threads with contextvars.copy_context().run)
+    into the given dict.
+    """
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
@@ -0,0 +1,229 @@
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Callable, List, Optional
+
+from config import settings, parse_options
+from services.metrics import track, observe, collect_request_timings
+from services.deadline import deadline_scope
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Pipeline stages, in order, whose worker counts can be configured
+PIPELINE_STAGES = ["content", "speech", "video", "upload"]
+
+# Window used to compute recent throughput
+THROUGHPUT_WINDOW_SECONDS = 60
+
+
+def parse_stage_concurrency(value: str) -> Dict[str, int]:
+    """
+    Parse a stage concurrency setting such as "content=4,speech=2".
+
+    Args:
+        value: Comma-separated list of stage=workers pairs
+
+    Returns:
+        Dictionary of stage name to number of workers
+    """
+    limits = {}
+    for stage, limit in parse_options(value).items():
+        if stage not in PIPELINE_STAGES:
+            logger.warning(f"Ignoring concurrency limit for unknown stage '{stage}'")
+            continue
+        limits[stage] = max(1, int(limit))
+    return limits
+
+
+class PipelineJob:
+    """
+    A unit of work travelling through the pipeline. Stages read and write
+    values in the shared context dictionary.
+    """
+
+    def __init__(self, context: Dict[str, Any]):
+        self.context = context
+        self.error: Optional[BaseException] = None
+        self.failed_stage: Optional[str] = None
+        self.done = threading.Event()
+        self.queued_at = time.perf_counter()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done.wait(timeout)
+
+
+class PipelineStage:
+    """
+    One pipeline stage: a bounded input queue drained by a fixed number of
+    worker threads. Finished jobs are handed to the next stage, which blocks
+    the worker when the next queue is full.
+    """
+
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], None], workers: int, queue_size: int):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue: "queue.Queue[PipelineJob]" = queue.Queue(maxsize=queue_size)
+        self.next_stage: Optional["PipelineStage"] = None
+        self.on_failure: Optional[Callable[[Dict[str, Any]], None]] = None
+        self.threads: List[threading.Thread] = []
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.processed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.started_at = time.time()
+        self.recent_completions: deque = deque()
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"pipeline-{self.name}-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _run(self) -> None:
+        while True:
+            job = self.queue.get()
+            with self.lock:
+                self.in_flight += 1
+            start = time.perf_counter()
+
+            try:
+                # Operations tracked while this stage runs are added to the
+                # request's timings, which are saved with the request
+                deadline = job.context.get("deadline")
+                with collect_request_timings(job.context.setdefault("timings", {})), deadline_scope(deadline):
+                    observe(f"queue_wait_{self.name}", start - job.queued_at)
+                    # Skip the stage for requests that ran out of time while queued,
+                    # and stop those that ran out of time inside it
+                    if deadline is not None:
+                        deadline.check(f"{self.name} stage")
+                    with track(f"stage_{self.name}"):
+                        self.func(job.context)
+                    if deadline is not None:
+                        deadline.check(f"{self.name} stage")
+                succeeded = True
+            except Exception as e:
+                logger.error(f"Pipeline stage '{self.name}' failed: {str(e)}", exc_info=True)
+                job.error = e
+                job.failed_stage = self.name
+                succeeded = False
+
+            elapsed = time.perf_counter() - start
+            now = time.time()
+            with self.lock:
+                self.in_flight -= 1
+                self.busy_seconds += elapsed
+                if succeeded:
+                    self.processed += 1
+                    self.recent_completions.append(now)
+                else:
+                    self.errors += 1
+                while self.recent_completions and self.recent_completions[0] < now - THROUGHPUT_WINDOW_SECONDS:
+                    self.recent_completions.popleft()
+
+            self.queue.task_done()
+
+            if succeeded and self.next_stage is not None:
+                job.queued_at = time.perf_counter()
+                self.next_stage.queue.put(job)
+                continue
+
+            if not succeeded and self.on_failure is not None:
+                try:
+                    self.on_failure(job.context)
+                except Exception as e:
+                    logger.error(f"Pipeline failure handler raised an error: {str(e)}", exc_info=True)
+            job.done.set()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        now = time.time()
+        with self.lock:
+            while self.recent_completions and self.recent_completions[0] < now - THROUGHPUT_WINDOW_SECONDS:
+                self.recent_completions.popleft()
+            window = min(THROUGHPUT_WINDOW_SECONDS, max(now - self.started_at, 1e-6))
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue.qsize(),
+                "in_flight": self.in_flight,
+                "processed": self.processed,
+                "errors": self.errors,
+                "throughput_per_second": len(self.recent_completions) / window,
+                "average_seconds": self.busy_seconds / max(1, self.processed + self.errors),
+                "utilization": self.busy_seconds / (max(now - self.started_at, 1e-6) * self.workers)
+            }
+
+
+class Pipeline:
+    """
+    Chain of stages connected by bounded queues, so that different requests
+    can be in different stages at the same time. on_failure is called with
+    the context of every job that fails in a stage, including jobs whose
+    deadline ran out, to release what earlier stages left for later ones.
+    """
+
+    def __init__(self, stages: List[PipelineStage], on_failure: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.stages = stages
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+        for stage in stages:
+            stage.on_failure = on_failure
+            stage.start()
+
+    def submit(self, context: Dict[str, Any], timeout: Optional[float] = None) -> PipelineJob:
+        """
+        Add a job to the first stage, blocking while its queue is full.
+
+        Raises:
+            queue.Full: If the first stage is still full after timeout seconds
+        """
+        job = PipelineJob(context)
+        self.stages[0].queue.put(job, timeout=timeout)
+        return job
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {stage.name: stage.get_metrics() for stage in self.stages}
+
+    def render_metrics(self) -> List[str]:
+        """
+        Per-stage queue depth and in-flight gauges in Prometheus text format.
+        """
+        metrics = self.get_metrics()
+        lines = []
+        for name, documentation, key in [
+            ("tapbuddy_pipeline_queue_depth", "Jobs waiting in each pipeline stage queue", "queue_depth"),
+            ("tapbuddy_pipeline_in_flight", "Jobs being processed by each pipeline stage", "in_flight"),
+            ("tapbuddy_pipeline_workers", "Worker threads of each pipeline stage", "workers"),
+        ]:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            for stage, values in metrics.items():
+                lines.append(f'{name}{{stage="{stage}"}} {values[key]}')
+        return lines
+
+
+def build_pipeline(
+    stage_funcs: Dict[str, Callable[[Dict[str, Any]], None]],
+    on_failure: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Pipeline:
+    """
+    Build a pipeline from stage functions, using STAGE_CONCURRENCY for the
+    worker count of each stage and PIPELINE_QUEUE_SIZE for the queues between them.
+
+    Args:
+        stage_funcs: Mapping of stage name to stage function, in pipeline order
+        on_failure: Called with the context of each job that fails in a stage
+
+    Returns:
+        The running Pipeline
+    """
+    workers = parse_stage_concurrency(settings.STAGE_CONCURRENCY)
+    stages = [
+        PipelineStage(name, func, workers.get(name, 1), settings.PIPELINE_QUEUE_SIZE)
+        for name, func in stage_funcs.items()
+    ]
+    logger.info("Started pipeline with stages: " + ", ".join(f"{s.name}x{s.workers}" for s in stages))
+    return Pipeline(stages, on_failure=on_failure)
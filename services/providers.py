@@ -0,0 +1,349 @@
+import os
+import re
+import json
+import time
+import shutil
+import random
+import hashlib
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from google.api_core import exceptions as api_exceptions
+
+from config import settings, parse_options
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Provider kinds and the setting that selects the implementation of each.
+# The built-in name (first entry) means the service's own upstream code path.
+PROVIDER_SETTINGS = {
+    "llm": ("LLM_PROVIDER", "gemini"),
+    "tts": ("TTS_PROVIDER", "elevenlabs"),
+    "storage": ("STORAGE_PROVIDER", "firebase"),
+    "messaging": ("MESSAGING_PROVIDER", "twilio"),
+}
+
+
+class ProviderError(Exception):
+    """
+    Raised by a provider when a call fails.
+    """
+
+
+class LLMProvider:
+    """
+    Source of GenerativeModel-compatible objects: generate_content(prompt,
+    stream=False, generation_config=None, request_options=None) returning a
+    response with .text and .usage_metadata, or an iterable of chunks when streaming.
+    """
+
+    def get_model(self, model_name: str) -> Any:
+        raise NotImplementedError
+
+
+class TTSProvider:
+    def synthesize(self, text: str, output_path: str) -> str:
+        """
+        Write speech for text to output_path and return the path of the audio file.
+        """
+        raise NotImplementedError
+
+
+class StorageProvider:
+    def upload(self, file_path: str, destination_path: str) -> bool:
+        raise NotImplementedError
+
+    def public_url(self, destination_path: str) -> str:
+        raise NotImplementedError
+
+
+class MessagingProvider:
+    def send(self, to_phone_number: str, message: str, message_type: str) -> bool:
+        raise NotImplementedError
+
+
+class FakeBehaviour:
+    """
+    Latency distribution and failure injection of one fake provider, e.g.
+    "latency=0.8,sigma=0.5,dist=lognormal,failure_rate=0.02".
+
+    dist is one of fixed, uniform (0..2x latency), exponential or lognormal.
+    per_unit adds that many seconds per unit of work (tokens, characters, bytes).
+    """
+
+    def __init__(self, name: str, spec: str, seed: int):
+        options = parse_options(spec)
+        self.name = name
+        self.latency = options.get("latency", 0.0)
+        self.sigma = options.get("sigma", 0.5)
+        self.dist = options.get("dist", "lognormal")
+        self.per_unit = options.get("per_unit", 0.0)
+        self.failure_rate = options.get("failure_rate", 0.0)
+        self.throttle_rate = options.get("throttle_rate", 0.0)
+        self.random = random.Random(f"{seed}:{name}")
+        self.lock = threading.Lock()
+
+    def draw_latency(self, units: float = 0) -> float:
+        with self.lock:
+            if self.dist == "fixed":
+                base = self.latency
+            elif self.dist == "uniform":
+                base = self.random.uniform(0, 2 * self.latency)
+            elif self.dist == "exponential":
+                base = self.random.expovariate(1 / self.latency) if self.latency > 0 else 0.0
+            else:
+                # Mean-preserving log-normal, with the long tail typical of upstream APIs
+                base = self.latency * self.random.lognormvariate(-self.sigma ** 2 / 2, self.sigma)
+        return base + units * self.per_unit
+
+    def draw_failure(self) -> Optional[str]:
+        """
+        Return "throttle" or "failure" if this call should fail, else None.
+        """
+        with self.lock:
+            roll = self.random.random()
+        if roll < self.throttle_rate:
+            return "throttle"
+        if roll < self.throttle_rate + self.failure_rate:
+            return "failure"
+        return None
+
+
+class FakeUsage:
+    def __init__(self, prompt_tokens: int, response_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = response_tokens
+        self.total_token_count = prompt_tokens + response_tokens
+
+
+class FakeResponse:
+    def __init__(self, text: str, usage: FakeUsage):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class FakeStream:
+    """
+    Streamed fake response: yields the text in small chunks, spreading the
+    latency across them.
+    """
+
+    def __init__(self, text: str, usage: FakeUsage, latency: float, chunk_size: int = 64):
+        self.chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or [""]
+        self.delay = latency / len(self.chunks)
+        self.usage_metadata = usage
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            time.sleep(self.delay)
+            yield FakeResponse(chunk, self.usage_metadata)
+
+
+def fake_content(prompt: str, structured: bool) -> Any:
+    """
+    Deterministic lesson content for a prompt, shaped like the answer the
+    content stage that sent the prompt expects.
+    """
+    topic_match = re.search(r"Topic:\s*(.+)", prompt)
+    topic = topic_match.group(1).strip() if topic_match else "the topic"
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+    scenes = [{
+        "description": f"Scene {i + 1}: an animated diagram of {topic}",
+        "narration": f"Part {i + 1} of the story of {topic}.",
+        "visual_elements": "Labelled diagram, arrows, bright colours",
+        "duration_seconds": rng.choice([10, 15, 20])
+    } for i in range(rng.randint(5, 8))]
+    sections = {
+        "title": {
+            "title": f"Discovering {topic}",
+            "description": f"A short lesson about {topic}.",
+            "learning_objectives": [f"Explain {topic}", f"Give an example of {topic}", f"Apply {topic}"]
+        },
+        "key_points": [{"point": f"Key idea {i + 1} about {topic}", "explanation": "It builds the foundation."}
+                       for i in range(rng.randint(4, 6))],
+        "interactive": {
+            "questions": [{"question": f"Why does {topic} matter?", "answer": "Because it explains what we see."}],
+            "activities": [{"title": f"Explore {topic}", "description": "Try it at home.", "materials_needed": "Paper"}]
+        },
+        "resources": [{"type": kind, "title": f"{topic} {kind}", "description": "Learn more."}
+                      for kind in ["website", "video", "book"]],
+        "script": {
+            "script": " ".join(scene["narration"] for scene in scenes),
+            "scenes": scenes
+        }
+    }
+    if structured:
+        return {
+            **sections["title"],
+            "key_points": sections["key_points"],
+            **sections["interactive"],
+            "additional_resources": sections["resources"],
+            **sections["script"]
+        }
+    if "catchy" in prompt:
+        return sections["title"]
+    if "key educational points" in prompt:
+        return sections["key_points"]
+    if "interactive elements" in prompt:
+        return sections["interactive"]
+    if "resources" in prompt and "scenes" not in prompt:
+        return sections["resources"]
+    return sections["script"]
+
+
+class FakeModel:
+    """
+    Offline stand-in for genai.GenerativeModel.
+    """
+
+    def __init__(self, behaviour: FakeBehaviour):
+        self.behaviour = behaviour
+
+    def generate_content(self, prompt: str, stream: bool = False, generation_config: Any = None,
+                         request_options: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        text = json.dumps(fake_content(prompt, structured=generation_config is not None))
+        usage = FakeUsage(len(prompt) // 4, len(text) // 4)
+        latency = self.behaviour.draw_latency(usage.candidates_token_count)
+        timeout = (request_options or {}).get("timeout")
+
+        failure = self.behaviour.draw_failure()
+        if failure == "throttle":
+            raise api_exceptions.ResourceExhausted("Fake quota exceeded")
+        if failure == "failure":
+            time.sleep(latency / 2)
+            raise api_exceptions.ServiceUnavailable("Fake LLM outage")
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise api_exceptions.DeadlineExceeded("Fake LLM call timed out")
+
+        if stream:
+            return FakeStream(text, usage, latency)
+        time.sleep(latency)
+        return FakeResponse(text, usage)
+
+
+class FakeLLMProvider(LLMProvider):
+    def __init__(self, behaviour: FakeBehaviour):
+        self.behaviour = behaviour
+
+    def get_model(self, model_name: str) -> Any:
+        return FakeModel(self.behaviour)
+
+
+class FakeTTSProvider(TTSProvider):
+    """
+    Writes deterministic bytes standing in for audio, about as large as an
+    MP3 of the text would be. per_unit is seconds per character.
+    """
+
+    # 128 kbit/s MP3 at roughly 15 characters of narration per second
+    BYTES_PER_CHARACTER = 16000 // 15
+
+    def __init__(self, behaviour: FakeBehaviour):
+        self.behaviour = behaviour
+
+    def synthesize(self, text: str, output_path: str) -> str:
+        time.sleep(self.behaviour.draw_latency(len(text)))
+        if self.behaviour.draw_failure():
+            raise ProviderError("Fake TTS failure")
+        block = hashlib.sha256(text.encode("utf-8")).digest()
+        size = max(len(block), len(text) * self.BYTES_PER_CHARACTER)
+        with open(output_path, "wb") as f:
+            f.write(block * (size // len(block)))
+        return output_path
+
+
+class FakeStorageProvider(StorageProvider):
+    """
+    Copies uploads into FAKE_STORAGE_DIR. per_unit is seconds per byte.
+    """
+
+    def __init__(self, behaviour: FakeBehaviour):
+        self.behaviour = behaviour
+
+    def upload(self, file_path: str, destination_path: str) -> bool:
+        time.sleep(self.behaviour.draw_latency(os.path.getsize(file_path)))
+        if self.behaviour.draw_failure():
+            raise ProviderError("Fake storage failure")
+        target = os.path.join(settings.FAKE_STORAGE_DIR, destination_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(file_path, target)
+        return True
+
+    def public_url(self, destination_path: str) -> str:
+        return f"{settings.FAKE_STORAGE_URL.rstrip('/')}/{destination_path}"
+
+
+class FakeMessagingProvider(MessagingProvider):
+    """
+    Keeps the most recent messages in memory instead of sending them.
+    """
+
+    def __init__(self, behaviour: FakeBehaviour):
+        self.behaviour = behaviour
+        self.sent = deque(maxlen=1000)
+
+    def send(self, to_phone_number: str, message: str, message_type: str) -> bool:
+        time.sleep(self.behaviour.draw_latency(len(message)))
+        if self.behaviour.draw_failure():
+            return False
+        self.sent.append((to_phone_number, message_type, message))
+        return True
+
+
+_factories: Dict[str, Dict[str, Callable[[], Any]]] = {kind: {} for kind in PROVIDER_SETTINGS}
+_providers: Dict[str, Any] = {}
+_providers_lock = threading.Lock()
+
+
+def register_provider(kind: str, name: str, factory: Callable[[], Any]) -> None:
+    """
+    Make an implementation available under a name, to be selected with the
+    kind's *_PROVIDER setting.
+    """
+    with _providers_lock:
+        _factories[kind][name] = factory
+        _providers.pop(kind, None)
+
+
+def get_provider(kind: str) -> Optional[Any]:
+    """
+    Return the configured provider for kind ("llm", "tts", "storage" or
+    "messaging"), or None when the built-in upstream service is configured.
+    """
+    setting, builtin = PROVIDER_SETTINGS[kind]
+    name = getattr(settings, setting)
+    if name == builtin:
+        return None
+
+    with _providers_lock:
+        provider = _providers.get(kind)
+        if provider is None:
+            factory = _factories[kind].get(name)
+            if factory is None:
+                raise ValueError(f"Unknown {kind} provider '{name}', expected one of {[builtin] + list(_factories[kind])}")
+            provider = factory()
+            _providers[kind] = provider
+            logger.info(f"Using {name} {kind} provider")
+        return provider
+
+
+def reset_providers() -> None:
+    """
+    Drop provider instances so that they are created again from the current settings.
+    """
+    with _providers_lock:
+        _providers.clear()
+
+
+def _fake(kind: str, provider_class: type, spec_setting: str) -> Callable[[], Any]:
+    return lambda: provider_class(FakeBehaviour(kind, getattr(settings, spec_setting), settings.FAKE_PROVIDER_SEED))
+
+
+register_provider("llm", "fake", _fake("llm", FakeLLMProvider, "FAKE_LLM"))
+register_provider("tts", "fake", _fake("tts", FakeTTSProvider, "FAKE_TTS"))
+register_provider("storage", "fake", _fake("storage", FakeStorageProvider, "FAKE_STORAGE"))
+register_provider("messaging", "fake", _fake("messaging", FakeMessagingProvider, "FAKE_MESSAGING"))
@@ -0,0 +1,281 @@
+import time
+import random
+import logging
+import threading
+from typing import Any, Callable, List, Optional
+
+from google.api_core import exceptions as api_exceptions
+
+from config import settings
+from services.metrics import register, register_collector, observe, Counter
+from services.deadline import current_deadline
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+THROTTLED = register(Counter(
+    "tapbuddy_gemini_throttled_total",
+    "Gemini calls rejected with 429 or 503, by status",
+    ("status",)
+))
+QUOTA_EXHAUSTED = register(Counter(
+    "tapbuddy_gemini_quota_exhausted_total",
+    "Gemini calls given up on for lack of quota, so that their request is queued again",
+    ("reason",)
+))
+
+
+class QuotaExhaustedError(Exception):
+    """
+    Raised when a Gemini call cannot get quota in time. The request should be
+    queued again rather than completed with default content.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to capacity tokens and refills at rate
+    tokens per second.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, amount: float) -> float:
+        """
+        Take amount tokens if they are available.
+
+        Returns:
+            0 on success, otherwise the seconds until enough tokens will be available
+        """
+        with self.lock:
+            self._refill()
+            # A request bigger than the bucket can never fit; let it through on a full bucket
+            amount = min(amount, self.capacity)
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    def adjust(self, amount: float) -> None:
+        """
+        Correct an earlier estimate: positive amounts take more tokens, negative
+        ones give tokens back. The balance may go negative.
+        """
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    Limit on concurrent calls that adapts AIMD-style: it grows by one for
+    every limit's worth of successful calls and halves when the upstream
+    signals overload.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    def on_success(self) -> None:
+        with self.condition:
+            previous = int(self.limit)
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            if int(self.limit) > previous:
+                self.condition.notify()
+
+    def on_overload(self) -> None:
+        with self.condition:
+            self.limit = max(self.minimum, self.limit / 2)
+            logger.warning(f"Gemini overloaded, concurrency limit lowered to {int(self.limit)}")
+
+
+def is_throttled(error: Exception) -> Optional[int]:
+    """
+    Return the HTTP status if the error means "slow down" (429 or 503), else None.
+    """
+    if isinstance(error, (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)):
+        return 429
+    if isinstance(error, api_exceptions.ServiceUnavailable):
+        return 503
+    code = getattr(error, "code", None)
+    if code in (429, 503):
+        return code
+    return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Full-jitter exponential backoff for the given retry attempt (0-based).
+    """
+    return random.uniform(0, min(settings.GEMINI_BACKOFF_MAX, settings.GEMINI_BACKOFF_BASE * (2 ** attempt)))
+
+
+class RateLimiter:
+    """
+    Shared gate for upstream calls: request and token rate limits plus an
+    adaptive concurrency limit. The limits apply per process, so set the
+    rates to the project quota divided by the number of worker processes.
+    """
+
+    def __init__(self, rpm: float, tpm: float, max_concurrency: int, min_concurrency: int = 1):
+        self.requests = TokenBucket(rpm / 60.0, max(1.0, rpm / 60.0 * settings.GEMINI_BURST_SECONDS))
+        self.tokens = TokenBucket(tpm / 60.0, max(1.0, tpm / 60.0 * settings.GEMINI_BURST_SECONDS))
+        self.concurrency = AdaptiveConcurrencyLimit(max_concurrency, min_concurrency, max_concurrency)
+
+    def _acquire(self, estimated_tokens: int, operation: str) -> None:
+        """
+        Wait for a request slot, token budget and concurrency slot, giving up
+        after GEMINI_QUOTA_WAIT_SECONDS or when the request's deadline is near.
+        """
+        wait_limit = settings.GEMINI_QUOTA_WAIT_SECONDS
+        deadline = current_deadline()
+        if deadline is not None:
+            wait_limit = min(wait_limit, deadline.remaining())
+        give_up_at = time.monotonic() + wait_limit
+        start = time.monotonic()
+        taken = []
+
+        try:
+            for bucket, amount, reason in [(self.requests, 1, "rpm"), (self.tokens, estimated_tokens, "tpm")]:
+                while True:
+                    wait = bucket.try_acquire(amount)
+                    if wait == 0:
+                        break
+                    if time.monotonic() + wait > give_up_at:
+                        QUOTA_EXHAUSTED.inc(reason)
+                        raise QuotaExhaustedError(f"{operation}: {reason} limit reached", settings.QUOTA_RETRY_DELAY_SECONDS)
+                    time.sleep(wait)
+                taken.append((bucket, amount))
+
+            if not self.concurrency.acquire(max(0.0, give_up_at - time.monotonic())):
+                QUOTA_EXHAUSTED.inc("concurrency")
+                raise QuotaExhaustedError(f"{operation}: no free concurrency slot", settings.QUOTA_RETRY_DELAY_SECONDS)
+        except QuotaExhaustedError:
+            # The call is not made, so give back what was already taken
+            for bucket, amount in taken:
+                bucket.adjust(-min(amount, bucket.capacity))
+            raise
+        observe("gemini_rate_limit_wait", time.monotonic() - start)
+
+    def call(
+        self,
+        func: Callable[[], Any],
+        estimated_tokens: int,
+        operation: str,
+        count_tokens: Optional[Callable[[Any], Optional[int]]] = None
+    ) -> Any:
+        """
+        Run func within the limits, retrying throttled calls with jittered
+        exponential backoff.
+
+        Args:
+            func: The upstream call
+            estimated_tokens: Tokens to reserve before the call
+            operation: Name used in logs and errors
+            count_tokens: Returns the tokens the call actually used, to correct the estimate
+
+        Returns:
+            The result of func
+
+        Raises:
+            QuotaExhaustedError: If no quota could be had in time, or the
+                call was still throttled after GEMINI_MAX_RETRIES retries
+        """
+        for attempt in range(settings.GEMINI_MAX_RETRIES + 1):
+            self._acquire(estimated_tokens, operation)
+            try:
+                try:
+                    result = func()
+                finally:
+                    # Free the slot before any backoff, so that a throttled call
+                    # does not hold it while it sleeps
+                    self.concurrency.release()
+            except Exception as e:
+                status = is_throttled(e)
+                if status is None:
+                    raise
+                THROTTLED.inc(str(status))
+                self.concurrency.on_overload()
+                delay = backoff_delay(attempt)
+                deadline = current_deadline()
+                if attempt == settings.GEMINI_MAX_RETRIES or (deadline is not None and deadline.remaining() < delay):
+                    QUOTA_EXHAUSTED.inc("throttled")
+                    raise QuotaExhaustedError(f"{operation} throttled ({status}): {str(e)}", settings.QUOTA_RETRY_DELAY_SECONDS)
+                logger.info(f"{operation} throttled ({status}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            self.concurrency.on_success()
+            if count_tokens is not None:
+                actual = count_tokens(result)
+                if actual:
+                    self.tokens.adjust(actual - estimated_tokens)
+            return result
+
+    def render_metrics(self) -> List[str]:
+        with self.concurrency.condition:
+            limit = int(self.concurrency.limit)
+            in_flight = self.concurrency.in_flight
+        return [
+            "# HELP tapbuddy_gemini_concurrency_limit Current adaptive limit on concurrent Gemini calls",
+            "# TYPE tapbuddy_gemini_concurrency_limit gauge",
+            f"tapbuddy_gemini_concurrency_limit {limit}",
+            "# HELP tapbuddy_gemini_calls_in_flight Gemini calls currently running",
+            "# TYPE tapbuddy_gemini_calls_in_flight gauge",
+            f"tapbuddy_gemini_calls_in_flight {in_flight}",
+        ]
+
+
+_gemini_limiter: Optional[RateLimiter] = None
+_gemini_limiter_lock = threading.Lock()
+
+
+def get_gemini_limiter() -> RateLimiter:
+    """
+    Return the process-wide limiter shared by all Gemini calls.
+    """
+    global _gemini_limiter
+    with _gemini_limiter_lock:
+        if _gemini_limiter is None:
+            _gemini_limiter = RateLimiter(
+                settings.GEMINI_RPM,
+                settings.GEMINI_TPM,
+                settings.GEMINI_MAX_CONCURRENCY,
+                settings.GEMINI_MIN_CONCURRENCY
+            )
+            register_collector(_gemini_limiter.render_metrics)
+        return _gemini_limiter
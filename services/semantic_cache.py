@@ -0,0 +1,332 @@
+import re
+import math
+import time
+import zlib
+import logging
+import threading
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+
+from config import settings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Very common words carry no meaning for matching questions
+STOP_WORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "is", "are",
+    "do", "does", "did", "how", "what", "why", "when", "which", "who", "can", "i", "me",
+    "my", "you", "your", "it", "its", "this", "that", "be", "about", "please", "explain"
+}
+
+# Hit/miss counters for this process
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "rebuilds": 0}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase word unigrams and bigrams, ignoring stop words.
+    """
+    words = [word for word in _TOKEN_RE.findall(text.lower()) if word not in STOP_WORDS]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def hash_term_frequencies(text: str, dimensions: int) -> np.ndarray:
+    """
+    Embed text as a signed, hashed term-frequency vector with sublinear scaling.
+
+    Args:
+        text: The text to embed
+        dimensions: Size of the hashed vector
+
+    Returns:
+        float32 vector of the given size
+    """
+    counts: Dict[Tuple[int, float], int] = {}
+    for token in tokenize(text):
+        digest = zlib.crc32(token.encode("utf-8"))
+        bucket = digest % dimensions
+        # The sign bit spreads hash collisions around zero instead of piling them up
+        sign = 1.0 if (digest >> 31) & 1 else -1.0
+        counts[(bucket, sign)] = counts.get((bucket, sign), 0) + 1
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for (bucket, sign), count in counts.items():
+        vector[bucket] += sign * (1.0 + math.log(count))
+    return vector
+
+
+class SemanticIndex:
+    """
+    Vector index of cached queries for one (subject, level) pair.
+
+    Vectors live in a fixed-capacity ring buffer, so memory is bounded by
+    max_entries and the oldest entries are overwritten first. New entries are
+    buffered and merged in batches, and IDF weights are only recomputed once
+    the index has grown noticeably since the last full rebuild.
+    """
+
+    # Recompute IDF weights once the entry count drifts this much
+    IDF_REFRESH_RATIO = 0.1
+
+    def __init__(self, dimensions: int, max_entries: int, rebuild_batch: int):
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self.rebuild_batch = rebuild_batch
+        capacity = min(max_entries, 1024)
+        self.matrix = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.row_norms = np.zeros(capacity, dtype=np.float32)
+        self.keys: List[str] = []
+        self.size = 0
+        self.next_slot = 0
+        self.document_frequency = np.zeros(dimensions, dtype=np.float32)
+        self.idf = np.ones(dimensions, dtype=np.float32)
+        self.idf_entry_count = 0
+        self.pending_vectors: List[np.ndarray] = []
+        self.pending_keys: List[str] = []
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.size + len(self.pending_keys)
+
+    def add(self, text: str, cache_key: str) -> None:
+        vector = hash_term_frequencies(text, self.dimensions)
+        with self.lock:
+            self.pending_vectors.append(vector)
+            self.pending_keys.append(cache_key)
+            if len(self.pending_keys) >= self.rebuild_batch:
+                self._merge_pending()
+
+    def _grow(self, required: int) -> None:
+        capacity = len(self.matrix)
+        if required <= capacity or capacity >= self.max_entries:
+            return
+        new_capacity = min(self.max_entries, max(required, capacity * 2))
+        grown = np.zeros((new_capacity, self.dimensions), dtype=np.float32)
+        grown[:self.size] = self.matrix[:self.size]
+        self.matrix = grown
+        norms = np.zeros(new_capacity, dtype=np.float32)
+        norms[:self.size] = self.row_norms[:self.size]
+        self.row_norms = norms
+
+    def _merge_pending(self) -> None:
+        """
+        Write pending vectors into the ring buffer, overwriting the oldest
+        entries once the index is full.
+        """
+        if not self.pending_vectors:
+            return
+
+        self._grow(self.size + len(self.pending_vectors))
+
+        for vector, key in zip(self.pending_vectors, self.pending_keys):
+            slot = self.next_slot
+            if slot < self.size:
+                # Overwriting the oldest entry
+                self.document_frequency -= self.matrix[slot] != 0
+                self.keys[slot] = key
+            else:
+                self.keys.append(key)
+                self.size += 1
+            self.matrix[slot] = vector
+            self.document_frequency += vector != 0
+            self.row_norms[slot] = np.linalg.norm(vector * self.idf)
+            self.next_slot = (slot + 1) % self.max_entries
+
+        self.pending_vectors = []
+        self.pending_keys = []
+
+        drift = abs(self.size - self.idf_entry_count)
+        if drift > self.IDF_REFRESH_RATIO * max(self.idf_entry_count, self.rebuild_batch):
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        """
+        Recompute IDF weights and every row norm from the current entries.
+        """
+        matrix = self.matrix[:self.size]
+        self.idf = (np.log((1.0 + self.size) / (1.0 + self.document_frequency)) + 1.0).astype(np.float32)
+        self.idf_entry_count = self.size
+        idf_squared = self.idf * self.idf
+        self.row_norms[:self.size] = np.sqrt(np.einsum("ij,ij,j->i", matrix, matrix, idf_squared))
+
+        with _stats_lock:
+            _stats["rebuilds"] += 1
+
+    def extend(self, entries: List[Tuple[str, str]]) -> None:
+        """
+        Add many (text, cache_key) entries at once with a single rebuild at the end.
+        """
+        with self.lock:
+            for text, cache_key in entries:
+                self.pending_vectors.append(hash_term_frequencies(text, self.dimensions))
+                self.pending_keys.append(cache_key)
+                if len(self.pending_keys) >= self.rebuild_batch:
+                    self._merge_pending()
+            self._merge_pending()
+            self._rebuild()
+
+    def search(self, text: str) -> Tuple[Optional[str], float]:
+        """
+        Find the most similar cached query.
+
+        Returns:
+            Tuple of (cache_key, cosine similarity), or (None, 0.0) if the index is empty
+        """
+        query = hash_term_frequencies(text, self.dimensions)
+
+        with self.lock:
+            if self.pending_vectors and not self.size:
+                self._merge_pending()
+            if not self.size and not self.pending_keys:
+                return None, 0.0
+
+            weighted_query = query * self.idf
+            query_norm = float(np.linalg.norm(weighted_query))
+            if query_norm == 0.0:
+                return None, 0.0
+
+            best_key, best_score = None, 0.0
+
+            if self.size:
+                # cos(m*idf, q*idf) = m . (q*idf^2) / (|m*idf| |q*idf|)
+                dots = self.matrix[:self.size] @ (weighted_query * self.idf)
+                scores = dots / (np.maximum(self.row_norms[:self.size], 1e-12) * query_norm)
+                index = int(np.argmax(scores))
+                best_key, best_score = self.keys[index], float(scores[index])
+
+            # Entries waiting for the next merge are checked directly
+            for vector, key in zip(self.pending_vectors, self.pending_keys):
+                weighted = vector * self.idf
+                norm = float(np.linalg.norm(weighted))
+                if norm == 0.0:
+                    continue
+                score = float(weighted @ weighted_query) / (norm * query_norm)
+                if score > best_score:
+                    best_key, best_score = key, score
+
+        return best_key, best_score
+
+    def memory_bytes(self) -> int:
+        return int(self.matrix.nbytes + self.row_norms.nbytes + sum(v.nbytes for v in self.pending_vectors))
+
+
+# One index per (subject, level)
+_indexes: Dict[Tuple[str, str], SemanticIndex] = {}
+_indexes_lock = threading.Lock()
+# Held for the whole first load, so that concurrent first callers wait for it
+_load_lock = threading.Lock()
+_loaded = False
+
+
+def _index_key(subject: str, level: str) -> Tuple[str, str]:
+    return (subject or "").strip().casefold(), (level or "").strip().casefold()
+
+
+def _get_index(subject: str, level: str) -> SemanticIndex:
+    key = _index_key(subject, level)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = SemanticIndex(
+                settings.SEMANTIC_CACHE_DIMENSIONS,
+                settings.SEMANTIC_CACHE_MAX_ENTRIES,
+                settings.SEMANTIC_CACHE_REBUILD_BATCH
+            )
+            _indexes[key] = index
+        return index
+
+
+def _embedding_text(topic: str, query: str) -> str:
+    return f"{topic} {query}"
+
+
+def _load_from_content_cache() -> None:
+    """
+    Populate the indexes from the persistent content cache the first time
+    they are used in this process.
+    """
+    global _loaded
+    if _loaded:
+        return
+    with _load_lock:
+        if _loaded:
+            return
+        try:
+            from services.content_cache import iter_cached_requests
+
+            start = time.perf_counter()
+            grouped: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+            # Oldest first, so that the ring buffers overwrite the least recently used entries
+            for cache_key, subject, topic, level, query in reversed(list(iter_cached_requests())):
+                grouped.setdefault((subject, level), []).append((_embedding_text(topic, query), cache_key))
+
+            loaded = 0
+            for (subject, level), entries in grouped.items():
+                _get_index(subject, level).extend(entries)
+                loaded += len(entries)
+
+            logger.info(f"Loaded {loaded} cached queries into the semantic cache in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logger.warning(f"Could not load semantic cache from content cache: {str(e)}")
+
+        # Only now may other callers skip the load and search the indexes
+        with _indexes_lock:
+            _loaded = True
+
+
+def find_similar(subject: str, topic: str, level: str, query: str) -> Optional[str]:
+    """
+    Look for a cached query that is similar enough to this one to reuse its content.
+
+    Args:
+        subject: The subject area
+        topic: The specific topic within the subject
+        level: The difficulty level
+        query: The student's question
+
+    Returns:
+        The content cache key of the best match above SEMANTIC_CACHE_THRESHOLD, or None
+    """
+    _load_from_content_cache()
+
+    cache_key, score = _get_index(subject, level).search(_embedding_text(topic, query))
+    if cache_key is not None and score >= settings.SEMANTIC_CACHE_THRESHOLD:
+        logger.info(f"Semantic cache hit for '{query[:50]}' (similarity {score:.3f})")
+        with _stats_lock:
+            _stats["hits"] += 1
+        return cache_key
+
+    with _stats_lock:
+        _stats["misses"] += 1
+    return None
+
+
+def add_entry(subject: str, topic: str, level: str, query: str, cache_key: str) -> None:
+    """
+    Register a newly cached query so that similar questions can reuse it.
+
+    Args:
+        subject, topic, level, query: The request values the content was generated for
+        cache_key: The content cache key the content is stored under
+    """
+    _load_from_content_cache()
+    _get_index(subject, level).add(_embedding_text(topic, query), cache_key)
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """
+    Return hit/miss counters, index sizes and memory usage for this process.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    stats["entries"] = sum(len(index) for index in indexes)
+    stats["memory_bytes"] = sum(index.memory_bytes() for index in indexes)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
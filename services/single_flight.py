@@ -0,0 +1,86 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from services.metrics import register, register_collector, Counter
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+COALESCED = register(Counter(
+    "tapbuddy_coalesced_requests_total",
+    "Requests attached to an identical request that was already being generated"
+))
+
+
+class Flight:
+    """
+    One generation in progress and the identical requests waiting on it.
+    """
+
+    def __init__(self, leader: int):
+        self.leader = leader
+        self.followers: List[Dict[str, Any]] = []
+
+
+# Normalized request key -> generation in progress in this process. Flights
+# are not shared between processes: with several worker processes, identical
+# requests leased by different processes are each generated.
+_flights: Dict[str, Flight] = {}
+_flights_lock = threading.Lock()
+
+
+def begin_flight(key: str, request_id: int, context: Dict[str, Any]) -> Optional[int]:
+    """
+    Start generating the request identified by key, unless an identical
+    request is already in flight in this process, in which case the caller
+    is attached to it.
+
+    Args:
+        key: Normalized request key (see make_cache_key)
+        request_id: The request that wants to generate it
+        context: The request's pipeline context, handed back to the leader by end_flight
+
+    Returns:
+        None if the caller should generate the video itself, otherwise the ID
+        of the in-flight request whose result the caller will share
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is None or flight.leader == request_id:
+            _flights[key] = Flight(request_id)
+            return None
+        # A request whose lease expired while attached is attached again
+        flight.followers = [f for f in flight.followers if f["request_id"] != request_id]
+        flight.followers.append(context)
+    COALESCED.inc()
+    return flight.leader
+
+
+def end_flight(key: str, request_id: int) -> List[Dict[str, Any]]:
+    """
+    Mark the leader's generation as finished; identical requests arriving
+    from now on start a new flight.
+
+    Returns:
+        The contexts of the requests that were attached to this generation
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is None or flight.leader != request_id:
+            return []
+        del _flights[key]
+        return flight.followers
+
+
+def render_flight_metrics() -> List[str]:
+    with _flights_lock:
+        in_flight = len(_flights)
+    return [
+        "# HELP tapbuddy_unique_generations_in_flight Distinct requests currently being generated",
+        "# TYPE tapbuddy_unique_generations_in_flight gauge",
+        f"tapbuddy_unique_generations_in_flight {in_flight}",
+    ]
+
+
+register_collector(render_flight_metrics)
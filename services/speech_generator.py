@@ -1,9 +1,22 @@
 import os
+import re
+import time
 import logging
 import requests
 import json
 import uuid
-from typing import Optional
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from services.metrics import instrumented, record_error, observe
+from services.deadline import call_timeout
+from services.providers import get_provider
+from services.audio_cache import audio_key, fetch_audio, store_audio
+from services import local_tts
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -12,10 +25,36 @@ logger = logging.getLogger(__name__)
 ELEVENLABS_API_KEY = os.environ.get("ELEVENLABS_API_KEY")
 TEMP_DIR = os.environ.get("TEMP_DIR", "./temp")
 
+# ElevenLabs voice used for all narration
+ELEVENLABS_VOICE_ID = "21m00Tcm4TlvDq8ikWAM"
+ELEVENLABS_MODEL_ID = "eleven_monolingual_v1"
+ELEVENLABS_VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.5
+}
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])[\"')\]]*\s+")
+_CLAUSE_RE = re.compile(r"(?<=[,;:])\s+")
+
+# Audio is written to disk in blocks of this size as it arrives
+DOWNLOAD_BLOCK_BYTES = 64 * 1024
+
+# Chunks of all requests share one bounded pool
+_chunk_executor: Optional[ThreadPoolExecutor] = None
+_chunk_executor_lock = threading.Lock()
+_elevenlabs_session: Optional[requests.Session] = None
+
+@instrumented("generate_speech")
 def generate_speech(script: str) -> str:
     """
     Generate speech audio from script text using text-to-speech services.
-    Currently uses ElevenLabs if available, with fallback to a placeholder.
+    Uses ElevenLabs if available, otherwise a local speech engine (see
+    services.local_tts), with fallback to a placeholder.
+    
+    Long scripts are split on paragraph and sentence boundaries and the
+    chunks are synthesized in parallel, then joined losslessly. A timing
+    manifest (see load_timing_manifest) is written next to the audio.
     
     Args:
         script: The narration script text
@@ -33,10 +72,10 @@ def generate_speech(script: str) -> str:
         audio_id = str(uuid.uuid4())
         output_path = os.path.join(TEMP_DIR, f"{audio_id}.mp3")
         
-        # Check if ELEVENLABS_API_KEY is available
-        if ELEVENLABS_API_KEY:
-            # Use ElevenLabs for voice generation
-            audio_path = generate_with_elevenlabs(script, output_path)
+        provider = get_provider("tts")
+        if provider is not None or ELEVENLABS_API_KEY or local_tts.is_available():
+            # Use the configured provider, ElevenLabs, or the local engine when offline
+            audio_path = synthesize_chunked(script, output_path)
         else:
             # Create a placeholder audio file with the script text
             audio_path = create_placeholder_audio(script, output_path)
@@ -46,6 +85,7 @@ def generate_speech(script: str) -> str:
         
     except Exception as e:
         logger.error(f"Error in speech generation: {str(e)}", exc_info=True)
+        record_error("generate_speech")
         # Return a placeholder/error audio path
         return create_placeholder_audio(
             f"Error generating speech. {str(e)}",
@@ -53,6 +93,382 @@ def generate_speech(script: str) -> str:
         )
 
 
+def split_script(script: str, max_chars: int) -> List[str]:
+    """
+    Split a script into chunks of at most max_chars characters. Chunks end
+    at a sentence, preferably at a paragraph; a single sentence is only split
+    (at commas, then at spaces) if it is longer than max_chars.
+
+    Args:
+        script: The narration script text
+        max_chars: Maximum chunk length
+
+    Returns:
+        The chunks, in order
+    """
+    chunks = []
+    current = ""
+    for paragraph in _PARAGRAPH_RE.split(script):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        # Keep short paragraphs together, otherwise start the paragraph in a new chunk
+        if current and len(current) + 2 + len(paragraph) <= max_chars:
+            current = f"{current}\n\n{paragraph}"
+            continue
+        if current:
+            chunks.append(current)
+            current = ""
+        for sentence in _SENTENCE_RE.split(paragraph):
+            for piece in _split_long(sentence.strip(), max_chars):
+                if current and len(current) + 1 + len(piece) > max_chars:
+                    chunks.append(current)
+                    current = piece
+                else:
+                    current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    if len(text) <= max_chars:
+        return [text] if text else []
+    pieces = []
+    for clause in _CLAUSE_RE.split(text):
+        while len(clause) > max_chars:
+            cut = clause.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(clause[:cut].strip())
+            clause = clause[cut:].strip()
+        if clause:
+            pieces.append(clause)
+    return pieces
+
+
+def get_chunk_executor() -> ThreadPoolExecutor:
+    global _chunk_executor
+    with _chunk_executor_lock:
+        if _chunk_executor is None:
+            _chunk_executor = ThreadPoolExecutor(
+                max_workers=settings.TTS_MAX_PARALLEL_CHUNKS,
+                thread_name_prefix="tts-chunk"
+            )
+        return _chunk_executor
+
+
+def get_elevenlabs_session() -> requests.Session:
+    """
+    Return the session shared by all ElevenLabs calls, sized so that every
+    chunk worker keeps its connection alive.
+    """
+    global _elevenlabs_session
+    with _chunk_executor_lock:
+        if _elevenlabs_session is None:
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(pool_maxsize=settings.TTS_MAX_PARALLEL_CHUNKS))
+            session.mount("https://", HTTPAdapter(pool_maxsize=settings.TTS_MAX_PARALLEL_CHUNKS))
+            session.headers.update({"xi-api-key": ELEVENLABS_API_KEY or ""})
+            _elevenlabs_session = session
+        return _elevenlabs_session
+
+
+def synthesize_chunk(text: str, output_path: str, previous_text: str = "", next_text: str = "") -> str:
+    """
+    Synthesize one chunk with the configured provider, with ElevenLabs, or
+    offline with the local engine when there is no ElevenLabs key. If
+    ElevenLabs is rate limited or down, the chunk is synthesized locally.
+
+    Returns:
+        Path to the chunk's audio
+    """
+    provider = get_provider("tts")
+    if provider is None and not ELEVENLABS_API_KEY:
+        provider = local_tts.get_local_provider()
+    try:
+        return synthesize_cached(provider, text, output_path, previous_text, next_text)
+    except requests.RequestException as e:
+        if provider is not None or not local_tts.should_fail_over(e):
+            raise
+        logger.warning(f"ElevenLabs unavailable, synthesizing the chunk locally: {str(e)[:200]}")
+        local_tts.FAILOVERS.inc()
+        return synthesize_cached(local_tts.get_local_provider(), text, output_path)
+
+
+def synthesize_cached(provider: Optional[Any], text: str, output_path: str, previous_text: str = "", next_text: str = "") -> str:
+    """
+    Synthesize text with provider (None for ElevenLabs). Text spoken before
+    with the same voice comes from the audio cache without calling the
+    provider. The neighbouring text lets ElevenLabs keep the intonation
+    continuous across chunk boundaries.
+
+    Returns:
+        Path to the audio
+    """
+    key = audio_key(text, voice_parameters(provider))
+    if fetch_audio(key, output_path, len(text)):
+        return output_path
+
+    if provider is not None:
+        audio_path = provider.synthesize(text, output_path)
+    else:
+        audio_path = synthesize_with_elevenlabs(text, output_path, previous_text, next_text)
+    store_audio(key, audio_path)
+    return audio_path
+
+
+def voice_parameters(provider: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Everything besides the text that determines the audio synthesized by
+    provider (None for ElevenLabs).
+    """
+    if isinstance(provider, local_tts.LocalTTSProvider):
+        return provider.voice_parameters()
+    return {
+        "provider": settings.TTS_PROVIDER,
+        "voice_id": ELEVENLABS_VOICE_ID,
+        "model_id": ELEVENLABS_MODEL_ID,
+        "voice_settings": ELEVENLABS_VOICE_SETTINGS,
+        "output_format": settings.TTS_OUTPUT_FORMAT,
+    }
+
+
+def synthesize_chunked(script: str, output_path: str) -> str:
+    """
+    Split the script, synthesize the chunks in parallel on the shared chunk
+    pool (at most TTS_MAX_PARALLEL_CHUNKS at once across all requests), join
+    them into output_path and write the timing manifest.
+
+    Returns:
+        Path to the generated audio file
+    """
+    chunks = split_script(script, settings.TTS_CHUNK_CHARS) or [script]
+    chunk_paths = [f"{output_path}.part{i}.mp3" for i in range(len(chunks))]
+    logger.info(f"Synthesizing {len(script)} characters in {len(chunks)} chunks")
+
+    start = time.perf_counter()
+    executor = get_chunk_executor()
+    futures = [
+        executor.submit(
+            contextvars.copy_context().run, synthesize_chunk, chunk, path,
+            chunks[i - 1] if i > 0 else "", chunks[i + 1] if i + 1 < len(chunks) else ""
+        )
+        for i, (chunk, path) in enumerate(zip(chunks, chunk_paths))
+    ]
+    try:
+        futures[0].result()
+        # Playback could start here; the rest is synthesized in the meantime
+        observe("tts_first_audio", time.perf_counter() - start)
+        chunk_paths = [future.result() for future in futures]
+        durations = concat_audio(chunk_paths, output_path)
+    finally:
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        for path in chunk_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    write_timing_manifest(output_path, chunks, durations)
+    return output_path
+
+
+def _frame_range(f) -> Tuple[int, int]:
+    """
+    Byte range of the MP3 frames in an open file, leaving out ID3v2 and
+    ID3v1 tags, so that files can be concatenated without re-encoding.
+    """
+    end = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    header = f.read(10)
+    start = 0
+    if header[:3] == b"ID3" and len(header) == 10:
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        footer = 10 if header[5] & 0x10 else 0
+        start = min(end, 10 + size + footer)
+    if end - start >= 128:
+        f.seek(end - 128)
+        if f.read(3) == b"TAG":
+            end -= 128
+    return start, end
+
+
+def audio_bitrate() -> int:
+    """
+    Bits per second of the constant-bitrate MP3s requested with
+    TTS_OUTPUT_FORMAT (e.g. mp3_44100_128), used to time the audio.
+    """
+    try:
+        return int(settings.TTS_OUTPUT_FORMAT.rsplit("_", 1)[1]) * 1000
+    except (IndexError, ValueError):
+        return 128000
+
+
+def concat_audio(chunk_paths: List[str], output_path: str) -> List[float]:
+    """
+    Join the chunks' MP3 frames into one file, without re-encoding.
+
+    Returns:
+        The duration of each chunk in seconds
+    """
+    bytes_per_second = audio_bitrate() / 8
+    durations = []
+    with open(output_path, "wb") as output:
+        for path in chunk_paths:
+            with open(path, "rb") as f:
+                start, end = _frame_range(f)
+                f.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    block = f.read(min(DOWNLOAD_BLOCK_BYTES, remaining))
+                    if not block:
+                        break
+                    output.write(block)
+                    remaining -= len(block)
+            durations.append((end - start) / bytes_per_second)
+    return durations
+
+
+def manifest_path(audio_path: str) -> str:
+    return f"{os.path.splitext(audio_path)[0]}.timing.json"
+
+
+def discard_speech(future) -> None:
+    """
+    Remove the audio, and its timing manifest, of a speech future that is
+    no longer needed, once it has one.
+    """
+    if future.cancelled() or future.exception() is not None:
+        return
+    audio_path = future.result()
+    for path in (audio_path, manifest_path(audio_path)):
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+def write_timing_manifest(audio_path: str, chunks: List[str], durations: List[float]) -> None:
+    """
+    Record where each chunk of the script starts in the audio.
+    """
+    entries = []
+    start = 0.0
+    for i, (text, duration) in enumerate(zip(chunks, durations)):
+        entries.append({"index": i, "text": text, "start": round(start, 3), "duration": round(duration, 3)})
+        start += duration
+    with open(manifest_path(audio_path), "w") as f:
+        json.dump({"audio": os.path.basename(audio_path), "duration": round(start, 3), "chunks": entries}, f, indent=2)
+
+
+def load_timing_manifest(audio_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Load the timing manifest written with the audio, or None if there is
+    none (e.g. for placeholder audio).
+    """
+    try:
+        with open(manifest_path(audio_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def align_scenes(manifest: Dict[str, Any], scenes: List[Dict[str, Any]]) -> List[float]:
+    """
+    Fit the scenes to the narration: their planned durations are scaled to
+    the length of the audio, and each cut is moved to the nearest chunk
+    boundary so that scenes change between sentences.
+
+    Args:
+        manifest: Timing manifest of the narration
+        scenes: The scenes of the video
+
+    Returns:
+        The duration of each scene in seconds
+    """
+    total = manifest["duration"]
+    planned = [max(1.0, float(scene.get("duration_seconds", 15) or 15)) for scene in scenes]
+    boundaries = [chunk["start"] + chunk["duration"] for chunk in manifest["chunks"]][:-1]
+
+    cuts = []
+    previous = 0.0
+    elapsed = 0.0
+    for duration in planned[:-1]:
+        elapsed += duration
+        target = total * elapsed / sum(planned)
+        later = [b for b in boundaries if b > previous + 1.0]
+        nearest = min(later, key=lambda b: abs(b - target), default=None)
+        # Only snap when a boundary is reasonably close to the planned cut
+        cut = nearest if nearest is not None and abs(nearest - target) <= total / len(planned) / 4 else target
+        cut = max(cut, previous + 1.0)
+        cuts.append(cut)
+        previous = cut
+
+    edges = [0.0] + cuts + [max(total, previous + 1.0)]
+    return [round(end - start, 3) for start, end in zip(edges, edges[1:])]
+
+
+def synthesize_with_elevenlabs(text: str, output_path: str, previous_text: str = "", next_text: str = "") -> str:
+    """
+    Synthesize text with the ElevenLabs API. The audio is streamed to a
+    temporary file next to output_path as it arrives and renamed into place
+    once complete, so it is never held in memory as a whole and readers
+    never see a partial file.
+
+    Args:
+        text: The text to speak
+        output_path: Path to save the generated audio
+        previous_text: Text spoken just before, for continuity
+        next_text: Text spoken just after, for continuity
+
+    Returns:
+        Path to the generated audio file
+
+    Raises:
+        requests.RequestException: If the request fails
+    """
+    # ElevenLabs API endpoint for text-to-speech
+    url = f"{settings.ELEVENLABS_API_URL}/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
+
+    # Request headers (the API key is set on the session)
+    headers = {
+        "Accept": "audio/mpeg",
+        "Content-Type": "application/json"
+    }
+
+    # Request body
+    data = {
+        "text": text,
+        "model_id": ELEVENLABS_MODEL_ID,
+        "voice_settings": ELEVENLABS_VOICE_SETTINGS
+    }
+    if previous_text:
+        data["previous_text"] = previous_text
+    if next_text:
+        data["next_text"] = next_text
+
+    temp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+    with get_elevenlabs_session().post(
+        url,
+        params={"output_format": settings.TTS_OUTPUT_FORMAT},
+        json=data,
+        headers=headers,
+        stream=True,
+        timeout=call_timeout(settings.TTS_CALL_TIMEOUT, "elevenlabs")
+    ) as response:
+        if response.status_code != 200:
+            raise requests.HTTPError(f"ElevenLabs API error: {response.status_code} - {response.text}", response=response)
+
+        try:
+            with open(temp_path, "wb") as audio_file:
+                for block in response.iter_content(chunk_size=DOWNLOAD_BLOCK_BYTES):
+                    audio_file.write(block)
+            os.replace(temp_path, output_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return output_path
+
+
 def generate_with_elevenlabs(script: str, output_path: str) -> str:
     """
     Generate speech using ElevenLabs API.
@@ -67,51 +483,20 @@ def generate_with_elevenlabs(script: str, output_path: str) -> str:
     logger.info("Generating speech with ElevenLabs API")
     
     try:
-        # ElevenLabs API endpoint for text-to-speech
-        url = "https://api.elevenlabs.io/v1/text-to-speech/21m00Tcm4TlvDq8ikWAM"
-        
-        # Request headers
-        headers = {
-            "Accept": "audio/mpeg",
-            "Content-Type": "application/json",
-            "xi-api-key": ELEVENLABS_API_KEY
-        }
-        
-        # Request body
-        data = {
-            "text": script,
-            "model_id": "eleven_monolingual_v1",
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.5
-            }
-        }
-        
-        # Send POST request to ElevenLabs API
-        logger.info("Sending request to ElevenLabs API")
-        response = requests.post(url, json=data, headers=headers)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            # Save the audio to the output path
-            with open(output_path, "wb") as audio_file:
-                audio_file.write(response.content)
-            logger.info(f"ElevenLabs audio saved to {output_path}")
-            return output_path
-        else:
-            # Log the error and fall back to placeholder
-            logger.error(f"ElevenLabs API error: {response.status_code} - {response.text}")
-            return create_placeholder_audio(script, output_path)
+        synthesize_chunk(script, output_path)
+        logger.info(f"ElevenLabs audio saved to {output_path}")
+        return output_path
             
     except Exception as e:
         logger.error(f"Error with ElevenLabs API: {str(e)}", exc_info=True)
+        record_error("generate_speech")
         return create_placeholder_audio(script, output_path)
 
 
 def create_placeholder_audio(script: str, output_path: str) -> str:
     """
     Create a placeholder audio file with the script text.
-    In a real implementation, this would be replaced with a local TTS solution.
+    Last resort when neither ElevenLabs nor a local speech engine is available.
     
     Args:
         script: The narration script text
@@ -0,0 +1,107 @@
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Callable, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def resolve_stage_order(dependencies: Dict[str, List[str]]) -> List[str]:
+    """
+    Return the stages in an order where every stage comes after its dependencies.
+
+    Args:
+        dependencies: Mapping of stage name to the names of the stages it waits on
+
+    Returns:
+        List of stage names in dependency order
+
+    Raises:
+        ValueError: If a dependency is unknown or the dependencies form a cycle
+    """
+    order = []
+    visiting = set()
+    visited = set()
+
+    def visit(name: str) -> None:
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f"Stage dependency cycle detected at '{name}'")
+        if name not in dependencies:
+            raise ValueError(f"Unknown stage '{name}'")
+
+        visiting.add(name)
+        for dependency in dependencies[name]:
+            visit(dependency)
+        visiting.discard(name)
+        visited.add(name)
+        order.append(name)
+
+    for name in dependencies:
+        visit(name)
+
+    return order
+
+
+def run_stages(
+    stages: Dict[str, Callable[[Dict[str, Any]], Any]],
+    dependencies: Optional[Dict[str, List[str]]] = None,
+    max_workers: int = 1
+) -> Dict[str, Any]:
+    """
+    Run a set of named stages, starting each one as soon as the stages it depends
+    on have finished. Independent stages run concurrently on a thread pool.
+
+    Args:
+        stages: Mapping of stage name to a callable. Each callable receives a dict
+            with the results of its dependencies, keyed by stage name.
+        dependencies: Mapping of stage name to the stage names it waits on.
+            Stages that are missing from the mapping have no dependencies.
+        max_workers: Maximum number of stages running at the same time.
+            With 1 the stages run serially in the calling thread.
+
+    Returns:
+        Dictionary of stage name to the value returned by that stage
+
+    Raises:
+        Exception: The first exception raised by any stage is re-raised
+    """
+    dependencies = {name: list((dependencies or {}).get(name, [])) for name in stages}
+    order = resolve_stage_order(dependencies)
+    results: Dict[str, Any] = {}
+
+    if max_workers <= 1:
+        for name in order:
+            results[name] = stages[name]({dep: results[dep] for dep in dependencies[name]})
+        return results
+
+    pending = list(order)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage") as executor:
+        try:
+            while pending or running:
+                # Start every stage whose dependencies have all completed
+                for name in list(pending):
+                    if all(dep in results for dep in dependencies[name]):
+                        pending.remove(name)
+                        dep_results = {dep: results[dep] for dep in dependencies[name]}
+                        logger.debug(f"Starting stage '{name}'")
+                        # Run in a copy of the caller's context so per-request state
+                        # such as metrics timings follows the stage onto the pool thread
+                        context = contextvars.copy_context()
+                        running[executor.submit(context.run, stages[name], dep_results)] = name
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    logger.debug(f"Stage '{name}' completed")
+        except Exception:
+            for future in running:
+                future.cancel()
+            raise
+
+    return results
@@ -1,11 +1,21 @@
 import os
+import math
 import logging
 import requests
 import json
 import time
 import uuid
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
 from typing import Dict, Any, List, Optional
 from config import settings
+from services.metrics import instrumented, record_error, observe
+from services.deadline import check_deadline, call_timeout, current_deadline
+from services import video_renderer
+from services.speech_generator import load_timing_manifest, align_scenes
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -14,7 +24,22 @@ logger = logging.getLogger(__name__)
 RUNWAY_ML_API_KEY = os.environ.get("RUNWAY_ML_API_KEY", "")
 TEMP_DIR = os.environ.get("TEMP_DIR", "./temp")
 
-def generate_video(content: Dict[str, Any], subject: str, audio_path: str, user_id: Optional[int] = None) -> str:
+# Runway task states that mean the task is still going
+RUNWAY_PENDING_STATES = {"PENDING", "THROTTLED", "RUNNING"}
+
+# Scene tasks of all requests share one bounded pool and one keep-alive session
+_scene_executor: Optional[ThreadPoolExecutor] = None
+_runway_session: Optional[requests.Session] = None
+_runway_lock = threading.Lock()
+
+
+class RunwayTaskFailed(Exception):
+    """
+    Raised when RunwayML reports a scene task as failed or it never finishes.
+    """
+
+@instrumented("generate_video")
+def generate_video(content: Dict[str, Any], subject: str, audio_path: str, user_id: Optional[int] = None, scene_clips: Optional[Dict[int, Dict[str, Any]]] = None) -> str:
     """
     Generate a video using text-to-video APIs based on the content and audio.
     Enhanced to support additional content features and personalization.
@@ -24,6 +49,8 @@ def generate_video(content: Dict[str, Any], subject: str, audio_path: str, user_
         subject: The subject area (for context-appropriate visuals)
         audio_path: Path to the generated audio file
         user_id: Optional user ID for personalized video generation
+        scene_clips: Scenes already rendered with render_scene while the content
+            was still being generated, keyed by scene index
         
     Returns:
         Path to the generated video file
@@ -55,7 +82,10 @@ def generate_video(content: Dict[str, Any], subject: str, audio_path: str, user_
         # Choose the appropriate video generation method based on available APIs
         if RUNWAY_ML_API_KEY:
             # Use RunwayML API to generate the video
-            video_path = generate_with_runway(content, subject, audio_path, output_path)
+            video_path = generate_with_runway(content, subject, audio_path, output_path, scene_clips)
+        elif video_renderer.is_available():
+            # Render scene cards locally and mux them with the narration
+            video_path = render_local_video(content, subject, audio_path, output_path)
         else:
             # Check for subject-specific generation methods
             if subject == "Coding":
@@ -76,6 +106,7 @@ def generate_video(content: Dict[str, Any], subject: str, audio_path: str, user_
         
     except Exception as e:
         logger.error(f"Error in video generation: {str(e)}", exc_info=True)
+        record_error("generate_video")
         # Create an error video file with information
         error_path = os.path.join(TEMP_DIR, "error_video.mp4")
         with open(error_path, 'w') as f:
@@ -85,93 +116,341 @@ def generate_video(content: Dict[str, Any], subject: str, audio_path: str, user_
         return error_path
 
 
-def generate_with_runway(content: Dict[str, Any], subject: str, audio_path: str, output_path: str) -> str:
+def build_scene_prompt(scene: Dict[str, Any], subject: str) -> Dict[str, Any]:
+    """
+    Build the RunwayML generation request for one scene, incorporating its visual elements.
+    """
+    # Use visual_elements if available for more specific scene generation
+    visual_elements = scene.get("visual_elements", "")
+    
+    # Combine description and visual elements for a richer prompt
+    prompt = scene.get("description", "")
+    if visual_elements:
+        prompt += f" {visual_elements}"
+    
+    return {
+        "prompt": prompt,
+        "duration": runway_duration(scene),
+        "style": get_subject_style(subject),  # Apply subject-specific style
+        "negative_prompt": "poor quality, blurry, distorted"  # Avoid common issues
+    }
+
+
+def runway_duration(scene: Dict[str, Any]) -> int:
+    """
+    The clip length to request for a scene: the shortest of RUNWAY_DURATIONS
+    that covers the scene, or the longest one. generate_with_runway cuts or
+    holds the clip to the scene's length.
+    """
+    supported = sorted(int(d) for d in settings.RUNWAY_DURATIONS.split(",") if d.strip())
+    wanted = video_renderer.scene_duration(scene)
+    return next((d for d in supported if d >= wanted), supported[-1])
+
+
+def discard_clip(future) -> None:
+    """
+    Remove the downloaded clip of a scene future, once it has one.
+    """
+    if future.cancelled() or future.exception() is not None:
+        return
+    path = future.result()["path"]
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def get_runway_session() -> requests.Session:
+    """
+    Return the session shared by all RunwayML calls, sized so that every
+    scene worker keeps its connection alive.
+    """
+    global _runway_session
+    with _runway_lock:
+        if _runway_session is None:
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(pool_maxsize=settings.RUNWAY_MAX_PARALLEL_SCENES))
+            session.mount("https://", HTTPAdapter(pool_maxsize=settings.RUNWAY_MAX_PARALLEL_SCENES))
+            session.headers.update({
+                "Authorization": f"Bearer {RUNWAY_ML_API_KEY}",
+                "X-Runway-Version": settings.RUNWAY_API_VERSION
+            })
+            _runway_session = session
+        return _runway_session
+
+
+def get_scene_executor() -> ThreadPoolExecutor:
+    """
+    Return the pool rendering scenes, which bounds the number of RunwayML
+    tasks this process has running at once.
+    """
+    global _scene_executor
+    with _runway_lock:
+        if _scene_executor is None:
+            _scene_executor = ThreadPoolExecutor(
+                max_workers=settings.RUNWAY_MAX_PARALLEL_SCENES,
+                thread_name_prefix="runway-scene"
+            )
+        return _scene_executor
+
+
+def submit_scene(scene: Dict[str, Any], subject: str):
+    """
+    Start rendering a scene on the scene pool. The current request deadline
+    carries over to the pool thread.
+    
+    Returns:
+        Future resolving to the result of render_scene
+    """
+    context = contextvars.copy_context()
+    return get_scene_executor().submit(context.run, render_scene, scene, subject)
+
+
+def wait_for_runway_task(session: requests.Session, task_id: str) -> Dict[str, Any]:
+    """
+    Poll a RunwayML task until it finishes. The interval starts at
+    RUNWAY_POLL_INITIAL and grows by half each poll up to RUNWAY_POLL_MAX,
+    with jitter so that scenes submitted together don't poll in lockstep.
+    
+    Returns:
+        The finished task
+    
+    Raises:
+        RunwayTaskFailed: If the task failed or took longer than RUNWAY_TASK_TIMEOUT
+        DeadlineExceeded: If the request ran out of time while waiting
+    """
+    give_up_at = time.monotonic() + settings.RUNWAY_TASK_TIMEOUT
+    interval = settings.RUNWAY_POLL_INITIAL
+    while True:
+        response = session.get(
+            f"{settings.RUNWAY_API_URL}/v1/tasks/{task_id}",
+            timeout=call_timeout(settings.RUNWAY_CALL_TIMEOUT, "runway")
+        )
+        response.raise_for_status()
+        task = response.json()
+        status = task.get("status")
+        if status == "SUCCEEDED":
+            return task
+        if status not in RUNWAY_PENDING_STATES:
+            raise RunwayTaskFailed(f"Runway task {task_id} {status}: {task.get('failure', 'no reason given')}")
+
+        wait = random.uniform(0.5, 1.0) * interval
+        if time.monotonic() + wait > give_up_at:
+            raise RunwayTaskFailed(f"Runway task {task_id} still {status} after {settings.RUNWAY_TASK_TIMEOUT:.0f}s")
+        deadline = current_deadline()
+        if deadline is not None:
+            if deadline.remaining() < wait:
+                deadline.check("runway")
+                wait = deadline.remaining()
+            # Wakes up early when the watchdog cancels the request
+            if deadline.cancelled.wait(wait):
+                deadline.check("runway")
+        else:
+            time.sleep(wait)
+        interval = min(settings.RUNWAY_POLL_MAX, interval * 1.5)
+
+
+def download_clip(session: requests.Session, url: str, task_id: str) -> str:
+    """
+    Download a finished clip into TEMP_DIR.
+    
+    Returns:
+        Path to the clip
+    """
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    clip_path = os.path.join(TEMP_DIR, f"scene_{task_id}.mp4")
+    with session.get(url, stream=True, timeout=call_timeout(settings.RUNWAY_CALL_TIMEOUT, "runway")) as response:
+        response.raise_for_status()
+        with open(clip_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+    return clip_path
+
+
+def render_scene(scene: Dict[str, Any], subject: str) -> Dict[str, Any]:
+    """
+    Generate the clip for one scene with a RunwayML text-to-video task: submit
+    it, poll until it finishes and download the clip. Can be called as soon as
+    the scene has been generated, before the rest of the content is ready.
+    
+    Args:
+        scene: The scene description
+        subject: The subject area (for the visual style)
+        
+    Returns:
+        The rendered clip, including the scene it was rendered from and the
+        path of the downloaded clip
+    
+    Raises:
+        RunwayTaskFailed: If RunwayML could not render the scene
+    """
+    prompt = build_scene_prompt(scene, subject)
+    check_deadline("runway")
+    logger.info(f"Processing scene: {prompt['prompt'][:50]}...")
+    
+    start = time.perf_counter()
+    session = get_runway_session()
+    response = session.post(
+        f"{settings.RUNWAY_API_URL}/v1/text_to_video",
+        json={
+            "model": settings.RUNWAY_MODEL,
+            "promptText": f"{prompt['prompt']} Style: {prompt['style']}. Avoid: {prompt['negative_prompt']}."[:1000],
+            "duration": prompt["duration"],
+            "ratio": settings.RUNWAY_RATIO
+        },
+        timeout=call_timeout(settings.RUNWAY_CALL_TIMEOUT, "runway")
+    )
+    response.raise_for_status()
+    task_id = response.json()["id"]
+    
+    task = wait_for_runway_task(session, task_id)
+    outputs = task.get("output") or []
+    if not outputs:
+        raise RunwayTaskFailed(f"Runway task {task_id} succeeded without output")
+    clip_path = download_clip(session, outputs[0], task_id)
+    observe("runway_scene", time.perf_counter() - start)
+    return {"scene": scene, "request": prompt, "task_id": task_id, "path": clip_path}
+
+
+def generate_with_runway(content: Dict[str, Any], subject: str, audio_path: str, output_path: str, scene_clips: Optional[Dict[int, Dict[str, Any]]] = None) -> str:
     """
     Generate a video using RunwayML API with enhanced scene descriptions and visual elements.
     This implementation handles the expanded content structure with visual elements.
+    Scenes found in scene_clips with an identical scene description are not rendered again.
+    
+    All other scenes are submitted at once to the shared scene pool, so the
+    video takes about as long as its slowest scene rather than the sum of
+    all of them. Clips are assembled in scene order whatever order they
+    finish in: each is re-encoded to the length of its scene (aligned to the
+    narration when it has a timing manifest), then they are joined and muxed
+    with the narration.
     
     Returns:
         Path to the generated video file
     """
     logger.info("Generating enhanced video with RunwayML API")
     
+    scene_clips = scene_clips or {}
+    pending = {}
+    segment_paths = []
+    fits = []
     try:
-        api_key = RUNWAY_ML_API_KEY
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+        if video_renderer.get_ffmpeg() is None:
+            raise video_renderer.RenderError("ffmpeg is not installed, the clips can't be assembled")
         
         # Extract scenes from content
         scenes = content.get("scenes", [])
+        if not scenes:
+            raise RunwayTaskFailed("The content has no scenes to render")
         
-        # Create enhanced prompts for each scene, incorporating visual elements
-        prompts = []
-        for scene in scenes:
-            # Use visual_elements if available for more specific scene generation
-            visual_elements = scene.get("visual_elements", "")
-            
-            # Combine description and visual elements for a richer prompt
-            prompt = scene["description"]
-            if visual_elements:
-                prompt += f" {visual_elements}"
-                
-            prompts.append({
-                "prompt": prompt,
-                "duration": scene.get("duration_seconds", 15),
-                "style": get_subject_style(subject),  # Apply subject-specific style
-                "negative_prompt": "poor quality, blurry, distorted"  # Avoid common issues
-            })
+        # Submit every scene that was not rendered while the content was
+        # streaming in, then collect the clips in scene order
+        for i, scene in enumerate(scenes):
+            clip = scene_clips.get(i)
+            if clip is None or clip["scene"] != scene:
+                pending[i] = submit_scene(scene, subject)
+        logger.info(f"Rendering {len(pending)} of {len(scenes)} scenes with RunwayML")
         
-        # In a production implementation, we would make actual API calls to RunwayML
-        # For demonstration, we're simulating the process
-        logger.info(f"Would send {len(prompts)} enhanced scenes to RunwayML API")
+        clips = []
+        try:
+            for i, scene in enumerate(scenes):
+                clips.append(pending[i].result() if i in pending else scene_clips[i])
+        except Exception:
+            # Don't start scenes of a video that can't be assembled anymore
+            for future in pending.values():
+                future.cancel()
+            raise
         
-        # Simulate video generation process with progress logging
-        logger.info("Simulating enhanced video generation process...")
-        for i, prompt in enumerate(prompts):
-            logger.info(f"Processing scene {i+1}/{len(prompts)}: {prompt['prompt'][:50]}...")
-            time.sleep(0.5)  # Simulate processing time
+        # Runway renders fixed clip lengths; cut or hold each clip to its scene
+        manifest = load_timing_manifest(audio_path) if audio_path else None
+        if manifest:
+            durations = align_scenes(manifest, scenes)
+        else:
+            durations = [video_renderer.scene_duration(scene) for scene in scenes]
         
-        # Create a more detailed demonstration file since we're not actually generating video
-        with open(output_path, 'w') as f:
-            f.write(f"TAPBUDDY EDUCATIONAL VIDEO\n")
-            f.write(f"==========================\n\n")
-            f.write(f"Title: {content['title']}\n")
-            f.write(f"Description: {content['description']}\n\n")
-            
-            # Include learning objectives
-            if "learning_objectives" in content:
-                f.write("LEARNING OBJECTIVES:\n")
-                for i, obj in enumerate(content["learning_objectives"]):
-                    f.write(f"{i+1}. {obj}\n")
-                f.write("\n")
-            
-            # Include key points
-            f.write("KEY POINTS:\n")
-            for i, point in enumerate(content.get("key_points", [])):
-                f.write(f"{i+1}. {point}\n")
-            f.write("\n")
-            
-            # Include script
-            f.write("SCRIPT:\n")
-            f.write(content['script'])
-            f.write("\n\n")
-            
-            # Include detailed scene descriptions
-            f.write("SCENES:\n")
-            for i, scene in enumerate(scenes):
-                f.write(f"Scene {i+1}: {scene.get('description', '')}\n")
-                f.write(f"Narration: {scene.get('narration', '')}\n")
-                if "visual_elements" in scene:
-                    f.write(f"Visual Elements: {scene.get('visual_elements', '')}\n")
-                f.write(f"Duration: {scene.get('duration_seconds', 15)} seconds\n\n")
+        parallel = min(len(clips), settings.VIDEO_RENDER_WORKERS or os.cpu_count() or 1)
+        threads = video_renderer.encoder_threads(parallel)
+        segment_paths = [f"{output_path}.scene{i}.mp4" for i in range(len(clips))]
+        executor = video_renderer.get_render_executor()
+        fits = [
+            executor.submit(contextvars.copy_context().run, video_renderer.fit_clip, clip["path"], path, duration, threads)
+            for clip, path, duration in zip(clips, segment_paths, durations)
+        ]
+        for future in fits:
+            future.result()
+        video_renderer.concat_segments(segment_paths, audio_path, output_path)
         
-        logger.info(f"Enhanced video representation saved to {output_path}")
+        logger.info(f"Assembled {len(clips)} RunwayML clips into {output_path}")
         return output_path
     
     except Exception as e:
         logger.error(f"Error generating video with RunwayML: {str(e)}", exc_info=True)
+        if video_renderer.is_available():
+            # Still a real video, rendered from the scenes locally
+            return render_local_video(content, subject, audio_path, output_path)
+        return generate_basic_video(content, subject, audio_path, output_path)
+    
+    finally:
+        # The clips are only needed to assemble this video; scenes still
+        # rendering after a failure are removed once they are downloaded
+        for future in fits:
+            future.cancel()
+        wait(fits)
+        for path in segment_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        for clip in scene_clips.values():
+            if os.path.exists(clip["path"]):
+                os.remove(clip["path"])
+        for future in pending.values():
+            future.add_done_callback(discard_clip)
+
+
+def snap_to_grid(durations: List[float], grid: float) -> List[float]:
+    """
+    Round the cuts between scenes to multiples of grid seconds. Rounding the
+    cuts rather than each duration keeps the scenes within half a grid step
+    of the narration; the last cut is rounded up so the video covers it.
+    """
+    if grid <= 0:
+        return durations
+    snapped = []
+    cut = 0.0
+    elapsed = 0.0
+    for i, duration in enumerate(durations):
+        elapsed += duration
+        steps = math.ceil(elapsed / grid - 1e-6) if i == len(durations) - 1 else round(elapsed / grid)
+        next_cut = max(cut + grid, steps * grid)
+        snapped.append(round(next_cut - cut, 3))
+        cut = next_cut
+    return snapped
+
+
+def render_local_video(content: Dict[str, Any], subject: str, audio_path: str, output_path: str) -> str:
+    """
+    Render a real MP4 from the scenes with the local ffmpeg renderer, falling
+    back to the text summaries if rendering fails. When the narration has a
+    timing manifest, the scenes are stretched to the narration and cut
+    between sentences, with the cuts on a VIDEO_SCENE_GRID_SECONDS grid:
+    fragments are cached by duration, so this lets scenes shared between
+    lessons with different narrations still come from the cache.
+    
+    Returns:
+        Path to the generated video file
+    """
+    manifest = load_timing_manifest(audio_path) if audio_path else None
+    scenes = content.get("scenes")
+    if manifest and scenes:
+        durations = snap_to_grid(align_scenes(manifest, scenes), settings.VIDEO_SCENE_GRID_SECONDS)
+        content = dict(content, scenes=[dict(scene, duration_seconds=d) for scene, d in zip(scenes, durations)])
+    
+    try:
+        return video_renderer.render_video(content, subject, audio_path, output_path)
+    except video_renderer.RenderError as e:
+        logger.error(f"Local video rendering failed: {str(e)}")
+        record_error("render_video")
+        if subject == "Coding":
+            return generate_coding_video(content, audio_path, output_path)
+        if subject == "Science":
+            return generate_science_video(content, audio_path, output_path)
         return generate_basic_video(content, subject, audio_path, output_path)
 
 
@@ -0,0 +1,342 @@
+import os
+import time
+import shutil
+import logging
+import textwrap
+import threading
+import subprocess
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from config import settings
+from services.metrics import observe
+from services.deadline import check_deadline
+from services.fragment_cache import fragment_key, fetch_fragment, store_fragment
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # Pillow is optional; without it videos fall back to text summaries
+    Image = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Fonts tried when VIDEO_FONT_PATH is not set
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+]
+
+# Background and accent colours of the scene cards for each subject
+SUBJECT_PALETTES = {
+    "Visual Arts": ((74, 20, 140), (255, 193, 7)),
+    "Performing Arts": ((136, 14, 79), (255, 138, 101)),
+    "Coding": ((18, 24, 38), (0, 230, 118)),
+    "Financial Literacy": ((13, 71, 161), (129, 199, 132)),
+    "Science": ((0, 77, 64), (128, 222, 234)),
+}
+DEFAULT_PALETTE = ((38, 50, 56), (255, 213, 79))
+
+# Scenes render on a process-wide pool; each scene is encoded by its own ffmpeg process
+_render_executor: Optional[ThreadPoolExecutor] = None
+_render_lock = threading.Lock()
+_fonts: Dict[int, Any] = {}
+
+
+class RenderError(Exception):
+    """
+    Raised when ffmpeg fails to encode or mux a video.
+    """
+
+
+def get_ffmpeg() -> Optional[str]:
+    """
+    Path of the ffmpeg binary, or None if it is not installed.
+    """
+    return shutil.which(settings.FFMPEG_PATH)
+
+
+def is_available() -> bool:
+    """
+    Whether real videos can be rendered: ffmpeg is installed and Pillow is
+    available to draw the text.
+    """
+    return settings.VIDEO_RENDERER_ENABLED and Image is not None and get_ffmpeg() is not None
+
+
+def get_font(size: int):
+    font = _fonts.get(size)
+    if font is None:
+        paths = [settings.VIDEO_FONT_PATH] if settings.VIDEO_FONT_PATH else FONT_CANDIDATES
+        for path in paths:
+            try:
+                font = ImageFont.truetype(path, size)
+                break
+            except OSError:
+                continue
+        else:
+            font = ImageFont.load_default(size=size)
+        _fonts[size] = font
+    return font
+
+
+def draw_scene_card(scene: Dict[str, Any], subject: str) -> np.ndarray:
+    """
+    Draw the card shown during one scene: its description as the heading
+    and its visual elements below. The card depends on nothing else (the
+    narration is heard, not shown), so scenes shared between lessons, such
+    as intros and outros, render to the same fragment.
+
+    Returns:
+        RGB frame as a (height, width, 3) uint8 array
+    """
+    width, height = settings.VIDEO_WIDTH, settings.VIDEO_HEIGHT
+    background, accent = SUBJECT_PALETTES.get(subject, DEFAULT_PALETTE)
+    image = Image.new("RGB", (width, height), background)
+    draw = ImageDraw.Draw(image)
+
+    margin = width // 16
+    medium, large = height // 22, height // 12
+
+    lines = textwrap.wrap(scene.get("description", ""), width=int(width / (large * 0.55)))[:4]
+    y = (height - len(lines) * int(large * 1.25)) // 2 - medium
+    for line in lines:
+        draw.text((margin, y), line, font=get_font(large), fill=(255, 255, 255))
+        y += int(large * 1.25)
+
+    y += medium
+    for line in textwrap.wrap(scene.get("visual_elements", ""), width=int(width / (medium * 0.5)))[:3]:
+        draw.text((margin, y), line, font=get_font(medium), fill=accent)
+        y += int(medium * 1.35)
+
+    return np.asarray(image, dtype=np.uint8)
+
+
+def scene_duration(scene: Dict[str, Any]) -> float:
+    try:
+        return max(1.0, float(scene.get("duration_seconds", 15)))
+    except (TypeError, ValueError):
+        return 15.0
+
+
+def encoder_threads(parallel_scenes: int) -> int:
+    """
+    x264 threads per scene, so that the scenes rendering at once share the cores.
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, parallel_scenes))
+
+
+def run_ffmpeg(args: List[str], operation: str) -> None:
+    result = subprocess.run([get_ffmpeg(), "-hide_banner", "-loglevel", "error", "-y"] + args, capture_output=True)
+    if result.returncode != 0:
+        raise RenderError(f"ffmpeg {operation} failed: {result.stderr.decode(errors='replace')[-500:]}")
+
+
+def encoding_settings() -> Dict[str, Any]:
+    """
+    Everything besides the scene that determines the bytes of a fragment.
+    Fragments are only joined with a stream copy if all of these match.
+    """
+    return {
+        "size": f"{settings.VIDEO_WIDTH}x{settings.VIDEO_HEIGHT}",
+        "fps": settings.VIDEO_FPS,
+        "card_fps": settings.VIDEO_CARD_FPS,
+        "preset": settings.VIDEO_X264_PRESET,
+        "crf": settings.VIDEO_CRF,
+        "font": settings.VIDEO_FONT_PATH,
+    }
+
+
+def render_scene_segment(scene: Dict[str, Any], subject: str, output_path: str, threads: int = 1) -> str:
+    """
+    Encode one scene to an MP4 segment. Frames are piped to ffmpeg as raw
+    RGB at VIDEO_CARD_FPS and repeated by ffmpeg up to VIDEO_FPS; only the
+    progress bar changes between frames, so the card is drawn once.
+
+    Returns:
+        Path to the segment
+    """
+    check_deadline("render_video")
+    width, height = settings.VIDEO_WIDTH, settings.VIDEO_HEIGHT
+    card_fps = max(1, min(settings.VIDEO_CARD_FPS, settings.VIDEO_FPS))
+    card = draw_scene_card(scene, subject)
+    _, accent = SUBJECT_PALETTES.get(subject, DEFAULT_PALETTE)
+
+    frame_count = int(round(scene_duration(scene) * card_fps))
+    bar_top = height - max(4, height // 120)
+    command = [
+        get_ffmpeg(), "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(card_fps), "-i", "-",
+        "-r", str(settings.VIDEO_FPS), "-c:v", "libx264", "-preset", settings.VIDEO_X264_PRESET, "-tune", "stillimage",
+        "-crf", str(settings.VIDEO_CRF), "-pix_fmt", "yuv420p", "-threads", str(threads),
+        "-movflags", "+faststart", output_path
+    ]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        frame = card.copy()
+        filled = 0
+        for i in range(frame_count):
+            # Grow the progress bar in place instead of redrawing the card
+            target = width * (i + 1) // frame_count
+            if target > filled:
+                frame[bar_top:, filled:target] = accent
+                filled = target
+            process.stdin.write(memoryview(frame))
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    finally:
+        stderr = process.stderr.read()
+        process.wait()
+    if process.returncode != 0:
+        raise RenderError(f"ffmpeg failed on {output_path}: {stderr.decode(errors='replace')[-500:]}")
+    return output_path
+
+
+def fit_clip(input_path: str, output_path: str, duration: float, threads: int = 1) -> str:
+    """
+    Re-encode a clip made elsewhere (e.g. by RunwayML) like a rendered scene,
+    so that clips of any size, frame rate or codec can be joined with a
+    stream copy. The clip is scaled and letterboxed to the video size and
+    cut to duration seconds, holding its last frame if it is shorter.
+
+    Returns:
+        Path to the segment
+    """
+    check_deadline("render_video")
+    width, height = settings.VIDEO_WIDTH, settings.VIDEO_HEIGHT
+    filters = (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={settings.VIDEO_FPS},"
+        f"tpad=stop_mode=clone:stop_duration={duration:.3f}"
+    )
+    run_ffmpeg([
+        "-i", input_path, "-vf", filters, "-t", f"{duration:.3f}", "-an",
+        "-c:v", "libx264", "-preset", settings.VIDEO_X264_PRESET, "-crf", str(settings.VIDEO_CRF),
+        "-pix_fmt", "yuv420p", "-threads", str(threads), "-movflags", "+faststart", output_path
+    ], "clip")
+    return output_path
+
+
+def render_cached_segment(scene: Dict[str, Any], subject: str, output_path: str, threads: int = 1) -> bool:
+    """
+    Place the fragment for a scene at output_path, from the fragment cache
+    if an identical scene was rendered before, otherwise by rendering it
+    and adding it to the cache.
+
+    Returns:
+        True if the fragment came from the cache
+    """
+    key = fragment_key(
+        scene,
+        SUBJECT_PALETTES.get(subject, DEFAULT_PALETTE),
+        scene_duration(scene),
+        encoding_settings()
+    )
+    # A leftover file may be a link to a cached fragment; never write through it
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    if fetch_fragment(key, output_path):
+        return True
+    render_scene_segment(scene, subject, output_path, threads)
+    store_fragment(key, output_path)
+    return False
+
+
+def get_render_executor() -> ThreadPoolExecutor:
+    global _render_executor
+    with _render_lock:
+        if _render_executor is None:
+            _render_executor = ThreadPoolExecutor(
+                max_workers=settings.VIDEO_RENDER_WORKERS or os.cpu_count() or 1,
+                thread_name_prefix="render-scene"
+            )
+        return _render_executor
+
+
+def concat_segments(segment_paths: List[str], audio_path: Optional[str], output_path: str) -> None:
+    """
+    Join scene segments without re-encoding and add the narration. If the
+    narration can't be decoded (e.g. placeholder audio), the video is
+    written without sound.
+    """
+    list_path = f"{output_path}.segments.txt"
+    with open(list_path, "w") as f:
+        for path in segment_paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+
+    concat_input = ["-f", "concat", "-safe", "0", "-i", list_path]
+    try:
+        if audio_path and os.path.exists(audio_path):
+            try:
+                run_ffmpeg(concat_input + [
+                    "-i", audio_path, "-map", "0:v", "-map", "1:a",
+                    "-c:v", "copy", "-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart", output_path
+                ], "mux")
+                return
+            except RenderError as e:
+                logger.warning(f"Could not add narration {audio_path}, writing the video without sound: {str(e)}")
+        run_ffmpeg(concat_input + ["-c", "copy", "-movflags", "+faststart", output_path], "concat")
+    finally:
+        os.remove(list_path)
+
+
+def render_video(content: Dict[str, Any], subject: str, audio_path: Optional[str], output_path: str) -> str:
+    """
+    Render the content's scenes as title cards and mux them with the
+    narration into an MP4. Scenes are encoded in parallel, each by its own
+    ffmpeg process, unless an identical scene is in the fragment cache; the
+    fragments are then joined with a stream copy.
+
+    Args:
+        content: The generated educational content; its scenes become the video
+        subject: The subject area (for the colours)
+        audio_path: The narration, or None for a silent video
+        output_path: Where to write the MP4
+
+    Returns:
+        Path to the rendered video
+
+    Raises:
+        RenderError: If ffmpeg fails
+    """
+    scenes = content.get("scenes") or [{
+        "description": content.get("title", ""),
+        "narration": content.get("description", ""),
+        "duration_seconds": 15
+    }]
+
+    start = time.perf_counter()
+    parallel = min(len(scenes), settings.VIDEO_RENDER_WORKERS or os.cpu_count() or 1)
+    threads = encoder_threads(parallel)
+    segment_paths = [f"{output_path}.scene{i}.mp4" for i in range(len(scenes))]
+    executor = get_render_executor()
+    futures = [
+        executor.submit(contextvars.copy_context().run, render_cached_segment, scene, subject, path, threads)
+        for scene, path in zip(scenes, segment_paths)
+    ]
+    try:
+        cached = sum(1 for future in futures if future.result())
+        concat_segments(segment_paths, audio_path, output_path)
+    finally:
+        # After a failure, let scenes that already started finish before removing their files
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        for path in segment_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    video_seconds = sum(scene_duration(scene) for scene in scenes)
+    elapsed = time.perf_counter() - start
+    observe("render_video", elapsed)
+    logger.info(
+        f"Rendered {video_seconds:.0f}s of video in {len(scenes)} scenes "
+        f"({cached} from the fragment cache) in {elapsed:.1f}s"
+    )
+    return output_path
@@ -5,7 +5,7 @@ import signal
 import logging
 from contextlib import contextmanager
 from services.content_generator import generate_educational_content
-import google.generativeai as genai
+from services.llm_client import get_model
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -105,11 +105,8 @@ def test_gemini_api_directly():
     print(f"Testing Gemini API directly with key: {gemini_api_key[:10]}... (truncated)")
     
     try:
-        # Configure the Gemini API
-        genai.configure(api_key=gemini_api_key)
-        
-        # Create a model instance with a shorter timeout
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        # Use the same shared model instance as the application
+        model = get_model()
         
         # Simple prompt for testing
         prompt = "What is photosynthesis? Answer in one short sentence."
@@ -0,0 +1,113 @@
+import threading
+import time
+
+from config import settings
+from services import job_queue
+from services.deadline import Deadline, DeadlineExceeded, call_timeout, current_deadline
+from services.pipeline import Pipeline, PipelineStage
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_stage_threads_see_the_request_deadline():
+    from app import app  # noqa: F401 (routes are imported through the app)
+    from routes.api import prefetch
+
+    seen = {}
+
+    def content(context):
+        seen["content"] = current_deadline()
+        seen["timeout"] = call_timeout(600)
+        # Work handed to another thread by a stage keeps the deadline too
+        seen["prefetch"] = prefetch(current_deadline).result()
+
+    def speech(context):
+        seen["speech"] = current_deadline()
+
+    pipeline = Pipeline([
+        PipelineStage("content", content, workers=1, queue_size=1),
+        PipelineStage("speech", speech, workers=1, queue_size=1),
+    ])
+    deadline = Deadline(30)
+    job = pipeline.submit({"deadline": deadline})
+
+    assert job.wait(10)
+    assert job.error is None
+    assert seen["content"] is deadline
+    assert seen["speech"] is deadline
+    assert seen["prefetch"] is deadline
+    assert seen["timeout"] <= 30
+
+
+def test_cancelled_deadline_skips_remaining_stages():
+    ran = []
+
+    def content(context):
+        ran.append("content")
+        context["deadline"].cancel("stopped by the watchdog")
+
+    def speech(context):
+        ran.append("speech")
+
+    pipeline = Pipeline([
+        PipelineStage("content", content, workers=1, queue_size=1),
+        PipelineStage("speech", speech, workers=1, queue_size=1),
+    ])
+    job = pipeline.submit({"deadline": Deadline(30)})
+
+    assert job.wait(10)
+    assert ran == ["content"]
+    assert job.failed_stage == "content"
+    assert isinstance(job.error, DeadlineExceeded)
+
+
+def test_watchdog_reaps_stuck_worker_and_replaces_it(app_context, make_request, monkeypatch):
+    from app import app
+    from models import VideoJob, VideoRequest
+
+    monkeypatch.setattr(settings, "REQUEST_DEADLINE_SECONDS", 0.5)
+    monkeypatch.setattr(settings, "WATCHDOG_GRACE_SECONDS", 0.5)
+    monkeypatch.setattr(settings, "JOB_LEASE_SECONDS", 3)
+    monkeypatch.setattr(settings, "JOB_POLL_INTERVAL", 0.05)
+
+    stuck_request_id = make_request().id
+    stuck_job = job_queue.enqueue_job(stuck_request_id, user_id=1).id
+    release = threading.Event()
+    handled = []
+
+    def handler(request_id, message_type):
+        if request_id == stuck_request_id:
+            # A hung upstream call that ignores its deadline
+            release.wait(30)
+        handled.append(request_id)
+
+    pool = job_queue.WorkerPool(app, num_workers=1, handler=handler)
+    pool.start()
+    try:
+        def reaped():
+            app_context.expire_all()
+            return app_context.get(VideoJob, stuck_job).status == "failed"
+        _wait_for(reaped)
+        assert app_context.get(VideoRequest, stuck_request_id).status == "failed"
+
+        # The only worker is still stuck, so this job needs the replacement
+        next_request_id = make_request(user_id=2).id
+        next_job = job_queue.enqueue_job(next_request_id, user_id=2).id
+        _wait_for(lambda: next_request_id in handled)
+
+        def completed():
+            app_context.expire_all()
+            return app_context.get(VideoJob, next_job).status == "done"
+        _wait_for(completed)
+    finally:
+        release.set()
+        pool.stop(timeout=5)
+
+    # The stuck worker finishing late does not revive its reaped job
+    app_context.expire_all()
+    assert app_context.get(VideoJob, stuck_job).status == "failed"
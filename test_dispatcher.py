@@ -0,0 +1,31 @@
+import pytest
+
+from config import settings
+from services import job_queue
+from services.dispatcher import dispatch_request
+
+
+@pytest.fixture(autouse=True)
+def queue_settings(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_QUEUE_DEPTH", 3)
+    monkeypatch.setattr(settings, "MAX_INFLIGHT_PER_USER", 0)
+
+
+def test_dispatch_rejects_when_queue_is_full(make_request):
+    accepted = [dispatch_request(make_request(user_id=user_id))[0] for user_id in (1, 2, 3)]
+    assert accepted == [True, True, True]
+
+    video_request = make_request(user_id=4)
+    assert dispatch_request(video_request) == (False, 0)
+    assert video_request.status == "failed"
+    assert video_request.request_metadata["rejected_reason"] == "queue_full"
+
+
+def test_dispatch_counts_leased_jobs_towards_depth(make_request):
+    for user_id in (1, 2, 3):
+        dispatch_request(make_request(user_id=user_id))
+    assert job_queue.lease_job("worker-1") is not None
+
+    # One job left the queue but still runs, so the queue is still full
+    assert dispatch_request(make_request(user_id=4))[0] is False
+
@@ -0,0 +1,75 @@
+import pytest
+
+from config import settings
+from services import job_queue
+from services.dispatcher import dispatch_request
+
+
+@pytest.fixture(autouse=True)
+def fair_settings(monkeypatch):
+    monkeypatch.setattr(settings, "FAIR_QUEUING_ENABLED", True)
+    monkeypatch.setattr(settings, "MAX_INFLIGHT_PER_USER", 0)
+    monkeypatch.setattr(settings, "MAX_QUEUE_DEPTH", 100)
+    monkeypatch.setattr(settings, "MAX_QUEUED_PER_USER", 2)
+    monkeypatch.setattr(job_queue, "_last_served", {})
+
+
+def _enqueue(make_request, user_id, priority=0):
+    video_request = make_request(user_id=user_id)
+    return job_queue.enqueue_job(video_request.id, user_id=user_id, priority=priority).id
+
+
+def _lease_users(jobs, complete=True):
+    users = []
+    while True:
+        leased = job_queue.lease_job("worker-1")
+        if leased is None:
+            return users
+        users.append(jobs[leased[0]])
+        if complete:
+            job_queue.complete_job(leased[0])
+
+
+def test_users_are_served_round_robin(make_request):
+    # A busy user queues first, but does not starve the others
+    jobs = {}
+    for user_id in (1, 1, 1, 2, 2, 3):
+        jobs[_enqueue(make_request, user_id)] = user_id
+
+    assert _lease_users(jobs) == [1, 2, 3, 1, 2, 1]
+
+
+def test_higher_priority_class_goes_first(make_request):
+    jobs = {}
+    for user_id, priority in ((1, 0), (1, 0), (2, 0), (3, 10)):
+        jobs[_enqueue(make_request, user_id, priority)] = user_id
+
+    assert _lease_users(jobs) == [3, 1, 2, 1]
+
+
+def test_users_at_inflight_cap_wait_for_their_running_job(make_request, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_INFLIGHT_PER_USER", 1)
+    jobs = {}
+    for user_id in (1, 1, 2):
+        jobs[_enqueue(make_request, user_id)] = user_id
+
+    running = job_queue.lease_job("worker-1")
+    assert jobs[running[0]] == 1
+    # User 1's second job waits while the first one runs
+    assert _lease_users(jobs, complete=False) == [2]
+
+    job_queue.complete_job(running[0])
+    assert _lease_users(jobs) == [1]
+
+
+def test_dispatch_rejects_user_over_per_user_limit(make_request):
+    assert dispatch_request(make_request(user_id=1))[0]
+    assert dispatch_request(make_request(user_id=1))[0]
+
+    video_request = make_request(user_id=1)
+    assert dispatch_request(video_request) == (False, 0)
+    assert video_request.status == "failed"
+    assert video_request.request_metadata["rejected_reason"] == "user_queue_full"
+
+    # Other users are not affected
+    assert dispatch_request(make_request(user_id=2))[0]
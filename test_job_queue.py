@@ -0,0 +1,171 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import settings
+from services import job_queue
+
+
+@pytest.fixture(autouse=True)
+def queue_settings(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 2)
+
+
+def test_lease_takes_highest_priority_first(make_request):
+    low = job_queue.enqueue_job(make_request().id, user_id=1, priority=0)
+    high = job_queue.enqueue_job(make_request(user_id=2).id, user_id=2, priority=10)
+
+    assert job_queue.lease_job("worker-1")[0] == high.id
+    assert job_queue.lease_job("worker-1")[0] == low.id
+    assert job_queue.lease_job("worker-1") is None
+
+
+def _expire(session, job_id):
+    from models import VideoJob
+
+    session.query(VideoJob).filter(VideoJob.id == job_id).update(
+        {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}
+    )
+    session.commit()
+
+
+def test_expired_lease_is_requeued(app_context, make_request):
+    from models import VideoJob
+
+    video_request = make_request()
+    job = job_queue.enqueue_job(video_request.id, user_id=1)
+    job_id, _, _ = job_queue.lease_job("worker-1")
+    video_request.status = "processing"
+    app_context.commit()
+
+    # A live lease is left alone
+    assert job_queue.recover_expired_leases() == 0
+
+    _expire(app_context, job_id)
+    assert job_queue.recover_expired_leases() == 1
+
+    app_context.expire_all()
+    job = app_context.get(VideoJob, job_id)
+    assert job.status == "queued"
+    assert job.leased_by is None
+    assert video_request.status == "pending"
+    assert job_queue.lease_job("worker-2")[0] == job_id
+
+
+def test_expired_lease_fails_after_max_attempts(app_context, make_request):
+    from models import VideoJob
+
+    video_request = make_request()
+    job_queue.enqueue_job(video_request.id, user_id=1)
+    for attempt in range(settings.JOB_MAX_ATTEMPTS):
+        job_id, _, _ = job_queue.lease_job(f"worker-{attempt}")
+        _expire(app_context, job_id)
+        job_queue.recover_expired_leases()
+
+    app_context.expire_all()
+    assert app_context.get(VideoJob, job_id).status == "failed"
+    assert video_request.status == "failed"
+    assert job_queue.lease_job("worker-3") is None
+
+
+def test_extend_leases_only_renews_own_jobs(app_context, make_request):
+    from models import VideoJob
+
+    job_queue.enqueue_job(make_request().id, user_id=1)
+    job_id, _, _ = job_queue.lease_job("worker-1")
+    _expire(app_context, job_id)
+
+    job_queue.extend_leases([job_id], "worker-2")
+    assert job_queue.recover_expired_leases() == 1
+
+    job_queue.lease_job("worker-1")
+    _expire(app_context, job_id)
+    job_queue.extend_leases([job_id], "worker-1")
+    app_context.expire_all()
+    assert app_context.get(VideoJob, job_id).lease_expires_at > datetime.utcnow()
+    assert job_queue.recover_expired_leases() == 0
+
+
+def _wait_for(condition, timeout=10.0):
+    import time
+
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_handed_off_job_stays_leased_until_completed(app_context, make_request, monkeypatch):
+    from app import app
+    from models import VideoJob
+
+    monkeypatch.setattr(settings, "JOB_LEASE_SECONDS", 3)
+    monkeypatch.setattr(settings, "JOB_POLL_INTERVAL", 0.05)
+    video_request = make_request()
+    job_id = job_queue.enqueue_job(video_request.id, user_id=1).id
+
+    def attach(request_id, message_type):
+        raise job_queue.JobHandedOff(f"Request {request_id} waits for an identical request")
+
+    pool = job_queue.WorkerPool(app, num_workers=1, handler=attach)
+    pool.start()
+    try:
+        _wait_for(lambda: job_id in pool.parked_jobs)
+        app_context.expire_all()
+        job = app_context.get(VideoJob, job_id)
+        assert job.status == "leased"
+        expires = job.lease_expires_at
+
+        # The maintenance thread renews the parked lease like a running one
+        def renewed():
+            app_context.expire_all()
+            return app_context.get(VideoJob, job_id).lease_expires_at > expires
+        _wait_for(renewed)
+
+        job_queue.complete_request_jobs([video_request.id])
+        _wait_for(lambda: job_id not in pool.parked_jobs)
+        app_context.expire_all()
+        assert app_context.get(VideoJob, job_id).status == "done"
+    finally:
+        pool.stop(timeout=5)
+
+
+def test_fail_job_leaves_reaped_job_failed(app_context, make_request):
+    from models import VideoJob
+
+    video_request = make_request()
+    job_queue.enqueue_job(video_request.id, user_id=1)
+    job_id, request_id, _ = job_queue.lease_job("worker-1")
+    job_queue.reap_job(job_id, request_id, "stuck")
+
+    # The stuck handler raising late must not queue the job again
+    job_queue.fail_job(job_id, "late error", retry_delay=0)
+    app_context.expire_all()
+    job = app_context.get(VideoJob, job_id)
+    assert job.status == "failed"
+    assert job.last_error == "stuck"
+
+
+def test_recovered_followers_are_notified_on_their_own_channel(app_context, make_request, monkeypatch):
+    from models import CoalescedRequest, User
+    from routes import api
+
+    user = app_context.query(User).filter(User.phone_number == "+15550100").first()
+    if user is None:
+        user = User(phone_number="+15550100")
+        app_context.add(user)
+        app_context.commit()
+    leader = make_request()
+    follower = make_request(user_id=user.id)
+    follower.status = "processing"
+    app_context.add(CoalescedRequest(request_id=follower.id, leader_request_id=leader.id))
+    app_context.commit()
+    job_queue.enqueue_job(follower.id, user_id=user.id, message_type="sms")
+    leader_id = leader.id
+
+    sent = []
+    monkeypatch.setattr(api, "send_message", lambda phone, text, message_type: sent.append((phone, message_type)))
+
+    # The follower is only known from the database, e.g. after a restart
+    api.finish_followers({"request_id": leader_id, "firebase_url": "https://example.com/v.mp4"}, None, [])
+    assert sent == [("+15550100", "sms")]
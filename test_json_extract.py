@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from services.json_extract import extract_json, extract_objects, StreamingJSONParser
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', {"a": 1}),
+    ('[1, 2]', [1, 2]),
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('Sure! Here it is: {"a": 1} Hope this helps.', {"a": 1}),
+    ('{"a": [1, 2,], "b": 2,}', {"a": [1, 2], "b": 2}),
+    ('{"a": 1, // the count\n "b": /* two */ 2}', {"a": 1, "b": 2}),
+    ("{'a': 'it\\'s', 'b': True, 'c': None}", {"a": "it's", "b": True, "c": None}),
+    ('{"text": "braces } and ] in a string, and a comma,}"}', {"text": "braces } and ] in a string, and a comma,}"}),
+    ('{"a": "line one\nline two"}', {"a": "line one\nline two"}),
+])
+def test_extract_json_repairs_common_mistakes(text, expected):
+    assert extract_json(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "no json here", "} only closers ]", "[}"])
+def test_extract_json_returns_none_without_a_value(text):
+    assert extract_json(text) is None
+
+
+def test_extract_json_takes_first_of_several_values():
+    assert extract_json('first {"a": 1} then {"b": 2}') == {"a": 1}
+
+
+def test_extract_json_filters_by_expected_type():
+    text = 'Tags: ["x", "y"]. Content: {"title": "T"}'
+    assert extract_json(text) == ["x", "y"]
+    assert extract_json(text, expect=dict) == {"title": "T"}
+    assert extract_json('{"a": 1}', expect=list) is None
+
+
+def test_extract_json_closes_truncated_response():
+    assert extract_json('{"title": "Orbits", "points": ["one", "tw') == {"title": "Orbits", "points": ["one", "tw"]}
+    assert extract_json('{"title": "Orbits", "summary":') == {"title": "Orbits", "summary": None}
+    assert extract_json('{"title": "Orbits", "summ') == {"title": "Orbits"}
+    assert extract_json('Here you go: {') == {}
+
+
+def test_extract_objects_salvages_list_items():
+    text = '{"scenes": [{"n": 1}, {"n": 2}, {"n": 3, "desc": "cut of'
+    assert extract_objects(text, after='"scenes"') == [{"n": 1}, {"n": 2}, {"n": 3, "desc": "cut of"}]
+    assert extract_objects(text, after='"missing"') == []
+
+
+def test_streaming_parser_reports_fields_as_they_complete():
+    document = json.dumps({
+        "script": 'Say "hello" \\ twice',
+        "scenes": [{"description": "one", "duration_seconds": 5}, {"description": "two }", "duration_seconds": 6}],
+        "title": "Greetings",
+    })
+    parser = StreamingJSONParser(strings=["script", "title"], arrays=["scenes"])
+    completed = []
+    for i in range(0, len(document), 7):
+        completed.extend(parser.feed(document[i:i + 7]))
+
+    assert completed == [
+        ("script", 'Say "hello" \\ twice'),
+        ("scenes", {"description": "one", "duration_seconds": 5}),
+        ("scenes", {"description": "two }", "duration_seconds": 6}),
+        ("title", "Greetings"),
+    ]
+    assert parser.text == document
+
+
+def test_streaming_parser_one_character_at_a_time():
+    document = '{"scenes": [{"a": 1}, {"b": "x, y"}], "script": "done"}'
+    parser = StreamingJSONParser(strings=["script"], arrays=["scenes"])
+    completed = [pair for char in document for pair in parser.feed(char)]
+    assert completed == [("scenes", {"a": 1}), ("scenes", {"b": "x, y"}), ("script", "done")]
+
+
+def test_streaming_parser_skips_keys_that_do_not_match():
+    document = '{"meta": {"script" : 3, "note": "say \\"script\\": \\"no\\""}, "script"\n :\n "yes \\\\"}'
+    parser = StreamingJSONParser(strings=["script"])
+    completed = [pair for char in document for pair in parser.feed(char)]
+    assert completed == [("script", "yes \\")]
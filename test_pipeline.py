@@ -0,0 +1,75 @@
+from concurrent.futures import Future
+
+from services.deadline import Deadline
+from services.pipeline import Pipeline, PipelineStage
+
+
+def _finished(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def test_failure_handler_sees_jobs_that_fail_or_run_out_of_time():
+    failed = []
+
+    def content(context):
+        if context.get("broken"):
+            raise ValueError("bad response")
+
+    def speech(context):
+        pass
+
+    pipeline = Pipeline([
+        PipelineStage("content", content, workers=1, queue_size=1),
+        PipelineStage("speech", speech, workers=1, queue_size=1),
+    ], on_failure=lambda context: failed.append(context["name"]))
+
+    cancelled = Deadline(30)
+    cancelled.cancel("abandoned")
+    jobs = [
+        pipeline.submit({"name": "ok", "deadline": Deadline(30)}),
+        pipeline.submit({"name": "broken", "broken": True}),
+        pipeline.submit({"name": "abandoned", "deadline": cancelled}),
+    ]
+    for job in jobs:
+        assert job.wait(10)
+
+    assert sorted(failed) == ["abandoned", "broken"]
+
+
+def test_discard_prefetched_cancels_and_removes_outputs(tmp_path):
+    from app import app  # noqa: F401 (routes are imported through the app)
+    from routes.api import discard_prefetched
+    from services.speech_generator import manifest_path
+
+    audio = tmp_path / "speech.mp3"
+    audio.write_bytes(b"audio")
+    manifest = tmp_path / "speech.timing.json"
+    manifest.write_text("{}")
+    assert manifest_path(str(audio)) == str(manifest)
+    clip = tmp_path / "scene_1.mp4"
+    clip.write_bytes(b"clip")
+
+    pending = Future()
+    running = Future()
+    running.set_running_or_notify_cancel()
+    context = {
+        "prefetched_speech": ("script", _finished(str(audio))),
+        "prefetched_scenes": {
+            0: ({"description": "one"}, _finished({"path": str(clip)})),
+            1: ({"description": "two"}, pending),
+            2: ({"description": "three"}, running),
+        },
+    }
+    discard_prefetched(context)
+
+    assert "prefetched_speech" not in context and "prefetched_scenes" not in context
+    assert not audio.exists() and not manifest.exists() and not clip.exists()
+    assert pending.cancelled()
+
+    # A download already in progress is removed once it finishes
+    late = tmp_path / "scene_3.mp4"
+    late.write_bytes(b"clip")
+    running.set_result({"path": str(late)})
+    assert not late.exists()
@@ -0,0 +1,125 @@
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from config import settings
+from services import rate_limiter
+from services.rate_limiter import AdaptiveConcurrencyLimit, QuotaExhaustedError, RateLimiter, TokenBucket
+
+
+class Throttled(Exception):
+    code = 429
+
+
+@pytest.fixture(autouse=True)
+def limiter_settings(monkeypatch):
+    monkeypatch.setattr(settings, "GEMINI_BURST_SECONDS", 1)
+    monkeypatch.setattr(settings, "GEMINI_QUOTA_WAIT_SECONDS", 0)
+    monkeypatch.setattr(settings, "GEMINI_MAX_RETRIES", 2)
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire(1) == 0
+    assert bucket.try_acquire(1) == 0
+    assert bucket.try_acquire(1) == pytest.approx(0.1, abs=0.02)
+
+    # Requests bigger than the bucket go through on a full bucket
+    big = TokenBucket(rate=10, capacity=2)
+    assert big.try_acquire(5) == 0
+
+
+def test_token_bucket_adjust_corrects_the_estimate():
+    bucket = TokenBucket(rate=0.001, capacity=10)
+    assert bucket.try_acquire(4) == 0
+    bucket.adjust(8)
+    assert bucket.tokens == pytest.approx(-2, abs=0.01)
+    bucket.adjust(-20)
+    assert bucket.tokens == 10
+
+
+def test_concurrency_halves_on_overload_and_recovers_on_success():
+    limit = AdaptiveConcurrencyLimit(initial=8, minimum=2, maximum=8)
+    limit.on_overload()
+    assert int(limit.limit) == 4
+    limit.on_overload()
+    limit.on_overload()
+    assert int(limit.limit) == 2
+
+    # About one more slot for every limit's worth of successful calls
+    for _ in range(3):
+        limit.on_success()
+    assert int(limit.limit) == 3
+    for _ in range(100):
+        limit.on_success()
+    assert int(limit.limit) == 8
+
+
+def test_concurrency_limit_blocks_when_full():
+    limit = AdaptiveConcurrencyLimit(initial=1, minimum=1, maximum=1)
+    assert limit.acquire(0)
+    assert not limit.acquire(0.05)
+    limit.release()
+    assert limit.acquire(0)
+
+
+def test_throttled_call_does_not_hold_its_slot_while_backing_off(monkeypatch):
+    limiter = RateLimiter(rpm=6000, tpm=600000, max_concurrency=1)
+    backing_off = threading.Event()
+    retry = threading.Event()
+
+    def sleep(delay):
+        backing_off.set()
+        assert retry.wait(5)
+
+    # Hold the throttled call in its backoff until the other call went through
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=time.monotonic, sleep=sleep))
+
+    calls = []
+
+    def flaky():
+        calls.append("flaky")
+        if len(calls) == 1:
+            raise Throttled("slow down")
+        return "done"
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(limiter.call(flaky, 1, "flaky")))
+    thread.start()
+    try:
+        assert backing_off.wait(5)
+        assert limiter.concurrency.in_flight == 0
+        assert limiter.call(lambda: "other", 1, "other") == "other"
+    finally:
+        retry.set()
+        thread.join(5)
+
+    assert results == ["done"]
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_throttled_call_gives_up_after_max_retries(monkeypatch):
+    limiter = RateLimiter(rpm=6000, tpm=600000, max_concurrency=4)
+    monkeypatch.setattr(rate_limiter, "backoff_delay", lambda attempt: 0)
+
+    def throttled():
+        raise Throttled("slow down")
+
+    with pytest.raises(QuotaExhaustedError):
+        limiter.call(throttled, 1, "throttled")
+    assert int(limiter.concurrency.limit) == 1
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_failed_acquire_refunds_rate_tokens():
+    limiter = RateLimiter(rpm=60, tpm=600, max_concurrency=1)
+    assert limiter.concurrency.acquire(0)
+
+    with pytest.raises(QuotaExhaustedError):
+        limiter.call(lambda: "never", 5, "blocked")
+
+    # No call was made, so neither the request nor its tokens were spent
+    assert limiter.requests.tokens == pytest.approx(limiter.requests.capacity)
+    assert limiter.tokens.tokens == pytest.approx(limiter.tokens.capacity)
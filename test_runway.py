@@ -0,0 +1,76 @@
+import os
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from config import settings
+from services import video_generator, video_renderer
+from benchmark_runway import FakeRunwayHandler, assembled_order, make_content
+
+
+@pytest.fixture
+def ffmpeg(monkeypatch):
+    if video_renderer.get_ffmpeg() is None:
+        imageio_ffmpeg = pytest.importorskip("imageio_ffmpeg", reason="ffmpeg is needed to assemble the clips")
+        monkeypatch.setattr(settings, "FFMPEG_PATH", imageio_ffmpeg.get_ffmpeg_exe())
+
+
+@pytest.fixture
+def runway_server(monkeypatch, ffmpeg):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRunwayHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(settings, "RUNWAY_API_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(settings, "RUNWAY_POLL_INITIAL", 0.05)
+    monkeypatch.setattr(settings, "RUNWAY_POLL_MAX", 0.2)
+    monkeypatch.setattr(settings, "RUNWAY_MAX_PARALLEL_SCENES", 4)
+    monkeypatch.setattr(settings, "VIDEO_WIDTH", 320)
+    monkeypatch.setattr(settings, "VIDEO_HEIGHT", 180)
+    monkeypatch.setattr(FakeRunwayHandler, "tasks", {})
+    monkeypatch.setattr(FakeRunwayHandler, "render_factor", 0.1)
+    monkeypatch.setattr(video_generator, "_scene_executor", None)
+    monkeypatch.setattr(video_generator, "_runway_session", None)
+    yield server
+    server.shutdown()
+
+
+def _scene_files():
+    return {name for name in os.listdir(video_generator.TEMP_DIR) if name.startswith("scene_")}
+
+
+def test_scenes_render_in_parallel_and_assemble_in_order(runway_server, tmp_path):
+    content = make_content(4, seed=5)
+    before = _scene_files()
+    output_path = str(tmp_path / "lesson.mp4")
+
+    assert video_generator.generate_with_runway(content, "Science", "", output_path) == output_path
+
+    # Every scene was submitted before the first one finished rendering
+    tasks = list(FakeRunwayHandler.tasks.values())
+    assert len(tasks) == 4
+    submitted = [task["done_at"] - task["duration"] * FakeRunwayHandler.render_factor for task in tasks]
+    assert max(submitted) < min(task["done_at"] for task in tasks)
+
+    durations = [scene["duration_seconds"] for scene in content["scenes"]]
+    assert assembled_order(output_path, durations) == [1, 2, 3, 4]
+    assert _scene_files() == before
+    assert not [name for name in os.listdir(tmp_path) if ".scene" in name]
+
+
+def test_failed_runway_render_falls_back_to_local_renderer(monkeypatch, tmp_path):
+    def unavailable(scene, subject):
+        raise video_generator.RunwayTaskFailed("RunwayML is down")
+
+    monkeypatch.setattr(video_generator, "submit_scene", unavailable)
+    monkeypatch.setattr(video_renderer, "get_ffmpeg", lambda: "/usr/bin/ffmpeg")
+    calls = []
+    monkeypatch.setattr(video_generator, "render_local_video", lambda *args: calls.append("local") or args[-1])
+    monkeypatch.setattr(video_generator, "generate_basic_video", lambda *args: calls.append("basic") or args[-1])
+    content = make_content(2, seed=1)
+
+    monkeypatch.setattr(video_renderer, "is_available", lambda: True)
+    video_generator.generate_with_runway(content, "Science", "", str(tmp_path / "a.mp4"))
+    monkeypatch.setattr(video_renderer, "is_available", lambda: False)
+    video_generator.generate_with_runway(content, "Science", "", str(tmp_path / "b.mp4"))
+
+    assert calls == ["local", "basic"]
@@ -0,0 +1,62 @@
+import pytest
+
+from config import settings
+from services import semantic_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_indexes(monkeypatch):
+    # Start from empty indexes instead of loading the persistent content cache
+    monkeypatch.setattr(semantic_cache, "_indexes", {})
+    monkeypatch.setattr(semantic_cache, "_loaded", True)
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_DIMENSIONS", 4096)
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_MAX_ENTRIES", 100)
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_REBUILD_BATCH", 2)
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_THRESHOLD", 0.9)
+
+    entries = [
+        ("Photosynthesis", "How does photosynthesis work in plants?", "photosynthesis"),
+        ("Cell Division", "What happens during mitosis in a cell?", "mitosis"),
+        ("Genetics", "How are traits inherited from parents?", "genetics"),
+    ]
+    for topic, query, cache_key in entries:
+        semantic_cache.add_entry("Biology", topic, "Beginner", query, cache_key)
+
+
+def test_near_duplicate_query_returns_cached_entry():
+    key = semantic_cache.find_similar(
+        "Biology", "Photosynthesis", "Beginner", "Please explain: photosynthesis, how does it work in plants?"
+    )
+    assert key == "photosynthesis"
+
+
+def test_subject_and_level_are_matched_case_insensitively():
+    key = semantic_cache.find_similar(
+        " biology", "Photosynthesis", "beginner ", "How does photosynthesis work in plants?"
+    )
+    assert key == "photosynthesis"
+
+
+def test_different_topic_is_a_miss():
+    key = semantic_cache.find_similar(
+        "Biology", "Respiration", "Beginner", "How does cellular respiration release energy?"
+    )
+    assert key is None
+
+
+def test_different_level_is_a_miss():
+    key = semantic_cache.find_similar(
+        "Biology", "Photosynthesis", "Advanced", "How does photosynthesis work in plants?"
+    )
+    assert key is None
+
+
+def test_ring_buffer_overwrites_oldest_entries():
+    index = semantic_cache.SemanticIndex(dimensions=1024, max_entries=2, rebuild_batch=1)
+    index.add("photosynthesis in plants", "first")
+    index.add("mitosis in cells", "second")
+    index.add("inheritance of traits", "third")
+
+    assert len(index) == 2
+    assert index.search("photosynthesis in plants")[0] != "first"
+    assert index.search("inheritance of traits")[0] == "third"
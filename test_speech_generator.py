@@ -0,0 +1,120 @@
+import os
+
+import pytest
+
+from config import settings
+from services.speech_generator import align_scenes, concat_audio, split_script
+
+FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+
+
+def id3v2_tag(body_size: int, footer: bool = False) -> bytes:
+    # Tag sizes are syncsafe: 7 bits per byte
+    size = bytes((body_size >> shift) & 0x7f for shift in (21, 14, 7, 0))
+    flags = b"\x10" if footer else b"\x00"
+    tag = b"ID3\x04\x00" + flags + size + b"\x00" * body_size
+    return tag + (b"3DI\x04\x00" + flags + size if footer else b"")
+
+
+def id3v1_tag() -> bytes:
+    return b"TAG" + b"title".ljust(125, b"\x00")
+
+
+def manifest(durations):
+    chunks = []
+    start = 0.0
+    for duration in durations:
+        chunks.append({"start": start, "duration": duration})
+        start += duration
+    return {"duration": start, "chunks": chunks}
+
+
+def scenes(*durations):
+    return [{"description": f"Scene {i}", "duration_seconds": d} for i, d in enumerate(durations)]
+
+
+@pytest.fixture
+def bitrate(monkeypatch):
+    monkeypatch.setattr(settings, "TTS_OUTPUT_FORMAT", "mp3_44100_128")
+    return 128000
+
+
+def test_concat_audio_joins_frames_without_tags(tmp_path, bitrate):
+    chunks = [
+        (id3v2_tag(300), FRAME * 3, id3v1_tag()),
+        (id3v2_tag(40, footer=True), FRAME * 2, b""),
+        (b"", FRAME * 5, id3v1_tag()),
+        (b"", FRAME, b""),
+    ]
+    paths = []
+    for i, parts in enumerate(chunks):
+        path = tmp_path / f"chunk_{i}.mp3"
+        path.write_bytes(b"".join(parts))
+        paths.append(str(path))
+
+    output = tmp_path / "narration.mp3"
+    durations = concat_audio(paths, str(output))
+
+    assert output.read_bytes() == FRAME * 11
+    assert durations == pytest.approx([len(frames) * 8 / bitrate for _, frames, _ in chunks])
+
+
+def test_concat_audio_keeps_short_files_whole(tmp_path, bitrate):
+    # Too short to hold an ID3v1 tag, even though it starts like one
+    path = tmp_path / "short.mp3"
+    path.write_bytes(b"TAG" + FRAME[:60])
+    output = tmp_path / "out.mp3"
+    concat_audio([str(path)], str(output))
+    assert output.read_bytes() == b"TAG" + FRAME[:60]
+
+
+def test_concat_audio_handles_tag_larger_than_file(tmp_path, bitrate):
+    path = tmp_path / "broken.mp3"
+    path.write_bytes(id3v2_tag(5000)[:100])
+    output = tmp_path / "out.mp3"
+    assert concat_audio([str(path)], str(output)) == [0.0]
+    assert os.path.getsize(output) == 0
+
+
+def test_align_scenes_fills_the_narration():
+    durations = align_scenes(manifest([4.0, 6.0, 5.0, 5.0]), scenes(10, 10))
+    assert len(durations) == 2
+    assert sum(durations) == pytest.approx(20.0)
+
+
+def test_align_scenes_snaps_cuts_to_chunk_boundaries():
+    # Planned cuts at 15s and 30s of a 45s narration; chunks end at 14, 31 and 40
+    durations = align_scenes(manifest([14.0, 17.0, 9.0, 5.0]), scenes(10, 10, 10))
+    assert durations == pytest.approx([14.0, 17.0, 14.0])
+
+
+def test_align_scenes_does_not_snap_to_distant_boundaries():
+    # The only boundary is far from the planned cut at 20s
+    durations = align_scenes(manifest([2.0, 38.0]), scenes(10, 10))
+    assert durations == pytest.approx([20.0, 20.0])
+
+
+def test_align_scenes_scales_planned_durations():
+    durations = align_scenes(manifest([30.0]), scenes(5, 10, 15))
+    assert durations == pytest.approx([5.0, 10.0, 15.0])
+    durations = align_scenes(manifest([60.0]), scenes(5, 10, 15))
+    assert durations == pytest.approx([10.0, 20.0, 30.0])
+
+
+def test_align_scenes_gives_every_scene_at_least_a_second():
+    durations = align_scenes(manifest([2.0]), scenes(10, 10, 10, 10))
+    assert len(durations) == 4
+    assert all(duration >= 1.0 for duration in durations)
+
+
+def test_align_scenes_defaults_missing_durations():
+    durations = align_scenes(manifest([30.0]), [{"description": "a"}, {"description": "b", "duration_seconds": None}])
+    assert durations == pytest.approx([15.0, 15.0])
+
+
+def test_split_script_respects_chunk_size():
+    script = "\n\n".join(["Short one.", "Another short one.", "A much longer paragraph. " * 20])
+    chunks = split_script(script, 120)
+    assert all(len(chunk) <= 120 for chunk in chunks)
+    assert chunks[0] == "Short one.\n\nAnother short one."
+    assert " ".join(" ".join(chunks).split()) == " ".join(script.split())
@@ -0,0 +1,85 @@
+import random
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from config import settings
+from services import firebase_service
+from benchmark_upload import FakeGCSHandler
+
+PART_SIZE = 1024 * 1024
+
+
+@pytest.fixture
+def gcs_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGCSHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("STORAGE_EMULATOR_HOST", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(settings, "STORAGE_PROVIDER", "firebase")
+    monkeypatch.setattr(firebase_service, "FIREBASE_STORAGE_BUCKET", "tapbuddy-test")
+    monkeypatch.setattr(firebase_service, "_emulator_bucket", None)
+
+    # Parts of two chunks each, so a dropped connection can leave half a chunk stored
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", PART_SIZE // 2)
+    monkeypatch.setattr(settings, "UPLOAD_COMPOSITE_PARTS", 4)
+    monkeypatch.setattr(settings, "UPLOAD_MAX_RETRIES", 10)
+    monkeypatch.setattr(settings, "UPLOAD_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(settings, "UPLOAD_BACKOFF_MAX", 0.05)
+
+    monkeypatch.setattr(FakeGCSHandler, "objects", {})
+    monkeypatch.setattr(FakeGCSHandler, "sessions", {})
+    monkeypatch.setattr(FakeGCSHandler, "stream_rate", 1 << 40)
+    monkeypatch.setattr(FakeGCSHandler, "failure_rate", 0.0)
+    monkeypatch.setattr(FakeGCSHandler, "rng", random.Random(3))
+    monkeypatch.setattr(FakeGCSHandler, "injected", {"503": 0, "partial": 0})
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def video(tmp_path):
+    data = random.Random(1).randbytes(4 * PART_SIZE)
+    path = tmp_path / "video.mp4"
+    path.write_bytes(data)
+    return str(path), data
+
+
+def _retries():
+    return sum(firebase_service.UPLOAD_RETRIES.values.values())
+
+
+def test_resumable_upload_in_chunks(gcs_server, video, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_COMPOSITE_THRESHOLD", 1 << 62)
+    file_path, data = video
+
+    assert firebase_service.upload_file_to_firebase(file_path, "videos/one.mp4")
+    assert FakeGCSHandler.objects["videos/one.mp4"] == data
+    assert len(FakeGCSHandler.sessions) == 1
+
+
+def test_composite_upload_joins_parts_and_removes_them(gcs_server, video, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_COMPOSITE_THRESHOLD", 0)
+    file_path, data = video
+
+    assert firebase_service.upload_file_to_firebase(file_path, "videos/parts.mp4")
+    assert FakeGCSHandler.objects["videos/parts.mp4"] == data
+    assert len(FakeGCSHandler.sessions) == 4
+    assert not [name for name in FakeGCSHandler.objects if ".parts/" in name]
+
+
+def test_transient_failures_resume_where_storage_left_off(gcs_server, video, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_COMPOSITE_THRESHOLD", 0)
+    monkeypatch.setattr(FakeGCSHandler, "failure_rate", 0.4)
+    file_path, data = video
+    retries_before = _retries()
+
+    assert firebase_service.upload_file_to_firebase(file_path, "videos/faulty.mp4")
+
+    # A chunk that did not start where storage left off would have been
+    # rejected, so an intact file means every retry resumed from the 308 Range
+    assert FakeGCSHandler.objects["videos/faulty.mp4"] == data
+    injected = FakeGCSHandler.injected
+    assert injected["503"] and injected["partial"]
+    assert _retries() - retries_before == injected["503"] + injected["partial"]
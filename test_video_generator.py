@@ -0,0 +1,26 @@
+import pytest
+
+from services.video_generator import snap_to_grid
+
+
+def test_snap_to_grid_rounds_cuts_not_durations():
+    durations = snap_to_grid([4.4, 4.4, 4.4, 4.4], 1.0)
+    # Cuts at 4.4, 8.8 and 13.2 round to 4, 9 and 13; the end rounds up to 18
+    assert durations == pytest.approx([4.0, 5.0, 4.0, 5.0])
+
+
+def test_snap_to_grid_gives_equal_scenes_equal_durations():
+    first = snap_to_grid([14.6, 5.3, 15.2], 1.0)
+    second = snap_to_grid([15.4, 4.8, 13.9], 1.0)
+    assert first[:2] == second[:2] == pytest.approx([15.0, 5.0])
+
+
+def test_snap_to_grid_covers_the_narration():
+    durations = [3.3, 7.05, 2.01]
+    snapped = snap_to_grid(durations, 0.5)
+    assert sum(durations) <= sum(snapped) < sum(durations) + 0.5
+    assert all(duration >= 0.5 for duration in snapped)
+
+
+def test_snap_to_grid_disabled():
+    assert snap_to_grid([3.3, 4.7], 0) == [3.3, 4.7]
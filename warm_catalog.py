@@ -0,0 +1,176 @@
+import os
+import sys
+import csv
+import time
+import logging
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+# The catalog is built in this process; don't start the queue workers
+os.environ["EMBEDDED_WORKERS"] = "False"
+
+from app import app
+from config import settings
+from models import get_db, VideoRequest
+from services.content_cache import make_cache_key, get_cached_video, store_video
+from services.content_generator import generate_educational_content, lookup_cached_content
+from services.speech_generator import generate_speech
+from services.video_generator import generate_video
+from services.firebase_service import upload_file_to_firebase, get_firebase_url
+from services.rate_limiter import QuotaExhaustedError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CatalogEntry = Tuple[str, str, str, str]
+
+
+def read_topic_list(path: str) -> List[CatalogEntry]:
+    """
+    Read a CSV of subject,topic,level[,query] rows. A header row is
+    skipped; a missing query defaults to the topic.
+    """
+    entries = []
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            row = [value.strip() for value in row]
+            if len(row) < 3 or not row[0] or row[0].lower() == "subject":
+                continue
+            subject, topic, level = row[:3]
+            query = row[3] if len(row) > 3 and row[3] else topic
+            entries.append((subject, topic, level, query))
+    return entries
+
+
+def top_requested(limit: int, days: Optional[int]) -> List[CatalogEntry]:
+    """
+    Mine video_requests for the most requested subject/topic/level
+    combinations, each with its most frequently asked question.
+    """
+    with app.app_context():
+        query = get_db().query(VideoRequest.subject, VideoRequest.topic, VideoRequest.level, VideoRequest.query)
+        if days:
+            query = query.filter(VideoRequest.created_at >= datetime.utcnow() - timedelta(days=days))
+        rows = query.all()
+
+    combinations = Counter()
+    questions = {}
+    for subject, topic, level, question in rows:
+        if not subject or not topic:
+            continue
+        key = (subject, topic, level or "Beginner")
+        combinations[key] += 1
+        questions.setdefault(key, Counter())[question or topic] += 1
+
+    return [
+        (subject, topic, level, questions[(subject, topic, level)].most_common(1)[0][0])
+        for (subject, topic, level), _ in combinations.most_common(limit)
+    ]
+
+
+def is_warm(entry: CatalogEntry, content_only: bool) -> bool:
+    """
+    Whether an earlier run already built this entry, so that an interrupted
+    run can simply be started again.
+    """
+    cache_key, content = lookup_cached_content(*entry)
+    if content is None:
+        return False
+    return content_only or get_cached_video(cache_key) is not None
+
+
+def warm_entry(entry: CatalogEntry, content_only: bool) -> str:
+    """
+    Generate content, audio and video for one entry and store them in the
+    content cache. Returns "built" or "skipped".
+    """
+    if is_warm(entry, content_only):
+        return "skipped"
+
+    subject, topic, level, query = entry
+    cache_key, content = lookup_cached_content(subject, topic, level, query)
+    if content is None:
+        content = generate_educational_content(subject, topic, level, query)
+        cache_key = make_cache_key(subject, topic, level, query)
+    if content_only:
+        return "built"
+
+    audio_path = generate_speech(content["script"])
+    video_path = generate_video(content, subject, audio_path)
+    firebase_path = f"catalog/{cache_key}.mp4"
+    if not upload_file_to_firebase(video_path, firebase_path):
+        raise RuntimeError(f"upload of {firebase_path} failed")
+    store_video(cache_key, get_firebase_url(firebase_path))
+
+    for path in (audio_path, video_path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return "built"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Pre-generate content and videos for popular requests")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--topics", help="CSV file of subject,topic,level[,query] rows")
+    source.add_argument("--top", type=int, help="Warm the N most requested subject/topic/level combinations")
+    parser.add_argument("--days", type=int, help="With --top, only count requests from the last N days")
+    parser.add_argument("--parallel", type=int, default=4, help="Entries built at the same time")
+    parser.add_argument("--content-only", action="store_true", help="Only generate and cache the content")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    if not settings.CONTENT_CACHE_ENABLED:
+        print("CONTENT_CACHE_ENABLED is off, nothing would be served from the catalog")
+        return 1
+
+    entries = read_topic_list(args.topics) if args.topics else top_requested(args.top, args.days)
+    total = len(entries)
+    print(f"Warming {total} catalog entries with {args.parallel} in parallel")
+
+    counts = {"built": 0, "skipped": 0, "failed": 0}
+    failures = []
+    progress_lock = threading.Lock()
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+        futures = {executor.submit(warm_entry, entry, args.content_only): entry for entry in entries}
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                outcome = future.result()
+            except QuotaExhaustedError as e:
+                outcome = "failed"
+                failures.append((entry, f"out of quota: {str(e)}"))
+            except Exception as e:
+                outcome = "failed"
+                failures.append((entry, str(e)))
+
+            with progress_lock:
+                counts[outcome] += 1
+                done = sum(counts.values())
+                elapsed = time.perf_counter() - start
+                # Skipped entries are nearly free, so estimate from the built ones
+                per_entry = elapsed / max(1, counts["built"] + counts["failed"])
+                eta = per_entry * (total - done) / max(1, args.parallel)
+                print(
+                    f"[{done}/{total}] {outcome:<7} {entry[0]} / {entry[1]} ({entry[2]})   "
+                    f"built {counts['built']}, skipped {counts['skipped']}, failed {counts['failed']}, "
+                    f"elapsed {elapsed:.0f}s, eta {eta:.0f}s",
+                    flush=True
+                )
+
+    for entry, error in failures:
+        print(f"FAILED {entry[0]} / {entry[1]} ({entry[2]}): {error}")
+    if failures:
+        print("Run the same command again to retry the failed entries; finished ones are skipped")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
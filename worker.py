@@ -0,0 +1,46 @@
+import os
+import sys
+import signal
+import logging
+import argparse
+
+# Workers run in this process, so the web app must not start its own pool
+os.environ["EMBEDDED_WORKERS"] = "False"
+
+from app import app
+from config import settings
+from services.job_queue import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> int:
+    """
+    Run the video generation worker pool separately from the Flask app.
+
+    Usage: python worker.py [--workers N]
+    """
+    parser = argparse.ArgumentParser(description="Process queued TAPBuddy video requests")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.WORKER_COUNT,
+        help=f"Number of worker threads (default: {settings.WORKER_COUNT})"
+    )
+    args = parser.parse_args()
+
+    pool = WorkerPool(app, num_workers=args.workers)
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, finishing running jobs")
+        pool.stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    pool.run_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())